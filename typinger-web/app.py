@@ -5,9 +5,9 @@ Typinger Web - Flaskアプリケーション
 タイピング練習Webアプリのメインアプリケーションファイルです。
 """
 
-from flask import Flask, render_template, request, jsonify, url_for
+from flask import Flask, render_template, request, jsonify, url_for, Response
 from flask_cors import CORS
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 import sys
 
@@ -17,23 +17,73 @@ from core.typing_judge import TypingJudge, JudgeResult
 from core.statistics import StatisticsCalculator, KeyEvent, EventType, StatisticsData
 from core.csv_logger import CSVLogger
 from core.scenario_manager import ScenarioManager
-from core.log_viewer import LogViewer
+from core.log_viewer import LogViewer, GLOBAL_PERCENTILES, CSV_FILE_TYPES
 from core.keymap_manager import KeymapManager, KeymapValidator
 from core.keymap_converter import KeymapConverter
+from core.typing_session import TypingSession, MAX_REPLAY_EVENTS
+from core.input_automaton import compile_automaton
+from core.batch_statistics import BatchStatisticsCalculator
+from core.bigram_latency import BigramLatencyCollector, KEY_SPACES
+from core.session_store import SessionStore, SQLiteSessionStore
+from core.session_journal import SessionJournal, EXPORT_KINDS
+from core.event_log import BinaryEventLog, load_event_logs
+from core.results_store import ResultsStore
+from config import get_config
+import realtime_server
 
 # Create Flask app
 app = Flask(__name__)
 CORS(app)
 
+config = get_config()
+
 # Initialize core components
 scenario_manager = ScenarioManager("scenario")
-csv_logger = CSVLogger("output")
-log_viewer = LogViewer("output")
+csv_logger = CSVLogger(
+    "output",
+    async_write=config.CSV_ASYNC_WRITE,
+    queue_size=config.CSV_QUEUE_SIZE,
+    fsync=config.CSV_FSYNC,
+)
+# LOG_STORAGE=journal の場合はセッションごとのCSVの代わりにジャーナルへ追記
+journal = None
+if config.LOG_STORAGE == 'journal':
+    journal = SessionJournal(
+        os.path.join("output", "journal"),
+        max_bytes=config.JOURNAL_MAX_BYTES,
+        max_age=config.JOURNAL_MAX_AGE,
+        fsync=config.CSV_FSYNC != 'none',
+    )
+# EVENT_LOG_BINARY=1 の場合はイベント列をバイナリの列指向ログにも追記し、集計はそこから読む
+event_log = BinaryEventLog("output", fsync=config.CSV_FSYNC != 'none') if config.EVENT_LOG_BINARY else None
+# RESULTS_STORE=1（既定）の場合は完了したセッションの結果を SQLite に保存し、管理画面の集計に使う
+results_store = None
+if config.RESULTS_STORE:
+    results_store = ResultsStore(config.RESULTS_DB_PATH)
+    # 結果ストア導入前のサマリCSVを取り込む（空の場合のみ）
+    if len(results_store) == 0:
+        results_store.import_summary_csvs("output")
+log_viewer = LogViewer("output", journal, results_store)
+# 書き込んだCSVは管理画面の一覧に直接追加する（ディレクトリを読み直さない）
+csv_logger.add_listener(log_viewer.add_csv_file)
 keymap_manager = KeymapManager("keymaps")
 romaji_converter = RomajiConverter()
+bigram_collector = BigramLatencyCollector("output", journal, event_log)
 
-# Session storage (in-memory for now, can be replaced with database)
-sessions = {}
+# Session storage (上限数とアイドルTTL付き)
+# SESSION_BACKEND=sqlite の場合は gunicorn の複数ワーカー間で共有
+if config.SESSION_BACKEND == 'sqlite':
+    sessions = SQLiteSessionStore(config.SESSION_DB_PATH,
+                                  config.SESSION_MAX_COUNT, config.SESSION_IDLE_TTL)
+else:
+    sessions = SessionStore(config.SESSION_MAX_COUNT, config.SESSION_IDLE_TTL)
+sessions.start_sweeper(config.SESSION_SWEEP_INTERVAL)
+
+# キー入力用 WebSocket サーバーのポート（起動していない場合は None）
+realtime_port = None
+# WS_SEPARATE=1 の場合は別プロセス（python realtime_server.py）が待ち受けるため、ポートだけを通知する
+if config.WS_SEPARATE and config.WS_PORT:
+    realtime_port = config.WS_PORT
 
 
 @app.route('/')
@@ -78,21 +128,14 @@ def start_session():
     # セッションを作成
     session_id = f"session_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
     
-    sessions[session_id] = {
-        'scenario_file': scenario_file,
-        'target_text': target_text,
-        'target_rubi': target_rubi,
-        'judge': TypingJudge(target_text, target_rubi),
-        'stats_calculator': StatisticsCalculator(),
-        'events': [],
-        'start_time': datetime.now(),
-    }
+    sessions.put(session_id, TypingSession(scenario_file, target_text, target_rubi))
     
     return jsonify({
         "ok": True,
         "session_id": session_id,
         "target_text": target_text,
         "target_rubi": target_rubi,
+        "ws_port": realtime_port,
     })
 
 
@@ -131,20 +174,14 @@ def typing_page(scenario_file):
     # セッションを作成
     session_id = f"session_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
     
-    sessions[session_id] = {
-        'scenario_file': scenario_file,
-        'target_text': target_text,
-        'target_rubi': target_rubi,
-        'judge': TypingJudge(target_text, target_rubi),
-        'stats_calculator': StatisticsCalculator(),
-        'events': [],
-        'start_time': datetime.now(),
-    }
+    sessions.put(session_id, TypingSession(scenario_file, target_text, target_rubi))
     
     return render_template('typing.html', 
                           session_id=session_id,
                           target_text=target_text,
-                          target_rubi=target_rubi)
+                          target_rubi=target_rubi,
+                          automaton=compile_automaton(target_rubi.lower()).to_dict(),
+                          ws_port=realtime_port or 0)
 
 
 @app.route('/typing/', defaults={'scenario_file': None})
@@ -154,18 +191,55 @@ def typing_setup(scenario_file):
     return render_template('typing_setup.html')
 
 
+def _get_progress(judge, progress_mode):
+    """
+    応答に含める進捗を取得
+    
+    progress_mode が 'delta' の場合は位置とカウントのみの差分形式、
+    それ以外は目標テキスト・ルビを含む完全形式を返す
+    """
+    if progress_mode == 'delta':
+        return judge.get_progress_delta()
+    return judge.get_progress_display()
+
+
+def _with_live_stats(response, session, data):
+    """
+    リクエストで "live_stats": true が指定された場合、ライブ統計を応答に追加
+    
+    速度メーターの表示用に、キー入力の応答と同じレスポンスで返す（追加のポーリング不要）
+    """
+    if data.get('live_stats'):
+        response["live_stats"] = session.live_stats.snapshot()
+    return response
+
+
+def _parse_seq(data):
+    """
+    リクエストのシーケンス番号を取得
+    
+    番号がない場合は従来どおり到着順に適用する。
+    不正な値の場合は ValueError を送出する
+    """
+    seq = data.get('seq')
+    if seq is None:
+        return None
+    if isinstance(seq, bool) or not isinstance(seq, int) or seq < 1:
+        raise ValueError("Sequence must be a positive integer")
+    return seq
+
+
 @app.route('/api/session/<session_id>/progress', methods=['GET'])
 def get_progress(session_id):
     """セッションの進捗を取得"""
-    if session_id not in sessions:
+    session = sessions.get(session_id)
+    if session is None:
         return jsonify({
             "ok": False,
             "error": "Session not found"
         }), 404
     
-    session = sessions[session_id]
-    judge = session['judge']
-    progress = judge.get_progress_display()
+    progress = session.judge.get_progress_display()
     
     return jsonify({
         "ok": True,
@@ -173,105 +247,272 @@ def get_progress(session_id):
     })
 
 
-@app.route('/api/session/<session_id>/judge_char', methods=['POST'])
-def judge_char(session_id):
-    """1文字の入力を判定"""
-    if session_id not in sessions:
+@app.route('/api/session/<session_id>/live_stats', methods=['GET'])
+def get_live_stats(session_id):
+    """直近5秒・30秒の WPM / CPM / 正解率を取得"""
+    session = sessions.get(session_id)
+    if session is None:
         return jsonify({
             "ok": False,
             "error": "Session not found"
         }), 404
     
+    return jsonify({
+        "ok": True,
+        "live_stats": session.live_stats.snapshot()
+    })
+
+
+@app.route('/api/session/<session_id>/judge_char', methods=['POST'])
+def judge_char(session_id):
+    """1文字の入力を判定"""
     data = request.json
     char = data.get('char', '')
     timestamp = data.get('timestamp', 0)  # ミリ秒単位
+    progress_mode = data.get('progress_mode', 'full')
     
-    if not char:
+    error = TypingSession.validate_event({"char": char, "timestamp": timestamp})
+    if error:
+        return jsonify({
+            "ok": False,
+            "error": error
+        }), 400
+    
+    try:
+        seq = _parse_seq(data)
+    except ValueError as e:
         return jsonify({
             "ok": False,
-            "error": "Character required"
+            "error": str(e)
         }), 400
     
-    session = sessions[session_id]
-    judge = session['judge']
-    stats_calc = session['stats_calculator']
+    with sessions.edit(session_id) as session:
+        if session is None:
+            return jsonify({
+                "ok": False,
+                "error": "Session not found"
+            }), 404
+        
+        judge = session.judge
+        
+        if seq is not None:
+            # シーケンス番号順に適用（先着分は並べ替えバッファで待機）
+            try:
+                applied = session.submit(seq, {"char": char, "timestamp": timestamp})
+            except ValueError as e:
+                return jsonify({
+                    "ok": False,
+                    "error": str(e),
+                    "ack": session.get_ack()
+                }), 409
+            
+            return jsonify(_with_live_stats({
+                "ok": True,
+                "ack": session.get_ack(),
+                "results": applied,
+                "progress": _get_progress(judge, progress_mode),
+                "finished": judge.is_completed()
+            }, session, data))
+        
+        # 判定を実行・イベントを記録
+        result = session.apply_char(char, timestamp)
+        
+        # 進捗を取得
+        response = _with_live_stats({
+            "ok": True,
+            "result": result.value,
+            "progress": _get_progress(judge, progress_mode),
+            "finished": judge.is_completed()
+        }, session, data)
     
-    # 判定を実行
-    result = judge.judge_char(char)
+    return jsonify(response)
+
+
+@app.route('/api/session/<session_id>/judge_batch', methods=['POST'])
+def judge_batch(session_id):
+    """複数のキー入力をまとめて判定"""
+    data = request.json
+    batch = data.get('events', [])
+    progress_mode = data.get('progress_mode', 'full')
     
-    # イベントを記録
-    event = KeyEvent(
-        event_type=EventType.KEY_DOWN,
-        timestamp=timestamp * 1000,  # マイクロ秒に変換
-        virtual_key=ord(char[0].upper()),
-        character=char
-    )
-    stats_calc.add_event(event)
-    session['events'].append(event)
+    error = TypingSession.validate_batch(batch)
+    if error:
+        return jsonify({
+            "ok": False,
+            "error": error
+        }), 400
     
-    # 進捗を取得
-    progress = judge.get_progress_display()
+    # イベントに seq がある場合は judge_char と同じく番号順に適用（再送の重複は無視）
+    try:
+        seqs = [_parse_seq(item) for item in batch]
+    except ValueError as e:
+        return jsonify({
+            "ok": False,
+            "error": str(e)
+        }), 400
+    sequenced = any(seq is not None for seq in seqs)
+    if sequenced and None in seqs:
+        return jsonify({
+            "ok": False,
+            "error": "Either all or no events must have a sequence"
+        }), 400
     
-    return jsonify({
-        "ok": True,
-        "result": result.value,
-        "progress": progress,
-        "finished": judge.is_completed()
-    })
+    with sessions.edit(session_id) as session:
+        if session is None:
+            return jsonify({
+                "ok": False,
+                "error": "Session not found"
+            }), 404
+        
+        judge = session.judge
+        
+        if sequenced:
+            results = []
+            try:
+                for seq, item in zip(seqs, batch):
+                    results.extend(session.submit(seq, item))
+            except ValueError as e:
+                return jsonify({
+                    "ok": False,
+                    "error": str(e),
+                    "ack": session.get_ack()
+                }), 409
+            
+            return jsonify(_with_live_stats({
+                "ok": True,
+                "ack": session.get_ack(),
+                "results": results,
+                "progress": _get_progress(judge, progress_mode),
+                "finished": judge.is_completed()
+            }, session, data))
+        
+        # 入力順にまとめて適用
+        results = session.apply_batch(batch)
+        
+        # 進捗はバッチ末尾の状態を1回だけ返す
+        response = _with_live_stats({
+            "ok": True,
+            "results": results,
+            "progress": _get_progress(judge, progress_mode),
+            "finished": judge.is_completed()
+        }, session, data)
+    
+    return jsonify(response)
 
 
 @app.route('/api/session/<session_id>/backspace', methods=['POST'])
 def handle_backspace(session_id):
     """Backspace を処理"""
-    if session_id not in sessions:
-        return jsonify({
-            "ok": False,
-            "error": "Session not found"
-        }), 404
-    
     data = request.json
     timestamp = data.get('timestamp', 0)
+    progress_mode = data.get('progress_mode', 'full')
     
-    session = sessions[session_id]
-    judge = session['judge']
-    stats_calc = session['stats_calculator']
-    
-    # 位置を戻す（簡易実装）
-    if judge.current_position > 0:
-        judge.current_position -= 1
+    error = TypingSession.validate_event({"type": "backspace", "timestamp": timestamp})
+    if error:
+        return jsonify({
+            "ok": False,
+            "error": error
+        }), 400
     
-    # イベントを記録
-    event = KeyEvent(
-        event_type=EventType.BACKSPACE,
-        timestamp=timestamp * 1000,
-        virtual_key=8,  # VK_BACK
-        character='\b'
-    )
-    stats_calc.add_event(event)
-    session['events'].append(event)
+    try:
+        seq = _parse_seq(data)
+    except ValueError as e:
+        return jsonify({
+            "ok": False,
+            "error": str(e)
+        }), 400
     
-    progress = judge.get_progress_display()
+    with sessions.edit(session_id) as session:
+        if session is None:
+            return jsonify({
+                "ok": False,
+                "error": "Session not found"
+            }), 404
+        
+        if seq is not None:
+            try:
+                applied = session.submit(seq, {"type": "backspace", "timestamp": timestamp})
+            except ValueError as e:
+                return jsonify({
+                    "ok": False,
+                    "error": str(e),
+                    "ack": session.get_ack()
+                }), 409
+            
+            return jsonify(_with_live_stats({
+                "ok": True,
+                "ack": session.get_ack(),
+                "results": applied,
+                "progress": _get_progress(session.judge, progress_mode),
+                "finished": session.judge.is_completed()
+            }, session, data))
+        
+        session.apply_backspace(timestamp)
+        
+        response = _with_live_stats({
+            "ok": True,
+            "progress": _get_progress(session.judge, progress_mode),
+        }, session, data)
     
-    return jsonify({
-        "ok": True,
-        "progress": progress,
-    })
+    return jsonify(response)
 
 
 @app.route('/api/session/<session_id>/complete', methods=['POST'])
 def complete_session(session_id):
     """セッションを完了し、統計を計算・保存"""
-    if session_id not in sessions:
+    # クライアント側判定モードでは、判定済みのイベント列がまとめて送られる
+    data = request.get_json(silent=True) or {}
+    client_events = data.get('events')
+    
+    if client_events is not None:
+        error = TypingSession.validate_batch(client_events, MAX_REPLAY_EVENTS)
+        if error:
+            return jsonify({
+                "ok": False,
+                "error": error
+            }), 400
+    
+    replayed = None
+    if client_events is not None:
+        # イベント列をサーバー側の判定器で再生（失敗した場合はセッションを残したまま返す）
+        session = sessions.get(session_id)
+        if session is None:
+            return jsonify({
+                "ok": False,
+                "error": "Session not found"
+            }), 404
+        try:
+            replayed = session.replay(client_events)
+        except (TypeError, ValueError, OverflowError) as e:
+            return jsonify({
+                "ok": False,
+                "error": f"Invalid events: {e}"
+            }), 400
+    
+    # セッションを取り出す（他ワーカーからの二重完了を防ぐため先に削除）
+    session = sessions.pop(session_id)
+    if session is None:
         return jsonify({
             "ok": False,
             "error": "Session not found"
         }), 404
     
-    session = sessions[session_id]
-    judge = session['judge']
-    stats_calc = session['stats_calculator']
-    events = session['events']
-    target_text = session['target_text']
+    verification = None
+    if replayed is not None:
+        # 再生した判定結果で、報告された結果を検証
+        session = replayed
+        mismatches = session.verify_client_result(data.get('client_result') or {})
+        verification = {
+            "verified": not mismatches,
+            "mismatches": mismatches,
+        }
+        if mismatches:
+            print(f'[WARN] Client judge mismatch in session {session_id}: {mismatches}')
+    
+    judge = session.judge
+    stats_calc = session.stats_calculator
+    events = session.events
+    target_text = session.target_text
     
     # 統計を計算
     stats_data = stats_calc.calculate_statistics(
@@ -281,9 +522,32 @@ def complete_session(session_id):
     
     accuracy = judge.get_accuracy()
     
-    # CSV保存
-    events_csv_path = csv_logger.save_events_csv(events)
-    summary_csv_path = csv_logger.save_summary_csv(stats_data, target_text, accuracy)
+    # 保存（ジャーナルでは1行追記し、CSVはダウンロード時に書き出す）
+    if journal is not None:
+        journal.append_session(session_id, events, stats_data, target_text, accuracy,
+                               stats_calc.get_kana_analysis())
+        files = {
+            "session_id": session_id,
+            "events_csv": f"journal/{session_id}/events",
+            "summary_csv": f"journal/{session_id}/summary",
+            "kana_csv": f"journal/{session_id}/kana_analysis",
+        }
+    else:
+        events_csv_path = csv_logger.save_events_csv(events)
+        summary_csv_path = csv_logger.save_summary_csv(stats_data, target_text, accuracy)
+        kana_csv_path = csv_logger.save_kana_analysis_csv(stats_calc.get_kana_analysis())
+        files = {
+            "events_csv": os.path.basename(events_csv_path),
+            "summary_csv": os.path.basename(summary_csv_path),
+            "kana_csv": os.path.basename(kana_csv_path),
+        }
+    if event_log is not None:
+        files["events_log"] = event_log.append_session(session_id, events)
+    if results_store is not None:
+        results_store.add_result(session_id, session.scenario_file, stats_data, target_text, accuracy, files)
+    # 遅延行列はその場で追加（ジャーナル・バイナリログはセッションID、CSVはファイル名で重複を除く）
+    bigram_collector.add_session(
+        events, session_id if journal is not None or event_log is not None else files["events_csv"])
     
     result = {
         "ok": True,
@@ -300,15 +564,25 @@ def complete_session(session_id):
             "avg_inter_key_interval_ms": round(stats_data.avg_inter_key_interval, 2),
             "min_inter_key_interval_ms": round(stats_data.min_inter_key_interval, 2),
             "max_inter_key_interval_ms": round(stats_data.max_inter_key_interval, 2),
+            "std_inter_key_interval_ms": round(stats_data.std_inter_key_interval, 2),
+            "interval_percentiles_ms": {
+                f"p{percent}": round(value / 1000, 2)
+                for percent, value in zip(
+                    GLOBAL_PERCENTILES,
+                    stats_calc.interval_sketch.quantiles([percent / 100 for percent in GLOBAL_PERCENTILES])
+                )
+                if value is not None
+            },
+            "slowest_kana": [
+                {"kana": kana, "avg_time_ms": round(avg_time, 2)}
+                for kana, avg_time in stats_calc.get_top_n_kana_by_time()
+            ],
         },
-        "files": {
-            "events_csv": os.path.basename(events_csv_path),
-            "summary_csv": os.path.basename(summary_csv_path),
-        }
+        "files": files,
     }
     
-    # セッションを削除
-    del sessions[session_id]
+    if verification is not None:
+        result["verification"] = verification
     
     return jsonify(result)
 
@@ -325,6 +599,10 @@ def health():
     return jsonify({
         "ok": True,
         "status": "Typinger Web is running",
+        "sessions": sessions.get_stats(),
+        "csv_writer": csv_logger.get_stats(),
+        "journal": journal.get_stats() if journal is not None else None,
+        "results": results_store.get_stats() if results_store is not None else None,
     })
 
 
@@ -356,13 +634,27 @@ def admin():
 
 @app.route('/api/admin/csv-files', methods=['GET'])
 def get_csv_files():
-    """CSVファイル一覧を取得"""
-    csv_files = log_viewer.get_csv_files()
+    """CSVファイル一覧を取得（新しい順、?type=&offset=&limit= でタイプの絞り込みとページ分割）"""
+    file_type = request.args.get('type', 'all')
+    offset = request.args.get('offset', '0')
+    limit = request.args.get('limit', '')
+    
+    if (file_type != 'all' and file_type not in CSV_FILE_TYPES) or not offset.isdigit() \
+            or (limit and not limit.isdigit()):
+        return jsonify({
+            "ok": False,
+            "error": f"type must be all or one of {', '.join(CSV_FILE_TYPES)}, "
+                     "and offset/limit non-negative integers"
+        }), 400
+    
+    csv_files, total_count = log_viewer.get_csv_files_page(
+        None if file_type == 'all' else file_type, int(offset), int(limit) if limit else None)
     
     return jsonify({
         "ok": True,
         "files": csv_files,
-        "total_count": len(csv_files),
+        "total_count": total_count,
+        "offset": int(offset),
     })
 
 
@@ -390,10 +682,37 @@ def get_csv_file_content(filename):
     })
 
 
+def _parse_results_filters():
+    """
+    結果の絞り込み（?scenario=&since=YYYYMMDD&until=YYYYMMDD、until の日を含む）を取得
+
+    Raises:
+        ValueError: 日付が YYYYMMDD でない場合
+    """
+    filters = {"scenario": request.args.get('scenario') or None, "since": None, "until": None}
+    for key in ("since", "until"):
+        value = request.args.get(key, '')
+        if not value:
+            continue
+        if not (len(value) == 8 and value.isdigit()):
+            raise ValueError("since and until must be YYYYMMDD")
+        day = datetime.strptime(value, '%Y%m%d')
+        filters[key] = (day if key == "since" else day + timedelta(days=1)).timestamp()
+    return filters
+
+
 @app.route('/api/admin/summary', methods=['GET'])
 def get_summary_statistics():
-    """サマリー統計を取得"""
-    summary = log_viewer.get_summary_statistics()
+    """サマリー統計を取得（結果ストアがある場合は ?scenario=&since=&until= で絞り込める）"""
+    try:
+        filters = _parse_results_filters()
+    except ValueError as e:
+        return jsonify({
+            "ok": False,
+            "error": str(e)
+        }), 400
+    
+    summary = log_viewer.get_summary_statistics(**filters)
     
     return jsonify({
         "ok": True,
@@ -403,8 +722,31 @@ def get_summary_statistics():
 
 @app.route('/api/admin/export-summary', methods=['GET'])
 def export_statistics_summary():
-    """統計情報をエクスポート"""
-    summary = log_viewer.export_statistics_summary()
+    """統計情報をエクスポート（?limit= で新しい順に件数を制限、?format=csv で結果ストアをCSVとして出力）"""
+    limit = request.args.get('limit', '')
+    try:
+        filters = _parse_results_filters()
+        if limit and not limit.isdigit():
+            raise ValueError("limit must be a non-negative integer")
+    except ValueError as e:
+        return jsonify({
+            "ok": False,
+            "error": str(e)
+        }), 400
+    
+    if request.args.get('format') == 'csv':
+        if results_store is None:
+            return jsonify({
+                "ok": False,
+                "error": "Results store is not enabled (RESULTS_STORE=1)"
+            }), 404
+        return Response(
+            results_store.export_csv(**filters),
+            mimetype='text/csv',
+            headers={"Content-Disposition": f"attachment; filename=typing_results_{datetime.now():%Y%m%d_%H%M%S}.csv"}
+        )
+    
+    summary = log_viewer.export_statistics_summary(limit=int(limit) if limit else None, **filters)
     
     return jsonify({
         "ok": True,
@@ -412,6 +754,182 @@ def export_statistics_summary():
     })
 
 
+@app.route('/api/admin/results', methods=['GET'])
+def get_results():
+    """結果ストアのセッション結果の一覧を取得（新しい順、?scenario=&since=&until=&limit=&offset=）"""
+    if results_store is None:
+        return jsonify({
+            "ok": False,
+            "error": "Results store is not enabled (RESULTS_STORE=1)"
+        }), 404
+    
+    limit = request.args.get('limit', '50')
+    offset = request.args.get('offset', '0')
+    try:
+        filters = _parse_results_filters()
+        if not limit.isdigit() or not offset.isdigit():
+            raise ValueError("limit and offset must be non-negative integers")
+    except ValueError as e:
+        return jsonify({
+            "ok": False,
+            "error": str(e)
+        }), 400
+    
+    results, total_count = results_store.query(limit=min(int(limit), 1000), offset=int(offset), **filters)
+    for result in results:
+        result.pop("interval_sketch", None)
+    return jsonify({
+        "ok": True,
+        "results": results,
+        "total_count": total_count,
+    })
+
+
+@app.route('/api/admin/interval-percentiles', methods=['GET'])
+def get_interval_percentiles():
+    """全セッションのキー間隔のパーセンタイル（サマリCSVのスケッチをマージ）"""
+    return jsonify({
+        "ok": True,
+        "intervals": log_viewer.get_interval_percentiles(),
+    })
+
+
+@app.route('/api/admin/daily-statistics', methods=['GET'])
+def get_daily_statistics():
+    """1日分（または全期間）のイベントCSVをまとめて集計"""
+    date = request.args.get('date', '')
+    
+    # 日付の検証（YYYYMMDD、省略時は全期間）
+    if date and not (len(date) == 8 and date.isdigit()):
+        return jsonify({
+            "ok": False,
+            "error": "Date must be YYYYMMDD"
+        }), 400
+    
+    calculator = BatchStatisticsCalculator()
+    
+    try:
+        if event_log is not None:
+            paths = event_log.find_logs(date or None)
+            names = [os.path.basename(path) for path in paths]
+            batch_data = calculator.calculate(*load_event_logs(paths))
+        elif journal is not None:
+            # completed_at（ISO 形式）の日付で絞り込む
+            day = f"{date[:4]}-{date[4:6]}-{date[6:]}" if date else ""
+            records = [
+                record for record, _ in journal.iter_records()
+                if record.get("completed_at", "").startswith(day)
+            ]
+            names = [record["session_id"] for record in records]
+            batch_data = calculator.calculate(*calculator.load_events_records(records))
+        else:
+            paths = calculator.find_events_csv(log_viewer.output_dir, date or None)
+            names = [os.path.basename(path) for path in paths]
+            batch_data = calculator.calculate_files(paths)
+    except (ValueError, OSError) as e:
+        return jsonify({
+            "ok": False,
+            "error": f"Failed to read event logs: {e}"
+        }), 500
+    
+    return jsonify({
+        "ok": True,
+        "date": date,
+        "backend": calculator.backend,
+        "files": names,
+        "statistics": batch_data.to_dict(),
+    })
+
+
+@app.route('/api/admin/bigram-latency', methods=['GET'])
+def get_bigram_latency():
+    """キー遷移（直前のキー → 次のキー）の遅延行列をヒートマップ用に取得"""
+    key_space = request.args.get('key', 'vk')
+    min_count = request.args.get('min_count', '1')
+    
+    if key_space not in KEY_SPACES or not min_count.isdigit():
+        return jsonify({
+            "ok": False,
+            "error": f"key must be one of {', '.join(KEY_SPACES)} and min_count a non-negative integer"
+        }), 400
+    
+    try:
+        matrix = bigram_collector.refresh()
+    except (ValueError, OSError) as e:
+        return jsonify({
+            "ok": False,
+            "error": f"Failed to read event logs: {e}"
+        }), 500
+    
+    return jsonify({
+        "ok": True,
+        "file_count": len(bigram_collector.files),
+        "heatmap": matrix.to_heatmap(key_space, int(min_count)),
+    })
+
+
+@app.route('/api/admin/event-logs', methods=['GET'])
+def get_event_logs():
+    """バイナリイベントログの一覧を取得"""
+    logs = log_viewer.get_event_logs()
+    
+    return jsonify({
+        "ok": True,
+        "files": logs,
+        "total_count": len(logs),
+    })
+
+
+@app.route('/api/admin/event-logs/<filename>', methods=['GET'])
+def get_event_log_content(filename):
+    """バイナリイベントログの1セッション分を取得（?session_id= 省略時は最後のセッション）"""
+    # ファイル名の検証
+    if '..' in filename or '/' in filename or '\\' in filename:
+        return jsonify({
+            "ok": False,
+            "error": "Invalid filename"
+        }), 400
+    
+    data = log_viewer.read_event_log(filename, request.args.get('session_id') or None)
+    
+    if data is None:
+        return jsonify({
+            "ok": False,
+            "error": "Event log or session not found"
+        }), 404
+    
+    return jsonify({
+        "ok": True,
+        "data": data,
+    })
+
+
+@app.route('/api/admin/journal', methods=['GET'])
+def get_journal_sessions():
+    """ジャーナルに記録されたセッションの一覧を取得（新しい順）"""
+    if journal is None:
+        return jsonify({
+            "ok": False,
+            "error": "Journal is not enabled (LOG_STORAGE=journal)"
+        }), 404
+    
+    limit = request.args.get('limit', '50')
+    offset = request.args.get('offset', '0')
+    if not limit.isdigit() or not offset.isdigit():
+        return jsonify({
+            "ok": False,
+            "error": "limit and offset must be non-negative integers"
+        }), 400
+    
+    entries, total_count = journal.list_sessions(min(int(limit), 1000), int(offset))
+    return jsonify({
+        "ok": True,
+        "sessions": entries,
+        "total_count": total_count,
+        "journal": journal.get_stats(),
+    })
+
+
 @app.route('/api/admin/csv-files/<filename>', methods=['DELETE'])
 def delete_csv_file(filename):
     """CSVファイルを削除"""
@@ -465,6 +983,27 @@ def download_csv_file(filename):
         return f"Error: {str(e)}", 500
 
 
+@app.route('/download/journal/<session_id>/<kind>', methods=['GET'])
+def download_journal_csv(session_id, kind):
+    """ジャーナルの記録をCSVとして書き出してダウンロード"""
+    if journal is None:
+        return "Journal is not enabled", 404
+    
+    if kind not in EXPORT_KINDS:
+        return "Invalid kind", 400
+    
+    content = journal.export_csv(session_id, kind)
+    if content is None:
+        return "Session not found", 404
+    
+    prefix = "kana_analysis" if kind == 'kana_analysis' else f"typing_{kind}"
+    return Response(
+        content,
+        mimetype='text/csv',
+        headers={"Content-Disposition": f"attachment; filename={prefix}_{session_id}.csv"}
+    )
+
+
 # ==================== キーマップエディタ関連エンドポイント ====================
 
 @app.route('/editor')
@@ -844,6 +1383,54 @@ def validate_scenario():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# 一括ローマ字生成の最大件数
+MAX_ROMAJI_TEXTS = 1000
+
+@app.route('/api/scenario/romaji', methods=['POST'])
+def generate_scenario_romaji():
+    """かな文のローマ字（ルビ）を一括生成"""
+    try:
+        data = request.get_json(silent=True) or {}
+        texts = data.get('texts')
+
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return jsonify({'error': 'texts must be a list of strings'}), 400
+        if len(texts) > MAX_ROMAJI_TEXTS:
+            return jsonify({'error': f'Too many texts (max {MAX_ROMAJI_TEXTS})'}), 400
+
+        return jsonify({'rubis': RomajiConverter.to_romaji_many(texts)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/scenario/kana-coverage')
+def get_scenario_kana_coverage():
+    """シナリオ（省略時はディレクトリ内のすべて）のカテゴリー別・重要かなの出現頻度を集計"""
+    try:
+        available = scenario_manager.get_available_scenarios()
+        requested = request.args.get('files', '')
+        filenames = [name for name in requested.split(',') if name] if requested else available
+
+        unknown = [name for name in filenames if name not in available]
+        if unknown:
+            return jsonify({'error': f'Scenario not found: {", ".join(unknown)}'}), 404
+
+        calculator = StatisticsCalculator(keep_events=False)
+        texts_by_file = {
+            name: [text for text, _ in scenario_manager.get_all_sentences(name)]
+            for name in filenames
+        }
+
+        return jsonify({
+            'scenarios': {
+                name: calculator.get_corpus_frequency(texts) for name, texts in texts_by_file.items()
+            },
+            'total': calculator.get_corpus_frequency(
+                text for texts in texts_by_file.values() for text in texts
+            ),
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/scenario/upload', methods=['POST'])
 def upload_scenario():
     """シナリオファイルをアップロード"""
@@ -922,6 +1509,22 @@ def download_scenario(filename):
         return jsonify({'error': str(e)}), 500
 
 
+def start_realtime_server():
+    """設定に応じてキー入力用 WebSocket サーバーを起動"""
+    global realtime_port
+    
+    if not config.WS_PORT or config.WS_SEPARATE:
+        return
+    
+    if not realtime_server.is_available():
+        print('Warning: WS_PORT is set but websockets is not installed')
+        return
+    
+    realtime_server.start_in_background(sessions, config.WS_HOST, config.WS_PORT)
+    realtime_port = config.WS_PORT
+    print(f'[REALTIME] WebSocket server listening on port {realtime_port}')
+
+
 if __name__ == '__main__':
     # 出力ディレクトリを作成
     os.makedirs("output", exist_ok=True)
@@ -933,5 +1536,9 @@ if __name__ == '__main__':
     if not os.path.exists("scenario"):
         os.makedirs("scenario", exist_ok=True)
     
+    # キー入力用 WebSocket サーバーを起動（リローダーの監視プロセスでは起動しない）
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_realtime_server()
+    
     # 開発用サーバーを起動
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,73 @@
+"""
+bench_batch_statistics.py
+一括統計計算のベンチマーク（純 Python vs NumPy）
+
+1日分の記録を想定した合成イベント列（セッション数 × イベント数）を
+両方のバックエンドで集計し、所要時間を比較します。結果が完全に一致することも確認します。
+NumPy がインストールされていない場合は純 Python のみ計測します。
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_batch_statistics.py --sessions 2000 --events 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.batch_statistics import BatchStatisticsCalculator, has_numpy
+from core.statistics import EventBuffer, EventType
+
+
+def build_events(sessions, events, seed=0):
+    """合成イベント列（キー間隔 50～400ms、まれに数秒の一時停止、10打鍵に1回 Backspace）"""
+    rng = random.Random(seed)
+    buffer = EventBuffer()
+    offsets = [0]
+    for _ in range(sessions):
+        timestamp = 0
+        for index in range(events):
+            timestamp += rng.randint(50, 400) * 1000
+            if rng.random() < 0.02:
+                timestamp += rng.randint(1000, 5000) * 1000
+            event_type = EventType.BACKSPACE if index % 10 == 9 else EventType.KEY_DOWN
+            buffer.add(event_type, timestamp, 65, 'a')
+        offsets.append(len(buffer))
+    return buffer, offsets
+
+
+def _time(calculator, events, offsets, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = calculator.calculate(events, offsets)
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=2000, help="セッション数")
+    parser.add_argument("--events", type=int, default=500, help="セッションあたりのイベント数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数")
+    args = parser.parse_args()
+
+    events, offsets = build_events(args.sessions, args.events)
+    print(f"{len(events)} events in {args.sessions} sessions")
+
+    python_ms, python_result = _time(BatchStatisticsCalculator('python'), events, offsets, args.repeat)
+    print(f"{'python':<8}{python_ms:>10.1f}ms")
+
+    if not has_numpy():
+        print("numpy   (not installed)")
+        return
+
+    numpy_ms, numpy_result = _time(BatchStatisticsCalculator('numpy'), events, offsets, args.repeat)
+    if numpy_result != python_result:
+        raise SystemExit("numpy and python results differ")
+    print(f"{'numpy':<8}{numpy_ms:>10.1f}ms  ({python_ms / numpy_ms:.1f}x, identical results)")
+
+
+if __name__ == "__main__":
+    main()
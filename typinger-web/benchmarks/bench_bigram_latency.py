@@ -0,0 +1,76 @@
+"""
+bench_bigram_latency.py
+キー遷移遅延行列の更新速度とメモリ使用量
+
+合成したセッションのイベント列を BigramLatencyMatrix に流し込み、
+1イベントあたりの処理時間と、行列が確保したメモリ（tracemalloc）を計測します。
+行列の大きさはイベント数ではなくバイグラムの種類数で決まることを確認します。
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_bigram_latency.py --sessions 2000 --events 500
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.bigram_latency import BigramLatencyMatrix
+from core.statistics import EventBuffer, EventType
+
+
+def build_session(rng, events):
+    """1セッション分の合成イベント列（英字のランダムな並び、キー間隔 50～400ms）"""
+    buffer = EventBuffer()
+    timestamp = 0
+    for index in range(events):
+        timestamp += rng.randint(50, 400) * 1000
+        if index % 10 == 9:
+            buffer.add(EventType.BACKSPACE, timestamp, 8, '\b')
+        else:
+            char = rng.choice("aiueokstnhmyrwgzdbp")
+            buffer.add(EventType.KEY_DOWN, timestamp, ord(char.upper()), char)
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=2000, help="セッション数")
+    parser.add_argument("--events", type=int, default=500, help="セッションあたりのイベント数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    sessions = [build_session(rng, args.events) for _ in range(16)]
+
+    matrix = BigramLatencyMatrix()
+    start = time.perf_counter()
+    for index in range(args.sessions):
+        matrix.add_events(sessions[index % len(sessions)])
+    elapsed = time.perf_counter() - start
+    bigrams, transitions = len(matrix), matrix.transition_count
+
+    # メモリは計測の影響を避けるため別に構築して測る
+    del matrix
+    gc.collect()
+    tracemalloc.start()
+    matrix = BigramLatencyMatrix()
+    for index in range(min(args.sessions, 200)):
+        matrix.add_events(sessions[index % len(sessions)])
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total_events = args.sessions * args.events
+    print(f"{total_events} events in {args.sessions} sessions")
+    print(f"update: {elapsed * 1000:.1f}ms ({elapsed / total_events * 1e9:.0f} ns/event)")
+    print(f"bigrams: {bigrams}, transitions: {transitions}")
+    print(f"matrix memory after {min(args.sessions, 200)} sessions: {current / 2**20:.2f} MiB "
+          f"(columns {matrix.nbytes() / 2**20:.2f} MiB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+bench_csv_writer.py
+CSV保存の応答時間（同期書き込みと非同期書き込みの比較）
+
+1セッション分のイベントCSVとサマリCSVの保存を繰り返し、保存メソッドが
+戻るまでの時間（リクエストの待ち時間に相当）を同期・非同期の各モードで計測します。
+非同期モードでは最後に flush() で全件の書き込みが終わるまでの時間も表示します。
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_csv_writer.py --sessions 200 --events 500 --fsync batch
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.csv_logger import CSVLogger, FSYNC_POLICIES
+from core.statistics import EventBuffer, EventType, StatisticsData
+
+
+def build_session(events):
+    """1セッション分の合成イベント列"""
+    buffer = EventBuffer()
+    for index in range(events):
+        char = "aiueo"[index % 5]
+        buffer.add(EventType.KEY_DOWN, index * 150000, ord(char.upper()), char)
+    return buffer
+
+
+def run(output_dir, async_write, fsync, sessions, events):
+    """保存を繰り返して1セッションあたりの待ち時間を返す"""
+    logger = CSVLogger(output_dir, async_write=async_write, fsync=fsync)
+    stats_data = StatisticsData(total_duration=len(events) * 150000, total_key_count=len(events),
+                                correct_key_count=len(events))
+    latencies = []
+    start = time.perf_counter()
+    for index in range(sessions):
+        # ファイル名の衝突を避けるため、セッションごとにサブディレクトリを分ける
+        logger.output_dir = os.path.join(output_dir, str(index))
+        os.makedirs(logger.output_dir)
+        begin = time.perf_counter()
+        logger.save_events_csv(events)
+        logger.save_summary_csv(stats_data, "あいうえお", 1.0)
+        latencies.append((time.perf_counter() - begin) * 1000)
+    logger.flush()
+    total_ms = (time.perf_counter() - start) * 1000
+    stats = logger.get_stats()
+    logger.close()
+    latencies.sort()
+    return latencies, total_ms, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=200, help="セッション数")
+    parser.add_argument("--events", type=int, default=500, help="セッションあたりのイベント数")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default='batch', help="fsync ポリシー")
+    args = parser.parse_args()
+
+    events = build_session(args.events)
+    for async_write in (False, True):
+        with tempfile.TemporaryDirectory() as output_dir:
+            latencies, total_ms, stats = run(output_dir, async_write, args.fsync, args.sessions, events)
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[int(0.99 * (len(latencies) - 1))]
+        print(f"{'async' if async_write else 'sync':5}: save p50 {p50:.3f}ms, p99 {p99:.3f}ms, "
+              f"all written in {total_ms:.1f}ms")
+        if async_write:
+            print(f"       group commits {stats['group_commits']}, avg group {stats['avg_group_size']}, "
+                  f"blocked {stats['blocked_count']} ({stats['blocked_ms']}ms)")
+
+
+if __name__ == "__main__":
+    main()
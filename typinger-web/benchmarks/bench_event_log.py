@@ -0,0 +1,79 @@
+"""
+bench_event_log.py
+バイナリイベントログとイベントCSVの大きさ・読み込み速度の比較
+
+同じ合成セッションをイベントCSV（1セッション1ファイル）とバイナリイベントログ
+（1日1ファイル）の両方に保存し、ファイルの合計サイズと、1日分の集計
+（BatchStatisticsCalculator に渡すイベント列の読み込み）にかかる時間を計測します。
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_event_log.py --sessions 1000 --events 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.batch_statistics import BatchStatisticsCalculator
+from core.csv_logger import CSVLogger
+from core.event_log import BinaryEventLog, load_event_logs
+from core.statistics import EventBuffer, EventType
+
+
+def build_session(rng, events):
+    """1セッション分の合成イベント列（キー間隔 50～400ms、KEY_DOWN/KEY_UP の組）"""
+    buffer = EventBuffer()
+    timestamp = 1700000000000000 + rng.randint(0, 10 ** 9)
+    for _ in range(events // 2):
+        char = rng.choice("aiueokstnhmyrwgzdbp")
+        timestamp += rng.randint(50, 400) * 1000
+        buffer.add(EventType.KEY_DOWN, timestamp, ord(char.upper()), char)
+        buffer.add(EventType.KEY_UP, timestamp + rng.randint(30, 120) * 1000, ord(char.upper()), char)
+    return buffer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000, help="セッション数")
+    parser.add_argument("--events", type=int, default=500, help="セッションあたりのイベント数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    sessions = [build_session(rng, args.events) for _ in range(args.sessions)]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        logger = CSVLogger(os.path.join(output_dir, "csv"))
+        log = BinaryEventLog(os.path.join(output_dir, "binary"))
+        csv_paths = []
+        for index, events in enumerate(sessions):
+            csv_paths.append(logger.save_events_csv(events))
+            log.append_session(f"session_{index}", events)
+        log_paths = log.find_logs()
+
+        csv_bytes = sum(os.path.getsize(path) for path in csv_paths)
+        log_bytes = sum(os.path.getsize(path) for path in log_paths)
+
+        start = time.perf_counter()
+        csv_events, _ = BatchStatisticsCalculator.load_events_csv(csv_paths)
+        csv_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        log_events, _ = load_event_logs(log_paths)
+        log_ms = (time.perf_counter() - start) * 1000
+
+    assert list(csv_events.timestamps) == list(log_events.timestamps)
+    total_events = len(log_events)
+    print(f"{total_events} events in {args.sessions} sessions")
+    print(f"csv   : {len(csv_paths)} files, {csv_bytes / 2**20:.2f} MiB "
+          f"({csv_bytes / total_events:.1f} B/event), load {csv_ms:.1f}ms")
+    print(f"binary: {len(log_paths)} files, {log_bytes / 2**20:.2f} MiB "
+          f"({log_bytes / total_events:.1f} B/event), load {log_ms:.1f}ms ({csv_ms / log_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+bench_event_memory.py
+イベント保持のメモリ使用量の比較（KeyEvent リスト2本 vs EventBuffer）
+
+多数のセッションが同時に進行している状態を想定し、セッションごとに
+一定数のキーイベントを保持したときの確保メモリを tracemalloc で計測します。
+
+- 従来: キー入力ごとに KeyEvent を生成し、統計計算器とセッションの2つのリストに追加
+- 現在: セッションごとに1つの EventBuffer（列ごとの array）に追加
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_event_memory.py --sessions 10000 --events 500
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.statistics import EventBuffer, EventType, KeyEvent
+
+
+def _keystrokes(count):
+    """1セッション分のキー入力（10打鍵に1回 Backspace）"""
+    rubi = "konnichihasekai"
+    for index in range(count):
+        timestamp = index * 150000
+        if index % 10 == 9:
+            yield EventType.BACKSPACE, timestamp, 8, '\b'
+        else:
+            char = rubi[index % len(rubi)]
+            yield EventType.KEY_DOWN, timestamp, ord(char.upper()), char
+
+
+def build_legacy(sessions, events):
+    """従来の表現（KeyEvent を統計計算器とセッションの両方のリストに保持）"""
+    store = []
+    for _ in range(sessions):
+        stats_events, session_events = [], []
+        for event_type, timestamp, virtual_key, char in _keystrokes(events):
+            event = KeyEvent(event_type, timestamp, virtual_key, char)
+            stats_events.append(event)
+            session_events.append(event)
+        store.append((stats_events, session_events))
+    return store
+
+
+def build_columnar(sessions, events):
+    """列指向の表現（セッションごとに EventBuffer 1つ）"""
+    store = []
+    for _ in range(sessions):
+        buffer = EventBuffer()
+        for event_type, timestamp, virtual_key, char in _keystrokes(events):
+            buffer.add(event_type, timestamp, virtual_key, char)
+        store.append(buffer)
+    return store
+
+
+def measure(builder, sessions, events):
+    """builder が確保したメモリ（バイト）を計測"""
+    gc.collect()
+    tracemalloc.start()
+    store = builder(sessions, events)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del store
+    gc.collect()
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=10000, help="同時セッション数")
+    parser.add_argument("--events", type=int, default=500, help="セッションあたりのイベント数")
+    args = parser.parse_args()
+
+    total_events = args.sessions * args.events
+    legacy = measure(build_legacy, args.sessions, args.events)
+    columnar = measure(build_columnar, args.sessions, args.events)
+
+    print(f"{args.sessions} sessions x {args.events} events ({total_events} events)")
+    print(f"{'representation':<28}{'total MiB':>12}{'B/event':>10}")
+    print(f"{'KeyEvent lists (x2)':<28}{legacy / 2**20:>12.1f}{legacy / total_events:>10.1f}")
+    print(f"{'EventBuffer':<28}{columnar / 2**20:>12.1f}{columnar / total_events:>10.1f}")
+    print(f"reduction: {legacy / columnar:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+bench_interval_sketch.py
+キー間隔スケッチのマージとパーセンタイル取得の速度
+
+セッションごとのスケッチ（サマリCSVに保存する文字列）を多数用意し、
+- 文字列からの復元とマージ（未読のサマリCSVを取り込む処理）
+- マージ済みスケッチからの p50 / p95 / p99 の取得（管理画面の問い合わせ）
+の所要時間を計測します。全キー間隔を並べ替えた正確な値との相対誤差も表示します。
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_interval_sketch.py --sessions 20000 --intervals 300
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.quantile_sketch import QuantileSketch
+
+PERCENTILES = (50, 95, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20000, help="セッション数")
+    parser.add_argument("--intervals", type=int, default=300, help="セッションあたりのキー間隔の数")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    serialized = []
+    exact = []
+    for _ in range(args.sessions):
+        # 人ごとに速さが異なる対数正規分布（マイクロ秒）
+        mu = rng.uniform(11.5, 12.5)
+        sketch = QuantileSketch()
+        for _ in range(args.intervals):
+            interval = int(rng.lognormvariate(mu, 0.5))
+            sketch.add(interval)
+            exact.append(interval)
+        serialized.append(sketch.to_string())
+
+    start = time.perf_counter()
+    merged = QuantileSketch()
+    for text in serialized:
+        merged.merge(QuantileSketch.from_string(text))
+    merge_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    values = merged.quantiles([percent / 100 for percent in PERCENTILES])
+    query_ms = (time.perf_counter() - start) * 1000
+
+    exact.sort()
+    print(f"{args.sessions} sessions, {len(exact)} intervals")
+    print(f"merge: {merge_ms:.1f}ms ({merge_ms / args.sessions * 1000:.1f} us/session), "
+          f"avg sketch {sum(map(len, serialized)) / len(serialized):.0f} chars")
+    print(f"query: {query_ms:.3f}ms")
+    for percent, value in zip(PERCENTILES, values):
+        true_value = exact[int(percent / 100 * (len(exact) - 1))]
+        print(f"p{percent}: {value / 1000:8.2f}ms (exact {true_value / 1000:8.2f}ms, "
+              f"error {abs(value - true_value) / true_value * 100:.2f}%)")
+
+
+if __name__ == "__main__":
+    main()
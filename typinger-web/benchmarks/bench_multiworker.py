@@ -0,0 +1,125 @@
+"""
+bench_multiworker.py
+複数ワーカー負荷テスト（SQLite 共有セッションストア）
+
+SESSION_BACKEND=sqlite で gunicorn をワーカー数を変えて起動し、
+複数のクライアントプロセスから judge_char を連続送信して
+スループット（キー/秒）と "Session not found" の件数を計測します。
+別ワーカーに振り分けられたキー入力も同じセッションに適用されることと、
+ワーカー数に応じてスループットが伸びることを確認します。
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_multiworker.py --workers 1 2 4 --clients 16 --duration 10
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SCENARIO_FILE = "beginner.json"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _request(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    conn.close()
+    return response.status, data
+
+
+def _wait_until_ready(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if _request(port, "GET", "/api/health")[0] == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def _client(port, duration, queue):
+    """1クライアント: セッションを作り、終了時刻まで judge_char を送り続ける"""
+    _, data = _request(port, "POST", "/api/session/start", {"scenario_file": SCENARIO_FILE})
+    session_id, rubi = data["session_id"], data["target_rubi"]
+
+    keys = 0
+    not_found = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        status, _ = _request(port, "POST", f"/api/session/{session_id}/judge_char",
+                             {"char": rubi[keys % len(rubi)], "timestamp": keys * 100})
+        if status == 404:
+            not_found += 1
+        keys += 1
+
+    queue.put((keys, not_found))
+
+
+def run(workers, clients, duration):
+    port = _free_port()
+    db_dir = tempfile.mkdtemp(prefix="typinger-bench-")
+    env = dict(os.environ,
+               SESSION_BACKEND="sqlite",
+               SESSION_DB_PATH=os.path.join(db_dir, "sessions.db"))
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+         "--log-level", "warning", "app:app"],
+        cwd=APP_DIR, env=env)
+
+    try:
+        _wait_until_ready(port)
+
+        queue = multiprocessing.Queue()
+        procs = [multiprocessing.Process(target=_client, args=(port, duration, queue))
+                 for _ in range(clients)]
+        for p in procs:
+            p.start()
+        results = [queue.get() for _ in procs]
+        for p in procs:
+            p.join()
+    finally:
+        server.terminate()
+        server.wait()
+
+    total_keys = sum(keys for keys, _ in results)
+    not_found = sum(nf for _, nf in results)
+    return total_keys / duration, not_found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="gunicorn ワーカー数")
+    parser.add_argument("--clients", type=int, default=16, help="同時クライアント数")
+    parser.add_argument("--duration", type=float, default=10, help="計測時間（秒）")
+    args = parser.parse_args()
+
+    print(f"clients={args.clients} duration={args.duration}s cpus={os.cpu_count()}")
+    baseline = None
+    for workers in args.workers:
+        throughput, not_found = run(workers, args.clients, args.duration)
+        baseline = baseline or throughput
+        print(f"workers={workers:<3} {throughput:10.1f} keys/s  "
+              f"x{throughput / baseline:4.2f}  session_not_found={not_found}")
+
+
+if __name__ == "__main__":
+    main()
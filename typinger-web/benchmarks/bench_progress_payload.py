@@ -0,0 +1,80 @@
+"""
+bench_progress_payload.py
+進捗応答サイズの比較（完全形式 vs 差分形式）
+
+シナリオ内の各文をミスなく入力したときの judge_char 応答の合計バイト数を、
+progress_mode=full（従来）と progress_mode=delta で比較します。
+完全形式は毎回 target_text / target_rubi / remaining_rubi を含むため
+文長に対して O(n²)、差分形式は O(n) で増加します。
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_progress_payload.py
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.scenario_manager import ScenarioManager
+from core.typing_judge import TypingJudge
+
+
+def _response_bytes(judge, result, progress):
+    # Flask の jsonify と同じく空白なし・非ASCIIはエスケープ
+    payload = {
+        "ok": True,
+        "result": result.value,
+        "progress": progress,
+        "finished": judge.is_completed(),
+    }
+    return len(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+
+def measure_sentence(text, rubi):
+    """1文をミスなく入力したときの (完全形式, 差分形式) の合計バイト数"""
+    full_judge = TypingJudge(text, rubi)
+    delta_judge = TypingJudge(text, rubi)
+    full_bytes = delta_bytes = 0
+
+    for char in full_judge.get_target_rubi():
+        result = full_judge.judge_char(char)
+        full_bytes += _response_bytes(full_judge, result, full_judge.get_progress_display())
+        result = delta_judge.judge_char(char)
+        delta_bytes += _response_bytes(delta_judge, result, delta_judge.get_progress_delta())
+
+    return full_bytes, delta_bytes
+
+
+def main():
+    scenario_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scenario')
+    manager = ScenarioManager(scenario_dir)
+
+    print(f"{'scenario':<24}{'sentences':>10}{'full B/sent':>14}{'delta B/sent':>14}{'ratio':>8}")
+    longest = None
+    for filename in manager.get_available_scenarios():
+        sentences = manager.get_all_sentences(filename)
+        if not sentences:
+            continue
+
+        full_total = delta_total = 0
+        for text, rubi in sentences:
+            full_bytes, delta_bytes = measure_sentence(text, rubi)
+            full_total += full_bytes
+            delta_total += delta_bytes
+            if longest is None or len(rubi) > len(longest[1]):
+                longest = (text, rubi, full_bytes, delta_bytes)
+
+        count = len(sentences)
+        print(f"{filename:<24}{count:>10}{full_total / count:>14.0f}{delta_total / count:>14.0f}"
+              f"{full_total / max(delta_total, 1):>7.1f}x")
+
+    if longest:
+        text, rubi, full_bytes, delta_bytes = longest
+        print(f"\nlongest sentence ({len(rubi)} keys): full={full_bytes} B  delta={delta_bytes} B  "
+              f"({full_bytes / delta_bytes:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
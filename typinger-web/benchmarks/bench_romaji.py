@@ -0,0 +1,158 @@
+"""
+bench_romaji.py
+ローマ字→かな変換のベンチマーク（旧実装 vs トライ木）
+
+scenario ディレクトリの各シナリオについて、全エントリのルビを連結した
+コーパスを convert_greedy で一括変換し、入力を1文字ずつ伸ばしながら
+convert を呼ぶ（入力途中の判定を模擬）処理と合わせて所要時間を比較します。
+両実装の変換結果が一致することも確認します。
+
+あわせて、入力済みかなの表示を想定して、1キーごとに伸びるバッファへ
+convert_greedy をかけ直す方式と RomajiStream.feed の逐次変換を比較します。
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_romaji.py --repeat 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from core.romaji_converter import RomajiConverter, RomajiStream, ConvertResult, ConvertStatus
+from core.scenario_manager import ScenarioManager
+
+
+class LegacyRomajiConverter(RomajiConverter):
+    """トライ木導入前の実装（テーブル全走査・接頭辞スライス・文字列連結）"""
+
+    def _has_partial_match(self, romaji):
+        for key in self.conversion_table:
+            if key.startswith(romaji):
+                return True
+        return False
+
+    def convert(self, input_str):
+        input_str = input_str.lower()
+        for length in range(len(input_str), 0, -1):
+            candidate = input_str[:length]
+            if candidate in self.conversion_table:
+                return ConvertResult(
+                    ConvertStatus.MATCHED,
+                    kana=self.conversion_table[candidate],
+                    consumed=candidate,
+                    remaining=input_str[length:]
+                )
+        if self._has_partial_match(input_str):
+            return ConvertResult(ConvertStatus.PARTIAL, remaining=input_str)
+        return ConvertResult(ConvertStatus.NO_MATCH, remaining=input_str)
+
+    def convert_greedy(self, input_str):
+        input_str = input_str.lower()
+        result_kana = ""
+        while input_str:
+            match_result = self.convert(input_str)
+            if match_result.status == ConvertStatus.MATCHED:
+                result_kana += match_result.kana
+                input_str = match_result.remaining
+            else:
+                break
+        return result_kana, input_str
+
+
+def load_corpora(scenario_dir):
+    """
+    シナリオごとに全エントリのルビを連結したコーパスを作成
+
+    convert_greedy は変換できない文字（記号など）で止まるため、
+    連結するのは末尾まで変換できるエントリのみとします。
+    """
+    manager = ScenarioManager(scenario_dir)
+    converter = RomajiConverter()
+    corpora = {}
+    for filename in manager.get_available_scenarios():
+        scenario = manager.load_scenario(filename)
+        if not scenario:
+            continue
+        rubis = [entry.get("rubi", "") for entry in scenario.get("entries", {}).values()]
+        corpus = "".join(rubi for rubi in rubis if rubi and not converter.convert_greedy(rubi)[1])
+        if corpus:
+            corpora[filename] = (corpus, rubis)
+    return corpora
+
+
+def _typing_workload(converter, rubis):
+    """入力途中の判定を模擬（かな1文字分の入力が確定するたびにバッファをリセット）"""
+    for rubi in rubis:
+        buffer = ""
+        for char in rubi:
+            buffer += char
+            result = converter.convert(buffer)
+            if result.status != ConvertStatus.PARTIAL:
+                buffer = result.remaining if result.status == ConvertStatus.MATCHED else ""
+
+
+def _regreedy_workload(converter, rubis):
+    """1キーごとに入力済みバッファ全体を convert_greedy で変換し直す"""
+    for rubi in rubis:
+        for end in range(1, len(rubi) + 1):
+            converter.convert_greedy(rubi[:end])
+
+
+def _stream_workload(rubis):
+    """1キーごとに RomajiStream.feed で差分だけ変換する"""
+    for rubi in rubis:
+        stream = RomajiStream()
+        for char in rubi:
+            stream.feed(char)
+
+
+def _time(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario-dir", default="scenario", help="シナリオディレクトリ")
+    parser.add_argument("--repeat", type=int, default=20, help="計測の繰り返し回数")
+    parser.add_argument("--scale", type=int, default=10, help="コーパスを何回連結するか")
+    args = parser.parse_args()
+
+    legacy = LegacyRomajiConverter()
+    trie = RomajiConverter()
+
+    print(f"{'scenario':<24}{'chars':>8}  {'greedy old':>11}{'greedy new':>11}{'speedup':>9}"
+          f"  {'typing old':>11}{'typing new':>11}{'speedup':>9}")
+
+    for filename, (corpus, rubis) in load_corpora(args.scenario_dir).items():
+        corpus = corpus * args.scale
+        rubis = rubis * args.scale
+
+        if legacy.convert_greedy(corpus) != trie.convert_greedy(corpus):
+            raise SystemExit(f"{filename}: convert_greedy results differ")
+
+        greedy_old = _time(lambda: legacy.convert_greedy(corpus), args.repeat)
+        greedy_new = _time(lambda: trie.convert_greedy(corpus), args.repeat)
+        typing_old = _time(lambda: _typing_workload(legacy, rubis), args.repeat)
+        typing_new = _time(lambda: _typing_workload(trie, rubis), args.repeat)
+
+        print(f"{filename:<24}{len(corpus):>8}  {greedy_old:>9.2f}ms{greedy_new:>9.2f}ms"
+              f"{greedy_old / greedy_new:>8.1f}x  {typing_old:>9.2f}ms{typing_new:>9.2f}ms"
+              f"{typing_old / typing_new:>8.1f}x")
+
+    print()
+    print(f"{'scenario':<24}{'keys':>8}  {'re-greedy':>11}{'stream':>11}{'speedup':>9}")
+    for filename, (_, rubis) in load_corpora(args.scenario_dir).items():
+        regreedy = _time(lambda: _regreedy_workload(trie, rubis), args.repeat)
+        stream = _time(lambda: _stream_workload(rubis), args.repeat)
+        keys = sum(len(rubi) for rubi in rubis)
+        print(f"{filename:<24}{keys:>8}  {regreedy:>9.2f}ms{stream:>9.2f}ms{regreedy / stream:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+bench_transport.py
+キー入力の転送方式ベンチマーク（HTTP judge_char vs WebSocket）
+
+同時に打鍵する N 人のタイピストを模擬し、キー入力からフィードバック
+（判定結果）を受け取るまでの遅延の p50 / p99 を転送方式ごとに比較します。
+
+実行方法（typinger-web ディレクトリで）:
+    python benchmarks/bench_transport.py --typists 100 --keys 50
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import websockets
+from werkzeug.serving import make_server
+
+import app as typinger_app
+import realtime_server
+
+
+SCENARIO_FILE = "beginner.json"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _http_request(port, method, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    payload = json.dumps(body) if body is not None else None
+    conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    conn.close()
+    return data
+
+
+def _start_session(http_port):
+    data = _http_request(http_port, "POST", "/api/session/start", {"scenario_file": SCENARIO_FILE})
+    return data["session_id"], data["target_rubi"]
+
+
+def run_http(http_port, typists, keys, interval):
+    """各タイピストが1キーごとに judge_char を呼ぶ"""
+    latencies = []
+    lock = threading.Lock()
+    sessions = [_start_session(http_port) for _ in range(typists)]
+    barrier = threading.Barrier(typists)
+
+    def typist(session_id, rubi):
+        local = []
+        barrier.wait()
+        for i in range(keys):
+            char = rubi[i % len(rubi)]
+            start = time.perf_counter()
+            _http_request(http_port, "POST", f"/api/session/{session_id}/judge_char",
+                          {"char": char, "timestamp": i * 100})
+            local.append(time.perf_counter() - start)
+            time.sleep(interval)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=typist, args=s) for s in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return latencies
+
+
+def run_websocket(http_port, ws_port, typists, keys, interval):
+    """各タイピストが WebSocket で1フレームずつ送信する"""
+    sessions = [_start_session(http_port) for _ in range(typists)]
+
+    async def typist(session_id, rubi, start_event):
+        local = []
+        async with websockets.connect(f"ws://127.0.0.1:{ws_port}/session/{session_id}",
+                                      compression=None) as ws:
+            await start_event.wait()
+            for i in range(keys):
+                char = rubi[i % len(rubi)]
+                start = time.perf_counter()
+                await ws.send(json.dumps({"s": i + 1, "t": i * 100, "c": char}, separators=(',', ':')))
+                await ws.recv()
+                local.append(time.perf_counter() - start)
+                await asyncio.sleep(interval)
+        return local
+
+    async def main():
+        start_event = asyncio.Event()
+        tasks = [asyncio.create_task(typist(sid, rubi, start_event)) for sid, rubi in sessions]
+        await asyncio.sleep(0.5)  # 全接続の確立を待つ
+        start_event.set()
+        results = await asyncio.gather(*tasks)
+        return [latency for local in results for latency in local]
+
+    return asyncio.run(main())
+
+
+def _report(name, latencies):
+    ms = [latency * 1000 for latency in latencies]
+    print(f"{name:<12} keys={len(ms):>6}  p50={_percentile(ms, 50):8.2f}ms  "
+          f"p99={_percentile(ms, 99):8.2f}ms  max={max(ms):8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--typists", type=int, default=100, help="同時タイピスト数")
+    parser.add_argument("--keys", type=int, default=50, help="1人あたりのキー数")
+    parser.add_argument("--interval", type=float, default=0.05, help="キー間隔（秒）")
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    http_port = _free_port()
+    ws_port = _free_port()
+
+    server = make_server("127.0.0.1", http_port, typinger_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    realtime_server.start_in_background(typinger_app.sessions, "127.0.0.1", ws_port)
+
+    print(f"typists={args.typists} keys/typist={args.keys} interval={args.interval * 1000:.0f}ms")
+    _report("HTTP", run_http(http_port, args.typists, args.keys, args.interval))
+    _report("WebSocket", run_websocket(http_port, ws_port, args.typists, args.keys, args.interval))
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
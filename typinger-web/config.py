@@ -21,6 +21,38 @@ class Config:
     # サーバー設定
     HOST = os.environ.get('HOST', '0.0.0.0')
     PORT = int(os.environ.get('PORT', 5000))
+    
+    # セッション管理（保存先・上限数・アイドルTTL秒・掃除間隔秒）
+    # SESSION_BACKEND: 'memory'（単一ワーカー）または 'sqlite'（複数ワーカーで共有）
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'memory')
+    SESSION_DB_PATH = os.environ.get('SESSION_DB_PATH', os.path.join('instance', 'sessions.db'))
+    SESSION_MAX_COUNT = int(os.environ.get('SESSION_MAX_COUNT', 1000))
+    SESSION_IDLE_TTL = int(os.environ.get('SESSION_IDLE_TTL', 1800))
+    SESSION_SWEEP_INTERVAL = int(os.environ.get('SESSION_SWEEP_INTERVAL', 60))
+    
+    # CSV の非同期書き込み（1 で有効）・書き込みキューの上限・fsync ポリシー（none / batch / always）
+    CSV_ASYNC_WRITE = os.environ.get('CSV_ASYNC_WRITE', '0') == '1'
+    CSV_QUEUE_SIZE = int(os.environ.get('CSV_QUEUE_SIZE', 256))
+    CSV_FSYNC = os.environ.get('CSV_FSYNC', 'none')
+    
+    # セッション記録の保存先（csv: セッションごとのCSVファイル / journal: 追記専用のジャーナル）
+    LOG_STORAGE = os.environ.get('LOG_STORAGE', 'csv')
+    JOURNAL_MAX_BYTES = int(os.environ.get('JOURNAL_MAX_BYTES', 64 * 1024 * 1024))
+    JOURNAL_MAX_AGE = int(os.environ.get('JOURNAL_MAX_AGE', 24 * 60 * 60))
+    
+    # イベント列をバイナリの列指向ログ（output/event_log_YYYYMMDD.tyel）にも保存（1 で有効）
+    EVENT_LOG_BINARY = os.environ.get('EVENT_LOG_BINARY', '0') == '1'
+    
+    # 完了したセッションの結果を SQLite に1行ずつ保存し、管理画面の集計に使う（0 で無効）
+    RESULTS_STORE = os.environ.get('RESULTS_STORE', '1') == '1'
+    RESULTS_DB_PATH = os.environ.get('RESULTS_DB_PATH', os.path.join('instance', 'results.db'))
+    
+    # キー入力用 WebSocket サーバー（0 で無効）
+    WS_HOST = os.environ.get('WS_HOST', '0.0.0.0')
+    WS_PORT = int(os.environ.get('WS_PORT', 0))
+    # 1 の場合は WebSocket サーバーを別プロセス（python realtime_server.py）で起動し、アプリはポートの通知のみ行う
+    # （gunicorn ではワーカー内で起動しないため、SESSION_BACKEND=sqlite と合わせて使う）
+    WS_SEPARATE = os.environ.get('WS_SEPARATE', '0') == '1'
 
 class DevelopmentConfig(Config):
     """開発環境設定"""
@@ -2,7 +2,7 @@
 
 from .romaji_converter import RomajiConverter, ConvertStatus, ConvertResult
 from .typing_judge import TypingJudge, JudgeResult
-from .statistics import StatisticsCalculator, KeyEvent, EventType, StatisticsData
+from .statistics import StatisticsCalculator, KeyEvent, EventType, EventBuffer, StatisticsData
 from .csv_logger import CSVLogger
 from .scenario_manager import ScenarioManager
 
@@ -15,6 +15,7 @@ __all__ = [
     'StatisticsCalculator',
     'KeyEvent',
     'EventType',
+    'EventBuffer',
     'StatisticsData',
     'CSVLogger',
     'ScenarioManager',
@@ -0,0 +1,436 @@
+"""
+batch_statistics.py
+一括統計計算モジュール（大量のイベント列の集計）
+
+1日分のイベントCSV（output/typing_events_*.csv）など、複数セッション分の
+イベント列をまとめて読み込み、StatisticsData の各項目に加えて
+キー間隔のパーセンタイル・ヒストグラム・バースト（連続入力）区間を計算します。
+
+NumPy がインストールされていれば列（EventBuffer の array）をコピーせずに
+ベクトル演算で集計し、ない場合は純 Python で同じ結果を計算します。
+両者の結果が完全に一致するよう、合計は整数で求め、浮動小数点の合計は
+math.fsum（正確に丸めた合計）で求めます。
+
+用語解説:
+- パーセンタイル (Percentile): 小さい順に並べたときに指定の割合の位置にある値（p50 = 中央値）。
+  隣り合う値の間は線形補間する
+- ヒストグラム (Histogram): キー間隔を区間（ビン）ごとに数えたもの。
+  区間は [境界, 次の境界) で、最後の区間は上限なし
+- バースト (Burst): 一時停止（しきい値を超えるキー間隔）で区切られた連続入力の区間
+- 一時停止 (Pause): しきい値を超えるキー間隔
+"""
+
+import csv
+import glob
+import math
+import os
+from array import array
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from core.statistics import EventBuffer, EventType, StatisticsData
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 未インストール時は純 Python で計算
+    np = None
+
+
+# 計算するキー間隔のパーセンタイル
+PERCENTILES = (50, 90, 99)
+
+# キー間隔ヒストグラムの区間の境界（ミリ秒）
+DEFAULT_HISTOGRAM_EDGES_MS = (0, 50, 100, 150, 200, 300, 500, 1000, 2000)
+
+# 一時停止とみなすキー間隔（ミリ秒）
+DEFAULT_PAUSE_THRESHOLD_MS = 1000
+
+# イベントCSVのファイル名パターン（CSVLogger.save_events_csv の出力）
+EVENTS_CSV_PATTERN = "typing_events_*.csv"
+
+
+def has_numpy() -> bool:
+    """NumPy による集計が利用可能か"""
+    return np is not None
+
+
+@dataclass
+class Burst:
+    """バースト（連続入力の区間）"""
+    start_time: int  # 先頭イベントの時刻（マイクロ秒）
+    end_time: int  # 最後のイベントの時刻（マイクロ秒）
+    key_count: int  # 区間内のイベント数
+
+    @property
+    def duration(self) -> int:
+        """所要時間（マイクロ秒）"""
+        return self.end_time - self.start_time
+
+
+@dataclass
+class BatchStatisticsData:
+    """一括統計データ"""
+    statistics: StatisticsData = field(default_factory=StatisticsData)
+    session_count: int = 0  # 集計したセッション（ファイル）数
+
+    # キー間隔の分布（ミリ秒）
+    interval_percentiles: Dict[str, float] = field(default_factory=dict)  # {"p50": ..., "p90": ..., "p99": ...}
+    histogram_edges_ms: List[float] = field(default_factory=list)
+    histogram_counts: List[int] = field(default_factory=list)
+
+    # バースト・一時停止
+    bursts: List[Burst] = field(default_factory=list)
+    pause_count: int = 0
+    total_pause_time: int = 0  # マイクロ秒
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON 応答用の辞書に変換（時間はミリ秒）"""
+        stats_data = self.statistics
+        burst_durations = [burst.duration for burst in self.bursts]
+        return {
+            "session_count": self.session_count,
+            "total_duration_ms": stats_data.total_duration / 1000,
+            "total_key_count": stats_data.total_key_count,
+            "correct_key_count": stats_data.correct_key_count,
+            "backspace_count": stats_data.backspace_count,
+            "wpm_total": round(stats_data.wpm_total, 2),
+            "wpm_correct": round(stats_data.wpm_correct, 2),
+            "cpm_total": round(stats_data.cpm_total, 2),
+            "cpm_correct": round(stats_data.cpm_correct, 2),
+            "avg_inter_key_interval_ms": round(stats_data.avg_inter_key_interval, 2),
+            "min_inter_key_interval_ms": round(stats_data.min_inter_key_interval, 2),
+            "max_inter_key_interval_ms": round(stats_data.max_inter_key_interval, 2),
+            "std_inter_key_interval_ms": round(stats_data.std_inter_key_interval, 2),
+            "interval_percentiles_ms": {
+                name: round(value, 2) for name, value in self.interval_percentiles.items()
+            },
+            "histogram": {
+                "edges_ms": self.histogram_edges_ms,
+                "counts": self.histogram_counts,
+            },
+            "burst_count": len(self.bursts),
+            "avg_burst_keys": (
+                sum(burst.key_count for burst in self.bursts) / len(self.bursts) if self.bursts else 0.0
+            ),
+            "longest_burst_ms": max(burst_durations) / 1000 if burst_durations else 0.0,
+            "pause_count": self.pause_count,
+            "total_pause_ms": self.total_pause_time / 1000,
+        }
+
+
+@dataclass
+class _Reduction:
+    """バックエンドごとの集計結果（以降の計算は共通）"""
+    total_duration: int
+    backspace_count: int
+    key_down_count: int
+    interval_count: int
+    interval_sum: int
+    interval_min: int
+    interval_max: int
+    sorted_intervals: Sequence[int]
+    squared_deviations: List[float]
+    histogram_counts: List[int]
+    burst_bounds: List[Tuple[int, int]]  # (先頭の位置, 末尾の次の位置)
+    pause_count: int
+    total_pause_time: int
+
+
+def _percentile(sorted_values: Sequence[int], percent: float) -> float:
+    """
+    小さい順に並んだ値のパーセンタイル（線形補間）
+
+    Args:
+        sorted_values: 小さい順の値
+        percent: パーセント（0 ～ 100）
+
+    Returns:
+        float: パーセンタイル値
+    """
+    position = (len(sorted_values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    low_value = int(sorted_values[lower])
+    return low_value + (int(sorted_values[upper]) - low_value) * (position - lower)
+
+
+def _reduce_python(timestamps: Sequence[int], type_codes: Sequence[int], offsets: List[int],
+                   edges: List[int], pause_threshold: int) -> _Reduction:
+    """純 Python による集計"""
+    intervals: List[int] = []
+    burst_bounds: List[Tuple[int, int]] = []
+    total_duration = 0
+
+    for start, stop in zip(offsets, offsets[1:]):
+        if stop <= start:
+            continue
+        total_duration += timestamps[stop - 1] - timestamps[start]
+        burst_start = start
+        for index in range(start + 1, stop):
+            interval = timestamps[index] - timestamps[index - 1]
+            intervals.append(interval)
+            if interval > pause_threshold:
+                burst_bounds.append((burst_start, index))
+                burst_start = index
+        burst_bounds.append((burst_start, stop))
+
+    pauses = [interval for interval in intervals if interval > pause_threshold]
+
+    histogram_counts = [0] * len(edges)
+    for interval in intervals:
+        histogram_counts[max(bisect_right(edges, interval) - 1, 0)] += 1
+
+    interval_sum = sum(intervals)
+    mean = interval_sum / len(intervals) if intervals else 0.0
+    deviations = [interval - mean for interval in intervals]
+
+    return _Reduction(
+        total_duration=total_duration,
+        backspace_count=type_codes.count(EventBuffer.code_of(EventType.BACKSPACE)),
+        key_down_count=type_codes.count(EventBuffer.code_of(EventType.KEY_DOWN)),
+        interval_count=len(intervals),
+        interval_sum=interval_sum,
+        interval_min=min(intervals) if intervals else 0,
+        interval_max=max(intervals) if intervals else 0,
+        sorted_intervals=sorted(intervals),
+        squared_deviations=[deviation * deviation for deviation in deviations],
+        histogram_counts=histogram_counts,
+        burst_bounds=burst_bounds,
+        pause_count=len(pauses),
+        total_pause_time=sum(pauses),
+    )
+
+
+def _reduce_numpy(timestamps: Sequence[int], type_codes: Sequence[int], offsets: List[int],
+                  edges: List[int], pause_threshold: int) -> _Reduction:
+    """NumPy によるベクトル演算での集計（array はコピーせずに参照する）"""
+    ts = np.frombuffer(timestamps, dtype=np.int64) if isinstance(timestamps, array) \
+        else np.asarray(timestamps, dtype=np.int64)
+    types = np.frombuffer(type_codes, dtype=np.uint8) if isinstance(type_codes, array) \
+        else np.asarray(type_codes, dtype=np.uint8)
+    event_count = len(ts)
+    bounds = np.asarray(offsets, dtype=np.int64)
+
+    # 空でないセッションの所要時間
+    starts, stops = bounds[:-1], bounds[1:]
+    non_empty = stops > starts
+    starts, stops = starts[non_empty], stops[non_empty]
+    total_duration = int(np.sum(ts[stops - 1] - ts[starts]))
+
+    # セッションの境界をまたぐ差分は除く
+    diffs = np.diff(ts)
+    valid = np.ones(len(diffs), dtype=bool)
+    inner = bounds[(bounds > 0) & (bounds < event_count)]
+    valid[inner - 1] = False
+    intervals = diffs[valid]
+
+    # バーストの先頭 = セッションの先頭 + 一時停止の直後
+    pause_mask = valid & (diffs > pause_threshold)
+    burst_starts = np.union1d(starts, np.flatnonzero(pause_mask) + 1)
+    burst_stops = np.append(burst_starts[1:], event_count)
+    pauses = diffs[pause_mask]
+
+    bins = np.clip(np.searchsorted(np.asarray(edges, dtype=np.int64), intervals, side='right') - 1,
+                   0, len(edges) - 1)
+
+    interval_sum = int(np.sum(intervals))
+    mean = interval_sum / len(intervals) if len(intervals) else 0.0
+    deviations = intervals - mean
+
+    return _Reduction(
+        total_duration=total_duration,
+        backspace_count=int(np.count_nonzero(types == EventBuffer.code_of(EventType.BACKSPACE))),
+        key_down_count=int(np.count_nonzero(types == EventBuffer.code_of(EventType.KEY_DOWN))),
+        interval_count=len(intervals),
+        interval_sum=interval_sum,
+        interval_min=int(intervals.min()) if len(intervals) else 0,
+        interval_max=int(intervals.max()) if len(intervals) else 0,
+        sorted_intervals=np.sort(intervals),
+        squared_deviations=(deviations * deviations).tolist(),
+        histogram_counts=np.bincount(bins, minlength=len(edges)).tolist(),
+        burst_bounds=list(zip(burst_starts.tolist(), burst_stops.tolist())),
+        pause_count=len(pauses),
+        total_pause_time=int(np.sum(pauses)),
+    )
+
+
+class BatchStatisticsCalculator:
+    """一括統計計算クラス"""
+
+    BACKENDS = ('auto', 'numpy', 'python')
+
+    def __init__(self, backend: str = 'auto',
+                 histogram_edges_ms: Sequence[float] = DEFAULT_HISTOGRAM_EDGES_MS,
+                 pause_threshold_ms: float = DEFAULT_PAUSE_THRESHOLD_MS):
+        """
+        コンストラクタ
+
+        Args:
+            backend: 'auto'（NumPy があれば使う）/ 'numpy' / 'python'
+            histogram_edges_ms: ヒストグラムの区間の境界（ミリ秒、昇順）
+            pause_threshold_ms: 一時停止とみなすキー間隔（ミリ秒）
+
+        Raises:
+            ValueError: 不明なバックエンド、または NumPy が利用できない場合
+        """
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == 'numpy' and not has_numpy():
+            raise ValueError("NumPy is not installed")
+
+        self.backend = 'numpy' if backend == 'auto' and has_numpy() else backend
+        if self.backend == 'auto':
+            self.backend = 'python'
+        self.histogram_edges_ms = list(histogram_edges_ms)
+        self.pause_threshold_ms = pause_threshold_ms
+
+    @staticmethod
+    def load_events_csv(paths: Sequence[str]) -> Tuple[EventBuffer, List[int]]:
+        """
+        イベントCSVを読み込んで1つのバッファに連結
+
+        Args:
+            paths: イベントCSVのパス（1ファイル = 1セッション）
+
+        Returns:
+            Tuple[EventBuffer, List[int]]: (イベント列, 各セッションの開始位置 + 末尾位置)
+        """
+        events = EventBuffer()
+        offsets = [0]
+        for path in paths:
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                next(reader, None)  # ヘッダー
+                for row in reader:
+                    if len(row) < 4:
+                        continue
+                    try:
+                        events.add(EventType(row[1]), int(row[0]), int(row[2]), row[3])
+                    except ValueError:
+                        # 壊れた行・基本多言語面の外の文字の行（古い出力）は読み飛ばす
+                        continue
+            offsets.append(len(events))
+        return events, offsets
+
+    @staticmethod
+    def load_events_records(records: Iterable[Dict[str, Any]]) -> Tuple[EventBuffer, List[int]]:
+        """
+        ジャーナルの記録（core/session_journal.py）のイベント列を1つのバッファに連結
+
+        Args:
+            records: 記録（1記録 = 1セッション、"events" はイベントCSVと同じ列順の行）
+
+        Returns:
+            Tuple[EventBuffer, List[int]]: (イベント列, 各セッションの開始位置 + 末尾位置)
+        """
+        events = EventBuffer()
+        offsets = [0]
+        for record in records:
+            for timestamp, event_type, virtual_key, character in record.get("events", []):
+                events.add(EventType(event_type), timestamp, virtual_key, character)
+            offsets.append(len(events))
+        return events, offsets
+
+    @staticmethod
+    def find_events_csv(output_dir: str, date: Optional[str] = None) -> List[str]:
+        """
+        イベントCSVを検索
+
+        Args:
+            output_dir: 出力ディレクトリ
+            date: 日付（YYYYMMDD、省略時はすべて）
+
+        Returns:
+            List[str]: ファイルパス（ファイル名順 = 時刻順）
+        """
+        pattern = f"typing_events_{date}_*.csv" if date else EVENTS_CSV_PATTERN
+        return sorted(glob.glob(os.path.join(output_dir, pattern)))
+
+    def calculate_files(self, paths: Sequence[str],
+                        correct_key_count: Optional[int] = None) -> BatchStatisticsData:
+        """
+        イベントCSVをまとめて集計
+
+        Args:
+            paths: イベントCSVのパス
+            correct_key_count: 正解キー数（省略時は正味の入力数 = KEY_DOWN 数 - Backspace 数）
+
+        Returns:
+            BatchStatisticsData: 一括統計データ
+        """
+        events, offsets = self.load_events_csv(paths)
+        return self.calculate(events, offsets, correct_key_count)
+
+    def calculate(self, events: EventBuffer, offsets: Optional[List[int]] = None,
+                  correct_key_count: Optional[int] = None) -> BatchStatisticsData:
+        """
+        イベント列を集計
+
+        Args:
+            events: イベント列
+            offsets: 各セッションの開始位置 + 末尾位置（省略時は全体で1セッション）
+            correct_key_count: 正解キー数（省略時は正味の入力数 = KEY_DOWN 数 - Backspace 数）
+
+        Returns:
+            BatchStatisticsData: 一括統計データ
+        """
+        event_count = len(events)
+        if offsets is None:
+            offsets = [0, event_count]
+        if event_count == 0:
+            return BatchStatisticsData(session_count=len(offsets) - 1,
+                                       histogram_edges_ms=self.histogram_edges_ms,
+                                       histogram_counts=[0] * len(self.histogram_edges_ms))
+
+        reduce = _reduce_numpy if self.backend == 'numpy' else _reduce_python
+        reduction = reduce(events.timestamps, events.event_types, offsets,
+                           [round(edge * 1000) for edge in self.histogram_edges_ms],
+                           round(self.pause_threshold_ms * 1000))
+
+        if correct_key_count is None:
+            correct_key_count = max(reduction.key_down_count - reduction.backspace_count, 0)
+
+        stats_data = StatisticsData()
+        stats_data.total_duration = reduction.total_duration
+        stats_data.total_key_count = event_count
+        stats_data.correct_key_count = correct_key_count
+        stats_data.incorrect_key_count = event_count - correct_key_count
+        stats_data.backspace_count = reduction.backspace_count
+
+        # WPM/CPM計算（5文字=1単語、StatisticsCalculator と同じ式）
+        if stats_data.total_duration > 0:
+            minutes = stats_data.total_duration / (1000000 * 60)
+            stats_data.wpm_total = (stats_data.total_key_count / 5) / minutes
+            stats_data.wpm_correct = (stats_data.correct_key_count / 5) / minutes
+            stats_data.cpm_total = stats_data.total_key_count / minutes
+            stats_data.cpm_correct = stats_data.correct_key_count / minutes
+
+        percentiles: Dict[str, float] = {}
+        if reduction.interval_count:
+            stats_data.avg_inter_key_interval = reduction.interval_sum / reduction.interval_count / 1000
+            stats_data.min_inter_key_interval = reduction.interval_min / 1000
+            stats_data.max_inter_key_interval = reduction.interval_max / 1000
+            variance = math.fsum(reduction.squared_deviations) / reduction.interval_count
+            stats_data.std_inter_key_interval = math.sqrt(variance) / 1000
+            percentiles = {
+                f"p{percent}": _percentile(reduction.sorted_intervals, percent) / 1000
+                for percent in PERCENTILES
+            }
+
+        timestamps = events.timestamps
+        bursts = [
+            Burst(timestamps[start], timestamps[stop - 1], stop - start)
+            for start, stop in reduction.burst_bounds
+        ]
+
+        return BatchStatisticsData(
+            statistics=stats_data,
+            session_count=len(offsets) - 1,
+            interval_percentiles=percentiles,
+            histogram_edges_ms=self.histogram_edges_ms,
+            histogram_counts=reduction.histogram_counts,
+            bursts=bursts,
+            pause_count=reduction.pause_count,
+            total_pause_time=reduction.total_pause_time,
+        )
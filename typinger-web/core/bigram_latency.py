@@ -0,0 +1,429 @@
+"""
+bigram_latency.py
+キー遷移（バイグラム）の遅延行列
+
+連続する2つのキー入力（直前のキー → 次のキー）ごとに、キー間隔の
+平均・件数・p90 を集計します。セッションのイベント列やイベントCSVを
+1件ずつ流し込んで更新するため、生のイベントは保持しません。
+
+用語解説:
+- バイグラム (Bigram / Digraph): 連続する2つのキーの組（例: "K" → "A"）
+- 遷移遅延 (Transition Latency): 直前のキーから次のキーまでのキー間隔
+- ヒートマップ (Heatmap): 行 = 直前のキー、列 = 次のキー とした表を色の濃さで表したもの
+- キー空間 (Key Space): 行列の添字に使うキーコードの種類。
+  仮想キーコード（'vk'、イベントCSVの VirtualKey 列）か HID キーコード（'hid'）
+
+セルごとの値は列ごとの array（件数・合計・遅延のヒストグラム）に保持し、
+出現したバイグラムの分だけ領域を確保します。p90 はヒストグラムから求めるため、
+区間の幅（既定 10ms）程度の誤差を含みます。一時停止（既定 1000ms を超える間隔）は
+キー遷移とみなさず集計しません。
+"""
+
+import csv
+import os
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from core.batch_statistics import DEFAULT_PAUSE_THRESHOLD_MS, BatchStatisticsCalculator
+from core.keymap_manager import KeymapValidator
+from core.event_log import BinaryEventLog, EventBlock, EventLogReader
+from core.session_journal import SessionJournal, Cursor
+from core.statistics import EventBuffer, EventType, KeyEvent, iter_event_rows
+
+
+# 遅延ヒストグラムの区間の幅（ミリ秒）
+BIGRAM_BUCKET_MS = 10
+
+# ヒートマップに含める p90 の割合
+BIGRAM_PERCENTILE = 90
+
+# キー空間
+KEY_SPACES = ('vk', 'hid')
+
+# 仮想キーコードの上限（キーコードは 0 ～ 255）
+_KEY_LIMIT = 256
+
+
+def _build_vk_to_hid() -> List[int]:
+    """仮想キーコード → HID キーコード の表（対応しないキーは 0）"""
+    table = [0] * _KEY_LIMIT
+    hid = KeymapValidator.HID_KEYS
+    # 英字・数字は仮想キーコードが文字コードと同じ
+    for name, code in hid.items():
+        if len(name) == 1:
+            table[ord(name)] = code
+    # 記号は入力文字の文字コードを仮想キーコードとして記録している
+    symbols = {
+        '-': 'MINUS', '=': 'EQUALS', '[': 'LEFTBRACE', ']': 'RIGHTBRACE', '\\': 'BACKSLASH',
+        ';': 'SEMICOLON', "'": 'APOSTROPHE', '`': 'GRAVE', ',': 'COMMA', '.': 'DOT', '/': 'SLASH',
+    }
+    for char, name in symbols.items():
+        table[ord(char)] = hid[name]
+    table[8] = hid['BACKSPACE']  # VK_BACK
+    table[9] = hid['TAB']
+    table[13] = hid['ENTER']
+    table[27] = hid['ESC']
+    table[32] = hid['SPACE']
+    return table
+
+
+VK_TO_HID = _build_vk_to_hid()
+
+
+def key_label(code: int, key_space: str = 'vk') -> str:
+    """
+    キーコードの表示名を取得
+
+    Args:
+        code: キーコード
+        key_space: 'vk' / 'hid'
+
+    Returns:
+        str: 表示名（例: "A", "BACKSPACE"）
+    """
+    if key_space == 'hid':
+        return KeymapValidator.get_key_name(code)
+    if code == 8:
+        return "BACKSPACE"
+    if code == 32:
+        return "SPACE"
+    if 33 <= code < 127:
+        return chr(code)
+    return f"VK_{code}"
+
+
+class BigramLatencyMatrix:
+    """バイグラム遅延行列クラス"""
+
+    def __init__(self, bucket_ms: float = BIGRAM_BUCKET_MS,
+                 max_latency_ms: float = DEFAULT_PAUSE_THRESHOLD_MS):
+        """
+        コンストラクタ
+
+        Args:
+            bucket_ms: 遅延ヒストグラムの区間の幅（ミリ秒）
+            max_latency_ms: 集計する最大の遅延（ミリ秒、これを超える間隔は一時停止とみなす）
+        """
+        self.bucket_ms = bucket_ms
+        self.max_latency_ms = max_latency_ms
+        self.bucket_width = round(bucket_ms * 1000)  # マイクロ秒
+        self.max_latency = round(max_latency_ms * 1000)
+        self.bucket_count = self.max_latency // self.bucket_width + 1
+
+        # (直前のキー << 8 | 次のキー) → セル番号
+        self._cells: Dict[int, int] = {}
+        # セルごとの列（キーの組・件数・遅延の合計（マイクロ秒））と、セルごとのヒストグラムを連結した列
+        self._pairs = array('H')
+        self._counts = array('Q')
+        self._sums = array('Q')
+        self._histograms = array('I')
+
+        # イベント列の途中状態（直前のキーと時刻）
+        self._previous: Optional[Tuple[int, int]] = None
+        self.transition_count = 0
+
+    def __len__(self) -> int:
+        """出現したバイグラムの種類数"""
+        return len(self._pairs)
+
+    def _cell(self, pair: int) -> int:
+        """キーの組のセル番号（なければ追加）"""
+        cell = self._cells.get(pair)
+        if cell is None:
+            cell = len(self._pairs)
+            self._cells[pair] = cell
+            self._pairs.append(pair)
+            self._counts.append(0)
+            self._sums.append(0)
+            self._histograms.extend(array('I', bytes(4 * self.bucket_count)))
+        return cell
+
+    def add(self, previous_key: int, next_key: int, latency: int):
+        """
+        キー遷移を1件追加
+
+        Args:
+            previous_key: 直前のキーコード（0 ～ 255）
+            next_key: 次のキーコード（0 ～ 255）
+            latency: 遅延（マイクロ秒）
+        """
+        if latency < 0 or latency > self.max_latency:
+            return
+        cell = self._cell(previous_key << 8 | next_key)
+        self._counts[cell] += 1
+        self._sums[cell] += latency
+        self._histograms[cell * self.bucket_count + latency // self.bucket_width] += 1
+        self.transition_count += 1
+
+    def feed(self, timestamp: int, virtual_key: int):
+        """
+        イベントを1件流し込む（直前のイベントとのキー遷移を追加）
+
+        Args:
+            timestamp: 入力時刻（マイクロ秒）
+            virtual_key: 仮想キーコード（0 ～ 255 以外のキーの前後はキー遷移とみなさない）
+        """
+        if not 0 <= virtual_key < _KEY_LIMIT:
+            self._previous = None
+            return
+        if self._previous is not None:
+            previous_key, previous_time = self._previous
+            self.add(previous_key, virtual_key, timestamp - previous_time)
+        self._previous = (virtual_key, timestamp)
+
+    def end_session(self):
+        """セッションの区切り（次のイベントとの間はキー遷移とみなさない）"""
+        self._previous = None
+
+    def add_events(self, events: Union[EventBuffer, Iterable[KeyEvent]]):
+        """
+        1セッション分のイベント列を追加
+
+        Args:
+            events: セッションのイベント列
+        """
+        self.end_session()
+        for event_type, timestamp, virtual_key, _ in iter_event_rows(events):
+            if event_type != EventType.KEY_UP:
+                self.feed(timestamp, virtual_key)
+        self.end_session()
+
+    def add_event_block(self, block: EventBlock):
+        """
+        バイナリイベントログの1ブロック（1セッション）を追加（列を直接たどる）
+
+        Args:
+            block: ブロック
+        """
+        key_up = EventBuffer.code_of(EventType.KEY_UP)
+        self.end_session()
+        for timestamp, type_code, virtual_key in zip(block.timestamps(), block.event_types, block.virtual_keys):
+            if type_code != key_up:
+                self.feed(timestamp, virtual_key)
+        self.end_session()
+
+    def add_events_csv(self, path: str):
+        """
+        イベントCSV（1ファイル = 1セッション）を1行ずつ読みながら追加
+
+        Args:
+            path: イベントCSVのパス
+        """
+        self.end_session()
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # ヘッダー
+            for row in reader:
+                if len(row) < 4 or row[1] not in (EventType.KEY_DOWN.value, EventType.BACKSPACE.value):
+                    continue
+                self.feed(int(row[0]), int(row[2]))
+        self.end_session()
+
+    def merge(self, other: 'BigramLatencyMatrix', key_map: Optional[List[int]] = None):
+        """
+        別の行列の集計を加える
+
+        Args:
+            other: 加える行列（区間の幅と最大の遅延が同じであること）
+            key_map: キーコードの変換表（VK_TO_HID など、省略時はそのまま）。
+                     変換先が 0（対応するキーがない）の組は加えない
+
+        Raises:
+            ValueError: ヒストグラムの区間が異なる場合
+        """
+        if (other.bucket_width, other.bucket_count) != (self.bucket_width, self.bucket_count):
+            raise ValueError("Histogram buckets differ")
+
+        width = self.bucket_count
+        skipped = 0
+        for source, pair in enumerate(other._pairs):
+            previous_key, next_key = pair >> 8, pair & 0xFF
+            if key_map is not None:
+                previous_key, next_key = key_map[previous_key], key_map[next_key]
+                if not previous_key or not next_key:
+                    skipped += other._counts[source]
+                    continue
+            cell = self._cell(previous_key << 8 | next_key)
+            self._counts[cell] += other._counts[source]
+            self._sums[cell] += other._sums[source]
+            for bucket in range(width):
+                self._histograms[cell * width + bucket] += other._histograms[source * width + bucket]
+        self.transition_count += other.transition_count - skipped
+
+    def get(self, previous_key: int, next_key: int) -> Optional[Dict[str, float]]:
+        """
+        キーの組の集計を取得
+
+        Returns:
+            Dict: {"count": 件数, "mean_ms": 平均, "p90_ms": p90}（出現していない場合は None）
+        """
+        cell = self._cells.get((previous_key & 0xFF) << 8 | (next_key & 0xFF))
+        if cell is None:
+            return None
+        return {
+            "count": self._counts[cell],
+            "mean_ms": self._sums[cell] / self._counts[cell] / 1000,
+            "p90_ms": self.percentile(cell, BIGRAM_PERCENTILE),
+        }
+
+    def percentile(self, cell: int, percent: float) -> float:
+        """
+        セルの遅延のパーセンタイル（ヒストグラムの区間内は線形補間、ミリ秒）
+
+        Args:
+            cell: セル番号
+            percent: パーセント（0 ～ 100）
+
+        Returns:
+            float: パーセンタイル値（ミリ秒）
+        """
+        count = self._counts[cell]
+        rank = count * percent / 100
+        offset = cell * self.bucket_count
+        cumulative = 0
+        for bucket in range(self.bucket_count):
+            in_bucket = self._histograms[offset + bucket]
+            if in_bucket and cumulative + in_bucket >= rank:
+                return (bucket + (rank - cumulative) / in_bucket) * self.bucket_ms
+            cumulative += in_bucket
+        return self.max_latency_ms
+
+    def to_heatmap(self, key_space: str = 'vk', min_count: int = 1) -> Dict[str, Any]:
+        """
+        ヒートマップ用の行列に変換
+
+        Args:
+            key_space: 'vk'（仮想キーコード）/ 'hid'（HID キーコード）
+            min_count: セルに含める最小の件数（少ない組は null）
+
+        Returns:
+            Dict: {"key_space", "keys", "labels", "mean_ms", "p90_ms", "count", "transition_count"}。
+                  mean_ms / p90_ms / count は 行 = 直前のキー、列 = 次のキー の2次元配列
+
+        Raises:
+            ValueError: 不明なキー空間の場合
+        """
+        if key_space not in KEY_SPACES:
+            raise ValueError(f"Unknown key space: {key_space}")
+
+        matrix = self
+        if key_space == 'hid':
+            matrix = BigramLatencyMatrix(self.bucket_ms, self.max_latency_ms)
+            matrix.merge(self, VK_TO_HID)
+
+        keys = sorted({pair >> 8 for pair in matrix._pairs} | {pair & 0xFF for pair in matrix._pairs})
+        position = {key: index for index, key in enumerate(keys)}
+        size = len(keys)
+        mean_ms: List[List[Optional[float]]] = [[None] * size for _ in range(size)]
+        p90_ms: List[List[Optional[float]]] = [[None] * size for _ in range(size)]
+        counts: List[List[int]] = [[0] * size for _ in range(size)]
+
+        for cell, pair in enumerate(matrix._pairs):
+            row, column = position[pair >> 8], position[pair & 0xFF]
+            count = matrix._counts[cell]
+            counts[row][column] = count
+            if count >= min_count:
+                mean_ms[row][column] = round(matrix._sums[cell] / count / 1000, 2)
+                p90_ms[row][column] = round(matrix.percentile(cell, BIGRAM_PERCENTILE), 2)
+
+        return {
+            "key_space": key_space,
+            "keys": keys,
+            "labels": [key_label(key, key_space) for key in keys],
+            "mean_ms": mean_ms,
+            "p90_ms": p90_ms,
+            "count": counts,
+            "transition_count": matrix.transition_count,
+        }
+
+    def nbytes(self) -> int:
+        """列の使用バイト数（セル番号の辞書を除く）"""
+        return sum(column.itemsize * len(column)
+                   for column in (self._pairs, self._counts, self._sums, self._histograms))
+
+
+class BigramLatencyCollector:
+    """出力ディレクトリのイベントCSV（またはジャーナル）から遅延行列を増分更新するクラス"""
+
+    def __init__(self, output_dir: str, journal: Optional[SessionJournal] = None,
+                 event_log: Optional[BinaryEventLog] = None):
+        """
+        コンストラクタ
+
+        Args:
+            output_dir: イベントCSVの出力ディレクトリ
+            journal: セッション記録のジャーナル（指定時はイベントCSVの代わりに読む）
+            event_log: バイナリイベントログ（指定時はイベントCSV・ジャーナルの代わりに読む）
+        """
+        self.output_dir = output_dir
+        self.journal = journal
+        self.event_log = event_log
+        self._journal_cursor: Optional[Cursor] = None
+        self._log_blocks: Dict[str, int] = {}  # ログファイルごとの読み込み済みブロック数
+        self.matrix = BigramLatencyMatrix()
+        self.files: Set[str] = set()  # 集計済みのイベントCSVのファイル名（ジャーナル・バイナリログではセッションID）
+        # add_session で追加し、まだファイルが書かれていないもの（非同期書き込み中）
+        self._pending: Set[str] = set()
+        self.lock = threading.Lock()
+
+    def add_session(self, events: Union[EventBuffer, Iterable[KeyEvent]], filename: str):
+        """
+        完了したセッションのイベント列を追加（CSV を読み直さない）
+
+        Args:
+            events: セッションのイベント列
+            filename: 保存したイベントCSVのファイル名（ジャーナル・バイナリログではセッションID）
+        """
+        with self.lock:
+            if filename not in self.files:
+                self.matrix.add_events(events)
+                self.files.add(filename)
+                self._pending.add(filename)
+
+    def refresh(self) -> BigramLatencyMatrix:
+        """
+        未集計のイベントCSVを追加（削除されたファイルがあれば集計し直す）
+
+        ジャーナル・バイナリログを使う場合は、前回の続きから追記された記録を読みます。
+
+        Returns:
+            BigramLatencyMatrix: 更新した遅延行列
+        """
+        with self.lock:
+            if self.event_log is not None:
+                for path in self.event_log.find_logs():
+                    name = os.path.basename(path)
+                    with EventLogReader(path) as reader:
+                        for index in range(self._log_blocks.get(name, 0), len(reader)):
+                            block = reader.block(index)
+                            try:
+                                if block.session_id not in self.files:
+                                    self.matrix.add_event_block(block)
+                                    self.files.add(block.session_id)
+                            finally:
+                                block.release()
+                        self._log_blocks[name] = len(reader)
+                return self.matrix
+
+            if self.journal is not None:
+                for record, self._journal_cursor in self.journal.iter_records(self._journal_cursor):
+                    if record["session_id"] not in self.files:
+                        self.matrix.add_events(BatchStatisticsCalculator.load_events_records([record])[0])
+                        self.files.add(record["session_id"])
+                return self.matrix
+
+            paths = BatchStatisticsCalculator.find_events_csv(self.output_dir)
+            names = {os.path.basename(path) for path in paths}
+            self._pending -= names
+            if not self.files - self._pending <= names:
+                self.matrix = BigramLatencyMatrix()
+                self.files = set()
+                self._pending = set()
+
+            for path in paths:
+                name = os.path.basename(path)
+                if name not in self.files:
+                    self.matrix.add_events_csv(path)
+                    self.files.add(name)
+            return self.matrix
@@ -3,68 +3,332 @@ csv_logger.py
 CSV出力機能
 
 タイピング結果をCSV形式で保存する機能を提供します。
+
+非同期書き込み（write-behind）モードでは、保存要求をキューに入れてすぐに
+ファイルパスを返し、書き込みはバックグラウンドのスレッドが行います。
+
+用語解説:
+- ライトビハインド (Write-Behind): 書き込みを後回しにして、呼び出し元を待たせない方式
+- グループコミット (Group Commit): キューに溜まった複数の書き込みをまとめて処理し、
+  fsync（ディスクへの確定）をまとめて行うこと
+- fsync ポリシー: 'none'（OS に任せる）/ 'batch'（まとめて書いた後に確定）/
+  'always'（ファイルごとに確定）
+- バックプレッシャー (Backpressure): キューが満杯のときに保存要求を待たせること。
+  待った回数と時間を get_stats() で確認できる
+
+ファイルは一時ファイル（.tmp）に書いてから名前を変えるため、
+一覧や読み込みで書きかけのCSVが見えることはありません。
 """
 
+import atexit
 import csv
 import os
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Any
-from core.statistics import KeyEvent, EventType, StatisticsData
+from typing import List, Dict, Any, Callable, Iterable, Optional, Tuple, Union
+from core.statistics import KeyEvent, EventBuffer, StatisticsData, iter_event_rows
+
+
+# サマリCSVでキー間隔の分位点スケッチを保存する行の名前
+INTERVAL_SKETCH_METRIC = "Inter-Key Interval Sketch"
+
+# fsync ポリシー
+FSYNC_POLICIES = ('none', 'batch', 'always')
+
+# 書き込みキューの既定の上限（件数）
+DEFAULT_QUEUE_SIZE = 256
+
+# グループコミット1回でまとめて書く最大件数
+MAX_GROUP_COMMIT = 64
+
+# 各CSVのヘッダー
+EVENTS_CSV_HEADER = ["timestamp (microseconds)", "event_type", "virtual_key", "character"]
+SUMMARY_CSV_HEADER = ["Metric", "Value"]
+KANA_ANALYSIS_CSV_HEADER = ["Kana", "Avg Input Time (ms)", "Count"]
+
+
+def event_rows(events: Union[EventBuffer, Iterable[KeyEvent]]) -> Iterable[Tuple[int, str, int, str]]:
+    """イベントCSVの行（ヘッダーを除く）を順に返す"""
+    for event_type, timestamp, virtual_key, character in iter_event_rows(events):
+        yield (timestamp, event_type.value, virtual_key, character)
+
+
+def summary_rows(stats_data: StatisticsData, target_text: str, accuracy: float) -> List[List[Any]]:
+    """サマリCSVの行（ヘッダーを除く）"""
+    rows = [
+        ["Target Text", target_text],
+        ["Total Duration (microseconds)", stats_data.total_duration],
+        ["Total Duration (seconds)", stats_data.total_duration / 1000000],
+        ["Total Key Count", stats_data.total_key_count],
+        ["Correct Key Count", stats_data.correct_key_count],
+        ["Incorrect Key Count", stats_data.incorrect_key_count],
+        ["Backspace Count", stats_data.backspace_count],
+        ["Accuracy (%)", f"{accuracy * 100:.2f}"],
+        ["WPM (Total)", f"{stats_data.wpm_total:.2f}"],
+        ["WPM (Correct)", f"{stats_data.wpm_correct:.2f}"],
+        ["CPM (Total)", f"{stats_data.cpm_total:.2f}"],
+        ["CPM (Correct)", f"{stats_data.cpm_correct:.2f}"],
+        ["Avg Inter-Key Interval (ms)", f"{stats_data.avg_inter_key_interval:.2f}"],
+        ["Min Inter-Key Interval (ms)", f"{stats_data.min_inter_key_interval:.2f}"],
+        ["Max Inter-Key Interval (ms)", f"{stats_data.max_inter_key_interval:.2f}"],
+        ["Std Inter-Key Interval (ms)", f"{stats_data.std_inter_key_interval:.2f}"],
+    ]
+    if stats_data.interval_sketch is not None:
+        rows.append([INTERVAL_SKETCH_METRIC, stats_data.interval_sketch.to_string()])
+    return rows
+
+
+def kana_analysis_rows(kana_analysis: Dict[str, Any]) -> List[List[Any]]:
+    """かな別分析CSVの行（ヘッダーを除く）"""
+    return [
+        [kana, f"{data.get('avg_time', 0):.2f}", data.get('count', 0)]
+        for kana, data in kana_analysis.items()
+    ]
 
 
 class CSVLogger:
     """CSV出力クラス"""
 
-    def __init__(self, output_dir: str = "output"):
+    def __init__(self, output_dir: str = "output", async_write: bool = False,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, fsync: str = 'none'):
         """
         コンストラクタ
-        
+
         Args:
             output_dir: 出力ディレクトリ
+            async_write: 非同期書き込み（write-behind）モードにするか
+            queue_size: 書き込みキューの上限（件数、満杯のときは保存要求を待たせる）
+            fsync: fsync ポリシー（'none' / 'batch' / 'always'）
+
+        Raises:
+            ValueError: 不明な fsync ポリシーの場合
         """
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync}")
+
         self.output_dir = output_dir
+        self.async_write = async_write
+        self.fsync = fsync
         self._ensure_output_dir()
 
+        # 書き込みキューと統計（非同期モードのみ使用）
+        self._queue: "queue.Queue[Optional[Tuple[str, Iterable[List[Any]]]]]" = queue.Queue(maxsize=queue_size)
+        self._writer: Optional[threading.Thread] = None
+        # 書き込みが済んだファイルのパスを受け取るコールバック（管理画面の一覧の更新など）
+        self._listeners: List[Callable[[str], None]] = []
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "queued": 0,
+            "written": 0,
+            "failed": 0,
+            "group_commits": 0,
+            "max_queue_depth": 0,
+            "blocked_count": 0,
+            "blocked_ms": 0.0,
+            "write_ms": 0.0,
+        }
+        if async_write:
+            self._writer = threading.Thread(target=self._run_writer, name="typinger-csv-writer", daemon=True)
+            self._writer.start()
+            # プロセス終了時にキューに残った書き込みを済ませる
+            atexit.register(self.close)
+
     def _ensure_output_dir(self):
         """出力ディレクトリが存在することを確認"""
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
     def _get_timestamp_filename(self, prefix: str, ext: str = "csv") -> str:
-        """タイムスタンプ付きファイル名を生成"""
+        """タイムスタンプ付きファイル名を生成（同じ秒に完了したセッションが衝突しないようマイクロ秒まで含める）"""
         now = datetime.now()
-        filename = f"{prefix}_{now.strftime('%Y%m%d_%H%M%S')}.{ext}"
+        filename = f"{prefix}_{now.strftime('%Y%m%d_%H%M%S_%f')}.{ext}"
         return os.path.join(self.output_dir, filename)
 
-    def save_events_csv(self, events: List[KeyEvent]) -> str:
+    def _write_file(self, filepath: str, rows: Iterable[List[Any]], sync: bool):
+        """一時ファイルに書いてから名前を変えて保存"""
+        temp_path = filepath + ".tmp"
+        with open(temp_path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows(rows)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, filepath)
+
+    def add_listener(self, callback: Callable[[str], None]):
+        """
+        書き込みが済んだファイルの通知先を追加
+
+        Args:
+            callback: 保存先のパスを受け取る関数（非同期モードでは書き込みスレッドから呼ばれる）
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, filepath: str):
+        """書き込みが済んだことを通知先に知らせる"""
+        for callback in self._listeners:
+            try:
+                callback(filepath)
+            except Exception as e:
+                print(f'[WARN] CSV write listener failed for {filepath}: {e}')
+
+    def _sync_output_dir(self):
+        """ファイル名の変更をディスクに確定（ディレクトリの fsync、対応しない OS では何もしない）"""
+        try:
+            fd = os.open(self.output_dir, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def _submit(self, filepath: str, rows: Iterable[List[Any]]) -> str:
+        """
+        書き込みを実行（非同期モードではキューに入れてすぐに戻る）
+
+        Args:
+            filepath: 保存先のパス
+            rows: ヘッダーを含む行の列
+
+        Returns:
+            str: 保存先のパス
+        """
+        if not self.async_write or self._writer is None:
+            self._write_file(filepath, rows, self.fsync != 'none')
+            if self.fsync != 'none':
+                self._sync_output_dir()
+            self._notify(filepath)
+            return filepath
+
+        job = (filepath, rows)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            # キューが満杯なら空くまで待つ（バックプレッシャー）
+            started = time.perf_counter()
+            self._queue.put(job)
+            with self._stats_lock:
+                self._stats["blocked_count"] += 1
+                self._stats["blocked_ms"] += (time.perf_counter() - started) * 1000
+
+        with self._stats_lock:
+            self._stats["queued"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return filepath
+
+    def _run_writer(self):
+        """書き込みスレッド（溜まった書き込みをまとめて処理する）"""
+        while True:
+            jobs = [self._queue.get()]
+            while len(jobs) < MAX_GROUP_COMMIT:
+                try:
+                    jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in jobs
+            started = time.perf_counter()
+            written: List[str] = []
+            failed = 0
+            for job in jobs:
+                if job is None:
+                    continue
+                filepath, rows = job
+                try:
+                    self._write_file(filepath, rows, self.fsync == 'always')
+                    written.append(filepath)
+                except Exception as e:
+                    failed += 1
+                    print(f'[WARN] Failed to write {filepath}: {e}')
+
+            # 'batch' はまとめて書いた後に各ファイルを確定し、ディレクトリの確定は1回にする
+            if written and self.fsync == 'batch':
+                for filepath in written:
+                    try:
+                        with open(filepath, 'rb') as f:
+                            os.fsync(f.fileno())
+                    except OSError as e:
+                        print(f'[WARN] Failed to fsync {filepath}: {e}')
+            if written and self.fsync != 'none':
+                self._sync_output_dir()
+            for filepath in written:
+                self._notify(filepath)
+
+            with self._stats_lock:
+                self._stats["written"] += len(written)
+                self._stats["failed"] += failed
+                self._stats["group_commits"] += 1
+                self._stats["write_ms"] += (time.perf_counter() - started) * 1000
+
+            for _ in jobs:
+                self._queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """キューに入っている書き込みがすべて終わるまで待つ"""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+
+    def close(self):
+        """キューの書き込みを済ませて書き込みスレッドを止める（終了時に呼ばれる）"""
+        if self._writer is None:
+            return
+        # 以降の保存は同期で書く
+        self.async_write = False
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._writer = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        書き込みキューの統計を取得
+
+        Returns:
+            Dict: モード、fsync ポリシー、キューの長さと上限、書き込み件数・失敗件数、
+                  グループコミット回数、満杯で待った回数と時間（ミリ秒）など
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        commits = stats["group_commits"]
+        stats.update({
+            "mode": "async" if self.async_write else "sync",
+            "fsync": self.fsync,
+            "queue_depth": self._queue.qsize(),
+            "queue_capacity": self._queue.maxsize,
+            "avg_group_size": round(stats["written"] / commits, 2) if commits else 0.0,
+            "blocked_ms": round(stats["blocked_ms"], 2),
+            "write_ms": round(stats["write_ms"], 2),
+        })
+        return stats
+
+    def save_events_csv(self, events: Union[EventBuffer, Iterable[KeyEvent]]) -> str:
         """
         イベントCSVを保存
         
         全キーイベント（KEY_DOWN/KEY_UP/BACKSPACE）をマイクロ秒単位で記録
         
         Args:
-            events: キーイベントのリスト
-            
+            events: キーイベントの列（EventBuffer は列から直接書き出す。
+                非同期モードでは書き込みが終わるまで変更しないこと）
+        
         Returns:
-            str: 保存されたファイルパス
+            str: 保存されたファイルパス（非同期モードでは保存予定のパス）
         """
         filepath = self._get_timestamp_filename("typing_events")
         
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["timestamp (microseconds)", "event_type", "virtual_key", "character"])
-            
-            for event in events:
-                writer.writerow([
-                    event.timestamp,
-                    event.event_type.value,
-                    event.virtual_key,
-                    event.character,
-                ])
+        def rows():
+            yield EVENTS_CSV_HEADER
+            yield from event_rows(events)
         
-        return filepath
+        return self._submit(filepath, rows())
 
-    def save_summary_csv(self, stats_data: StatisticsData, 
+    def save_summary_csv(self, stats_data: StatisticsData,
                          target_text: str, accuracy: float) -> str:
         """
         サマリCSVを保存
@@ -75,38 +339,16 @@ class CSVLogger:
             stats_data: 統計データ
             target_text: 目標テキスト
             accuracy: 正解率
-            
+        
         Returns:
-            str: 保存されたファイルパス
+            str: 保存されたファイルパス（非同期モードでは保存予定のパス）
         """
         filepath = self._get_timestamp_filename("typing_summary")
         
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            # ヘッダーとデータ
-            summary_data = [
-                ["Metric", "Value"],
-                ["Target Text", target_text],
-                ["Total Duration (microseconds)", stats_data.total_duration],
-                ["Total Duration (seconds)", stats_data.total_duration / 1000000],
-                ["Total Key Count", stats_data.total_key_count],
-                ["Correct Key Count", stats_data.correct_key_count],
-                ["Incorrect Key Count", stats_data.incorrect_key_count],
-                ["Backspace Count", stats_data.backspace_count],
-                ["Accuracy (%)", f"{accuracy * 100:.2f}"],
-                ["WPM (Total)", f"{stats_data.wpm_total:.2f}"],
-                ["WPM (Correct)", f"{stats_data.wpm_correct:.2f}"],
-                ["CPM (Total)", f"{stats_data.cpm_total:.2f}"],
-                ["CPM (Correct)", f"{stats_data.cpm_correct:.2f}"],
-                ["Avg Inter-Key Interval (ms)", f"{stats_data.avg_inter_key_interval:.2f}"],
-                ["Min Inter-Key Interval (ms)", f"{stats_data.min_inter_key_interval:.2f}"],
-                ["Max Inter-Key Interval (ms)", f"{stats_data.max_inter_key_interval:.2f}"],
-            ]
-            
-            writer.writerows(summary_data)
+        # ヘッダーとデータ
+        summary_data = [SUMMARY_CSV_HEADER] + summary_rows(stats_data, target_text, accuracy)
         
-        return filepath
+        return self._submit(filepath, summary_data)
 
     def save_kana_analysis_csv(self, kana_analysis: Dict[str, Any]) -> str:
         """
@@ -116,21 +358,12 @@ class CSVLogger:
         
         Args:
             kana_analysis: かな別分析データ
-            
+        
         Returns:
-            str: 保存されたファイルパス
+            str: 保存されたファイルパス（非同期モードでは保存予定のパス）
         """
         filepath = self._get_timestamp_filename("kana_analysis")
         
-        with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(["Kana", "Avg Input Time (ms)", "Count"])
-            
-            for kana, data in kana_analysis.items():
-                writer.writerow([
-                    kana,
-                    f"{data.get('avg_time', 0):.2f}",
-                    data.get('count', 0),
-                ])
+        rows = [KANA_ANALYSIS_CSV_HEADER] + kana_analysis_rows(kana_analysis)
         
-        return filepath
+        return self._submit(filepath, rows)
@@ -0,0 +1,562 @@
+"""
+event_log.py
+列指向のバイナリイベントログ（イベントCSVと並べて保存する形式）
+
+1日1ファイル（event_log_YYYYMMDD.tyel）に、完了したセッションのイベント列を
+セッションごとのブロックとして追記します。時刻は直前のイベントとの差分を可変長整数で、
+種別・仮想キーコード・文字は固定幅の列で保存するため、CSVより小さく、
+読み込み時に文字列を解析する必要がありません。
+
+読み込み（EventLogReader）はファイルを mmap し、固定幅の列を memoryview として
+コピーせずに参照します。時刻の列のみ差分を足し戻して array('q') に復元します。
+
+用語解説:
+- 列指向 (Columnar): イベントごとではなく、項目（時刻・種別など）ごとに値を並べて保存する方式
+- 差分符号化 (Delta Encoding): 値そのものではなく直前の値との差を保存すること。
+  キー間隔は数十万マイクロ秒程度のため、絶対時刻より少ないバイト数で表せる
+- 可変長整数 (Varint): 7ビットずつ下位から並べ、続きがあるバイトの最上位ビットを 1 にする整数の表現。
+  負の差分は ZigZag 変換（0, -1, 1, -2, ... → 0, 1, 2, 3, ...）で正の整数にする
+- mmap: ファイルをメモリに対応付け、読み込みを OS のページキャッシュに任せる仕組み
+- ブロック索引 (Block Index): セッションIDからブロックの位置を引く索引。
+  ブロックヘッダーの長さをたどって作るため、ファイルの末尾に書き足す必要がない
+- 確定済みの末尾位置 (Committed End): 書き終えたブロックの末尾。途中で止まった書き込みは
+  大きさが 8 バイト境界に揃っていても、この位置より後ろにあるため読まれず、次の追記で切り詰められる
+
+ファイルの構成（数値はリトルエンディアン）:
+- ファイルヘッダー（16 バイト）: マジック "TYEL"、バージョン、予約、確定済みの末尾位置
+  （追記したブロックを書き終えてから更新する。これより後ろは書きかけか途中で止まった書き込み。
+  0 は確定済みの末尾位置を記録していない古いファイル）
+- ブロック（8 バイト境界に揃える）:
+  ヘッダー（32 バイト）: マジック "TYBK"、イベント数、セッションIDの長さ、時刻列の長さ、
+  長い文字の長さ、ブロック全体の長さ、先頭の時刻
+  本体: セッションID（4 バイト境界まで詰める）、文字 u32 × n、仮想キーコード u16 × n、
+  種別 u8 × n、時刻の差分（ZigZag 可変長整数）、1文字ではない文字（JSON）
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from core.statistics import EventBuffer, KeyEvent
+
+try:
+    import fcntl
+except ImportError:  # fcntl がない環境（Windows）ではプロセス内の排他のみ
+    fcntl = None
+
+
+# ファイル名（1日1ファイル）
+EVENT_LOG_PREFIX = "event_log_"
+EVENT_LOG_EXT = ".tyel"
+
+FORMAT_VERSION = 1
+
+_FILE_HEADER = struct.Struct("<4sHHq")
+_FILE_MAGIC = b"TYEL"
+_BLOCK_HEADER = struct.Struct("<4sIIIIIq")
+_BLOCK_MAGIC = b"TYBK"
+
+# 列の型（ファイル上はリトルエンディアン）
+_LITTLE_ENDIAN = sys.byteorder == 'little'
+
+
+def _pad(length: int, alignment: int) -> int:
+    """length を alignment の倍数に切り上げるための詰め物のバイト数"""
+    return -length % alignment
+
+
+def encode_timestamps(timestamps: Iterable[int]) -> bytes:
+    """
+    時刻の列を差分の ZigZag 可変長整数に変換
+
+    Args:
+        timestamps: 時刻（マイクロ秒）
+
+    Returns:
+        bytes: 符号化したバイト列
+    """
+    out = bytearray()
+    previous = 0
+    for timestamp in timestamps:
+        delta = timestamp - previous
+        previous = timestamp
+        value = delta * 2 if delta >= 0 else -delta * 2 - 1
+        while value >= 0x80:
+            out.append((value & 0x7F) | 0x80)
+            value >>= 7
+        out.append(value)
+    return bytes(out)
+
+
+def decode_timestamps(data: Union[bytes, memoryview]) -> array:
+    """
+    encode_timestamps() のバイト列を時刻の列に戻す
+
+    Args:
+        data: 符号化したバイト列
+
+    Returns:
+        array: 時刻の array('q')
+
+    Raises:
+        ValueError: 可変長整数が途中で終わっている場合
+    """
+    out = array('q')
+    append = out.append
+    timestamp = 0
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        timestamp += (value >> 1) ^ -(value & 1)
+        append(timestamp)
+        value = 0
+        shift = 0
+    if shift:
+        raise ValueError("Truncated varint")
+    return out
+
+
+def _little_endian(column: array) -> bytes:
+    """列をリトルエンディアンのバイト列にする"""
+    if _LITTLE_ENDIAN:
+        return column.tobytes()
+    swapped = array(column.typecode, column)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _extend_column(column: array, view: memoryview):
+    """リトルエンディアンの列（memoryview）を column の末尾に追加"""
+    start = len(column)
+    column.frombytes(view if view.format == 'B' else view.cast('B'))
+    if not _LITTLE_ENDIAN and column.itemsize > 1:
+        tail = column[start:]
+        tail.byteswap()
+        column[start:] = tail
+
+
+def encode_block(session_id: str, events: Union[EventBuffer, Iterable[KeyEvent]]) -> bytes:
+    """
+    1セッション分のイベント列をブロックに変換
+
+    Args:
+        session_id: セッションID
+        events: イベント列
+
+    Returns:
+        bytes: ブロック（ヘッダーを含む、8 バイト境界に揃えた長さ）
+    """
+    if not isinstance(events, EventBuffer):
+        events = EventBuffer(events)
+    timestamps, event_types, virtual_keys, chars, long_chars = events.columns()
+
+    session_bytes = session_id.encode('utf-8')
+    timestamp_bytes = encode_timestamps(timestamps)
+    long_char_bytes = json.dumps(long_chars, ensure_ascii=False).encode('utf-8') if long_chars else b""
+    body = b"".join([
+        session_bytes, b"\0" * _pad(len(session_bytes), 4),
+        _little_endian(chars),
+        _little_endian(virtual_keys),
+        event_types.tobytes(),
+        timestamp_bytes,
+        long_char_bytes,
+    ])
+    length = _BLOCK_HEADER.size + len(body)
+    header = _BLOCK_HEADER.pack(_BLOCK_MAGIC, len(events), len(session_bytes), len(timestamp_bytes),
+                                len(long_char_bytes), length + _pad(length, 8),
+                                timestamps[0] if len(timestamps) else 0)
+    return header + body + b"\0" * _pad(length, 8)
+
+
+@dataclass
+class BlockInfo:
+    """ブロック索引の1件"""
+    session_id: str
+    offset: int  # ブロックの先頭位置（ファイル先頭からのバイト数）
+    length: int  # ブロック全体の長さ
+    event_count: int
+    first_timestamp: int  # 先頭の時刻（マイクロ秒、時刻の列を復元せずに参照できる）
+
+
+class EventBlock:
+    """1セッション分の列（固定幅の列は mmap をコピーしない memoryview）"""
+
+    __slots__ = ('info', 'chars', 'virtual_keys', 'event_types', '_timestamp_bytes', '_long_char_bytes')
+
+    def __init__(self, info: BlockInfo, view: memoryview, id_length: int,
+                 timestamp_length: int, long_char_length: int):
+        count = info.event_count
+        position = _BLOCK_HEADER.size + id_length + _pad(id_length, 4)
+        self.info = info
+        self.chars = view[position:position + 4 * count].cast('I')
+        position += 4 * count
+        self.virtual_keys = view[position:position + 2 * count].cast('H')
+        position += 2 * count
+        self.event_types = view[position:position + count]
+        position += count
+        self._timestamp_bytes = view[position:position + timestamp_length]
+        position += timestamp_length
+        self._long_char_bytes = view[position:position + long_char_length]
+
+    @property
+    def session_id(self) -> str:
+        return self.info.session_id
+
+    def __len__(self) -> int:
+        return self.info.event_count
+
+    def timestamps(self) -> array:
+        """時刻の列を復元（差分を足し戻す）"""
+        return decode_timestamps(self._timestamp_bytes)
+
+    def long_chars(self) -> Dict[int, str]:
+        """1文字ではない文字（位置 → 文字列）"""
+        if not len(self._long_char_bytes):
+            return {}
+        return {int(index): text for index, text in json.loads(bytes(self._long_char_bytes)).items()}
+
+    def to_event_buffer(self) -> EventBuffer:
+        """
+        EventBuffer に変換（固定幅の列はバイト列のまま複製し、文字列の解析はしない）
+
+        Returns:
+            EventBuffer: イベント列
+        """
+        chars, virtual_keys, event_types = array('I'), array('H'), array('B')
+        _extend_column(chars, self.chars)
+        _extend_column(virtual_keys, self.virtual_keys)
+        _extend_column(event_types, self.event_types)
+        return EventBuffer.from_columns(self.timestamps(), event_types, virtual_keys, chars, self.long_chars())
+
+    def release(self):
+        """memoryview を解放（mmap を閉じる前に呼ぶ）"""
+        for view in (self.chars, self.virtual_keys, self.event_types,
+                     self._timestamp_bytes, self._long_char_bytes):
+            view.release()
+
+
+class EventLogReader:
+    """バイナリイベントログの読み込みクラス（mmap）"""
+
+    def __init__(self, path: str):
+        """
+        コンストラクタ（ファイルを mmap してブロック索引を作る）
+
+        Args:
+            path: ログファイルのパス
+
+        Raises:
+            ValueError: ファイル形式が正しくない場合
+        """
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+        self._committed = 0
+        self.blocks: List[BlockInfo] = []
+        self._block_fields: List[Tuple[int, int, int]] = []
+        self._index: Dict[str, int] = {}
+        try:
+            self.refresh()
+        except Exception:
+            self.close()
+            raise
+
+    def refresh(self) -> int:
+        """
+        追記されたブロックを索引に加える（ファイルが伸びていれば mmap し直す）
+
+        確定済みの末尾位置より後ろのブロック（書きかけ）は次の refresh まで読みません。
+        壊れたブロックがあれば、その手前で読むのをやめます。
+
+        Returns:
+            int: 新たに加えたブロックの数
+
+        Raises:
+            ValueError: ファイルヘッダーが正しくない場合
+        """
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _FILE_HEADER.size:
+            raise ValueError(f"Not an event log: {self.path}")
+        # os.pread は Windows にないため、このリーダー専用のファイルオブジェクトで読む
+        self._file.seek(0)
+        magic, version, _, committed = _FILE_HEADER.unpack(self._file.read(_FILE_HEADER.size))
+        if magic != _FILE_MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported event log: {self.path}")
+        if self._mmap is not None and size == len(self._mmap) and committed == self._committed:
+            return 0
+
+        self._unmap()
+        self._mmap = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._committed = committed
+        # 確定済みの末尾位置より後ろは書きかけのため読まない（記録していない古いファイルは末尾まで）
+        limit = committed if 0 < committed <= size else size
+
+        added = 0
+        offset = self.blocks[-1].offset + self.blocks[-1].length if self.blocks else _FILE_HEADER.size
+        while offset + _BLOCK_HEADER.size <= limit:
+            (magic, count, id_length, timestamp_length,
+             long_char_length, length, first_timestamp) = _BLOCK_HEADER.unpack_from(self._mmap, offset)
+            if magic != _BLOCK_MAGIC or length < _BLOCK_HEADER.size or offset + length > limit:
+                # 壊れたブロック・途中で止まった書き込みの手前まで読む
+                break
+            session_id = bytes(self._view[offset + _BLOCK_HEADER.size:
+                                          offset + _BLOCK_HEADER.size + id_length]).decode('utf-8', 'replace')
+            self._index[session_id] = len(self.blocks)
+            self.blocks.append(BlockInfo(session_id, offset, length, count, first_timestamp))
+            self._block_fields.append((id_length, timestamp_length, long_char_length))
+            offset += length
+            added += 1
+        return added
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def session_ids(self) -> List[str]:
+        """ブロックのセッションID（追記順）"""
+        return [info.session_id for info in self.blocks]
+
+    def block(self, index: int) -> EventBlock:
+        """
+        index 番目のブロックの列を取得
+
+        Args:
+            index: ブロックの番号（追記順）
+
+        Returns:
+            EventBlock: 列（mmap を参照する memoryview、使い終わったら release()）
+        """
+        info = self.blocks[index]
+        view = self._view[info.offset:info.offset + info.length]
+        return EventBlock(info, view, *self._block_fields[index])
+
+    def find(self, session_id: str) -> Optional[EventBlock]:
+        """セッションIDのブロックを取得（ない場合は None）"""
+        index = self._index.get(session_id)
+        return None if index is None else self.block(index)
+
+    def iter_sessions(self, start: int = 0) -> Iterator[Tuple[str, EventBuffer]]:
+        """
+        セッションごとのイベント列を順に返す（統計の再計算・再生用）
+
+        Args:
+            start: 開始するブロックの番号
+
+        Yields:
+            Tuple[str, EventBuffer]: (セッションID, イベント列)
+        """
+        for index in range(start, len(self.blocks)):
+            block = self.block(index)
+            try:
+                yield block.session_id, block.to_event_buffer()
+            finally:
+                block.release()
+
+    def _unmap(self):
+        """mmap を閉じる（解放されていないブロックがあれば、それらが破棄されたときに閉じられる）"""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+
+    def close(self):
+        """mmap とファイルを閉じる"""
+        self._unmap()
+        self._file.close()
+
+    def __enter__(self) -> 'EventLogReader':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BinaryEventLog:
+    """バイナリイベントログへの追記クラス（1日1ファイル）"""
+
+    def __init__(self, output_dir: str = "output", fsync: bool = False):
+        """
+        コンストラクタ
+
+        Args:
+            output_dir: 出力ディレクトリ
+            fsync: 追記のたびにディスクへ確定するか
+        """
+        self.output_dir = output_dir
+        self.fsync = fsync
+        os.makedirs(output_dir, exist_ok=True)
+        # flock はファイルを開いた単位の排他のため、同じプロセスのスレッド間は別に排他する
+        self._write_lock = threading.Lock()
+
+    def filename_for(self, date: Optional[datetime] = None) -> str:
+        """日付のログファイル名（省略時は今日）"""
+        return f"{EVENT_LOG_PREFIX}{(date or datetime.now()).strftime('%Y%m%d')}{EVENT_LOG_EXT}"
+
+    def find_logs(self, date: Optional[str] = None) -> List[str]:
+        """
+        ログファイルを検索
+
+        Args:
+            date: 日付（YYYYMMDD、省略時はすべて）
+
+        Returns:
+            List[str]: ファイルパス（日付順）
+        """
+        if date:
+            path = os.path.join(self.output_dir, f"{EVENT_LOG_PREFIX}{date}{EVENT_LOG_EXT}")
+            return [path] if os.path.exists(path) else []
+        return sorted(
+            os.path.join(self.output_dir, name) for name in os.listdir(self.output_dir)
+            if name.startswith(EVENT_LOG_PREFIX) and name.endswith(EVENT_LOG_EXT)
+        )
+
+    @contextmanager
+    def _locked(self, fd: int):
+        """プロセス内とプロセス間の排他ロック"""
+        with self._write_lock:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _committed_end(fd: int, size: int) -> int:
+        """
+        最後の完全なブロックの末尾位置を取得
+
+        ファイルヘッダーの確定済みの末尾位置を使い、記録していない古いファイル（または
+        ファイルの大きさを越える値）の場合のみブロックヘッダーをたどって求めます。
+        """
+        committed = _FILE_HEADER.unpack(BinaryEventLog._read_at(fd, _FILE_HEADER.size, 0))[3]
+        if 0 < committed <= size:
+            return committed
+
+        offset = _FILE_HEADER.size
+        while offset + _BLOCK_HEADER.size <= size:
+            header = _BLOCK_HEADER.unpack(BinaryEventLog._read_at(fd, _BLOCK_HEADER.size, offset))
+            if header[0] != _BLOCK_MAGIC or header[5] < _BLOCK_HEADER.size or offset + header[5] > size:
+                break
+            offset += header[5]
+        return offset
+
+    # 以下の読み書きはファイル位置を動かすため、ロック内でのみ呼ぶ
+    # （os.pread / os.pwrite は Windows にないため lseek と read / write を使う）
+
+    @staticmethod
+    def _read_at(fd: int, size: int, offset: int) -> bytes:
+        """offset から size バイトを読む（ファイル末尾で短くなった場合は ValueError）"""
+        os.lseek(fd, offset, os.SEEK_SET)
+        data = b''
+        while len(data) < size:
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                raise ValueError(f"Unexpected end of event log at {offset + len(data)}")
+            data += chunk
+        return data
+
+    @staticmethod
+    def _write_all(fd: int, data: bytes, offset: int):
+        """data を offset から書き込む"""
+        os.lseek(fd, offset, os.SEEK_SET)
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+
+    def append_session(self, session_id: str, events: Union[EventBuffer, Iterable[KeyEvent]]) -> str:
+        """
+        セッションのイベント列をブロックとして追記
+
+        途中で止まった書き込みの残り（確定済みの末尾位置より後ろ）があれば切り詰めてから書き、
+        書き終えた後でファイルヘッダーの確定済みの末尾位置を更新します。
+
+        Args:
+            session_id: セッションID
+            events: イベント列
+
+        Returns:
+            str: 追記したログファイル名
+        """
+        filename = self.filename_for()
+        block = encode_block(session_id, events)
+        # 途中で止まった書き込みを切り詰めてから書くため、O_APPEND ではなくロック内で末尾の位置を求めて書く
+        # （Windows では O_BINARY がないと改行が変換される）
+        fd = os.open(os.path.join(self.output_dir, filename),
+                     os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            with self._locked(fd):
+                size = os.lseek(fd, 0, os.SEEK_END)
+                if size < _FILE_HEADER.size:
+                    # 新しいファイル（またはファイルヘッダーの書き込みが途中で止まったファイル）
+                    self._write_all(fd, _FILE_HEADER.pack(_FILE_MAGIC, FORMAT_VERSION, 0, _FILE_HEADER.size), 0)
+                    os.ftruncate(fd, _FILE_HEADER.size)
+                    size = _FILE_HEADER.size
+                else:
+                    end = self._committed_end(fd, size)
+                    if end != size:
+                        print(f'[WARN] Truncating torn event log block at {end} (size {size})')
+                        os.ftruncate(fd, end)
+                        size = end
+                try:
+                    self._write_all(fd, block, size)
+                except OSError:
+                    os.ftruncate(fd, size)
+                    raise
+                if self.fsync:
+                    os.fsync(fd)
+                self._write_all(fd, _FILE_HEADER.pack(_FILE_MAGIC, FORMAT_VERSION, 0, size + len(block)), 0)
+                if self.fsync:
+                    os.fsync(fd)
+        finally:
+            os.close(fd)
+        return filename
+
+
+def load_event_logs(paths: Sequence[str]) -> Tuple[EventBuffer, List[int]]:
+    """
+    バイナリイベントログを読み込んで1つのバッファに連結（文字列を解析しない）
+
+    Args:
+        paths: ログファイルのパス
+
+    Returns:
+        Tuple[EventBuffer, List[int]]: (イベント列, 各セッションの開始位置 + 末尾位置)
+    """
+    timestamps, event_types, virtual_keys, chars = array('q'), array('B'), array('H'), array('I')
+    long_chars: Dict[int, str] = {}
+    offsets = [0]
+    for path in paths:
+        with EventLogReader(path) as reader:
+            for index in range(len(reader)):
+                block = reader.block(index)
+                try:
+                    long_chars.update({len(timestamps) + i: text for i, text in block.long_chars().items()})
+                    timestamps.extend(block.timestamps())
+                    _extend_column(chars, block.chars)
+                    _extend_column(virtual_keys, block.virtual_keys)
+                    _extend_column(event_types, block.event_types)
+                finally:
+                    block.release()
+                offsets.append(len(timestamps))
+    return EventBuffer.from_columns(timestamps, event_types, virtual_keys, chars, long_chars), offsets
@@ -0,0 +1,374 @@
+"""
+input_automaton.py
+入力オートマトン（1文ごとの受理可能なローマ字綴りの事前コンパイル）
+
+目標ルビをかな単位に分割し、各かなについて変換テーブル上の別綴り
+（例: "si" / "shi"、"tu" / "tsu"、"n" / "nn"）をすべて受理する
+決定性有限オートマトン（DFA）を構築します。判定時は1キーにつき
+遷移表を1回引くだけで済みます。
+
+構築したオートマトンは不変で、目標ルビごとにキャッシュされ全セッションで共有されます。
+
+用語解説:
+- 入力単位（Input Unit）: かな1つ分（拗音・促音を含む）の入力。例: "ka"、"sha"、"kko"
+- 促音（Sokuon）: 「っ」。次の子音を重ねる（"kko"）か "xtu" などで入力する
+- NFA / DFA: 非決定性 / 決定性有限オートマトン。別綴りの接頭辞が重なる
+  （"n" + "ni" と "nn" + "i" など）ため、NFA を部分集合構成法で DFA に変換する
+- 表示綴り（Display Spelling）: 入力済みの文字と、現在の状態から推奨される残りの綴りを連結したもの。
+  残りの綴りは状態ごとに保存せず、「入力中の単位の残りの綴り + 目標ルビの続き」として
+  入力単位ごとの綴り一覧から求める（状態数・文の長さに比例した大きさで済む）
+- 入力単位の進捗: 状態ごとの「入力を終えた単位の数」と「入力中の単位に打った文字数」。
+  表示綴りと同じ解釈で求め、かな別入力時間の計測（core/kana_aligner.py）に使う
+"""
+
+from collections import defaultdict
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from core.romaji_converter import RomajiConverter
+
+
+# 「ん」を "n" 1文字で入力できない次の文字（母音・や行）
+_N_AMBIGUOUS_NEXT = frozenset('aiueoy')
+
+# 子音の重ねで促音を表せない文字
+_NON_SOKUON_CHARS = frozenset('aiueon')
+
+# キャッシュするオートマトンの最大数
+AUTOMATON_CACHE_SIZE = 4096
+
+_converter = RomajiConverter()
+
+
+def _build_reverse_index() -> Dict[str, Tuple[str, ...]]:
+    """かな → ローマ字綴り一覧の逆引き表を構築"""
+    index: Dict[str, List[str]] = defaultdict(list)
+    for romaji, kana in _converter.conversion_table.items():
+        index[kana].append(romaji)
+    return {kana: tuple(sorted(spellings)) for kana, spellings in index.items()}
+
+
+_KANA_SPELLINGS = _build_reverse_index()
+
+# 促音の単独入力綴り（"xtu" など）
+_SOKUON_SPELLINGS = _KANA_SPELLINGS.get('っ', ())
+
+
+class InputUnit:
+    """入力単位（かな1つ分）クラス"""
+
+    __slots__ = ('literal', 'kana', 'base_kana', 'sokuon')
+
+    def __init__(self, literal: str, kana: Optional[str], sokuon: bool = False):
+        """
+        コンストラクタ
+
+        Args:
+            literal: 目標ルビ上の綴り
+            kana: かな（変換できない記号などは None）
+            sokuon: 促音を含む単位かどうか
+        """
+        self.literal = literal
+        self.kana = ('っ' + kana) if sokuon else kana
+        self.base_kana = kana
+        self.sokuon = sokuon
+
+
+def segment_rubi(rubi: str) -> List[InputUnit]:
+    """
+    目標ルビを入力単位に分割
+
+    - 同じ子音の重ね（"kko"）は促音を含む1単位とする
+    - "tch" は促音を含む1単位とする（"matcha" → ま + っちゃ）
+    - "nn" の直後が母音・や行の場合は "n"（ん）+ "n..." と読む（"konnichiha"）
+    - 変換できない文字（"-" など）はその文字だけを受理する単位とする
+
+    Args:
+        rubi: 小文字化済みの目標ルビ
+
+    Returns:
+        List[InputUnit]: 入力単位のリスト
+    """
+    units: List[InputUnit] = []
+    length = len(rubi)
+    pos = 0
+
+    while pos < length:
+        char = rubi[pos]
+
+        # 促音（子音の重ね）
+        if (char.isascii() and char.isalpha() and char not in _NON_SOKUON_CHARS
+                and rubi[pos + 1:pos + 2] == char):
+            end, kana, _ = _converter._match_at(rubi, pos + 1)
+            if kana is not None:
+                units.append(InputUnit(rubi[pos:end], kana, sokuon=True))
+                pos = end
+                continue
+
+        # "tch"（"matcha" など）は「っ」+「ち・ちゃ行」
+        if char == 't' and rubi[pos + 1:pos + 3] == 'ch':
+            end, kana, _ = _converter._match_at(rubi, pos + 1)
+            if kana is not None:
+                units.append(InputUnit(rubi[pos:end], kana, sokuon=True))
+                pos = end
+                continue
+
+        # "nn" + 母音・や行 は「ん」+「な行・にゃ行」
+        if char == 'n' and rubi[pos + 1:pos + 2] == 'n' and rubi[pos + 2:pos + 3] in _N_AMBIGUOUS_NEXT:
+            units.append(InputUnit('n', 'ん'))
+            pos += 1
+            continue
+
+        end, kana, _ = _converter._match_at(rubi, pos)
+        if kana is None:
+            units.append(InputUnit(char, None))
+            pos += 1
+        else:
+            units.append(InputUnit(rubi[pos:end], kana))
+            pos = end
+
+    return units
+
+
+def _kana_spellings(kana: Optional[str], literal: str) -> List[str]:
+    """かなの綴り一覧（目標ルビ上の綴りを先頭に含む）"""
+    spellings = [literal]
+    for spelling in _KANA_SPELLINGS.get(kana, ()):
+        if spelling not in spellings:
+            spellings.append(spelling)
+    return spellings
+
+
+def unit_spellings(units: List[InputUnit], index: int) -> List[str]:
+    """
+    入力単位の受理する綴り一覧を取得（先頭は目標ルビ上の綴り）
+
+    Args:
+        units: 入力単位のリスト
+        index: 対象の位置
+
+    Returns:
+        List[str]: 綴りのリスト
+    """
+    unit = units[index]
+
+    if unit.kana is None:
+        return [unit.literal]
+
+    if unit.sokuon:
+        # 促音は次のかなの綴りに依存する（"kko" / "xtuko" など）
+        spellings = [unit.literal]
+        for base in _kana_spellings(unit.base_kana, unit.literal[1:]):
+            candidates = [prefix + base for prefix in _SOKUON_SPELLINGS]
+            if base[0] not in _NON_SOKUON_CHARS:
+                candidates.insert(0, base[0] + base)
+            if base.startswith('ch'):
+                candidates.insert(0, 't' + base)
+            spellings.extend(c for c in candidates if c not in spellings)
+        return spellings
+
+    spellings = _kana_spellings(unit.kana, unit.literal)
+
+    if unit.kana == 'ん' and 'n' in spellings and unit.literal != 'n':
+        # "n" 1文字で済むのは、次が母音・や行で始まらない場合のみ
+        following = units[index + 1] if index + 1 < len(units) else None
+        if following is None or following.literal[0] in _N_AMBIGUOUS_NEXT:
+            spellings.remove('n')
+
+    return spellings
+
+
+class InputAutomaton:
+    """1文分の入力オートマトン（DFA）クラス"""
+
+    __slots__ = ('transitions', 'accepting', 'units_done', 'unit_offset', 'unit_spelling',
+                 'unit_kana', 'unit_start', 'spellings', 'rubi')
+
+    # 開始状態の番号
+    start = 0
+
+    def __init__(self, transitions: Tuple[Dict[str, int], ...], accepting: Tuple[bool, ...],
+                 units_done: Tuple[int, ...], unit_offset: Tuple[int, ...],
+                 unit_spelling: Tuple[int, ...], unit_kana: Tuple[str, ...],
+                 unit_start: Tuple[int, ...], spellings: Tuple[Tuple[str, ...], ...], rubi: str):
+        """
+        コンストラクタ
+
+        Args:
+            transitions: 状態ごとの 入力文字 → 遷移先状態 の表
+            accepting: 状態ごとの受理（入力完了）フラグ
+            units_done: 状態ごとの入力を終えた単位の数
+            unit_offset: 状態ごとの入力中の単位に打った文字数
+            unit_spelling: 状態ごとの入力中の単位の綴り（spellings 内の番号）
+            unit_kana: 入力単位ごとのかな（かなでない単位は綴りそのもの）
+            unit_start: 入力単位ごとの目標ルビ上の開始位置（末尾に目標ルビの長さを含む）
+            spellings: 入力単位ごとの受理する綴り一覧
+            rubi: 目標ルビ
+        """
+        self.transitions = transitions
+        self.accepting = accepting
+        self.units_done = units_done
+        self.unit_offset = unit_offset
+        self.unit_spelling = unit_spelling
+        self.unit_kana = unit_kana
+        self.unit_start = unit_start
+        self.spellings = spellings
+        self.rubi = rubi
+
+    def step(self, state: int, char: str) -> Optional[int]:
+        """
+        1文字分遷移
+
+        Args:
+            state: 現在の状態
+            char: 入力文字（小文字）
+
+        Returns:
+            Optional[int]: 遷移先の状態（受理しない文字の場合は None）
+        """
+        return self.transitions[state].get(char)
+
+    def state_count(self) -> int:
+        """状態数を取得"""
+        return len(self.transitions)
+
+    def remaining_splice(self, state: int) -> Tuple[str, int]:
+        """
+        推奨される残りの綴りを (入力中の単位の残り, 目標ルビ上の続きの位置) で取得
+
+        残りの綴りは 入力中の単位の残り + 目標ルビ[位置:] です。
+
+        Args:
+            state: 状態
+
+        Returns:
+            Tuple[str, int]: (入力中の単位の残りの綴り, 目標ルビ上の位置)
+        """
+        done = self.units_done[state]
+        offset = self.unit_offset[state]
+        if offset == 0:
+            return '', self.unit_start[done]
+        spelling = self.spellings[done][self.unit_spelling[state]]
+        return spelling[offset:], self.unit_start[done + 1]
+
+    def remaining(self, state: int) -> str:
+        """推奨される残りの綴りを取得"""
+        head, tail = self.remaining_splice(state)
+        return head + self.rubi[tail:]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        クライアント側判定用に辞書に変換
+
+        残りの綴りは状態ごとに持たず、入力単位ごとの綴り一覧から求めます（remaining_splice と同じ）。
+
+        Returns:
+            Dict: transitions / accepting / units_done / unit_offset / unit_spelling /
+                  unit_start / spellings を含む辞書
+        """
+        return {
+            "transitions": list(self.transitions),
+            "accepting": list(self.accepting),
+            "units_done": list(self.units_done),
+            "unit_offset": list(self.unit_offset),
+            "unit_spelling": list(self.unit_spelling),
+            "unit_start": list(self.unit_start),
+            "spellings": [list(spellings) for spellings in self.spellings],
+        }
+
+
+def _build_nfa(units: List[InputUnit],
+               spellings: List[List[str]]) -> Tuple[List[Dict[str, List[int]]], List[Tuple[bool, int, int, int]], int]:
+    """
+    入力単位の列から NFA を構築
+
+    状態 0..len(units) は入力単位の境界で、各綴りは境界間をつなぐ状態の鎖になります。
+
+    Returns:
+        Tuple: (状態ごとの遷移表,
+                状態ごとの (目標ルビ上の綴りか, 入力を終えた単位の数, 入力中の単位に打った文字数, 綴りの番号),
+                受理状態)
+    """
+    boundary_count = len(units) + 1
+    transitions: List[Dict[str, List[int]]] = [defaultdict(list) for _ in range(boundary_count)]
+    info: List[Tuple[bool, int, int, int]] = [(True, index, 0, 0) for index in range(boundary_count)]
+
+    for index in range(len(units)):
+        for order, spelling in enumerate(spellings[index]):
+            current = index
+            for offset, char in enumerate(spelling):
+                if offset == len(spelling) - 1:
+                    target = index + 1
+                else:
+                    target = len(transitions)
+                    transitions.append(defaultdict(list))
+                    info.append((order == 0, index, offset + 1, order))
+                transitions[current][char].append(target)
+                current = target
+
+    return transitions, info, len(units)
+
+
+@lru_cache(maxsize=AUTOMATON_CACHE_SIZE)
+def compile_automaton(target_rubi: str) -> InputAutomaton:
+    """
+    目標ルビから入力オートマトンをコンパイル（結果はキャッシュされる）
+
+    Args:
+        target_rubi: 目標ルビ（小文字化済み）
+
+    Returns:
+        InputAutomaton: コンパイル済みのオートマトン
+    """
+    units = segment_rubi(target_rubi)
+    spellings = [unit_spellings(units, index) for index in range(len(units))]
+    nfa, info, final = _build_nfa(units, spellings)
+
+    unit_start = [0]
+    for unit in units:
+        unit_start.append(unit_start[-1] + len(unit.literal))
+
+    def display_key(item):
+        # 目標ルビ上の綴りを優先し、次に短い残りを表示する（単位の進捗も同じ解釈で求める）
+        is_literal, done, offset, order = item
+        if offset == 0:
+            rest = target_rubi[unit_start[done]:]
+        else:
+            rest = spellings[done][order][offset:] + target_rubi[unit_start[done + 1]:]
+        return (not is_literal, len(rest), rest, -done)
+
+    # 部分集合構成法で DFA に変換
+    start: FrozenSet[int] = frozenset((0,))
+    state_ids: Dict[FrozenSet[int], int] = {start: 0}
+    queue = [start]
+    transitions: List[Dict[str, int]] = []
+    accepting: List[bool] = []
+    units_done: List[int] = []
+    unit_offset: List[int] = []
+    unit_spelling: List[int] = []
+
+    for subset in queue:
+        moves: Dict[str, set] = defaultdict(set)
+        for nfa_state in subset:
+            for char, targets in nfa[nfa_state].items():
+                moves[char].update(targets)
+
+        row: Dict[str, int] = {}
+        for char in sorted(moves):
+            target = frozenset(moves[char])
+            if target not in state_ids:
+                state_ids[target] = len(state_ids)
+                queue.append(target)
+            row[char] = state_ids[target]
+        transitions.append(row)
+
+        _, done, offset, order = min((info[nfa_state] for nfa_state in subset), key=display_key)
+        accepting.append(final in subset)
+        units_done.append(done)
+        unit_offset.append(offset)
+        unit_spelling.append(order)
+
+    unit_kana = tuple(unit.kana if unit.kana is not None else unit.literal for unit in units)
+    return InputAutomaton(tuple(transitions), tuple(accepting), tuple(units_done), tuple(unit_offset),
+                          tuple(unit_spelling), unit_kana, tuple(unit_start),
+                          tuple(tuple(unit) for unit in spellings), target_rubi)
@@ -0,0 +1,156 @@
+"""
+kana_aligner.py
+かな単位の入力時間の計測
+
+正解したキー入力を目標ルビの入力単位（かな）に対応づけ、
+かなの入力が終わるたびに KanaInputData を生成します。
+
+用語解説:
+- 入力単位 (Input Unit): 目標ルビを区切った、かな1つ分の綴り（例: "shi" → し、"kka" → っか）
+- 確定 (Completion): 入力単位の最後の文字を打ち終えること
+- 入力時間 (Kana Input Time): 直前のかなが確定してから、そのかなが確定するまでの時間。
+  最初のかなは最初のキー入力の時刻から数える
+
+保存する状態は入力中の単位の文字と時刻、直前のかなの終了時刻だけで、
+文の長さによらず小さく保たれます。確定したかなは保存せず、
+セッション終了時にイベント列を再生して求め直します（TypingSession.from_state）。
+
+入力単位の対応は、オートマトンのコンパイル時に状態ごとに求めてあります
+（InputAutomaton.units_done / unit_offset）。表示綴りと同じ解釈で求めるため、
+目標ルビと異なる綴り（"si" と "shi" など）で入力しても正しく対応づけられます。
+1キーあたりの処理は表を引くだけの一定時間です。
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.input_automaton import InputAutomaton
+from core.statistics import KanaInputData
+
+
+class KanaAligner:
+    """かな単位の入力時間を計測するクラス"""
+
+    def __init__(self, automaton: InputAutomaton):
+        """
+        コンストラクタ
+
+        Args:
+            automaton: 目標ルビのオートマトン（TypingJudge.automaton）
+        """
+        self.automaton = automaton
+        # 確定していない（入力中の単位の）正解した文字と入力時刻（マイクロ秒）
+        self._chars: List[str] = []
+        self._times: List[int] = []
+        # 直前に確定したかなの終了時刻（まだない場合は None）と、確定したかなの数
+        self._last_end: Optional[int] = None
+        self._done = 0
+        # このインスタンスで確定したかな（復元前に確定したかなは含まない）
+        self.completed: List[KanaInputData] = []
+        # Backspace で確定を取り消すための履歴
+        # （確定に使った文字・時刻、確定前の終了時刻・確定数、確定したかな）。保存はしない
+        self._history: List[Tuple[List[str], List[int], Optional[int], int, List[KanaInputData]]] = []
+
+    def advance(self, state: int, char: str, timestamp: int) -> List[KanaInputData]:
+        """
+        正解した1文字を記録
+
+        Args:
+            state: 入力後のオートマトンの状態
+            char: 正解した文字
+            timestamp: 入力時刻（マイクロ秒）
+
+        Returns:
+            List[KanaInputData]: この入力で確定したかな（通常は0件か1件）
+        """
+        self._chars.append(char)
+        self._times.append(timestamp)
+
+        done = self.automaton.units_done[state]
+        if done <= self._done:
+            return []
+
+        # 次のかなに入った文字を除いた位置までが、確定したかなの綴り
+        end = max(len(self._chars) - self.automaton.unit_offset[state], 0)
+        end_time = self._times[end - 1] if end else timestamp
+        start_time = self._last_end if self._last_end is not None else self._times[0]
+        romaji = ''.join(self._chars[:end])
+
+        emitted = []
+        for index in range(self._done, done):
+            # 1キーで複数のかなが確定した場合、綴りは最後のかなにまとめる
+            emitted.append(KanaInputData(
+                kana=self.automaton.unit_kana[index],
+                romaji=romaji if index == done - 1 else '',
+                start_time=start_time,
+                end_time=end_time,
+            ))
+
+        self._history.append((self._chars[:end], self._times[:end], self._last_end, self._done, emitted))
+        del self._chars[:end]
+        del self._times[:end]
+        self._last_end = end_time
+        self._done = done
+        self.completed.extend(emitted)
+        return emitted
+
+    def backspace(self, state: int) -> List[KanaInputData]:
+        """
+        直前に正解した1文字の取り消しを反映
+
+        Args:
+            state: 取り消し後のオートマトンの状態
+
+        Returns:
+            List[KanaInputData]: 確定を取り消したかな
+        """
+        withdrawn = []
+        target = self.automaton.units_done[state]
+        while self._done > target:
+            if not self._history:
+                # 復元前に確定したかなは取り消す綴りがないため、確定数だけ戻す
+                self._done = target
+                self._chars = []
+                self._times = []
+                break
+            chars, times, last_end, done, emitted = self._history.pop()
+            self._chars = chars + self._chars
+            self._times = times + self._times
+            self._last_end = last_end
+            self._done = done
+            del self.completed[len(self.completed) - len(emitted):]
+            withdrawn.extend(reversed(emitted))
+
+        if self._chars:
+            self._chars.pop()
+            self._times.pop()
+        return withdrawn
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        入力中の単位の状態を辞書に変換（共有ストア保存用）
+
+        確定したかなは含めません（TypingSession.from_state がイベント列から求め直す）。
+        """
+        return {
+            "chars": ''.join(self._chars),
+            "times": list(self._times),
+            "last_end": self._last_end,
+            "done": self._done,
+        }
+
+    def restore_state(self, state: Dict[str, Any]):
+        """
+        to_state() で保存した状態を復元
+
+        Args:
+            state: 保存した状態
+        """
+        self._chars = list(state.get("chars", ""))
+        self._times = list(state.get("times", []))
+        if len(self._times) != len(self._chars):
+            # 入力時刻が保存されていない場合は時刻 0 とみなす
+            self._times = [0] * len(self._chars)
+        self._last_end = state.get("last_end")
+        self._done = state.get("done", len(state.get("completed", [])))
+        self.completed = []
+        self._history = []
@@ -0,0 +1,122 @@
+"""
+keystroke_channel.py
+キー入力チャネル（常時接続用フレームプロトコル）
+
+WebSocket などの常時接続でキー入力を1フレームずつやり取りするための
+エンコード/デコードと、セッションへの適用処理を提供します。
+HTTP の judge_char / backspace と同じ TypingSession を操作します。
+
+フレーム形式（JSON、キー名は転送量削減のため1文字）:
+- 上り（クライアント→サーバー）
+    {"s": 1, "t": 123, "c": "k"}   文字入力（s: クライアント連番, t: ミリ秒, c: 文字）
+    {"s": 2, "t": 150, "b": 1}     Backspace
+- 下り（サーバー→クライアント）
+    {"s": 1, "a": 1, "r": "correct", "p": 3, "f": 0}
+                                               判定結果（a: 累積ACK, p: 現在位置, f: 完了フラグ）
+    {"s": 4, "a": 4, "r": "correct", "p": 4, "f": 0, "d": ["", 5]}
+                                               残りの綴りが目標ルビの続きと異なる場合は
+                                               d: [先頭, 位置]（残り = 先頭 + 目標ルビ[位置:]）
+    {"s": 1, "e": "Character required"}        エラー
+
+s は HTTP の seq と同じ連番として TypingSession.submit() で適用するため、
+接続が切れた後に HTTP で同じ番号を再送しても二重には数えられません。
+適用済みの番号（重複）の応答には r が付きません。
+"""
+
+import json
+from typing import Any, Dict, Optional
+
+from core.typing_session import TypingSession
+
+
+# フレームの最大長（バイト）
+MAX_FRAME_SIZE = 256
+
+
+def encode_frame(payload: Dict[str, Any]) -> str:
+    """フレームを空白なしのJSON文字列にエンコード"""
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+
+class KeystrokeChannel:
+    """1セッション分のキー入力チャネルクラス"""
+
+    def __init__(self, store, session_id: str):
+        """
+        コンストラクタ
+
+        Args:
+            store: セッションストア（SessionStore / SQLiteSessionStore）
+            session_id: 入力を適用するセッションID
+        """
+        self.store = store
+        self.session_id = session_id
+
+    def handle_frame(self, frame: str) -> str:
+        """
+        上りフレームを1件処理して下りフレームを返す
+
+        Args:
+            frame: 受信したフレーム文字列
+
+        Returns:
+            str: 送信するフレーム文字列
+        """
+        if len(frame) > MAX_FRAME_SIZE:
+            return encode_frame({"e": "Frame too large"})
+
+        try:
+            message = json.loads(frame)
+        except ValueError:
+            return encode_frame({"e": "Invalid frame"})
+
+        if not isinstance(message, dict):
+            return encode_frame({"e": "Invalid frame"})
+
+        return encode_frame(self.handle_message(message))
+
+    def handle_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        デコード済みの上りメッセージを処理
+
+        Args:
+            message: 上りメッセージ
+
+        Returns:
+            Dict: 下りメッセージ
+        """
+        seq: Optional[int] = message.get('s')
+        timestamp = message.get('t', 0)
+
+        if message.get('b'):
+            item = {"type": "backspace", "timestamp": timestamp}
+        else:
+            item = {"char": message.get('c', ''), "timestamp": timestamp}
+        error = TypingSession.validate_event(item)
+        if error:
+            return {"s": seq, "e": error}
+        if isinstance(seq, bool) or not isinstance(seq, int) or seq < 1:
+            return {"s": seq, "e": "Sequence must be a positive integer"}
+
+        with self.store.edit(self.session_id) as session:
+            if session is None:
+                return {"s": seq, "e": "Session not found"}
+
+            try:
+                applied = session.submit(seq, item)
+            except ValueError as e:
+                return {"s": seq, "e": str(e), "a": session.get_ack()}
+
+            reply = {
+                "s": seq,
+                "a": session.get_ack(),
+                "p": session.judge.current_position,
+                "f": 1 if session.judge.is_completed() else 0,
+            }
+            for entry in applied:
+                if entry["seq"] == seq:
+                    reply["r"] = entry["result"]
+            splice = session.judge.get_remaining_splice()
+            if splice is not None:
+                reply["d"] = splice
+            return reply
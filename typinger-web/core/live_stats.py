@@ -0,0 +1,152 @@
+"""
+live_stats.py
+ライブ統計（直近の時間窓での WPM / CPM / 正解率）
+
+セッション中のキー入力を直近の時間窓（5秒・30秒）ごとに集計し、
+タイピング中の速度メーター表示に使う値を返します。
+
+用語解説:
+- スライディングウィンドウ (Sliding Window): 最新の入力から一定時間さかのぼった範囲。
+  新しい入力が来るたびに範囲の先頭も進む
+- リングバッファ (Ring Buffer): 最も長い時間窓に入っている入力のみを保持するキュー。
+  古い入力は先頭から捨てるため、セッションが長くなってもメモリ量は増えない
+
+各時間窓は件数を差分で更新するため、値の取得はセッションの長さによらず一定時間です。
+時間窓の終端は最後の入力の時刻（クライアントのタイムスタンプ）とします。
+"""
+
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Sequence, Tuple
+
+
+# 集計する時間窓（ミリ秒）
+LIVE_WINDOWS_MS = (5000, 30000)
+
+# 記録する入力の種類（JudgeResult の値に対応）
+_CORRECT = 1
+_INCORRECT = 0
+_BACKSPACE = 2
+_KINDS = {"correct": _CORRECT, "incorrect": _INCORRECT, "backspace": _BACKSPACE}
+
+
+class _Window:
+    """1つの時間窓の集計値"""
+
+    __slots__ = ('length', 'start', 'keys', 'correct', 'incorrect')
+
+    def __init__(self, length: int):
+        self.length = length  # マイクロ秒
+        self.start = 0  # 窓に入っている最も古い入力の通し番号
+        self.keys = 0
+        self.correct = 0
+        self.incorrect = 0
+
+    def add(self, kind: int, sign: int):
+        self.keys += sign
+        if kind == _CORRECT:
+            self.correct += sign
+        elif kind == _INCORRECT:
+            self.incorrect += sign
+
+
+class LiveStats:
+    """ライブ統計クラス"""
+
+    def __init__(self, windows_ms: Sequence[int] = LIVE_WINDOWS_MS):
+        """
+        コンストラクタ
+
+        Args:
+            windows_ms: 集計する時間窓（ミリ秒）
+        """
+        self.windows = [_Window(length * 1000) for length in windows_ms]
+        # (時刻（マイクロ秒）, 種類) のリングバッファと、先頭要素の通し番号
+        self.entries: Deque[Tuple[int, int]] = deque()
+        self.base = 0
+        self.first_timestamp: Optional[int] = None
+        self.last_timestamp = 0
+
+    def record(self, timestamp: int, result: str):
+        """
+        入力を1件記録
+
+        Args:
+            timestamp: 入力時刻（マイクロ秒）
+            result: 判定結果（"correct" / "incorrect" / "backspace"、それ以外は記録しない）
+        """
+        kind = _KINDS.get(result)
+        if kind is None:
+            return
+
+        # 時刻が前後した場合は直前の入力と同時とみなす
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        timestamp = max(timestamp, self.last_timestamp)
+        self.last_timestamp = timestamp
+
+        self.entries.append((timestamp, kind))
+        end = self.base + len(self.entries)
+
+        for window in self.windows:
+            window.add(kind, 1)
+            # 窓から外れた入力を先頭から取り除く
+            while window.start < end and self.entries[window.start - self.base][0] <= timestamp - window.length:
+                window.add(self.entries[window.start - self.base][1], -1)
+                window.start += 1
+
+        # どの窓にも入っていない入力をリングバッファから捨てる
+        oldest = min(window.start for window in self.windows)
+        while self.base < oldest:
+            self.entries.popleft()
+            self.base += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        時間窓ごとの WPM / CPM / 正解率を取得
+
+        入力開始から時間窓の長さが経過していない場合は、経過時間で割ります。
+
+        Returns:
+            Dict: {"5s": {"wpm": ..., "cpm": ..., "accuracy": ..., "keys": ...}, "30s": {...}}
+        """
+        elapsed = self.last_timestamp - self.first_timestamp if self.first_timestamp is not None else 0
+        result = {}
+        for window in self.windows:
+            span = min(window.length, elapsed)
+            minutes = span / (1000000 * 60)
+            judged = window.correct + window.incorrect
+            cpm = window.correct / minutes if minutes > 0 else 0.0
+            result[f"{window.length // 1000000}s"] = {
+                "wpm": round(cpm / 5, 1),
+                "cpm": round(cpm, 1),
+                "accuracy": round(window.correct / judged, 3) if judged else 1.0,
+                "keys": window.keys,
+            }
+        return result
+
+    def to_state(self) -> Dict[str, Any]:
+        """リングバッファの内容を辞書に変換（共有ストア保存用）"""
+        return {
+            "first_timestamp": self.first_timestamp,
+            "entries": [list(entry) for entry in self.entries],
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any],
+                   windows_ms: Sequence[int] = LIVE_WINDOWS_MS) -> 'LiveStats':
+        """
+        to_state() で保存した状態から復元
+
+        Args:
+            state: 保存した状態
+            windows_ms: 集計する時間窓（ミリ秒）
+
+        Returns:
+            LiveStats: 復元したライブ統計
+        """
+        live_stats = cls(windows_ms)
+        kinds: Dict[int, str] = {kind: name for name, kind in _KINDS.items()}
+        for timestamp, kind in state.get("entries", []):
+            live_stats.record(timestamp, kinds[kind])
+        live_stats.first_timestamp = state.get("first_timestamp", live_stats.first_timestamp)
+        return live_stats
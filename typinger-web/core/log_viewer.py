@@ -3,63 +3,217 @@ log_viewer.py
 ログビューア・管理画面用モジュール
 
 CSVファイルの管理、表示、分析機能を提供します。
+
+全セッションのキー間隔のパーセンタイルは、サマリCSVに保存された
+分位点スケッチ（core/quantile_sketch.py）をマージして求めます。
+マージ済みのスケッチはメモリに保持し、新しいサマリCSVの分だけ追加します。
+セッション記録をジャーナル（core/session_journal.py）に保存している場合は、
+ジャーナルの記録のサマリから同じように読みます。
+
+バイナリイベントログ（core/event_log.py）は文字列を解析せずに列から行を作って表示します。
+
+CSVファイルの一覧はメモリに整列済みで保持し、出力ディレクトリの更新時刻が変わったときだけ
+os.scandir で読み直します。CSVLogger が書き込んだファイルは通知を受けて二分探索で挿入します。
+
+結果ストアがない場合の統計のエクスポートは、サマリCSVの索引（core/summary_index.py）から
+読み込み済みの項目を使い、追加・更新されたサマリCSVだけを読みます。
+
+結果ストア（core/results_store.py）を指定した場合、サマリー統計・統計のエクスポート・
+キー間隔のパーセンタイルは出力ディレクトリを走査せず、SQL の集計と絞り込みで求めます。
 """
 
 import os
 import csv
+import bisect
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Sequence, Set, Tuple
 from pathlib import Path
 
+from core.csv_logger import INTERVAL_SKETCH_METRIC, EVENTS_CSV_HEADER
+from core.event_log import EVENT_LOG_PREFIX, EVENT_LOG_EXT, EventLogReader
+from core.quantile_sketch import QuantileSketch
+from core.results_store import ResultsStore, result_metrics
+from core.summary_index import SummaryIndex
+from core.session_journal import SessionJournal, Cursor
+
+
+# 全体のキー間隔で求めるパーセンタイル
+GLOBAL_PERCENTILES = (50, 95, 99)
+
+# CSVファイルのタイプ（ファイル名から判定）
+CSV_FILE_TYPES = ('events', 'summary', 'kana_analysis', 'unknown')
+
+# ディレクトリの更新時刻の粒度（これより短い間の変更は更新時刻が変わらないことがあるため、
+# 走査の直前に変わったディレクトリの一覧は、時間がたつまで次の取得時にも読み直す）
+LISTING_MTIME_SLACK_NS = 2 * 10**9
+
 
 class LogViewer:
     """ログビューアクラス"""
 
-    def __init__(self, output_dir: str = "output"):
+    def __init__(self, output_dir: str = "output", journal: Optional[SessionJournal] = None,
+                 results: Optional[ResultsStore] = None):
         """
         コンストラクタ
         
         Args:
             output_dir: ログファイルの出力ディレクトリ
+            journal: セッション記録のジャーナル（指定時はキー間隔をジャーナルから読む）
+            results: 結果ストア（指定時は統計をファイルではなく結果ストアから求める）
         """
         self.output_dir = output_dir
+        self.journal = journal
+        self.results = results
+        self._journal_cursor: Optional[Cursor] = None
+        self._results_rowid = 0
+        self.summary_index = SummaryIndex(output_dir)
+        # CSVファイルの一覧（ファイル名 → (並び順のキー, 情報)）と、タイプごとの整列済みのキー（None はすべて）
+        self._listing: Dict[str, Tuple[Tuple[int, str], Dict[str, Any]]] = {}
+        self._listing_keys: Dict[Optional[str], List[Tuple[int, str]]] = {None: []}
+        self._listing_dir_mtime: Optional[int] = None
+        self._listing_settled = False
+        self._listing_lock = threading.Lock()
         self._ensure_output_dir()
+        # マージ済みのキー間隔スケッチと、読み込み済みのサマリCSV
+        self._interval_sketch = QuantileSketch()
+        self._sketch_files: Set[str] = set()
+        self._sketch_sessions = 0
+        self._sketch_lock = threading.Lock()
 
     def _ensure_output_dir(self):
         """出力ディレクトリが存在することを確認"""
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
 
-    def get_csv_files(self) -> List[Dict[str, Any]]:
+    def _file_info(self, filename: str, stat: os.stat_result) -> Dict[str, Any]:
+        """一覧に載せるファイル情報（日時の書式化はファイルごとに1回だけ行う）"""
+        return {
+            'filename': filename,
+            'filepath': os.path.join(self.output_dir, filename),
+            'size': stat.st_size,
+            'created_time': datetime.fromtimestamp(stat.st_ctime).isoformat(),
+            'modified_time': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            'file_type': self._determine_file_type(filename),
+        }
+
+    def _dir_mtime_ns(self) -> Optional[int]:
+        """出力ディレクトリの更新時刻（ない場合は None）"""
+        try:
+            return os.stat(self.output_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def _refresh_listing(self):
+        """ディレクトリの更新時刻が変わっていれば一覧を読み直す（変わっていないファイルの情報は使い回す）"""
+        dir_mtime = self._dir_mtime_ns()
+        if dir_mtime is not None and dir_mtime == self._listing_dir_mtime and self._listing_settled:
+            return
+
+        listing: Dict[str, Tuple[Tuple[int, str], Dict[str, Any]]] = {}
+        if dir_mtime is not None:
+            with os.scandir(self.output_dir) as it:
+                for entry in it:
+                    if not entry.name.endswith('.csv'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    key = (-stat.st_mtime_ns, entry.name)
+                    cached = self._listing.get(entry.name)
+                    if cached is not None and cached[0] == key and cached[1]['size'] == stat.st_size:
+                        listing[entry.name] = cached
+                    else:
+                        listing[entry.name] = (key, self._file_info(entry.name, stat))
+
+        self._listing = listing
+        self._listing_keys = {None: sorted(key for key, _ in listing.values())}
+        for key in self._listing_keys[None]:
+            self._listing_keys.setdefault(listing[key[1]][1]['file_type'], []).append(key)
+        self._listing_dir_mtime = dir_mtime
+        self._listing_settled = dir_mtime is not None and time.time_ns() - dir_mtime > LISTING_MTIME_SLACK_NS
+
+    def _remove_from_listing(self, filename: str):
+        """一覧からファイルを除く（二分探索で位置を求める）"""
+        cached = self._listing.pop(filename, None)
+        if cached is None:
+            return
+        key, info = cached
+        for keys in (self._listing_keys[None], self._listing_keys[info['file_type']]):
+            index = bisect.bisect_left(keys, key)
+            if index < len(keys) and keys[index] == key:
+                del keys[index]
+
+    def add_csv_file(self, filepath: str):
+        """
+        書き込んだCSVファイルを一覧に追加（CSVLogger の通知先）
+
+        保持しているディレクトリの更新時刻は進めません。次の取得時にはディレクトリを読み直すため
+        （追加したファイルを含め、変わっていないファイルの情報は使い回す）、
+        ほぼ同時に別のプロセスが書いたファイルも一覧に載ります。
+
+        Args:
+            filepath: 書き込んだファイルのパス
+        """
+        filename = os.path.basename(filepath)
+        if (not filename.endswith('.csv')
+                or os.path.abspath(os.path.dirname(filepath)) != os.path.abspath(self.output_dir)):
+            return
+        try:
+            stat = os.stat(filepath)
+        except OSError:
+            return
+
+        with self._listing_lock:
+            if self._listing_dir_mtime is None:
+                # まだ一覧を作っていない（次の取得時にまとめて読む）
+                return
+            self._remove_from_listing(filename)
+            key = (-stat.st_mtime_ns, filename)
+            info = self._file_info(filename, stat)
+            self._listing[filename] = (key, info)
+            bisect.insort(self._listing_keys[None], key)
+            bisect.insort(self._listing_keys.setdefault(info['file_type'], []), key)
+            # 更新時刻の粒度内の変更でも次の取得時に読み直す
+            self._listing_settled = False
+
+    def get_csv_files(self, file_type: Optional[str] = None, offset: int = 0,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        CSVファイルの一覧を取得
+        CSVファイルの一覧を取得（更新日時の新しい順）
         
+        Args:
+            file_type: ファイルタイプ（CSV_FILE_TYPES のいずれか、省略時はすべて）
+            offset: 先頭から飛ばす件数
+            limit: 最大件数（None で全件）
+
         Returns:
             List[Dict]: ファイル情報のリスト
         """
-        csv_files = []
-        
-        if not os.path.exists(self.output_dir):
-            return []
-        
-        for filename in os.listdir(self.output_dir):
-            if filename.endswith('.csv'):
-                filepath = os.path.join(self.output_dir, filename)
-                stat = os.stat(filepath)
-                
-                csv_files.append({
-                    'filename': filename,
-                    'filepath': filepath,
-                    'size': stat.st_size,
-                    'created_time': datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                    'modified_time': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                    'file_type': self._determine_file_type(filename),
-                })
-        
-        # 更新日時でソート（新しい順）
-        csv_files.sort(key=lambda x: x['modified_time'], reverse=True)
-        
-        return csv_files
+        return self.get_csv_files_page(file_type, offset, limit)[0]
+
+    def get_csv_files_page(self, file_type: Optional[str] = None, offset: int = 0,
+                           limit: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        CSVファイルの一覧の1ページを取得
+
+        ディレクトリの更新時刻が前回と同じ場合は、保持している整列済みの一覧から切り出します。
+
+        Args:
+            file_type: ファイルタイプ（省略時はすべて）
+            offset: 先頭から飛ばす件数
+            limit: 最大件数（None で全件）
+
+        Returns:
+            Tuple[List[Dict], int]: (ファイル情報のリスト, 条件に合う全件数)
+        """
+        with self._listing_lock:
+            self._refresh_listing()
+            keys = self._listing_keys.get(file_type, [])
+            page = keys[offset:] if limit is None else keys[offset:offset + limit]
+            return [dict(self._listing[key[1]][1]) for key in page], len(keys)
 
     def _determine_file_type(self, filename: str) -> str:
         """ファイルタイプを判定"""
@@ -107,22 +261,107 @@ class LogViewer:
         except Exception as e:
             return None
 
-    def get_summary_statistics(self) -> Dict[str, Any]:
+    def get_event_logs(self) -> List[Dict[str, Any]]:
+        """
+        バイナリイベントログの一覧を取得
+
+        Returns:
+            List[Dict]: {"filename", "size", "modified_time", "session_count", "event_count"} のリスト（新しい順）
+        """
+        logs = []
+        for filename in sorted(os.listdir(self.output_dir), reverse=True):
+            if not (filename.startswith(EVENT_LOG_PREFIX) and filename.endswith(EVENT_LOG_EXT)):
+                continue
+            filepath = os.path.join(self.output_dir, filename)
+            try:
+                with EventLogReader(filepath) as reader:
+                    event_count = sum(info.event_count for info in reader.blocks)
+                    session_count = len(reader)
+                stat = os.stat(filepath)
+            except (OSError, ValueError):
+                continue
+            logs.append({
+                'filename': filename,
+                'size': stat.st_size,
+                'modified_time': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                'session_count': session_count,
+                'event_count': event_count,
+            })
+        return logs
+
+    def read_event_log(self, filename: str, session_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        バイナリイベントログの1セッション分をイベントCSVと同じ形で読み込み
+
+        Args:
+            filename: ファイル名
+            session_id: セッションID（省略時は最後のセッション）
+
+        Returns:
+            Dict: read_csv_file() と同じ形のデータ + "session_id"・"sessions"（ファイル内のセッションID）
+        """
+        filepath = os.path.join(self.output_dir, filename)
+        if not os.path.abspath(filepath).startswith(os.path.abspath(self.output_dir)):
+            return None
+        if not filename.endswith(EVENT_LOG_EXT) or not os.path.exists(filepath):
+            return None
+
+        try:
+            with EventLogReader(filepath) as reader:
+                if session_id is None and len(reader):
+                    session_id = reader.blocks[-1].session_id
+                block = reader.find(session_id) if session_id is not None else None
+                if block is None:
+                    return None
+                try:
+                    events = block.to_event_buffer()
+                finally:
+                    block.release()
+                sessions = reader.session_ids()
+        except (OSError, ValueError):
+            return None
+
+        rows = [[timestamp, event_type.value, virtual_key, character]
+                for event_type, timestamp, virtual_key, character in events.rows()]
+        return {
+            'filename': filename,
+            'session_id': session_id,
+            'sessions': sessions,
+            'headers': list(EVENTS_CSV_HEADER),
+            'rows': rows,
+            'row_count': len(rows),
+            'column_count': len(EVENTS_CSV_HEADER),
+        }
+
+    def get_summary_statistics(self, scenario: Optional[str] = None, since: Optional[float] = None,
+                               until: Optional[float] = None) -> Dict[str, Any]:
         """
         サマリー統計を計算
         
+        結果ストアがある場合は SQL の集計で求め、絞り込みを使えます
+        （ない場合は絞り込みを無視し、CSVファイルから求めます）。
+
+        Args:
+            scenario: シナリオファイル名（省略時はすべて）
+            since: 期間の開始（UNIX 時刻、以上）
+            until: 期間の終了（UNIX 時刻、未満）
+
         Returns:
             Dict: 統計情報
         """
-        csv_files = self.get_csv_files()
-        
-        events_count = len([f for f in csv_files if f['file_type'] == 'events'])
-        summary_count = len([f for f in csv_files if f['file_type'] == 'summary'])
-        total_size = sum(f['size'] for f in csv_files)
+        if self.results is not None:
+            return self._get_results_summary(scenario, since, until)
+
+        # タイプごとの件数は保持している一覧から求める（ディレクトリが変わっていなければ読み直さない）
+        with self._listing_lock:
+            self._refresh_listing()
+            counts = {file_type: len(keys) for file_type, keys in self._listing_keys.items()}
+            total_size = sum(info['size'] for _, info in self._listing.values())
+            summary_files = [{'filename': key[1]} for key in self._listing_keys.get('summary', [])[:1]]
+        events_count = counts.get('events', 0)
+        summary_count = counts.get('summary', 0)
         
         # 最新のサマリーファイルから統計を取得
-        summary_files = [f for f in csv_files if f['file_type'] == 'summary']
-        
         latest_stats = None
         if summary_files:
             latest_file = summary_files[0]['filename']
@@ -136,18 +375,40 @@ class LogViewer:
                 }
         
         return {
-            'total_csv_files': len(csv_files),
+            'total_csv_files': counts[None],
             'events_files': events_count,
             'summary_files': summary_count,
             'total_size_bytes': total_size,
             'file_types': {
                 'events': events_count,
                 'summary': summary_count,
-                'kana_analysis': len([f for f in csv_files if f['file_type'] == 'kana_analysis']),
+                'kana_analysis': counts.get('kana_analysis', 0),
             },
             'latest_summary': latest_stats,
         }
 
+    def _get_results_summary(self, scenario: Optional[str], since: Optional[float],
+                             until: Optional[float]) -> Dict[str, Any]:
+        """結果ストアからサマリー統計を求める"""
+        latest, _ = self.results.query(scenario, since, until, limit=1)
+        latest_stats = None
+        if latest:
+            result = latest[0]
+            latest_stats = {
+                'filename': result['files'].get('summary_csv', result['session_id']),
+                'session_id': result['session_id'],
+                'scenario': result['scenario'],
+                'completed_at': result['completed_at'],
+                'metrics': result_metrics(result),
+            }
+
+        return {
+            'source': 'results',
+            'sessions': self.results.summarize(scenario, since, until),
+            'by_scenario': self.results.summarize_by_scenario(since, until),
+            'latest_summary': latest_stats,
+        }
+
     def delete_csv_file(self, filename: str) -> bool:
         """
         CSVファイルを削除
@@ -167,45 +428,154 @@ class LogViewer:
         try:
             if os.path.exists(filepath):
                 os.remove(filepath)
+                with self._listing_lock:
+                    if self._listing_dir_mtime is not None:
+                        self._remove_from_listing(filename)
+                        self._listing_settled = False
                 return True
         except Exception:
             pass
         
         return False
 
-    def export_statistics_summary(self) -> Dict[str, Any]:
+    def export_statistics_summary(self, scenario: Optional[str] = None, since: Optional[float] = None,
+                                  until: Optional[float] = None, limit: Optional[int] = None) -> Dict[str, Any]:
         """
         統計情報をエクスポート
         
+        結果ストアがある場合は索引を使って絞り込み、新しい順に limit 件まで返します
+        （ない場合は絞り込みを無視し、サマリCSVの索引から新しい順に limit 件まで返します）。
+
+        Args:
+            scenario: シナリオファイル名（省略時はすべて）
+            since: 期間の開始（UNIX 時刻、以上）
+            until: 期間の終了（UNIX 時刻、未満）
+            limit: 最大件数（None で全件）
+
         Returns:
             Dict: エクスポート用統計データ
         """
-        csv_files = self.get_csv_files()
+        if self.results is not None:
+            results, total = self.results.query(scenario, since, until, limit=limit)
+            return {
+                'total_sessions': total,
+                'sessions': {
+                    result['session_id']: {
+                        'filename': result['files'].get('summary_csv', result['session_id']),
+                        'scenario': result['scenario'],
+                        'metrics': result_metrics(result),
+                        'created': result['completed_at'],
+                    }
+                    for result in results
+                },
+            }
+
+        # サマリCSVの索引から求める（前回から追加・更新されたファイルだけ読む）
+        entries = sorted(self.summary_index.refresh().items(),
+                         key=lambda item: item[1]['mtime_ns'], reverse=True)
         
         # セッション別に統計をグループ化
         session_stats = {}
         
-        for csv_file in csv_files:
-            if csv_file['file_type'] == 'summary':
-                filename = csv_file['filename']
-                # ファイル名から日時を抽出：typing_summary_YYYYMMDD_HHMMSS.csv
-                if 'typing_summary_' in filename:
-                    timestamp = filename.replace('typing_summary_', '').replace('.csv', '')
-                    
-                    data = self.read_csv_file(filename)
-                    if data:
-                        metrics = {}
-                        for row in data['rows']:
-                            if len(row) >= 2:
-                                metrics[row[0]] = row[1]
-                        
-                        session_stats[timestamp] = {
-                            'filename': filename,
-                            'metrics': metrics,
-                            'created': csv_file['created_time'],
-                        }
+        for filename, entry in entries[:limit]:
+            # ファイル名から日時を抽出：typing_summary_YYYYMMDD_HHMMSS_ffffff.csv
+            timestamp = filename.replace('typing_summary_', '').replace('.csv', '')
+            session_stats[timestamp] = {
+                'filename': filename,
+                'metrics': entry['metrics'],
+                'created': entry['created'],
+            }
         
         return {
-            'total_sessions': len(session_stats),
+            'total_sessions': len(entries),
             'sessions': session_stats,
         }
+
+    def _read_interval_sketch(self, filename: str) -> Optional[QuantileSketch]:
+        """サマリCSVからキー間隔スケッチを読み込む（ない・壊れている場合は None）"""
+        try:
+            with open(os.path.join(self.output_dir, filename), 'r', newline='', encoding='utf-8') as f:
+                for row in csv.reader(f):
+                    if len(row) >= 2 and row[0] == INTERVAL_SKETCH_METRIC:
+                        return QuantileSketch.from_string(row[1])
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _merge_summary_sketches(self):
+        """未読のサマリCSVのキー間隔スケッチをマージ（削除されたファイルがあれば読み直す）"""
+        # ファイル名は保持している一覧から求める（ディレクトリが変わっていなければ読み直さない）
+        with self._listing_lock:
+            self._refresh_listing()
+            names = {
+                name for _, name in self._listing_keys.get('summary', [])
+                if name.startswith('typing_summary_')
+            }
+
+        if not self._sketch_files <= names:
+            self._interval_sketch = QuantileSketch()
+            self._sketch_files = set()
+            self._sketch_sessions = 0
+
+        for name in sorted(names - self._sketch_files):
+            sketch = self._read_interval_sketch(name)
+            if sketch is not None:
+                self._interval_sketch.merge(sketch)
+                self._sketch_sessions += 1
+            self._sketch_files.add(name)
+
+    def _merge_journal_sketches(self):
+        """ジャーナルの未読の記録のキー間隔スケッチをマージ"""
+        for record, self._journal_cursor in self.journal.iter_records(self._journal_cursor):
+            for row in record.get("summary", []):
+                if len(row) >= 2 and row[0] == INTERVAL_SKETCH_METRIC:
+                    try:
+                        self._interval_sketch.merge(QuantileSketch.from_string(row[1]))
+                    except ValueError:
+                        break
+                    self._sketch_sessions += 1
+                    break
+
+    def _merge_results_sketches(self):
+        """結果ストアに追加された行のキー間隔スケッチをマージ"""
+        for self._results_rowid, text in self.results.iter_sketches(self._results_rowid):
+            try:
+                self._interval_sketch.merge(QuantileSketch.from_string(text))
+            except ValueError:
+                continue
+            self._sketch_sessions += 1
+
+    def get_interval_percentiles(self, percentiles: Sequence[float] = GLOBAL_PERCENTILES) -> Dict[str, Any]:
+        """
+        全セッションのキー間隔のパーセンタイルを取得
+
+        未読のサマリCSV（または結果ストア・ジャーナルの記録）のスケッチのみ読み込んでマージします
+        （削除されたファイルがあれば読み直します）。イベントCSVは読みません。
+
+        Args:
+            percentiles: パーセント（0 ～ 100）
+
+        Returns:
+            Dict: {"session_count": スケッチのあるセッション数, "interval_count": キー間隔の数,
+                   "percentiles_ms": {"p50": ..., ...}, "min_ms": ..., "max_ms": ...}
+        """
+        with self._sketch_lock:
+            if self.results is not None:
+                self._merge_results_sketches()
+            elif self.journal is not None:
+                self._merge_journal_sketches()
+            else:
+                self._merge_summary_sketches()
+
+            merged = self._interval_sketch
+            values = merged.quantiles([percent / 100 for percent in percentiles])
+            return {
+                'session_count': self._sketch_sessions,
+                'interval_count': merged.count,
+                'percentiles_ms': {
+                    f"p{percent:g}": None if value is None else round(value / 1000, 2)
+                    for percent, value in zip(percentiles, values)
+                },
+                'min_ms': None if merged.min is None else merged.min / 1000,
+                'max_ms': None if merged.max is None else merged.max / 1000,
+            }
@@ -0,0 +1,231 @@
+"""
+quantile_sketch.py
+マージ可能な分位点スケッチ（キー間隔の分布の要約）
+
+値を対数スケールの区間（バケット）ごとに数えるヒストグラムで、
+セッションごとのスケッチを足し合わせるだけで全体の分布が得られます。
+サマリCSVにセッションごとのスケッチを保存しておけば、イベントCSVを
+読み直さずに全ユーザーの p50 / p95 / p99 を求められます。
+
+用語解説:
+- 分位点 (Quantile): 小さい順に並べたときに指定の割合の位置にある値（0.5 = 中央値）
+- スケッチ (Sketch): 全データを保持せず、一定の大きさで分布を近似する要約
+- 相対誤差 (Relative Accuracy): 推定値と真の値の差の、真の値に対する割合の上限（既定 1%）
+- マージ (Merge): 2つのスケッチのバケットごとの件数を足すこと。
+  足した結果は、両方の値をまとめて1つのスケッチに追加した場合と同じになる
+
+バケット i は (γ^(i-1), γ^i] の値を数え（γ = (1 + α) / (1 - α)）、代表値を
+2γ^i / (γ + 1) とすることで相対誤差が α 以下になります（DDSketch と同じ方式）。
+バケット数の上限は扱う最大値で決まり、値の件数によらずメモリ使用量は一定以下です
+（件数の列は使われた最小～最大のバケットの範囲だけ確保します）。0 以下の値は別に数えます。
+"""
+
+import math
+from array import array
+from typing import List, Optional
+
+
+# 既定の相対誤差
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# 扱う最大値（マイクロ秒、1000秒）。これを超える値は最後のバケットに数える
+DEFAULT_MAX_VALUE = 1000 * 1000000
+
+# シリアライズ形式のバージョン
+_FORMAT_VERSION = "1"
+
+
+class QuantileSketch:
+    """対数バケットの分位点スケッチクラス"""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 max_value: int = DEFAULT_MAX_VALUE):
+        """
+        コンストラクタ
+
+        Args:
+            relative_accuracy: 相対誤差（0 < α < 1）
+            max_value: 扱う最大値（これを超える値は最後のバケットに数える）
+
+        Raises:
+            ValueError: 相対誤差・最大値が範囲外の場合
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        if max_value < 1:
+            raise ValueError("max_value must be positive")
+
+        self.relative_accuracy = relative_accuracy
+        self.max_value = max_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_index = self._index(max_value)
+        # バケット offset 以降の件数（使われた範囲のみ）
+        self.offset = 0
+        self.buckets = array('Q')
+        self.zero_count = 0
+        self.count = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+
+    def _index(self, value: float) -> int:
+        """正の値のバケット番号"""
+        return max(math.ceil(math.log(value) / self._log_gamma), 0)
+
+    def _ensure(self, low: int, high: int):
+        """バケット low ～ high を確保"""
+        if not self.buckets:
+            self.offset = low
+            self.buckets = array('Q', bytes(8 * (high - low + 1)))
+            return
+        if low < self.offset:
+            self.buckets = array('Q', bytes(8 * (self.offset - low))) + self.buckets
+            self.offset = low
+        end = self.offset + len(self.buckets)
+        if high >= end:
+            self.buckets.extend(array('Q', bytes(8 * (high - end + 1))))
+
+    def add(self, value: int, count: int = 1):
+        """
+        値を追加
+
+        Args:
+            value: 値
+            count: 追加する件数
+        """
+        if value <= 0:
+            self.zero_count += count
+        else:
+            index = min(self._index(value), self.max_index)
+            self._ensure(index, index)
+            self.buckets[index - self.offset] += count
+        self.count += count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'QuantileSketch'):
+        """
+        別のスケッチの件数を加える
+
+        Args:
+            other: 加えるスケッチ（相対誤差と最大値が同じであること）
+
+        Raises:
+            ValueError: バケットの構成が異なる場合
+        """
+        if (other.relative_accuracy, other.max_value) != (self.relative_accuracy, self.max_value):
+            raise ValueError("Sketch parameters differ")
+        if other.count == 0:
+            return
+
+        if other.buckets:
+            self._ensure(other.offset, other.offset + len(other.buckets) - 1)
+            buckets = self.buckets
+            shift = other.offset - self.offset
+            for index, count in enumerate(other.buckets):
+                if count:
+                    buckets[shift + index] += count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        分位点を推定
+
+        Args:
+            q: 割合（0 ～ 1）
+
+        Returns:
+            float: 推定値（値がない場合は None）。最小値・最大値の範囲に収める
+        """
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count
+        if rank < cumulative:
+            return float(self.min)
+
+        value = float(self.max)
+        for index, count in enumerate(self.buckets):
+            cumulative += count
+            if cumulative > rank:
+                value = 2 * self.gamma ** (self.offset + index) / (self.gamma + 1)
+                break
+        return min(max(value, self.min), self.max)
+
+    def quantiles(self, qs: List[float]) -> List[Optional[float]]:
+        """複数の分位点を推定（quantile() をまとめて呼ぶ）"""
+        return [self.quantile(q) for q in qs]
+
+    def to_string(self) -> str:
+        """
+        CSV のセルに保存できる文字列に変換
+
+        形式: "1;相対誤差;最大値;0以下の件数;最小値;最大値;番号の差分:件数,..."
+        （件数が 0 のバケットは省き、番号は直前のバケットからの差分で表す）
+
+        Returns:
+            str: シリアライズした文字列
+        """
+        parts = []
+        previous = 0
+        for index, count in enumerate(self.buckets, self.offset):
+            if count:
+                parts.append(f"{index - previous}:{count}")
+                previous = index
+        return ";".join([
+            _FORMAT_VERSION,
+            repr(self.relative_accuracy),
+            str(self.max_value),
+            str(self.zero_count),
+            "" if self.min is None else str(self.min),
+            "" if self.max is None else str(self.max),
+            ",".join(parts),
+        ])
+
+    @classmethod
+    def from_string(cls, text: str) -> 'QuantileSketch':
+        """
+        to_string() の文字列から復元
+
+        Args:
+            text: シリアライズした文字列
+
+        Returns:
+            QuantileSketch: 復元したスケッチ
+
+        Raises:
+            ValueError: 形式が正しくない場合
+        """
+        fields = text.split(";")
+        if len(fields) != 7 or fields[0] != _FORMAT_VERSION:
+            raise ValueError("Unsupported sketch format")
+
+        sketch = cls(float(fields[1]), int(fields[2]))
+        sketch.zero_count = int(fields[3])
+        sketch.min = int(fields[4]) if fields[4] else None
+        sketch.max = int(fields[5]) if fields[5] else None
+
+        index = 0
+        entries = []
+        for part in filter(None, fields[6].split(",")):
+            delta, bucket_count = part.split(":")
+            index += int(delta)
+            if not 0 <= index <= sketch.max_index:
+                raise ValueError("Bucket index out of range")
+            entries.append((index, int(bucket_count)))
+
+        sketch.count = sketch.zero_count
+        if entries:
+            sketch._ensure(entries[0][0], entries[-1][0])
+            for index, bucket_count in entries:
+                sketch.buckets[index - sketch.offset] += bucket_count
+                sketch.count += bucket_count
+        return sketch
+
+    def nbytes(self) -> int:
+        """件数の列の使用バイト数"""
+        return self.buckets.itemsize * len(self.buckets)
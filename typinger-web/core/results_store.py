@@ -0,0 +1,423 @@
+"""
+results_store.py
+タイピング結果ストア（SQLite）
+
+完了したセッションの結果を1セッション1行で SQLite に保存します。
+シナリオ・完了時刻・WPM・正解率・所要時間などを型付きの列として持ち、
+完了時刻とシナリオに索引を張るため、管理画面の集計・絞り込み・エクスポートを
+出力ディレクトリのファイル一覧やサマリCSVの解析なしに SQL で求められます。
+
+用語解説:
+- 索引 (Index): 列の値から行を素早く探すためのデータ構造。
+  期間（completed_at）やシナリオでの絞り込みが全行の走査にならない
+- 集計関数 (Aggregate): COUNT / AVG / MAX などの、複数の行から1つの値を求める SQL の関数
+- WAL (Write-Ahead Logging): 読み取りと書き込みを並行して行えるSQLiteのジャーナル方式
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from core.statistics import StatisticsData
+from core.csv_logger import INTERVAL_SKETCH_METRIC
+
+
+# サマリCSVの項目名と列の対応（エクスポート・管理画面の表示と、既存のサマリCSVの取り込みに使う）
+METRIC_COLUMNS = (
+    ("Target Text", "target_text"),
+    ("Total Duration (microseconds)", "duration_us"),
+    ("Total Duration (seconds)", "duration_seconds"),
+    ("Total Key Count", "total_key_count"),
+    ("Correct Key Count", "correct_key_count"),
+    ("Incorrect Key Count", "incorrect_key_count"),
+    ("Backspace Count", "backspace_count"),
+    ("Accuracy (%)", "accuracy_percent"),
+    ("WPM (Total)", "wpm_total"),
+    ("WPM (Correct)", "wpm_correct"),
+    ("CPM (Total)", "cpm_total"),
+    ("CPM (Correct)", "cpm_correct"),
+    ("Avg Inter-Key Interval (ms)", "avg_interval_ms"),
+    ("Min Inter-Key Interval (ms)", "min_interval_ms"),
+    ("Max Inter-Key Interval (ms)", "max_interval_ms"),
+    ("Std Inter-Key Interval (ms)", "std_interval_ms"),
+    (INTERVAL_SKETCH_METRIC, "interval_sketch"),
+)
+
+# 結果の列（session_id と計算で求める duration_seconds を除く、挿入順）
+_COLUMNS = (
+    "scenario", "completed_at", "target_text", "duration_us",
+    "total_key_count", "correct_key_count", "incorrect_key_count", "backspace_count",
+    "accuracy_percent", "wpm_total", "wpm_correct", "cpm_total", "cpm_correct",
+    "avg_interval_ms", "min_interval_ms", "max_interval_ms", "std_interval_ms",
+    "interval_sketch", "files",
+)
+
+# サマリCSVのファイル名（書き出した日時。古いファイルはマイクロ秒なし）
+_SUMMARY_FILENAME_PATTERN = re.compile(r'^typing_summary_(\d{8}_\d{6})(?:_(\d{6}))?\.csv$')
+
+# query() で返す列
+_SELECT = (
+    "session_id, " + ", ".join(_COLUMNS)
+    + ", duration_us / 1000000.0 AS duration_seconds"
+)
+
+
+def _summary_completed_at(path: str) -> float:
+    """サマリCSVを書き出した日時（UNIX 時刻）をファイル名から取得（読めない場合は更新日時）"""
+    match = _SUMMARY_FILENAME_PATTERN.match(os.path.basename(path))
+    if match is not None:
+        try:
+            completed = datetime.strptime(match.group(1), '%Y%m%d_%H%M%S')
+        except ValueError:
+            pass
+        else:
+            return completed.timestamp() + int(match.group(2) or 0) / 1000000
+    return os.path.getmtime(path)
+
+
+def result_metrics(result: Dict[str, Any]) -> Dict[str, Any]:
+    """query() の結果1行を、サマリCSVの項目名をキーとする辞書にする"""
+    return {
+        metric: result[column] for metric, column in METRIC_COLUMNS
+        if column != "interval_sketch" and column in result
+    }
+
+
+class ResultsStore:
+    """
+    SQLite のタイピング結果ストアクラス
+
+    接続はプロセス・スレッドごとに作成するため、gunicorn の
+    pre-fork ワーカー間で同じデータベースファイルを安全に共有できます。
+    """
+
+    def __init__(self, db_path: str):
+        """
+        コンストラクタ
+
+        Args:
+            db_path: データベースファイルのパス
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._initialize_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """現在のプロセス・スレッド用の接続を取得"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        # fork 後に親プロセスの接続を使い回さない
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _initialize_schema(self):
+        """テーブルと索引を作成"""
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                session_id TEXT PRIMARY KEY,
+                scenario TEXT NOT NULL DEFAULT '',
+                completed_at REAL NOT NULL,
+                target_text TEXT NOT NULL DEFAULT '',
+                duration_us INTEGER NOT NULL DEFAULT 0,
+                total_key_count INTEGER NOT NULL DEFAULT 0,
+                correct_key_count INTEGER NOT NULL DEFAULT 0,
+                incorrect_key_count INTEGER NOT NULL DEFAULT 0,
+                backspace_count INTEGER NOT NULL DEFAULT 0,
+                accuracy_percent REAL NOT NULL DEFAULT 0,
+                wpm_total REAL NOT NULL DEFAULT 0,
+                wpm_correct REAL NOT NULL DEFAULT 0,
+                cpm_total REAL NOT NULL DEFAULT 0,
+                cpm_correct REAL NOT NULL DEFAULT 0,
+                avg_interval_ms REAL NOT NULL DEFAULT 0,
+                min_interval_ms REAL NOT NULL DEFAULT 0,
+                max_interval_ms REAL NOT NULL DEFAULT 0,
+                std_interval_ms REAL NOT NULL DEFAULT 0,
+                interval_sketch TEXT,
+                files TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_completed_at ON results(completed_at);
+            CREATE INDEX IF NOT EXISTS idx_results_scenario ON results(scenario, completed_at);
+        """)
+
+    def _insert(self, values: Dict[str, Any], replace: bool = True):
+        """1行を保存（replace=False の場合、同じセッションIDの行があれば何もしない）"""
+        columns = ("session_id",) + _COLUMNS
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        self._connect().execute(
+            f"{verb} INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+            [values.get(column) for column in columns],
+        )
+
+    def add_result(self, session_id: str, scenario: Optional[str], stats_data: StatisticsData,
+                   target_text: str, accuracy: float, files: Optional[Dict[str, str]] = None,
+                   completed_at: Optional[float] = None):
+        """
+        完了したセッションの結果を保存
+
+        Args:
+            session_id: セッションID
+            scenario: シナリオファイル名
+            stats_data: 統計データ
+            target_text: 目標テキスト
+            accuracy: 正解率（0 ～ 1）
+            files: 保存したファイル（応答の "files" と同じ、省略可）
+            completed_at: 完了時刻（UNIX 時刻、省略時は現在）
+        """
+        sketch = stats_data.interval_sketch
+        self._insert({
+            "session_id": session_id,
+            "scenario": scenario or "",
+            "completed_at": time.time() if completed_at is None else completed_at,
+            "target_text": target_text,
+            "duration_us": stats_data.total_duration,
+            "total_key_count": stats_data.total_key_count,
+            "correct_key_count": stats_data.correct_key_count,
+            "incorrect_key_count": stats_data.incorrect_key_count,
+            "backspace_count": stats_data.backspace_count,
+            "accuracy_percent": round(accuracy * 100, 2),
+            "wpm_total": round(stats_data.wpm_total, 2),
+            "wpm_correct": round(stats_data.wpm_correct, 2),
+            "cpm_total": round(stats_data.cpm_total, 2),
+            "cpm_correct": round(stats_data.cpm_correct, 2),
+            "avg_interval_ms": round(stats_data.avg_inter_key_interval, 2),
+            "min_interval_ms": round(stats_data.min_inter_key_interval, 2),
+            "max_interval_ms": round(stats_data.max_inter_key_interval, 2),
+            "std_interval_ms": round(stats_data.std_inter_key_interval, 2),
+            "interval_sketch": sketch.to_string() if sketch is not None else None,
+            "files": json.dumps(files) if files else None,
+        })
+
+    def import_summary_csv(self, path: str, scenario: str = "") -> bool:
+        """
+        既存のサマリCSVを1行として取り込む（セッションIDはファイル名、すでにあれば何もしない）
+
+        Args:
+            path: サマリCSVのパス
+            scenario: シナリオファイル名（サマリCSVには記録されていない）
+
+        Returns:
+            bool: 読み込めたか
+        """
+        try:
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                metrics = {row[0]: row[1] for row in csv.reader(f) if len(row) >= 2}
+        except OSError:
+            return False
+
+        values: Dict[str, Any] = {"session_id": os.path.basename(path), "scenario": scenario,
+                                  "completed_at": _summary_completed_at(path)}
+        for metric, column in METRIC_COLUMNS:
+            if metric not in metrics or column == "duration_seconds":
+                continue
+            value = metrics[metric]
+            if column in ("target_text", "interval_sketch"):
+                values[column] = value
+            else:
+                try:
+                    values[column] = int(value) if column.endswith("count") or column == "duration_us" \
+                        else float(value)
+                except ValueError:
+                    continue
+        values["files"] = json.dumps({"summary_csv": os.path.basename(path)})
+        self._insert(values, replace=False)
+        return True
+
+    def import_summary_csvs(self, output_dir: str) -> int:
+        """
+        出力ディレクトリのサマリCSVをまとめて取り込む（結果ストア導入前のデータの移行用）
+
+        Args:
+            output_dir: 出力ディレクトリ
+
+        Returns:
+            int: 取り込んだファイル数
+        """
+        if not os.path.isdir(output_dir):
+            return 0
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            count = sum(
+                self.import_summary_csv(os.path.join(output_dir, name))
+                for name in sorted(os.listdir(output_dir))
+                if name.startswith('typing_summary_') and name.endswith('.csv')
+            )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return count
+
+    @staticmethod
+    def _where(scenario: Optional[str], since: Optional[float],
+               until: Optional[float]) -> Tuple[str, List[Any]]:
+        """絞り込みの WHERE 句（期間は since 以上 until 未満）"""
+        clauses, params = [], []
+        if scenario is not None:
+            clauses.append("scenario = ?")
+            params.append(scenario)
+        if since is not None:
+            clauses.append("completed_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("completed_at < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        result = dict(row)
+        result["completed_at"] = datetime.fromtimestamp(row["completed_at"]).isoformat()
+        result["files"] = json.loads(row["files"]) if row["files"] else {}
+        return result
+
+    def query(self, scenario: Optional[str] = None, since: Optional[float] = None,
+              until: Optional[float] = None, limit: Optional[int] = 50,
+              offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        結果を新しい順に取得
+
+        Args:
+            scenario: シナリオファイル名（省略時はすべて）
+            since: 期間の開始（UNIX 時刻、以上）
+            until: 期間の終了（UNIX 時刻、未満）
+            limit: 最大件数（None で全件）
+            offset: 先頭から飛ばす件数
+
+        Returns:
+            Tuple[List[Dict], int]: (結果のリスト, 条件に合う全件数)
+        """
+        where, params = self._where(scenario, since, until)
+        conn = self._connect()
+        total = conn.execute(f"SELECT COUNT(*) FROM results{where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {_SELECT} FROM results{where} ORDER BY completed_at DESC LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset],
+        ).fetchall()
+        return [self._row_to_dict(row) for row in rows], total
+
+    def summarize(self, scenario: Optional[str] = None, since: Optional[float] = None,
+                  until: Optional[float] = None) -> Dict[str, Any]:
+        """
+        結果を集計（SQL の集計関数で求める）
+
+        Args:
+            scenario: シナリオファイル名（省略時はすべて）
+            since: 期間の開始（UNIX 時刻、以上）
+            until: 期間の終了（UNIX 時刻、未満）
+
+        Returns:
+            Dict: セッション数、WPM・正解率の平均と最大、合計所要時間（秒）、最初と最後の完了時刻
+        """
+        where, params = self._where(scenario, since, until)
+        row = self._connect().execute(f"""
+            SELECT COUNT(*) AS session_count,
+                   AVG(wpm_correct) AS avg_wpm_correct,
+                   MAX(wpm_correct) AS max_wpm_correct,
+                   AVG(accuracy_percent) AS avg_accuracy_percent,
+                   MIN(accuracy_percent) AS min_accuracy_percent,
+                   SUM(duration_us) / 1000000.0 AS total_duration_seconds,
+                   SUM(total_key_count) AS total_key_count,
+                   MIN(completed_at) AS first_completed_at,
+                   MAX(completed_at) AS last_completed_at
+            FROM results{where}
+        """, params).fetchone()
+        summary = {key: (round(value, 2) if isinstance(value, float) else value) for key, value in dict(row).items()}
+        for key in ("first_completed_at", "last_completed_at"):
+            if row[key] is not None:
+                summary[key] = datetime.fromtimestamp(row[key]).isoformat()
+        summary["total_key_count"] = summary["total_key_count"] or 0
+        summary["total_duration_seconds"] = summary["total_duration_seconds"] or 0.0
+        return summary
+
+    def summarize_by_scenario(self, since: Optional[float] = None,
+                              until: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        シナリオごとに集計
+
+        Args:
+            since: 期間の開始（UNIX 時刻、以上）
+            until: 期間の終了（UNIX 時刻、未満）
+
+        Returns:
+            List[Dict]: {"scenario", "session_count", "avg_wpm_correct", "avg_accuracy_percent"} のリスト（セッション数順）
+        """
+        where, params = self._where(None, since, until)
+        rows = self._connect().execute(f"""
+            SELECT scenario, COUNT(*) AS session_count,
+                   ROUND(AVG(wpm_correct), 2) AS avg_wpm_correct,
+                   ROUND(AVG(accuracy_percent), 2) AS avg_accuracy_percent
+            FROM results{where}
+            GROUP BY scenario
+            ORDER BY session_count DESC, scenario
+        """, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def iter_sketches(self, after_rowid: int = 0) -> Iterator[Tuple[int, str]]:
+        """
+        キー間隔スケッチを追加順に返す（増分マージ用）
+
+        Args:
+            after_rowid: この行番号より後の行のみ
+
+        Yields:
+            Tuple[int, str]: (行番号, シリアライズしたスケッチ)
+        """
+        yield from self._connect().execute(
+            "SELECT rowid, interval_sketch FROM results WHERE rowid > ? AND interval_sketch IS NOT NULL "
+            "ORDER BY rowid", (after_rowid,))
+
+    def export_csv(self, scenario: Optional[str] = None, since: Optional[float] = None,
+                   until: Optional[float] = None) -> str:
+        """
+        結果を1セッション1行のCSVとして書き出す
+
+        Args:
+            scenario: シナリオファイル名（省略時はすべて）
+            since: 期間の開始（UNIX 時刻、以上）
+            until: 期間の終了（UNIX 時刻、未満）
+
+        Returns:
+            str: CSVの内容（ヘッダー: session_id, scenario, completed_at, サマリCSVの項目名）
+        """
+        rows, _ = self.query(scenario, since, until, limit=None)
+        metrics = [metric for metric, column in METRIC_COLUMNS if column != "interval_sketch"]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["session_id", "scenario", "completed_at"] + metrics)
+        for row in rows:
+            values = result_metrics(row)
+            writer.writerow([row["session_id"], row["scenario"], row["completed_at"]]
+                            + [values[metric] for metric in metrics])
+        return buffer.getvalue()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ストアの状態を取得
+
+        Returns:
+            Dict: {"db_path": データベースファイルのパス, "session_count": 保存したセッション数}
+        """
+        return {"db_path": self.db_path, "session_count": len(self)}
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM results").fetchone()[0]
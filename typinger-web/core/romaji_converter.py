@@ -5,10 +5,18 @@ romaji_converter.py
 用語解説:
 - ローマ字(Romaji): キーボードで入力するアルファベット表記（例: "ka", "shi"）
 - かな(Kana): 日本語のひらがな（例: "か", "し"）
+- トライ木(Trie): 変換テーブルのキーを1文字ずつの木構造にしたもの。
+  入力を先頭からたどるだけで最長一致・部分一致を判定できる（入力長に比例する時間）
+- 確定かな(Committed Kana): これ以上入力が続いても変わらない変換結果
+- 未確定ローマ字(Pending Romaji): 入力途中で、まだかなに確定していないローマ字（例: "k"、"sh"）
+
+変換表はモジュール読み込み時に1度だけ構築し、読み取り専用の表として全インスタンスで共有します。
 """
 
 from enum import Enum
-from typing import Dict, Tuple, Optional
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Tuple, Optional
 
 
 class ConvertStatus(Enum):
@@ -26,130 +34,262 @@ class ConvertResult:
         self.remaining = remaining
 
 
+class _TrieNode:
+    """トライ木のノード（kana はこのノードで終わるキーの変換結果）"""
+
+    __slots__ = ('children', 'kana')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.kana: Optional[str] = None
+
+
+def _build_trie(table: Mapping[str, str]) -> _TrieNode:
+    """
+    変換表からトライ木を構築
+
+    Args:
+        table: 変換元 → 変換先 の表
+
+    Returns:
+        _TrieNode: 根ノード
+    """
+    root = _TrieNode()
+    for key, value in table.items():
+        node = root
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+        node.kana = value
+    return root
+
+
+def _longest_match(root: _TrieNode, input_str: str, start: int) -> Tuple[int, Optional[str], bool]:
+    """
+    start 位置からトライ木をたどって最長一致を探す
+
+    Args:
+        root: トライ木の根ノード
+        input_str: 入力
+        start: 照合開始位置
+
+    Returns:
+        Tuple[int, Optional[str], bool]:
+            (最長一致の終了位置, 変換結果（一致なしは None）, 末尾までたどれたか)
+    """
+    node = root
+    match_end = start
+    match_value = None
+
+    for pos in range(start, len(input_str)):
+        node = node.children.get(input_str[pos])
+        if node is None:
+            return match_end, match_value, False
+        if node.kana is not None:
+            match_end = pos + 1
+            match_value = node.kana
+
+    return match_end, match_value, True
+
+
+# ローマ字→かな変換表（全インスタンスで共有する読み取り専用の表）
+ROMAJI_TO_KANA: Mapping[str, str] = MappingProxyType({
+    # 単独音（あ行）
+    'a': 'あ', 'i': 'い', 'u': 'う', 'e': 'え', 'o': 'お',
+    
+    # か行
+    'ka': 'か', 'ki': 'き', 'ku': 'く', 'ke': 'け', 'ko': 'こ',
+    
+    # さ行
+    'sa': 'さ', 'si': 'し', 'su': 'す', 'se': 'せ', 'so': 'そ',
+    'sha': 'しゃ', 'shu': 'しゅ', 'sho': 'しょ', 'shi': 'し',
+    
+    # た行
+    'ta': 'た', 'ti': 'ち', 'tu': 'つ', 'te': 'て', 'to': 'と',
+    'cha': 'ちゃ', 'chu': 'ちゅ', 'cho': 'ちょ', 'chi': 'ち',
+    'tsu': 'つ',
+    
+    # 促音（単独入力）
+    'xtu': 'っ', 'ltu': 'っ', 'xtsu': 'っ', 'ltsu': 'っ',
+    
+    # な行
+    'na': 'な', 'ni': 'に', 'nu': 'ぬ', 'ne': 'ね', 'no': 'の',
+    
+    # は行
+    'ha': 'は', 'hi': 'ひ', 'hu': 'ふ', 'he': 'へ', 'ho': 'ほ',
+    'fu': 'ふ',
+    'fa': 'ふぁ', 'fi': 'ふぃ', 'fe': 'ふぇ', 'fo': 'ふぉ',
+    
+    # ま行
+    'ma': 'ま', 'mi': 'み', 'mu': 'む', 'me': 'め', 'mo': 'も',
+    
+    # や行
+    'ya': 'や', 'yu': 'ゆ', 'yo': 'よ',
+    
+    # ら行
+    'ra': 'ら', 'ri': 'り', 'ru': 'る', 're': 'れ', 'ro': 'ろ',
+    
+    # わ行
+    'wa': 'わ', 'wi': 'ゐ', 'wu': 'う', 'we': 'ゑ', 'wo': 'を', 'n': 'ん',
+    
+    # ん
+    'nn': 'ん', 'n\'': 'ん',
+    
+    # 濁音（が行）
+    'ga': 'が', 'gi': 'ぎ', 'gu': 'ぐ', 'ge': 'げ', 'go': 'ご',
+    
+    # 濁音（ざ行）
+    'za': 'ざ', 'zi': 'じ', 'zu': 'ず', 'ze': 'ぜ', 'zo': 'ぞ',
+    'ja': 'じゃ', 'ju': 'じゅ', 'jo': 'じょ', 'ji': 'じ',
+    
+    # 濁音（だ行）
+    'da': 'だ', 'di': 'ぢ', 'du': 'づ', 'de': 'で', 'do': 'ど',
+    
+    # 濁音（ば行）
+    'ba': 'ば', 'bi': 'び', 'bu': 'ぶ', 'be': 'べ', 'bo': 'ぼ',
+    
+    # 半濁音（ぱ行）
+    'pa': 'ぱ', 'pi': 'ぴ', 'pu': 'ぷ', 'pe': 'ぺ', 'po': 'ぽ',
+    
+    # 拗音（きゃ行）
+    'kya': 'きゃ', 'kyu': 'きゅ', 'kyo': 'きょ',
+    
+    # 拗音（しゃ行）
+    'sya': 'しゃ', 'syu': 'しゅ', 'syo': 'しょ',
+    
+    # 拗音（ちゃ行）
+    'cya': 'ちゃ', 'cyu': 'ちゅ', 'cyo': 'ちょ',
+    'tya': 'ちゃ', 'tyu': 'ちゅ', 'tyo': 'ちょ',
+    
+    # 拗音（にゃ行）
+    'nya': 'にゃ', 'nyu': 'にゅ', 'nyo': 'にょ',
+    
+    # 拗音（ひゃ行）
+    'hya': 'ひゃ', 'hyu': 'ひゅ', 'hyo': 'ひょ',
+    
+    # 拗音（みゃ行）
+    'mya': 'みゃ', 'myu': 'みゅ', 'myo': 'みょ',
+    
+    # 拗音（りゃ行）
+    'rya': 'りゃ', 'ryu': 'りゅ', 'ryo': 'りょ',
+    
+    # 拗音（ぎゃ行）
+    'gya': 'ぎゃ', 'gyu': 'ぎゅ', 'gyo': 'ぎょ',
+    
+    # 拗音（じゃ行）
+    'jya': 'じゃ', 'jyu': 'じゅ', 'jyo': 'じょ',
+    'zya': 'じゃ', 'zyu': 'じゅ', 'zyo': 'じょ',
+    
+    # 拗音（びゃ行）
+    'bya': 'びゃ', 'byu': 'びゅ', 'byo': 'びょ',
+    
+    # 拗音（ぴゃ行）
+    'pya': 'ぴゃ', 'pyu': 'ぴゅ', 'pyo': 'ぴょ',
+})
+
+
+# かな→ローマ字変換表（to_romaji 用）
+KANA_TO_ROMAJI: Mapping[str, str] = MappingProxyType({
+    'あ': 'a', 'い': 'i', 'う': 'u', 'え': 'e', 'お': 'o',
+    'か': 'ka', 'き': 'ki', 'く': 'ku', 'け': 'ke', 'こ': 'ko',
+    'さ': 'sa', 'し': 'shi', 'す': 'su', 'せ': 'se', 'そ': 'so',
+    'た': 'ta', 'ち': 'chi', 'つ': 'tsu', 'て': 'te', 'と': 'to',
+    'な': 'na', 'に': 'ni', 'ぬ': 'nu', 'ね': 'ne', 'の': 'no',
+    'は': 'ha', 'ひ': 'hi', 'ふ': 'fu', 'へ': 'he', 'ほ': 'ho',
+    'ま': 'ma', 'み': 'mi', 'む': 'mu', 'め': 'me', 'も': 'mo',
+    'や': 'ya', 'ゆ': 'yu', 'よ': 'yo',
+    'ら': 'ra', 'り': 'ri', 'る': 'ru', 'れ': 're', 'ろ': 'ro',
+    'わ': 'wa', 'を': 'wo', 'ん': 'n', 'ー': '-',
+    'が': 'ga', 'ぎ': 'gi', 'ぐ': 'gu', 'げ': 'ge', 'ご': 'go',
+    'ざ': 'za', 'じ': 'ji', 'ず': 'zu', 'ぜ': 'ze', 'ぞ': 'zo',
+    'だ': 'da', 'ぢ': 'di', 'づ': 'du', 'で': 'de', 'ど': 'do',
+    'ば': 'ba', 'び': 'bi', 'ぶ': 'bu', 'べ': 'be', 'ぼ': 'bo',
+    'ぱ': 'pa', 'ぴ': 'pi', 'ぷ': 'pu', 'ぺ': 'pe', 'ぽ': 'po',
+    'きゃ': 'kya', 'きゅ': 'kyu', 'きょ': 'kyo',
+    'しゃ': 'sha', 'しゅ': 'shu', 'しょ': 'sho',
+    'ちゃ': 'cha', 'ちゅ': 'chu', 'ちょ': 'cho',
+    'にゃ': 'nya', 'にゅ': 'nyu', 'にょ': 'nyo',
+    'ひゃ': 'hya', 'ひゅ': 'hyu', 'ひょ': 'hyo',
+    'みゃ': 'mya', 'みゅ': 'myu', 'みょ': 'myo',
+    'りゃ': 'rya', 'りゅ': 'ryu', 'りょ': 'ryo',
+    'ぎゃ': 'gya', 'ぎゅ': 'gyu', 'ぎょ': 'gyo',
+    'じゃ': 'ja', 'じゅ': 'ju', 'じょ': 'jo',
+    'びゃ': 'bya', 'びゅ': 'byu', 'びょ': 'byo',
+    'ぴゃ': 'pya', 'ぴゅ': 'pyu', 'ぴょ': 'pyo',
+})
+
+_ROMAJI_TRIE = _build_trie(ROMAJI_TO_KANA)
+_KANA_TRIE = _build_trie(KANA_TO_ROMAJI)
+
+# カタカナ → ひらがな（to_romaji の前処理）
+_KATAKANA_TO_HIRAGANA = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+
+# 「ん」を "nn" と綴る次の音の先頭文字（母音・や行・な行）
+_NN_BEFORE = frozenset('aiueoyn')
+
+# 促音を重ねて表せる子音
+_DOUBLE_CONSONANTS = frozenset('bcdfghjklmpqrstvwxyz')
+
+# to_romaji_many でキャッシュする変換結果の最大数
+ROMAJI_CACHE_SIZE = 8192
+
+
 class RomajiConverter:
     """ローマ字→かな変換器クラス"""
 
     def __init__(self):
-        self.conversion_table: Dict[str, str] = {}
-        self._initialize_table()
-
-    def _initialize_table(self):
-        """変換テーブルを初期化"""
-        # 基本的なローマ字→かな対応表
-        self.conversion_table = {
-            # 単独音（あ行）
-            'a': 'あ', 'i': 'い', 'u': 'う', 'e': 'え', 'o': 'お',
-            
-            # か行
-            'ka': 'か', 'ki': 'き', 'ku': 'く', 'ke': 'け', 'ko': 'こ',
-            
-            # さ行
-            'sa': 'さ', 'si': 'し', 'su': 'す', 'se': 'せ', 'so': 'そ',
-            'sha': 'しゃ', 'shu': 'しゅ', 'sho': 'しょ', 'shi': 'し',
-            
-            # た行
-            'ta': 'た', 'ti': 'ち', 'tu': 'つ', 'te': 'て', 'to': 'と',
-            'cha': 'ちゃ', 'chu': 'ちゅ', 'cho': 'ちょ', 'chi': 'ち',
-            'tsu': 'つ',
-            
-            # な行
-            'na': 'な', 'ni': 'に', 'nu': 'ぬ', 'ne': 'ね', 'no': 'の',
-            
-            # は行
-            'ha': 'は', 'hi': 'ひ', 'hu': 'ふ', 'he': 'へ', 'ho': 'ほ',
-            'fa': 'ふぁ', 'fi': 'ふぃ', 'fe': 'ふぇ', 'fo': 'ふぉ',
-            
-            # ま行
-            'ma': 'ま', 'mi': 'み', 'mu': 'む', 'me': 'め', 'mo': 'も',
-            
-            # や行
-            'ya': 'や', 'yu': 'ゆ', 'yo': 'よ',
-            
-            # ら行
-            'ra': 'ら', 'ri': 'り', 'ru': 'る', 're': 'れ', 'ro': 'ろ',
-            
-            # わ行
-            'wa': 'わ', 'wi': 'ゐ', 'wu': 'う', 'we': 'ゑ', 'wo': 'を', 'n': 'ん',
-            
-            # ん
-            'nn': 'ん', 'n\'': 'ん',
-            
-            # 濁音（が行）
-            'ga': 'が', 'gi': 'ぎ', 'gu': 'ぐ', 'ge': 'げ', 'go': 'ご',
-            
-            # 濁音（ざ行）
-            'za': 'ざ', 'zi': 'じ', 'zu': 'ず', 'ze': 'ぜ', 'zo': 'ぞ',
-            'ja': 'じゃ', 'ju': 'じゅ', 'jo': 'じょ',
-            
-            # 濁音（だ行）
-            'da': 'だ', 'di': 'ぢ', 'du': 'づ', 'de': 'で', 'do': 'ど',
-            
-            # 濁音（ば行）
-            'ba': 'ば', 'bi': 'び', 'bu': 'ぶ', 'be': 'べ', 'bo': 'ぼ',
-            
-            # 半濁音（ぱ行）
-            'pa': 'ぱ', 'pi': 'ぴ', 'pu': 'ぷ', 'pe': 'ぺ', 'po': 'ぽ',
-            
-            # 拗音（きゃ行）
-            'kya': 'きゃ', 'kyu': 'きゅ', 'kyo': 'きょ',
-            
-            # 拗音（しゃ行）
-            'sya': 'しゃ', 'syu': 'しゅ', 'syo': 'しょ',
-            
-            # 拗音（ちゃ行）
-            'cya': 'ちゃ', 'cyu': 'ちゅ', 'cyo': 'ちょ',
-            
-            # 拗音（にゃ行）
-            'nya': 'にゃ', 'nyu': 'にゅ', 'nyo': 'にょ',
-            
-            # 拗音（ひゃ行）
-            'hya': 'ひゃ', 'hyu': 'ひゅ', 'hyo': 'ひょ',
-            
-            # 拗音（みゃ行）
-            'mya': 'みゃ', 'myu': 'みゅ', 'myo': 'みょ',
-            
-            # 拗音（りゃ行）
-            'rya': 'りゃ', 'ryu': 'りゅ', 'ryo': 'りょ',
-            
-            # 拗音（ぎゃ行）
-            'gya': 'ぎゃ', 'gyu': 'ぎゅ', 'gyo': 'ぎょ',
-            
-            # 拗音（じゃ行）
-            'jya': 'じゃ', 'jyu': 'じゅ', 'jyo': 'じょ',
-            
-            # 拗音（びゃ行）
-            'bya': 'びゃ', 'byu': 'びゅ', 'byo': 'びょ',
-            
-            # 拗音（ぴゃ行）
-            'pya': 'ぴゃ', 'pyu': 'ぴゅ', 'pyo': 'ぴょ',
-        }
+        # 既定では共有の読み取り専用表とトライ木を使う（インスタンスごとの構築は不要）
+        self.conversion_table: Mapping[str, str] = ROMAJI_TO_KANA
+        self._trie = _ROMAJI_TRIE
+
+    def rebuild_trie(self):
+        """
+        conversion_table の変更をトライ木に反映
+
+        共有の表は変更できないため、独自の表を使う場合は
+        conversion_table に新しい辞書を代入してから呼び出してください。
+        """
+        self._trie = _build_trie(self.conversion_table)
+
+    def _match_at(self, input_str: str, start: int) -> Tuple[int, Optional[str], bool]:
+        """
+        start 位置からトライ木をたどって最長一致を探す
+
+        Args:
+            input_str: 小文字化済みの入力
+            start: 照合開始位置
+
+        Returns:
+            Tuple[int, Optional[str], bool]:
+                (最長一致の終了位置, 変換結果（一致なしは None）, 末尾までたどれたか)
+        """
+        return _longest_match(self._trie, input_str, start)
 
     def _has_partial_match(self, romaji: str) -> bool:
         """部分一致チェック（入力途中かどうか）"""
-        for key in self.conversion_table:
-            if key.startswith(romaji):
-                return True
-        return False
+        node = self._trie
+        for char in romaji:
+            node = node.children.get(char)
+            if node is None:
+                return False
+        return True
 
     def convert(self, input_str: str) -> ConvertResult:
         """ローマ字をかなに変換"""
         input_str = input_str.lower()
         
-        # 直接マッチチェック（最長一致）
-        for length in range(len(input_str), 0, -1):
-            candidate = input_str[:length]
-            if candidate in self.conversion_table:
-                kana = self.conversion_table[candidate]
-                remaining = input_str[length:]
-                return ConvertResult(
-                    ConvertStatus.MATCHED,
-                    kana=kana,
-                    consumed=candidate,
-                    remaining=remaining
-                )
+        # 最長一致と部分一致をトライ木の1回の走査で判定
+        match_end, kana, reached_end = self._match_at(input_str, 0)
         
-        # 部分一致チェック
-        if self._has_partial_match(input_str):
+        if kana is not None:
+            return ConvertResult(
+                ConvertStatus.MATCHED,
+                kana=kana,
+                consumed=input_str[:match_end],
+                remaining=input_str[match_end:]
+            )
+        
+        # 部分一致チェック（入力全体がいずれかのキーの接頭辞）
+        if reached_end:
             return ConvertResult(ConvertStatus.PARTIAL, remaining=input_str)
         
         return ConvertResult(ConvertStatus.NO_MATCH, remaining=input_str)
@@ -157,18 +297,18 @@ class RomajiConverter:
     def convert_greedy(self, input_str: str) -> Tuple[str, str]:
         """最長一致変換（貪欲マッチ）"""
         input_str = input_str.lower()
-        result_kana = ""
+        kana_parts: List[str] = []
+        pos = 0
         
-        while input_str:
-            match_result = self.convert(input_str)
-            if match_result.status == ConvertStatus.MATCHED:
-                result_kana += match_result.kana
-                input_str = match_result.remaining
-            else:
+        while pos < len(input_str):
+            match_end, kana, _ = self._match_at(input_str, pos)
+            if kana is None:
                 # マッチしない場合はそこで終了
                 break
+            kana_parts.append(kana)
+            pos = match_end
         
-        return result_kana, input_str
+        return "".join(kana_parts), input_str[pos:]
 
     def can_convert(self, romaji: str) -> bool:
         """特定のローマ字が変換可能かチェック"""
@@ -180,53 +320,215 @@ class RomajiConverter:
 
     @staticmethod
     def to_romaji(kana: str) -> str:
-        """かな→ローマ字変換（逆変換）"""
-        kana_to_romaji = {
-            'あ': 'a', 'い': 'i', 'う': 'u', 'え': 'e', 'お': 'o',
-            'か': 'ka', 'き': 'ki', 'く': 'ku', 'け': 'ke', 'こ': 'ko',
-            'さ': 'sa', 'し': 'shi', 'す': 'su', 'せ': 'se', 'そ': 'so',
-            'た': 'ta', 'ち': 'chi', 'つ': 'tsu', 'て': 'te', 'と': 'to',
-            'な': 'na', 'に': 'ni', 'ぬ': 'nu', 'ね': 'ne', 'の': 'no',
-            'は': 'ha', 'ひ': 'hi', 'ふ': 'fu', 'へ': 'he', 'ほ': 'ho',
-            'ま': 'ma', 'み': 'mi', 'む': 'mu', 'め': 'me', 'も': 'mo',
-            'や': 'ya', 'ゆ': 'yu', 'よ': 'yo',
-            'ら': 'ra', 'り': 'ri', 'る': 'ru', 'れ': 're', 'ろ': 'ro',
-            'わ': 'wa', 'を': 'wo', 'ん': 'n',
-            'が': 'ga', 'ぎ': 'gi', 'ぐ': 'gu', 'げ': 'ge', 'ご': 'go',
-            'ざ': 'za', 'じ': 'ji', 'ず': 'zu', 'ぜ': 'ze', 'ぞ': 'zo',
-            'だ': 'da', 'ぢ': 'di', 'づ': 'du', 'で': 'de', 'ど': 'do',
-            'ば': 'ba', 'び': 'bi', 'ぶ': 'bu', 'べ': 'be', 'ぼ': 'bo',
-            'ぱ': 'pa', 'ぴ': 'pi', 'ぷ': 'pu', 'ぺ': 'pe', 'ぽ': 'po',
-            'きゃ': 'kya', 'きゅ': 'kyu', 'きょ': 'kyo',
-            'しゃ': 'sha', 'しゅ': 'shu', 'しょ': 'sho',
-            'ちゃ': 'cha', 'ちゅ': 'chu', 'ちょ': 'cho',
-            'にゃ': 'nya', 'にゅ': 'nyu', 'にょ': 'nyo',
-            'ひゃ': 'hya', 'ひゅ': 'hyu', 'ひょ': 'hyo',
-            'みゃ': 'mya', 'みゅ': 'myu', 'みょ': 'myo',
-            'りゃ': 'rya', 'りゅ': 'ryu', 'りょ': 'ryo',
-            'ぎゃ': 'gya', 'ぎゅ': 'gyu', 'ぎょ': 'gyo',
-            'じゃ': 'ja', 'じゅ': 'ju', 'じょ': 'jo',
-            'びゃ': 'bya', 'びゅ': 'byu', 'びょ': 'byo',
-            'ぴゃ': 'pya', 'ぴゅ': 'pyu', 'ぴょ': 'pyo',
-        }
+        """
+        かな→ローマ字変換（逆変換）
+
+        かなのトライ木で先頭から1回走査して最長一致で変換します。
+        カタカナはひらがなとして扱い、「っ」は次の音の子音を重ね、
+        「ん」は次が母音・や行・な行の場合と文末では "nn" とします。
+        変換できない文字（漢字など）はそのまま残します。
+        """
+        kana = kana.translate(_KATAKANA_TO_HIRAGANA)
+        parts: List[str] = []
+        length = len(kana)
+        pos = 0
+        sokuon = False
         
-        result = ""
-        i = 0
-        while i < len(kana):
-            # 2文字分をチェック
-            if i + 1 < len(kana):
-                two_char = kana[i:i+2]
-                if two_char in kana_to_romaji:
-                    result += kana_to_romaji[two_char]
-                    i += 2
-                    continue
+        while pos < length:
+            if kana[pos] == 'っ':
+                if sokuon:
+                    parts.append('xtu')
+                sokuon = True
+                pos += 1
+                continue
             
-            # 1文字分をチェック
-            char = kana[i]
-            if char in kana_to_romaji:
-                result += kana_to_romaji[char]
-            else:
-                result += char  # 変換できない場合はそのまま
-            i += 1
+            end, romaji, _ = _longest_match(_KANA_TRIE, kana, pos)
+            if romaji is None:
+                romaji = kana[pos]
+                end = pos + 1
+            elif romaji == 'n':
+                _, following, _ = _longest_match(_KANA_TRIE, kana, end)
+                if following is None and end < length:
+                    following = kana[end]
+                if not following or following[0] in _NN_BEFORE:
+                    romaji = 'nn'
+            
+            if sokuon:
+                # 促音は次の音の子音を重ねる（重ねられない場合は "xtu"）
+                parts.append(romaji[0] if romaji[0] in _DOUBLE_CONSONANTS else 'xtu')
+                sokuon = False
+            
+            parts.append(romaji)
+            pos = end
         
-        return result
+        if sokuon:
+            parts.append('xtu')
+        
+        return "".join(parts)
+
+    @staticmethod
+    def to_romaji_many(kana_list: Iterable[str]) -> List[str]:
+        """
+        複数のかな文字列をまとめてローマ字に変換
+
+        同じ文字列の変換結果は LRU キャッシュから返します
+        （シナリオのルビ自動生成など、同じ文が繰り返し変換される用途向け）。
+
+        Args:
+            kana_list: かな文字列の列
+
+        Returns:
+            List[str]: ローマ字のリスト（入力と同じ順序）
+        """
+        return [_to_romaji_cached(kana) for kana in kana_list]
+
+
+@lru_cache(maxsize=ROMAJI_CACHE_SIZE)
+def _to_romaji_cached(kana: str) -> str:
+    """to_romaji のキャッシュ付き版"""
+    return RomajiConverter.to_romaji(kana)
+
+
+class RomajiStream:
+    """
+    逐次ローマ字→かな変換器クラス（IME 風の1キーずつの変換）
+
+    未確定ローマ字に対応するトライ木のノードを保持し、1キーごとに
+    子ノードを1つたどるだけで変換します。それまでの入力は再走査しません。
+    未確定ローマ字は変換表の最長キー長を超えないため、確定時の戻り処理も定数時間です。
+    """
+
+    def __init__(self, converter: Optional[RomajiConverter] = None):
+        """
+        コンストラクタ
+
+        Args:
+            converter: 変換表を提供する変換器（省略時は共有の変換表）
+        """
+        self._root = converter._trie if converter is not None else _ROMAJI_TRIE
+        self._node = self._root
+        self._pending = ""
+        self._parts: List[str] = []
+        self._length = 0
+        # feed ごとの直前の状態（確定済みの要素数、確定かな文字数、未確定ローマ字、ノード）
+        self._history: List[Tuple[int, int, str, _TrieNode]] = []
+
+    @property
+    def kana(self) -> str:
+        """確定かな"""
+        return "".join(self._parts)
+
+    @property
+    def kana_length(self) -> int:
+        """確定かなの文字数"""
+        return self._length
+
+    @property
+    def pending(self) -> str:
+        """未確定ローマ字"""
+        return self._pending
+
+    def feed(self, char: str) -> str:
+        """
+        1文字入力
+
+        - 変換表のキーが確定した時点でかなを確定する（"ka" → "か"）
+        - "n" は次の文字で確定する（"n'" は「ん」、"nk" は「ん」+ "k"）
+        - "nn" は2文字目を入力した時点で「ん」を確定する（IME・convert_greedy・to_romaji と同じく
+          "kinnyou" は「きんよう」、"konnnichiha" は「こんにちは」）
+        - 同じ子音の重ね（"kk"）は「っ」を確定し、2文字目を未確定に残す
+
+        Args:
+            char: 入力文字
+
+        Returns:
+            str: この入力で確定したかな（確定しなかった場合は空文字列）
+        """
+        start = len(self._parts)
+        self._history.append((start, self._length, self._pending, self._node))
+        self._push(char.lower())
+        return "".join(self._parts[start:])
+
+    def _commit(self, kana: str):
+        """かなを確定して未確定ローマ字をリセット"""
+        self._parts.append(kana)
+        self._length += len(kana)
+        self._pending = ""
+        self._node = self._root
+
+    def _push(self, char: str):
+        """1文字をトライ木上で進める（確定できない場合は戻って再入力）"""
+        node = self._node.children.get(char)
+        if node is not None and self._pending == 'n' and char == 'n':
+            # "nn" はその時点で「ん」を確定する
+            self._commit(node.kana)
+            return
+
+        if node is not None:
+            if node.children:
+                # まだ長いキーの途中の可能性がある（"n" → "na" など）
+                self._pending += char
+                self._node = node
+            else:
+                self._commit(node.kana)
+            return
+
+        pending = self._pending
+        if not pending:
+            # 変換表にない文字はそのまま確定
+            self._commit(char)
+            return
+
+        if pending == char and char in _DOUBLE_CONSONANTS:
+            # 促音（子音の重ね）
+            self._commit('っ')
+            self._push(char)
+            return
+
+        # 未確定部分の最長一致を確定し、残りと今回の文字を入力し直す
+        end, kana, _ = _longest_match(self._root, pending, 0)
+        if kana is None:
+            end, kana = 1, pending[0]
+        self._commit(kana)
+        for rest in pending[end:] + char:
+            self._push(rest)
+
+    def backspace(self) -> bool:
+        """
+        直前の feed を取り消す
+
+        Returns:
+            bool: 取り消した場合 True（入力がない場合 False）
+        """
+        if not self._history:
+            return False
+        part_count, self._length, self._pending, self._node = self._history.pop()
+        del self._parts[part_count:]
+        return True
+
+    def flush(self) -> str:
+        """
+        未確定ローマ字を確定（文末の "n" は「ん」、途中の綴りはそのまま）
+
+        Returns:
+            str: 確定したかな
+        """
+        start = len(self._parts)
+        while self._pending:
+            pending = self._pending
+            end, kana, _ = _longest_match(self._root, pending, 0)
+            if kana is None:
+                end, kana = 1, pending[0]
+            self._commit(kana)
+            for rest in pending[end:]:
+                self._push(rest)
+        self._history.clear()
+        return "".join(self._parts[start:])
+
+    def reset(self):
+        """リセット"""
+        self._node = self._root
+        self._pending = ""
+        self._parts = []
+        self._length = 0
+        self._history = []
@@ -3,6 +3,7 @@ scenario_manager.py
 シナリオ管理機能
 
 JSONシナリオファイルを読み込み、キャッシング機能を提供します。
+sentences 形式（テキストのみ）のシナリオでは、ローマ字を自動生成します。
 """
 
 import json
@@ -10,6 +11,8 @@ import os
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
+from core.romaji_converter import RomajiConverter
+
 
 class ScenarioManager:
     """シナリオ管理クラス"""
@@ -105,7 +108,7 @@ class ScenarioManager:
                 return None
             
             text = random.choice(sentences)
-            return (text, text)  # ローマ字は別途変換が必要
+            return (text, RomajiConverter.to_romaji_many([text])[0])  # ローマ字は自動生成
         
         return None
 
@@ -137,7 +140,7 @@ class ScenarioManager:
             sentences = scenario["sentences"]
             if sentences:
                 text = sentences[0]
-                return (text, text)
+                return (text, RomajiConverter.to_romaji_many([text])[0])
         
         return None
 
@@ -168,8 +171,8 @@ class ScenarioManager:
         
         # "sentences"形式
         elif "sentences" in scenario and isinstance(scenario["sentences"], list):
-            for text in scenario["sentences"]:
-                sentences.append((text, text))
+            texts = scenario["sentences"]
+            sentences.extend(zip(texts, RomajiConverter.to_romaji_many(texts)))
         
         return sentences
 
@@ -0,0 +1,389 @@
+"""
+session_journal.py
+セッション記録のジャーナル（追記専用・ローテーション付き）
+
+完了したセッションのイベント列・サマリ・かな別分析を、1セッション1行の JSON として
+ジャーナルファイルに追記します。セッションごとにCSVファイルを作らないため、
+出力ディレクトリのファイル数が増えず、同じ秒に完了したセッションの記録が
+上書きされることもありません。CSVが必要なときはセッションIDを指定して
+その場で書き出します（export_csv）。
+
+用語解説:
+- ジャーナル (Journal): 記録を末尾に追記するだけで、書き換えないファイル
+- セグメント (Segment): ジャーナルを分割した1つのファイル
+  （journal_<番号>_<作成日時>.jsonl）。大きさ（max_bytes）または作成からの経過時間
+  （max_age）を超えると次のセグメントに切り替える（ローテーション）
+- オフセットインデックス (Offset Index): セッションIDから記録の位置
+  （セグメント・バイト位置・長さ）を引く索引（journal.idx、1行1セッション）
+- ファイルロック (flock): 複数のプロセス（gunicorn のワーカー）が同時に追記しても
+  記録やセグメントの切り替えが混ざらないようにする排他ロック（journal.lock）
+
+記録は行末まで書いてからインデックスに追記するため、インデックスにある記録は
+常に読めます。読み込みは改行で終わる行だけを扱い、書きかけの行は次の読み込みに回します。
+"""
+
+import csv
+import io
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from core.csv_logger import (
+    EVENTS_CSV_HEADER, SUMMARY_CSV_HEADER, KANA_ANALYSIS_CSV_HEADER,
+    event_rows, summary_rows, kana_analysis_rows,
+)
+from core.statistics import KeyEvent, EventBuffer, StatisticsData
+
+try:
+    import fcntl
+except ImportError:  # fcntl がない環境（Windows）ではプロセス内の排他のみ
+    fcntl = None
+
+
+# セグメントを切り替える大きさ（バイト）
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# セグメントを切り替える作成からの経過時間（秒）
+DEFAULT_MAX_AGE = 24 * 60 * 60
+
+INDEX_FILENAME = "journal.idx"
+LOCK_FILENAME = "journal.lock"
+
+# セグメントのファイル名（番号順 = 時刻順）
+_SEGMENT_PATTERN = re.compile(r"^journal_(\d{6})_(\d{8}_\d{6})\.jsonl$")
+
+# export_csv で書き出せるCSVの種類と、記録のキー・ヘッダー
+EXPORT_KINDS = {
+    'events': EVENTS_CSV_HEADER,
+    'summary': SUMMARY_CSV_HEADER,
+    'kana_analysis': KANA_ANALYSIS_CSV_HEADER,
+}
+
+# 読み込み位置（セグメントのファイル名, バイト位置）
+Cursor = Tuple[str, int]
+
+
+class SessionJournal:
+    """追記専用のセッション記録ジャーナルクラス"""
+
+    def __init__(self, journal_dir: str, max_bytes: int = DEFAULT_MAX_BYTES,
+                 max_age: float = DEFAULT_MAX_AGE, fsync: bool = False):
+        """
+        コンストラクタ
+
+        Args:
+            journal_dir: ジャーナルのディレクトリ
+            max_bytes: セグメントを切り替える大きさ（バイト）
+            max_age: セグメントを切り替える作成からの経過時間（秒）
+            fsync: 追記のたびにディスクへ確定するか
+        """
+        self.journal_dir = journal_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.fsync = fsync
+        os.makedirs(journal_dir, exist_ok=True)
+
+        # flock はファイルを開いた単位の排他のため、同じプロセスのスレッド間は別に排他する
+        self._write_lock = threading.Lock()
+        # 読み込み済みのインデックス（セッションID → (セグメント, 位置, 長さ)）
+        self._index: Dict[str, Tuple[str, int, int]] = {}
+        self._index_position = 0
+        self._index_inode: Optional[int] = None
+        self._index_lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.journal_dir, name)
+
+    @contextmanager
+    def _locked(self):
+        """プロセス内とプロセス間の排他ロック"""
+        with self._write_lock:
+            with open(self._path(LOCK_FILENAME), 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def segments(self) -> List[str]:
+        """
+        セグメントのファイル名を取得
+
+        Returns:
+            List[str]: ファイル名（古い順）
+        """
+        return sorted(name for name in os.listdir(self.journal_dir) if _SEGMENT_PATTERN.match(name))
+
+    def _active_segment(self, now: float) -> str:
+        """追記先のセグメント（大きさか経過時間が上限を超えていれば次のセグメント）"""
+        segments = self.segments()
+        number = 1
+        if segments:
+            name = segments[-1]
+            match = _SEGMENT_PATTERN.match(name)
+            created = datetime.strptime(match.group(2), '%Y%m%d_%H%M%S').timestamp()
+            if os.path.getsize(self._path(name)) < self.max_bytes and now - created < self.max_age:
+                return name
+            number = int(match.group(1)) + 1
+        return f"journal_{number:06d}_{datetime.fromtimestamp(now).strftime('%Y%m%d_%H%M%S')}.jsonl"
+
+    def _write(self, path: str, data: bytes) -> int:
+        """ファイルの末尾に追記し、書き始めの位置を返す"""
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            offset = os.lseek(fd, 0, os.SEEK_END)
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+            if self.fsync:
+                os.fsync(fd)
+            return offset
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _ends_with_newline(path: str) -> bool:
+        """ファイルが空か改行で終わっているか"""
+        try:
+            with open(path, 'rb') as f:
+                if f.seek(0, os.SEEK_END) == 0:
+                    return True
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) == b"\n"
+        except FileNotFoundError:
+            return True
+
+    def append(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        記録を追記
+
+        Args:
+            record: 記録（"session_id" を含む、JSON に変換できる辞書）
+
+        Returns:
+            Dict: {"session_id": ..., "segment": ..., "offset": ..., "length": ...}
+
+        Raises:
+            ValueError: セッションIDがない・タブや改行を含む場合
+        """
+        session_id = record.get("session_id")
+        if not session_id or any(char in session_id for char in "\t\r\n"):
+            raise ValueError("Invalid session_id")
+
+        line = (json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+        with self._locked():
+            segment = self._active_segment(time.time())
+            path = self._path(segment)
+            if not self._ends_with_newline(path):
+                # 前回の書き込みが途中で止まっていれば、その残りと混ざらないよう改行を挟む
+                line = b"\n" + line
+            offset = self._write(path, line)
+            if line.startswith(b"\n"):
+                offset, line = offset + 1, line[1:]
+            self._write(self._path(INDEX_FILENAME),
+                        f"{session_id}\t{segment}\t{offset}\t{len(line)}\n".encode('utf-8'))
+
+        return {"session_id": session_id, "segment": segment, "offset": offset, "length": len(line)}
+
+    def append_session(self, session_id: str, events: Union[EventBuffer, Iterable[KeyEvent]],
+                       stats_data: StatisticsData, target_text: str, accuracy: float,
+                       kana_analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        完了したセッションを追記（CSVLogger の3つのCSVと同じ内容）
+
+        Args:
+            session_id: セッションID
+            events: キーイベントの列
+            stats_data: 統計データ
+            target_text: 目標テキスト
+            accuracy: 正解率
+            kana_analysis: かな別分析データ
+
+        Returns:
+            Dict: 追記した位置（append() と同じ）
+        """
+        return self.append({
+            "session_id": session_id,
+            "completed_at": datetime.now().isoformat(),
+            "target_text": target_text,
+            "events": list(event_rows(events)),
+            "summary": summary_rows(stats_data, target_text, accuracy),
+            "kana_analysis": kana_analysis_rows(kana_analysis),
+        })
+
+    def _refresh_index(self):
+        """インデックスの未読の行を読み込む（作り直されていれば最初から読む）"""
+        try:
+            f = open(self._path(INDEX_FILENAME), 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            if inode != self._index_inode:
+                self._index = {}
+                self._index_position = 0
+                self._index_inode = inode
+            f.seek(self._index_position)
+            data = f.read()
+
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].decode('utf-8').splitlines():
+            fields = line.split("\t")
+            if len(fields) == 4:
+                self._index[fields[0]] = (fields[1], int(fields[2]), int(fields[3]))
+        self._index_position += end
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        セッションの記録を取得（インデックスの位置から1行だけ読む）
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            Dict: 記録（ない・読めない場合は None）
+        """
+        with self._index_lock:
+            self._refresh_index()
+            entry = self._index.get(session_id)
+        if entry is None:
+            return None
+
+        segment, offset, length = entry
+        try:
+            with open(self._path(segment), 'rb') as f:
+                f.seek(offset)
+                return json.loads(f.read(length))
+        except (OSError, ValueError):
+            return None
+
+    def list_sessions(self, limit: int = 50, offset: int = 0) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        記録されたセッションの一覧を取得（新しい順）
+
+        Args:
+            limit: 最大件数
+            offset: 先頭から飛ばす件数
+
+        Returns:
+            Tuple[List[Dict], int]: ({"session_id", "segment", "offset", "length"} のリスト, 全件数)
+        """
+        with self._index_lock:
+            self._refresh_index()
+            entries = list(self._index.items())
+        page = entries[::-1][offset:offset + limit]
+        return [
+            {"session_id": session_id, "segment": segment, "offset": position, "length": length}
+            for session_id, (segment, position, length) in page
+        ], len(entries)
+
+    def _iter_lines(self, cursor: Optional[Cursor] = None) -> Iterator[Tuple[str, int, bytes]]:
+        """改行で終わる行を (セグメント, 行の位置, 行) で順に返す（最後のセグメントの書きかけの行で止まる）"""
+        segments = self.segments()
+        for segment in segments:
+            if cursor is not None and segment < cursor[0]:
+                continue
+            position = cursor[1] if cursor is not None and segment == cursor[0] else 0
+            with open(self._path(segment), 'rb') as f:
+                f.seek(position)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        # 途中で止まった書き込みの残り（最後のセグメントなら書き込み中）
+                        if segment == segments[-1]:
+                            return
+                        break
+                    yield segment, position, line
+                    position += len(line)
+
+    def iter_records(self, cursor: Optional[Cursor] = None) -> Iterator[Tuple[Dict[str, Any], Cursor]]:
+        """
+        記録を追記順に読む
+
+        Args:
+            cursor: 読み始める位置（前回返された位置、省略時は最初から）
+
+        Returns:
+            Iterator[Tuple[Dict, Cursor]]: (記録, その記録の次の位置)。
+                書きかけの行の手前で止まる
+        """
+        for segment, position, line in self._iter_lines(cursor):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                print(f'[WARN] Skipping broken journal record in {segment} at {position}')
+                continue
+            yield record, (segment, position + len(line))
+
+    def export_csv(self, session_id: str, kind: str) -> Optional[str]:
+        """
+        セッションの記録をCSVとして書き出す
+
+        Args:
+            session_id: セッションID
+            kind: 'events' / 'summary' / 'kana_analysis'
+
+        Returns:
+            str: CSVの内容（CSVLogger が保存するファイルと同じ、記録がない場合は None）
+
+        Raises:
+            ValueError: 不明な種類の場合
+        """
+        if kind not in EXPORT_KINDS:
+            raise ValueError(f"Unknown kind: {kind}")
+
+        record = self.get(session_id)
+        if record is None:
+            return None
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_KINDS[kind])
+        writer.writerows(record.get(kind, []))
+        return buffer.getvalue()
+
+    def rebuild_index(self) -> int:
+        """
+        セグメントを読み直してインデックスを作り直す（インデックスの破損・削除時）
+
+        Returns:
+            int: 記録の件数
+        """
+        with self._locked():
+            lines = []
+            for segment, position, line in self._iter_lines():
+                try:
+                    session_id = json.loads(line)["session_id"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+                lines.append(f"{session_id}\t{segment}\t{position}\t{len(line)}\n")
+
+            temp_path = self._path(INDEX_FILENAME + ".tmp")
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.writelines(lines)
+            os.replace(temp_path, self._path(INDEX_FILENAME))
+        return len(lines)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ジャーナルの統計を取得
+
+        Returns:
+            Dict: {"session_count", "segment_count", "total_bytes", "active_segment"}
+        """
+        with self._index_lock:
+            self._refresh_index()
+            session_count = len(self._index)
+        segments = self.segments()
+        return {
+            "session_count": session_count,
+            "segment_count": len(segments),
+            "total_bytes": sum(os.path.getsize(self._path(name)) for name in segments),
+            "active_segment": segments[-1] if segments else None,
+        }
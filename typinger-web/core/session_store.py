@@ -0,0 +1,506 @@
+"""
+session_store.py
+セッションストア
+
+タイピングセッションを上限数とアイドルTTL付きで保持します。
+放置・中断されたセッションが残り続けないよう、
+LRU 方式の追い出しとバックグラウンドの定期掃除を行います。
+
+保存先は次の2種類から選べます（同じインターフェース）:
+- SessionStore: プロセス内メモリ（単一ワーカー向け）
+- SQLiteSessionStore: SQLite（WALモード）の共有ファイル（gunicorn の複数ワーカー向け）
+
+用語解説:
+- LRU (Least Recently Used): 最も長く使われていないものから追い出す方式
+- TTL (Time To Live): 最後のアクセスから破棄されるまでの猶予時間
+- WAL (Write-Ahead Logging): 読み取りと書き込みを並行して行えるSQLiteのジャーナル方式
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+from core.statistics import KeyEvent, EventType, EventBuffer, iter_event_rows
+from core.typing_session import TypingSession
+
+
+def _current_rss_bytes() -> Optional[int]:
+    """プロセスの現在の常駐メモリ量（取得できない環境では None）"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+
+    try:
+        import resource
+        page_size = resource.getpagesize()
+    except ImportError:
+        page_size = 4096
+
+    return resident_pages * page_size
+
+
+class SessionStore:
+    """セッションストアクラス（スレッドセーフ）"""
+
+    def __init__(self, max_sessions: int = 1000, idle_ttl: float = 1800):
+        """
+        コンストラクタ
+
+        Args:
+            max_sessions: 同時に保持するセッションの上限数
+            idle_ttl: 最終アクセスからセッションを破棄するまでの秒数
+        """
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+
+        # セッションID -> (セッション, 最終アクセス時刻)。先頭ほど古い
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.lru_evictions = 0
+        self.idle_evictions = 0
+
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+    def put(self, session_id: str, session: TypingSession):
+        """
+        セッションを登録（上限を超えた場合は最も古いセッションを追い出す）
+
+        Args:
+            session_id: セッションID
+            session: タイピングセッション
+        """
+        with self._lock:
+            self._sessions[session_id] = (session, time.monotonic())
+            self._sessions.move_to_end(session_id)
+
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.lru_evictions += 1
+
+    def get(self, session_id: str) -> Optional[TypingSession]:
+        """
+        セッションを取得し、最終アクセス時刻を更新
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            TypingSession: セッション、存在しない場合はNone
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+
+            self._sessions[session_id] = (entry[0], time.monotonic())
+            self._sessions.move_to_end(session_id)
+            return entry[0]
+
+    @contextmanager
+    def edit(self, session_id: str) -> Iterator[Optional[TypingSession]]:
+        """
+        セッションを排他的に更新するコンテキストマネージャ
+
+        with store.edit(session_id) as session: の形で使い、
+        ブロック内の変更はブロックを抜けた時点で確定します。
+
+        Args:
+            session_id: セッションID
+
+        Yields:
+            TypingSession: セッション、存在しない場合はNone
+        """
+        session = self.get(session_id)
+        if session is None:
+            yield None
+            return
+
+        with session.lock:
+            yield session
+
+    def pop(self, session_id: str) -> Optional[TypingSession]:
+        """セッションを取り除いて返す（存在しない場合はNone）"""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            return entry[0] if entry else None
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def sweep(self) -> int:
+        """
+        アイドルTTLを過ぎたセッションを破棄
+
+        Returns:
+            int: 破棄したセッション数
+        """
+        deadline = time.monotonic() - self.idle_ttl
+        removed = 0
+
+        with self._lock:
+            # 先頭ほど最終アクセスが古いので、期限内のものが来たら終了
+            while self._sessions:
+                session_id, (_, last_access) = next(iter(self._sessions.items()))
+                if last_access > deadline:
+                    break
+                del self._sessions[session_id]
+                removed += 1
+
+            self.idle_evictions += removed
+
+        return removed
+
+    def start_sweeper(self, interval: float = 60):
+        """
+        定期掃除スレッドを起動
+
+        Args:
+            interval: 掃除の間隔（秒）
+        """
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        self._stop_event.clear()
+
+        def run():
+            while not self._stop_event.wait(interval):
+                self.sweep()
+
+        self._sweeper = threading.Thread(target=run, name="typinger-session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        """定期掃除スレッドを停止"""
+        self._stop_event.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ストアの状態を取得（ヘルスチェック用）
+
+        Returns:
+            Dict: セッション数・追い出し回数・メモリ使用量
+        """
+        with self._lock:
+            sessions = [entry[0] for entry in self._sessions.values()]
+            stats = {
+                "backend": "memory",
+                "active_sessions": len(sessions),
+                "max_sessions": self.max_sessions,
+                "idle_ttl_seconds": self.idle_ttl,
+                "evictions": {
+                    "lru": self.lru_evictions,
+                    "idle": self.idle_evictions,
+                },
+            }
+
+        stats["estimated_session_bytes"] = sum(s.estimate_memory() for s in sessions)
+        stats["process_rss_bytes"] = _current_rss_bytes()
+
+        return stats
+
+
+class SQLiteSessionStore:
+    """
+    SQLite 共有セッションストアクラス
+
+    セッション状態（イベント列を除く）を1行、イベントを1件1行で保存します。
+    キー入力1回あたりの処理は「状態1行の読み込み + イベント行の追加 +
+    状態1行の更新」で、それまでのイベント数に依存しません。
+    イベント列の全件読み込みは pop()（セッション完了時）でのみ行います。
+
+    接続はプロセス・スレッドごとに作成するため、gunicorn の
+    pre-fork ワーカー間で同じデータベースファイルを安全に共有できます。
+    """
+
+    def __init__(self, db_path: str, max_sessions: int = 1000, idle_ttl: float = 1800):
+        """
+        コンストラクタ
+
+        Args:
+            db_path: データベースファイルのパス
+            max_sessions: 同時に保持するセッションの上限数
+            idle_ttl: 最終アクセスからセッションを破棄するまでの秒数
+        """
+        self.db_path = db_path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+
+        self._local = threading.local()
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._initialize_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        """現在のプロセス・スレッド用の接続を取得"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        # fork 後に親プロセスの接続を使い回さない
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _initialize_schema(self):
+        """テーブルを作成"""
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                event_count INTEGER NOT NULL DEFAULT 0,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access);
+            CREATE TABLE IF NOT EXISTS session_events (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                event_type TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
+                virtual_key INTEGER NOT NULL,
+                character TEXT NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS store_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO store_counters (name, value) VALUES ('lru_evictions', 0);
+            INSERT OR IGNORE INTO store_counters (name, value) VALUES ('idle_evictions', 0);
+        """)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """書き込みトランザクション（BEGIN IMMEDIATE でワーカー間の更新を直列化）"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    def _delete_sessions(self, conn: sqlite3.Connection, session_ids: List[str]):
+        """セッションとそのイベントを削除"""
+        conn.executemany("DELETE FROM session_events WHERE session_id = ?",
+                         [(sid,) for sid in session_ids])
+        conn.executemany("DELETE FROM sessions WHERE session_id = ?",
+                         [(sid,) for sid in session_ids])
+
+    def _increment_counter(self, conn: sqlite3.Connection, name: str, amount: int):
+        if amount:
+            conn.execute("UPDATE store_counters SET value = value + ? WHERE name = ?",
+                         (amount, name))
+
+    @staticmethod
+    def _insert_events(conn: sqlite3.Connection, session_id: str,
+                       start_seq: int, events: Union[EventBuffer, List[KeyEvent]]):
+        conn.executemany(
+            "INSERT INTO session_events (session_id, seq, event_type, timestamp, virtual_key, character) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (session_id, start_seq + i, event_type.value, timestamp, virtual_key, character)
+                for i, (event_type, timestamp, virtual_key, character) in enumerate(iter_event_rows(events))
+            ],
+        )
+
+    def put(self, session_id: str, session: TypingSession):
+        """
+        セッションを登録（上限を超えた場合は最も古いセッションを追い出す）
+
+        Args:
+            session_id: セッションID
+            session: タイピングセッション
+        """
+        with self._transaction() as conn:
+            self._delete_sessions(conn, [session_id])
+            conn.execute(
+                "INSERT INTO sessions (session_id, state, event_count, last_access) VALUES (?, ?, ?, ?)",
+                (session_id, json.dumps(session.to_state(), ensure_ascii=False),
+                 len(session.events), time.time()),
+            )
+            self._insert_events(conn, session_id, 0, session.events)
+
+            overflow = conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions
+            if overflow > 0:
+                oldest = [row[0] for row in conn.execute(
+                    "SELECT session_id FROM sessions ORDER BY last_access LIMIT ?", (overflow,))]
+                self._delete_sessions(conn, oldest)
+                self._increment_counter(conn, 'lru_evictions', len(oldest))
+
+    def get(self, session_id: str) -> Optional[TypingSession]:
+        """
+        セッションの状態を取得（イベント列は含まない読み取り専用のコピー）
+
+        Args:
+            session_id: セッションID
+
+        Returns:
+            TypingSession: セッション、存在しない場合はNone
+        """
+        row = self._connect().execute(
+            "SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return None
+        return TypingSession.from_state(json.loads(row[0]))
+
+    @contextmanager
+    def edit(self, session_id: str) -> Iterator[Optional[TypingSession]]:
+        """
+        セッションを排他的に更新するコンテキストマネージャ
+
+        ブロック内で session.events に追加されたイベントと更新後の状態を
+        ブロックを抜けた時点で1トランザクションで保存します。
+
+        Args:
+            session_id: セッションID
+
+        Yields:
+            TypingSession: セッション、存在しない場合はNone
+        """
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT state, event_count FROM sessions WHERE session_id = ?",
+                (session_id,)).fetchone()
+            if row is None:
+                yield None
+                return
+
+            state, event_count = row
+            session = TypingSession.from_state(json.loads(state))
+            yield session
+
+            new_events = session.events
+            self._insert_events(conn, session_id, event_count, new_events)
+            conn.execute(
+                "UPDATE sessions SET state = ?, event_count = ?, last_access = ? WHERE session_id = ?",
+                (json.dumps(session.to_state(), ensure_ascii=False),
+                 event_count + len(new_events), time.time(), session_id),
+            )
+
+    def pop(self, session_id: str) -> Optional[TypingSession]:
+        """セッションをイベント列ごと読み込んで取り除く（存在しない場合はNone）"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT state FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+
+            events = EventBuffer()
+            for event_type, timestamp, virtual_key, character in conn.execute(
+                    "SELECT event_type, timestamp, virtual_key, character FROM session_events "
+                    "WHERE session_id = ? ORDER BY seq", (session_id,)):
+                events.add(EventType(event_type), timestamp, virtual_key, character)
+            self._delete_sessions(conn, [session_id])
+
+        return TypingSession.from_state(json.loads(row[0]), events)
+
+    def __contains__(self, session_id: str) -> bool:
+        row = self._connect().execute(
+            "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def sweep(self) -> int:
+        """
+        アイドルTTLを過ぎたセッションを破棄
+
+        Returns:
+            int: 破棄したセッション数
+        """
+        deadline = time.time() - self.idle_ttl
+
+        with self._transaction() as conn:
+            expired = [row[0] for row in conn.execute(
+                "SELECT session_id FROM sessions WHERE last_access <= ?", (deadline,))]
+            self._delete_sessions(conn, expired)
+            self._increment_counter(conn, 'idle_evictions', len(expired))
+
+        return len(expired)
+
+    def start_sweeper(self, interval: float = 60):
+        """
+        定期掃除スレッドを起動
+
+        Args:
+            interval: 掃除の間隔（秒）
+        """
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        self._stop_event.clear()
+
+        def run():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.sweep()
+                except sqlite3.OperationalError:
+                    # 他ワーカーの書き込みと競合した場合は次回に持ち越す
+                    pass
+
+        self._sweeper = threading.Thread(target=run, name="typinger-session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        """定期掃除スレッドを停止"""
+        self._stop_event.set()
+        if self._sweeper is not None:
+            self._sweeper.join()
+            self._sweeper = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        ストアの状態を取得（ヘルスチェック用）
+
+        Returns:
+            Dict: セッション数・追い出し回数・メモリ/ディスク使用量
+        """
+        conn = self._connect()
+        counters = dict(conn.execute("SELECT name, value FROM store_counters"))
+        db_bytes = sum(
+            os.path.getsize(path)
+            for path in (self.db_path, self.db_path + "-wal")
+            if os.path.exists(path)
+        )
+
+        return {
+            "backend": "sqlite",
+            "active_sessions": len(self),
+            "max_sessions": self.max_sessions,
+            "idle_ttl_seconds": self.idle_ttl,
+            "evictions": {
+                "lru": counters.get('lru_evictions', 0),
+                "idle": counters.get('idle_evictions', 0),
+            },
+            "database_bytes": db_bytes,
+            "process_rss_bytes": _current_rss_bytes(),
+        }
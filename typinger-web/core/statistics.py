@@ -6,12 +6,25 @@ statistics.py
 - WPM (Words Per Minute): 1分あたりの入力単語数（英語では5文字=1単語）
 - CPM (Characters Per Minute): 1分あたりの入力文字数
 - キー間隔 (Inter-Key Interval): 連続するキー入力間の時間差
+- オンライン集計 (Online Statistics): イベントを保持せず、追加のたびに件数・平均・分散などを
+  更新する集計方法。統計の計算はイベント数によらず一定時間で済む
+- Welford 法 (Welford's Algorithm): 平均と分散を1件ずつ数値的に安定して更新する方法
+- 列指向バッファ (Columnar Buffer): イベントを1件ずつのオブジェクトではなく、
+  項目（時刻・種別・キーコード・文字）ごとの配列で保持する形式
+- 逆引き索引 (Reverse Index): かな → そのかなを含むカテゴリー の辞書。
+  1文字につき辞書を1回引くだけでカテゴリーが分かる
 """
 
+import heapq
+import math
+from array import array
 from enum import Enum
-from typing import Dict, List
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from dataclasses import dataclass, field
-import statistics as stats
+
+from core.quantile_sketch import QuantileSketch
 
 
 class EventType(Enum):
@@ -29,13 +42,192 @@ class KeyEvent:
     character: str  # 実際の文字（ASCII）
 
 
+# EventType と列に格納する番号の対応
+_EVENT_TYPES = tuple(EventType)
+_EVENT_TYPE_CODES = {event_type: code for code, event_type in enumerate(_EVENT_TYPES)}
+
+# 1文字ではない character の目印（Unicode の範囲外のコードポイント）
+_EXTENDED_CHAR = 0x110000
+
+
+class EventBuffer:
+    """
+    キーイベントの列指向バッファクラス
+
+    時刻は array('q')、種別は array('B')、仮想キーコードは array('H')、
+    文字はコードポイントの array('I') に格納し、イベント1件あたり
+    KeyEvent を生成しません。1文字ではない文字列（まれ）のみ別の辞書に保持します。
+    """
+
+    __slots__ = ('timestamps', 'event_types', 'virtual_keys', '_chars', '_long_chars')
+
+    def __init__(self, events: Iterable[KeyEvent] = ()):
+        """
+        コンストラクタ
+
+        Args:
+            events: 初期イベント列
+        """
+        self.timestamps = array('q')
+        self.event_types = array('B')
+        self.virtual_keys = array('H')
+        self._chars = array('I')
+        self._long_chars: Dict[int, str] = {}
+        self.extend(events)
+
+    def add(self, event_type: EventType, timestamp: int, virtual_key: int, character: str):
+        """
+        イベントを1件追加
+
+        Args:
+            event_type: イベント種別
+            timestamp: 時刻（マイクロ秒）
+            virtual_key: 仮想キーコード（0～0xFFFF）
+            character: 文字
+
+        Raises:
+            ValueError: 仮想キーコードが16ビットに収まらない場合
+        """
+        if not 0 <= virtual_key <= 0xFFFF:
+            raise ValueError(f"Virtual key out of range: {virtual_key}")
+        if len(character) == 1:
+            code = ord(character)
+        else:
+            code = _EXTENDED_CHAR
+            self._long_chars[len(self._chars)] = character
+        self.timestamps.append(timestamp)
+        self.event_types.append(_EVENT_TYPE_CODES[event_type])
+        self.virtual_keys.append(virtual_key)
+        self._chars.append(code)
+
+    @staticmethod
+    def code_of(event_type: EventType) -> int:
+        """イベント種別の列（event_types）上の番号を取得"""
+        return _EVENT_TYPE_CODES[event_type]
+
+    def append(self, event: KeyEvent):
+        """KeyEvent を1件追加"""
+        self.add(event.event_type, event.timestamp, event.virtual_key, event.character)
+
+    def extend(self, events: Iterable[KeyEvent]):
+        """KeyEvent の列を追加"""
+        for event in events:
+            self.append(event)
+
+    def _char_at(self, index: int) -> str:
+        code = self._chars[index]
+        if code == _EXTENDED_CHAR:
+            return self._long_chars[index]
+        return chr(code)
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Tuple[EventType, int, int, str]]:
+        """
+        イベントを (種別, 時刻, 仮想キーコード, 文字) のタプルで順に返す
+
+        各列を直接たどるため、列のコピーや KeyEvent の生成は行いません
+        （CSV 出力・セッションストアへの保存用）。
+
+        Args:
+            start: 開始位置
+            stop: 終了位置（省略時は末尾まで）
+
+        Yields:
+            Tuple: (EventType, 時刻, 仮想キーコード, 文字)
+        """
+        columns = zip(self.event_types, self.timestamps, self.virtual_keys, self._chars)
+        for index, (type_code, timestamp, virtual_key, code) in enumerate(
+                islice(columns, start, stop), start):
+            character = self._long_chars[index] if code == _EXTENDED_CHAR else chr(code)
+            yield _EVENT_TYPES[type_code], timestamp, virtual_key, character
+
+    def columns(self) -> Tuple[array, array, array, array, Dict[int, str]]:
+        """
+        列をそのまま取得（コピーしない、バイナリログへの書き出し用）
+
+        Returns:
+            Tuple: (時刻, 種別の番号, 仮想キーコード, 文字のコードポイント, 1文字ではない文字の辞書)
+        """
+        return self.timestamps, self.event_types, self.virtual_keys, self._chars, self._long_chars
+
+    @classmethod
+    def from_columns(cls, timestamps: array, event_types: array, virtual_keys: array,
+                     chars: array, long_chars: Optional[Dict[int, str]] = None) -> 'EventBuffer':
+        """
+        列から EventBuffer を作成（columns() の逆、列はそのまま保持する）
+
+        Args:
+            timestamps: 時刻の array('q')
+            event_types: 種別の番号の array('B')
+            virtual_keys: 仮想キーコードの array('H')
+            chars: 文字のコードポイントの array('I')
+            long_chars: 1文字ではない文字（位置 → 文字列）
+
+        Returns:
+            EventBuffer: イベント列
+
+        Raises:
+            ValueError: 列の長さが揃っていない場合
+        """
+        if not len(timestamps) == len(event_types) == len(virtual_keys) == len(chars):
+            raise ValueError("Column lengths differ")
+        buffer = cls()
+        buffer.timestamps = timestamps
+        buffer.event_types = event_types
+        buffer.virtual_keys = virtual_keys
+        buffer._chars = chars
+        buffer._long_chars = dict(long_chars or {})
+        return buffer
+
+    def nbytes(self) -> int:
+        """列が使用しているおおよそのバイト数"""
+        return (
+            sum(column.buffer_info()[1] * column.itemsize
+                for column in (self.timestamps, self.event_types, self.virtual_keys, self._chars))
+            + sum(len(char) for char in self._long_chars.values())
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, index: int) -> KeyEvent:
+        """index 番目のイベントを KeyEvent として取得（負の値は末尾から）"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("EventBuffer index out of range")
+        return KeyEvent(_EVENT_TYPES[self.event_types[index]], self.timestamps[index],
+                        self.virtual_keys[index], self._char_at(index))
+
+    def __iter__(self) -> Iterator[KeyEvent]:
+        """KeyEvent として順に返す（既存の KeyEvent リストとの互換用）"""
+        for row in self.rows():
+            yield KeyEvent(*row)
+
+
+def iter_event_rows(events: Union[EventBuffer, Iterable[KeyEvent]]) -> Iterator[Tuple[EventType, int, int, str]]:
+    """
+    イベント列を (種別, 時刻, 仮想キーコード, 文字) のタプルで順に返す
+
+    EventBuffer は列を直接たどり、KeyEvent のリストは各イベントの属性を返します。
+
+    Args:
+        events: EventBuffer または KeyEvent の列
+
+    Returns:
+        Iterator[Tuple]: (EventType, 時刻, 仮想キーコード, 文字)
+    """
+    if isinstance(events, EventBuffer):
+        return events.rows()
+    return ((e.event_type, e.timestamp, e.virtual_key, e.character) for e in events)
+
+
 @dataclass
 class KanaInputData:
     """かな入力データ"""
     kana: str  # 仮名文字（例: "し", "しゅ"）
     romaji: str  # 対応するローマ字（例: "shi", "shu"）
-    start_time: int  # 先頭キーダウン（マイクロ秒）
-    end_time: int  # 最後のキーアップ（マイクロ秒）
+    start_time: int  # 入力開始（直前のかなの確定時刻、マイクロ秒）
+    end_time: int  # 確定（最後のキーダウン、マイクロ秒）
     
     @property
     def duration(self) -> int:
@@ -63,6 +255,8 @@ class StatisticsData:
     avg_inter_key_interval: float = 0.0  # 平均キー間隔（ミリ秒）
     min_inter_key_interval: float = 0.0  # 最小キー間隔（ミリ秒）
     max_inter_key_interval: float = 0.0  # 最大キー間隔（ミリ秒）
+    std_inter_key_interval: float = 0.0  # キー間隔の標準偏差（ミリ秒）
+    interval_sketch: Optional[QuantileSketch] = None  # キー間隔の分位点スケッチ（マイクロ秒、セッション間でマージ可能）
     
     # キー別平均時間
     avg_key_press_duration: Dict[str, float] = field(default_factory=dict)
@@ -102,31 +296,103 @@ class StatisticsCalculator:
         "W行": ["わ", "を", "ん"],
     }
 
-    def __init__(self):
-        self.events: List[KeyEvent] = []
+    def __init__(self, keep_events: bool = True):
+        """
+        コンストラクタ
+
+        Args:
+            keep_events: イベントを events に保持するか（False の場合は集計値のみ保持し、
+                長時間のセッションでもメモリ使用量が一定になる）
+        """
+        self.keep_events = keep_events
+        self.events = EventBuffer()
         self.session_start_time: int = 0
         self.kana_input_data: List[KanaInputData] = []
+        # かな別の (入力時間の合計（マイクロ秒）, 件数)（add_kana_data ごとに更新）
+        self.kana_totals: Dict[str, List[int]] = {}
+
+        # オンライン集計の状態（add_event ごとに更新）
+        self.event_count = 0
+        self.backspace_count = 0
+        self.last_timestamp: Optional[int] = None
+        self.interval_count = 0
+        self.interval_mean = 0.0  # マイクロ秒
+        self.interval_m2 = 0.0  # 平均からの偏差の2乗和（Welford 法）
+        self.interval_min = 0
+        self.interval_max = 0
+        self.interval_sketch = QuantileSketch()
 
     def add_event(self, event: KeyEvent):
-        """イベントを追加"""
-        if not self.events:
-            self.session_start_time = event.timestamp
-        self.events.append(event)
+        """イベントを追加（集計値を更新）"""
+        self.record(event.event_type, event.timestamp, event.virtual_key, event.character)
+
+    def record(self, event_type: EventType, timestamp: int, virtual_key: int, character: str):
+        """
+        イベントを項目ごとに受け取って追加（KeyEvent を生成しない）
+
+        Args:
+            event_type: イベント種別
+            timestamp: 時刻（マイクロ秒）
+            virtual_key: 仮想キーコード
+            character: 文字
+        """
+        if self.last_timestamp is None:
+            self.session_start_time = timestamp
+        else:
+            self._add_interval(timestamp - self.last_timestamp)
+        self.last_timestamp = timestamp
+
+        self.event_count += 1
+        if event_type == EventType.BACKSPACE:
+            self.backspace_count += 1
+
+        if self.keep_events:
+            self.events.add(event_type, timestamp, virtual_key, character)
+
+    def _add_interval(self, interval: int):
+        """キー間隔を1件追加（Welford 法で平均と分散を更新）"""
+        if self.interval_count == 0:
+            self.interval_min = self.interval_max = interval
+        else:
+            self.interval_min = min(self.interval_min, interval)
+            self.interval_max = max(self.interval_max, interval)
+
+        self.interval_count += 1
+        delta = interval - self.interval_mean
+        self.interval_mean += delta / self.interval_count
+        self.interval_m2 += delta * (interval - self.interval_mean)
+        self.interval_sketch.add(interval)
+
+    def get_interval_variance(self) -> float:
+        """
+        キー間隔の分散を取得（母分散、マイクロ秒の2乗）
+
+        Returns:
+            float: 分散（キー間隔がない場合は 0.0）
+        """
+        if self.interval_count == 0:
+            return 0.0
+        return self.interval_m2 / self.interval_count
 
     def calculate_statistics(self, correct_key_count: int, 
                            target_text_length: int) -> StatisticsData:
-        """統計を計算"""
-        if not self.events:
+        """
+        統計を計算
+
+        add_event で更新した集計値から求めるため、イベント数によらず一定時間で
+        計算できます。セッションの途中で呼び出して途中経過を得ることもできます。
+        """
+        if self.event_count == 0:
             return StatisticsData()
         
         stats_data = StatisticsData()
         
         # 基本情報
-        stats_data.total_duration = self.events[-1].timestamp - self.session_start_time
-        stats_data.total_key_count = len(self.events)
+        stats_data.total_duration = self.last_timestamp - self.session_start_time
+        stats_data.total_key_count = self.event_count
         stats_data.correct_key_count = correct_key_count
         stats_data.incorrect_key_count = stats_data.total_key_count - correct_key_count
-        stats_data.backspace_count = sum(1 for e in self.events if e.event_type == EventType.BACKSPACE)
+        stats_data.backspace_count = self.backspace_count
         
         # WPM/CPM計算（5文字=1単語）
         if stats_data.total_duration > 0:
@@ -137,59 +403,164 @@ class StatisticsCalculator:
                 stats_data.cpm_total = stats_data.total_key_count / minutes
                 stats_data.cpm_correct = stats_data.correct_key_count / minutes
         
-        # キー間隔計算
-        inter_key_intervals = []
-        for i in range(1, len(self.events)):
-            interval = self.events[i].timestamp - self.events[i-1].timestamp
-            inter_key_intervals.append(interval)
-        
-        if inter_key_intervals:
-            stats_data.avg_inter_key_interval = sum(inter_key_intervals) / len(inter_key_intervals) / 1000  # ミリ秒
-            stats_data.min_inter_key_interval = min(inter_key_intervals) / 1000
-            stats_data.max_inter_key_interval = max(inter_key_intervals) / 1000
+        # キー間隔（ミリ秒）
+        if self.interval_count:
+            stats_data.avg_inter_key_interval = self.interval_mean / 1000
+            stats_data.min_inter_key_interval = self.interval_min / 1000
+            stats_data.max_inter_key_interval = self.interval_max / 1000
+            stats_data.std_inter_key_interval = math.sqrt(self.get_interval_variance()) / 1000
+            stats_data.interval_sketch = self.interval_sketch
         
         return stats_data
 
-    def get_top_n_kana_by_time(self, kana_input_data: List[KanaInputData], n: int = 5) -> List[tuple]:
-        """かな入力時間のトップNを取得"""
-        if not kana_input_data:
-            return []
-        
-        # かな別の平均入力時間を計算
-        kana_times: Dict[str, List[int]] = {}
-        for data in kana_input_data:
-            if data.kana not in kana_times:
-                kana_times[data.kana] = []
-            kana_times[data.kana].append(data.duration)
-        
-        # 平均を計算
-        avg_times = [
-            (kana, sum(times) / len(times) / 1000)  # ミリ秒
-            for kana, times in kana_times.items()
-        ]
-        
-        # 時間でソート（降順）
-        avg_times.sort(key=lambda x: x[1], reverse=True)
-        
-        return avg_times[:n]
+    def add_kana_data(self, data: KanaInputData):
+        """確定したかなの入力データを追加し、かな別の集計を更新"""
+        self.kana_input_data.append(data)
+        totals = self.kana_totals.setdefault(data.kana, [0, 0])
+        totals[0] += data.duration
+        totals[1] += 1
+
+    def remove_kana_data(self, data: KanaInputData):
+        """Backspace で確定を取り消したかなの入力データを取り除く"""
+        if self.kana_input_data and self.kana_input_data[-1] is data:
+            self.kana_input_data.pop()
+        else:
+            self.kana_input_data.remove(data)
+        totals = self.kana_totals[data.kana]
+        totals[0] -= data.duration
+        totals[1] -= 1
+        if totals[1] == 0:
+            del self.kana_totals[data.kana]
+
+    def get_kana_analysis(self) -> Dict[str, Dict[str, float]]:
+        """
+        かな別の平均入力時間を取得（CSVLogger.save_kana_analysis_csv の形式）
+
+        Returns:
+            Dict: {かな: {'avg_time': 平均入力時間（ミリ秒）, 'count': 件数}}
+        """
+        return {
+            kana: {'avg_time': total / count / 1000, 'count': count}
+            for kana, (total, count) in self.kana_totals.items()
+        }
+
+    def get_top_n_kana_by_time(self, kana_input_data: Optional[List[KanaInputData]] = None,
+                               n: int = 5) -> List[tuple]:
+        """
+        かな入力時間のトップNを取得
+
+        かな別の合計と件数は add_kana_data で更新済みのため、呼び出しごとに
+        かなの種類数に比例する時間で上位N件をヒープで選びます。
+
+        Args:
+            kana_input_data: 集計するかな入力データ（省略時は add_kana_data で追加したもの）
+            n: 取得する件数
+
+        Returns:
+            List[tuple]: (かな, 平均入力時間（ミリ秒）) の入力時間の降順のリスト
+        """
+        totals = self.kana_totals
+        if kana_input_data is not None:
+            totals = {}
+            for data in kana_input_data:
+                entry = totals.setdefault(data.kana, [0, 0])
+                entry[0] += data.duration
+                entry[1] += 1
+
+        top = heapq.nlargest(
+            n,
+            ((total / count, kana) for kana, (total, count) in totals.items()),
+        )
+        return [(kana, average / 1000) for average, kana in top]  # ミリ秒
 
     def get_category_frequency(self, target_text: str) -> Dict[str, int]:
-        """カテゴリー別出現頻度を計算"""
-        frequency = {cat: 0 for cat in self.KANA_CATEGORIES}
-        
-        for char in target_text:
-            for category, kanas in self.KANA_CATEGORIES.items():
-                if char in kanas:
-                    frequency[category] += 1
-        
-        return frequency
+        """カテゴリー別出現頻度を計算（文ごとにキャッシュ）"""
+        return dict(_sentence_frequency(target_text)[0])
 
     def get_important_kana_frequency(self, target_text: str) -> Dict[str, int]:
-        """重要かな30文字の出現頻度を計算"""
-        frequency = {kana: 0 for kana in self.IMPORTANT_KANA}
-        
-        for char in target_text:
-            if char in frequency:
-                frequency[char] += 1
-        
-        return {k: v for k, v in frequency.items() if v > 0}
+        """
+        重要かな30文字の出現頻度を計算（文ごとにキャッシュ）
+
+        拗音（"しゃ" など）は2文字の並びを優先して数えます。
+        """
+        return dict(_sentence_frequency(target_text)[1])
+
+    def get_corpus_frequency(self, texts: Iterable[str]) -> Dict[str, Any]:
+        """
+        複数の文（シナリオ全体など）のカテゴリー別・重要かなの出現頻度を計算
+
+        文ごとの結果はキャッシュされるため、同じ文を含むシナリオを
+        繰り返し集計しても各文は1回しか走査しません。
+
+        Args:
+            texts: 目標テキストの列
+
+        Returns:
+            Dict: 文数、カテゴリー別頻度、重要かなの頻度、出現しなかった重要かな
+        """
+        category_frequency = {category: 0 for category in self.KANA_CATEGORIES}
+        important_frequency = {kana: 0 for kana in self.IMPORTANT_KANA}
+        sentence_count = 0
+
+        for text in texts:
+            categories, important = _sentence_frequency(text)
+            for category, count in categories:
+                category_frequency[category] += count
+            for kana, count in important:
+                important_frequency[kana] += count
+            sentence_count += 1
+
+        return {
+            "sentence_count": sentence_count,
+            "category_frequency": category_frequency,
+            "important_kana_frequency": {k: v for k, v in important_frequency.items() if v > 0},
+            "missing_important_kana": [k for k, v in important_frequency.items() if v == 0],
+        }
+
+
+# 文ごとの出現頻度のキャッシュの最大件数
+FREQUENCY_CACHE_SIZE = 8192
+
+
+def _build_category_index(categories: Dict[str, List[str]]) -> Dict[str, Tuple[str, ...]]:
+    """かな → そのかなを含むカテゴリー の逆引き索引を作成"""
+    index: Dict[str, Tuple[str, ...]] = {}
+    for category, kanas in categories.items():
+        for kana in kanas:
+            index[kana] = index.get(kana, ()) + (category,)
+    return index
+
+
+_CATEGORY_INDEX = _build_category_index(StatisticsCalculator.KANA_CATEGORIES)
+_IMPORTANT_KANA = frozenset(StatisticsCalculator.IMPORTANT_KANA)
+_IMPORTANT_KANA_MAX_LENGTH = max(len(kana) for kana in StatisticsCalculator.IMPORTANT_KANA)
+
+
+@lru_cache(maxsize=FREQUENCY_CACHE_SIZE)
+def _sentence_frequency(text: str) -> Tuple[Tuple[Tuple[str, int], ...], Tuple[Tuple[str, int], ...]]:
+    """
+    1文のカテゴリー別頻度と重要かなの頻度を計算
+
+    Returns:
+        Tuple: ((カテゴリー, 件数) の並び（全カテゴリー）, (重要かな, 件数) の並び（出現したもののみ）)
+    """
+    categories = {category: 0 for category in StatisticsCalculator.KANA_CATEGORIES}
+    for char in text:
+        for category in _CATEGORY_INDEX.get(char, ()):
+            categories[category] += 1
+
+    important: Dict[str, int] = {}
+    position = 0
+    while position < len(text):
+        # 長い並び（拗音）から順に照合
+        for length in range(_IMPORTANT_KANA_MAX_LENGTH, 0, -1):
+            kana = text[position:position + length]
+            if len(kana) == length and kana in _IMPORTANT_KANA:
+                important[kana] = important.get(kana, 0) + 1
+                position += length
+                break
+        else:
+            position += 1
+
+    ordered = tuple((kana, important[kana]) for kana in StatisticsCalculator.IMPORTANT_KANA if kana in important)
+    return tuple(categories.items()), ordered
@@ -0,0 +1,162 @@
+"""
+summary_index.py
+サマリCSVの索引
+
+出力ディレクトリのサマリCSV（typing_summary_*.csv）のファイル名・更新時刻・大きさと、
+解析済みの項目（Metric, Value）をJSONファイルに保存しておく索引です。
+ディレクトリの一覧と前回の索引を比べ、追加・更新されたファイルだけを読み直し、
+なくなったファイルは索引から除きます。索引はサーバーを再起動しても残り、
+ない（壊れている）場合はスレッドで並列にすべてのサマリCSVを読んで作り直します。
+
+用語解説:
+- 索引 (Index): 毎回ファイルを読まずに済むよう、読み込んだ結果を保存しておくもの
+- 差分検出: 前回の一覧と今回の一覧を比べて、追加・更新・削除されたファイルを求めること。
+  更新は更新時刻（ナノ秒）と大きさの組で判定する
+"""
+
+import csv
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 索引ファイル名（出力ディレクトリ内、CSV一覧に出ないようドットで始める）
+SUMMARY_INDEX_FILENAME = ".summary_index.json"
+
+# 索引ファイルの形式のバージョン（変わった場合は作り直す）
+SUMMARY_INDEX_VERSION = 1
+
+# これ以上のファイルを読む場合はスレッドで並列に読む
+PARALLEL_THRESHOLD = 32
+
+
+def _read_summary_metrics(path: str) -> Optional[Dict[str, str]]:
+    """サマリCSVの項目を読み込む（読めない場合は None）"""
+    try:
+        with open(path, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)  # ヘッダー
+            return {row[0]: row[1] for row in reader if len(row) >= 2}
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return None
+
+
+class SummaryIndex:
+    """
+    サマリCSVの増分索引クラス
+
+    refresh() はディレクトリを1回走査し、前回から変わったファイルだけを読みます。
+    """
+
+    def __init__(self, output_dir: str, index_path: Optional[str] = None,
+                 max_workers: Optional[int] = None):
+        """
+        コンストラクタ
+
+        Args:
+            output_dir: サマリCSVの出力ディレクトリ
+            index_path: 索引ファイルのパス（省略時は出力ディレクトリの .summary_index.json）
+            max_workers: 並列に読むスレッド数（省略時は ThreadPoolExecutor の既定）
+        """
+        self.output_dir = output_dir
+        self.index_path = index_path or os.path.join(output_dir, SUMMARY_INDEX_FILENAME)
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        # 直近の refresh() で読み直した・除いたファイル数と、累計の読み込み数
+        self.last_read = 0
+        self.last_removed = 0
+        self.total_reads = 0
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """索引ファイルを読み込む（ない・壊れている・形式が違う場合は空）"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get("version") != SUMMARY_INDEX_VERSION:
+            return {}
+        files = data.get("files")
+        return files if isinstance(files, dict) else {}
+
+    def _save(self):
+        """索引ファイルを書き込む（一時ファイルに書いてから置き換える）"""
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": SUMMARY_INDEX_VERSION, "files": self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            print(f"[WARN] Failed to save summary index {self.index_path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _scan(self) -> Dict[str, os.stat_result]:
+        """出力ディレクトリのサマリCSVと stat を取得"""
+        try:
+            with os.scandir(self.output_dir) as it:
+                return {
+                    entry.name: entry.stat() for entry in it
+                    if entry.name.startswith('typing_summary_') and entry.name.endswith('.csv')
+                    and entry.is_file()
+                }
+        except FileNotFoundError:
+            return {}
+
+    def _read_all(self, names: List[str]) -> List[Tuple[str, Optional[Dict[str, str]]]]:
+        """サマリCSVを読む（多い場合はスレッドで並列に読む）"""
+        paths = [os.path.join(self.output_dir, name) for name in names]
+        if len(paths) < PARALLEL_THRESHOLD:
+            metrics = [_read_summary_metrics(path) for path in paths]
+        else:
+            with ThreadPoolExecutor(self.max_workers) as executor:
+                metrics = list(executor.map(_read_summary_metrics, paths))
+        return list(zip(names, metrics))
+
+    def refresh(self) -> Dict[str, Dict[str, Any]]:
+        """
+        索引を更新して返す
+
+        Returns:
+            Dict[str, Dict]: ファイル名 → {"mtime_ns", "size", "created", "modified", "metrics"}
+        """
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+
+            stats = self._scan()
+            removed = [name for name in self._entries if name not in stats]
+            changed = [
+                name for name, stat in stats.items()
+                if (self._entries.get(name) or {}).get("mtime_ns") != stat.st_mtime_ns
+                or self._entries[name]["size"] != stat.st_size
+            ]
+
+            for name in removed:
+                del self._entries[name]
+            for name, metrics in self._read_all(changed):
+                if metrics is None:
+                    # 消えた・読めないファイルは次回読み直す
+                    self._entries.pop(name, None)
+                    continue
+                stat = stats[name]
+                self._entries[name] = {
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
+                    "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                    "metrics": metrics,
+                }
+
+            self.last_read = len(changed)
+            self.last_removed = len(removed)
+            self.total_reads += len(changed)
+            if changed or removed or not os.path.exists(self.index_path):
+                self._save()
+            return dict(self._entries)
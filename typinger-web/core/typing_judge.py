@@ -5,10 +5,21 @@ typing_judge.py
 用語解説:
 - rubi（ルビ）: 目標となるローマ字入力列（例: "konnichiwa"）
 - 逐次判定（Incremental Judgment）: 1文字ずつ入力を照合
+- 入力オートマトン（Input Automaton）: "si" / "shi" などの別綴りをすべて受理する状態遷移表。
+  判定は現在の状態からの遷移を1回引くだけ（core/input_automaton.py）
+- 入力済みかな（Typed Kana）: 入力を終えた入力単位のかな。判定と同じオートマトンの
+  単位の進捗（InputAutomaton.units_done / unit_offset）から求めるため、判定結果と食い違わない。
+  入力中の単位に打った文字（"k" など）は未確定のローマ字として別に返す
 """
 
 from enum import Enum
-from typing import List
+from typing import List, Optional
+
+from core.input_automaton import compile_automaton
+
+
+# 保存・保持する直近の状態の数（Backspace で戻れる数。超えた分は正解した文字列から求め直す）
+STATE_HISTORY = 32
 
 
 class JudgeResult(Enum):
@@ -30,10 +41,24 @@ class TypingJudge:
         """
         self.target_text = target_text
         self.target_rubi = target_rubi.lower()  # 小文字正規化
-        self.current_position = 0
+        # 同じルビのセッション間で共有されるコンパイル済みオートマトン
+        self.automaton = compile_automaton(self.target_rubi)
         self.correct_count = 0
         self.incorrect_count = 0
         self.input_history: List[char] = []
+        # 直近の正解した入力ごとの状態（Backspace で1つ戻す）と、正解した文字
+        self._states: List[int] = [self.automaton.start]
+        self._typed: List[str] = []
+
+    @property
+    def current_position(self) -> int:
+        """現在位置（正解として受理された文字数）"""
+        return len(self._typed)
+
+    @property
+    def current_state(self) -> int:
+        """現在のオートマトンの状態"""
+        return self._states[-1]
 
     def judge_char(self, input_char: str) -> JudgeResult:
         """
@@ -51,29 +76,46 @@ class TypingJudge:
         # 入力文字を小文字に正規化
         input_char_lower = input_char.lower()
         
-        # 現在位置の目標文字と比較
-        if self.current_position < len(self.target_rubi):
-            target_char = self.target_rubi[self.current_position]
-            
-            if input_char_lower == target_char:
-                self.correct_count += 1
-                self.current_position += 1
-                self.input_history.append(input_char)
-                return JudgeResult.CORRECT
-            else:
-                self.incorrect_count += 1
-                self.input_history.append(input_char)
-                return JudgeResult.INCORRECT
+        # 現在の状態から遷移できるか（いずれかの綴りの続きか）
+        next_state = self.automaton.step(self._states[-1], input_char_lower)
+        self.input_history.append(input_char)
         
-        return JudgeResult.ALREADY_DONE
+        if next_state is None:
+            self.incorrect_count += 1
+            return JudgeResult.INCORRECT
+        
+        self.correct_count += 1
+        self._states.append(next_state)
+        self._typed.append(input_char_lower)
+        if len(self._states) > 2 * STATE_HISTORY:
+            del self._states[:-STATE_HISTORY]
+        return JudgeResult.CORRECT
+
+    def backspace(self):
+        """直前に正解した1文字を取り消す（位置を1つ戻す）"""
+        if not self._typed:
+            return
+        self._typed.pop()
+        if len(self._states) > 1:
+            self._states.pop()
+        else:
+            # 保持している状態を使い切った場合は正解した文字列から求め直す
+            self._states = self._replay(self._typed)
+
+    def _replay(self, typed) -> List[int]:
+        """正解した文字列をオートマトン上で再生し、入力ごとの状態を求める"""
+        states = [self.automaton.start]
+        for char in typed:
+            states.append(self.automaton.step(states[-1], char))
+        return states
 
     def get_current_position(self) -> int:
         """現在位置を取得"""
         return self.current_position
 
     def get_target_length(self) -> int:
-        """目標ルビ長を取得"""
-        return len(self.target_rubi)
+        """目標ルビ長を取得（入力中の綴りでの長さ）"""
+        return self.current_position + len(self.get_remaining_rubi())
 
     def get_correct_count(self) -> int:
         """正解数を取得"""
@@ -85,7 +127,7 @@ class TypingJudge:
 
     def is_completed(self) -> bool:
         """完了判定"""
-        return self.current_position >= len(self.target_rubi)
+        return self.automaton.accepting[self._states[-1]]
 
     def get_accuracy(self) -> float:
         """
@@ -100,8 +142,36 @@ class TypingJudge:
         return self.correct_count / total
 
     def get_remaining_rubi(self) -> str:
-        """未入力のルビ部分を取得"""
-        return self.target_rubi[self.current_position:]
+        """未入力のルビ部分を取得（入力中の綴りに沿った残り）"""
+        return self.automaton.remaining(self._states[-1])
+
+    def get_display_rubi(self) -> str:
+        """表示用のルビを取得（入力済みの綴り + 残りの綴り）"""
+        return "".join(self._typed) + self.get_remaining_rubi()
+
+    def get_remaining_splice(self) -> Optional[list]:
+        """
+        目標ルビの続きと異なる残りの綴りを差し替え形式で取得
+
+        Returns:
+            Optional[list]: [入力中の単位の残りの綴り, 目標ルビ上の位置]
+                （残りの綴りが 目標ルビ[現在位置:] と同じ場合は None）
+        """
+        head, tail = self.automaton.remaining_splice(self._states[-1])
+        position = self.current_position
+        if tail - len(head) == position and self.target_rubi.startswith(head, position):
+            return None
+        return [head, tail]
+
+    def get_typed_kana(self) -> str:
+        """入力済みかなを取得（入力を終えた入力単位のかな、未確定のローマ字は含まない）"""
+        done = self.automaton.units_done[self._states[-1]]
+        return "".join(self.automaton.unit_kana[:done])
+
+    def get_pending_romaji(self) -> str:
+        """かなに確定していない入力中の単位のローマ字を取得"""
+        offset = self.automaton.unit_offset[self._states[-1]]
+        return "".join(self._typed[len(self._typed) - offset:])
 
     def get_target_text(self) -> str:
         """目標テキストを取得"""
@@ -113,22 +183,72 @@ class TypingJudge:
 
     def reset(self):
         """リセット"""
-        self.current_position = 0
         self.correct_count = 0
         self.incorrect_count = 0
         self.input_history = []
+        self._states = [self.automaton.start]
+        self._typed = []
+
+    def to_state(self) -> dict:
+        """判定状態を辞書に変換（入力履歴は含まない）"""
+        return {
+            "current_position": self.current_position,
+            "correct_count": self.correct_count,
+            "incorrect_count": self.incorrect_count,
+            "typed": "".join(self._typed),
+            "states": self._states[-STATE_HISTORY:],
+        }
+
+    def restore_state(self, state: dict):
+        """
+        to_state() で取得した判定状態を復元
+
+        保存した直近の状態をそのまま使うため、正解した文字列は再生しません。
+        states を含まない古い状態のみ、オートマトン上で正解した文字列を再生して求めます。
+        typed も含まない場合は目標ルビどおりに入力したものとみなします。
+        """
+        typed = state.get("typed", self.target_rubi[:state["current_position"]])
+        self._typed = list(typed)
+        states = state.get("states")
+        self._states = list(states) if states else self._replay(typed)
+        self.correct_count = state["correct_count"]
+        self.incorrect_count = state["incorrect_count"]
 
     def get_progress_display(self) -> dict:
         """進捗を表示用フォーマットで取得"""
         return {
             "target_text": self.target_text,
             "target_rubi": self.target_rubi,
+            "display_rubi": self.get_display_rubi(),
             "current_position": self.current_position,
-            "target_length": len(self.target_rubi),
-            "progress_percent": (self.current_position / len(self.target_rubi) * 100) if self.target_rubi else 0,
+            "target_length": self.get_target_length(),
+            "progress_percent": (self.current_position / self.get_target_length() * 100) if self.target_rubi else 0,
             "correct_count": self.correct_count,
             "incorrect_count": self.incorrect_count,
             "accuracy": self.get_accuracy(),
             "remaining_rubi": self.get_remaining_rubi(),
+            "typed_kana": self.get_typed_kana(),
+            "pending_romaji": self.get_pending_romaji(),
+            "is_completed": self.is_completed(),
+        }
+
+    def get_progress_delta(self) -> dict:
+        """
+        進捗の差分を取得（キー入力ごとの応答用）
+
+        目標テキスト・ルビはセッション開始時に送信済みのため含めません。
+        残りルビや正解率はクライアント側で位置とカウントから計算します。
+        残りの綴りが 目標ルビ[現在位置:] と異なる場合（"shi" を "si" で入力した後など）のみ、
+        remaining_splice: [先頭, 位置] を含めます。残りの綴りは 先頭 + 目標ルビ[位置:] で、
+        先頭は入力中の単位の残りだけのため文の長さによらず数文字です。
+        """
+        delta = {
+            "current_position": self.current_position,
+            "correct_count": self.correct_count,
+            "incorrect_count": self.incorrect_count,
             "is_completed": self.is_completed(),
         }
+        splice = self.get_remaining_splice()
+        if splice is not None:
+            delta["remaining_splice"] = splice
+        return delta
@@ -0,0 +1,354 @@
+"""
+typing_session.py
+タイピングセッション管理
+
+1セッション分の判定器・統計計算器・イベント列をまとめて保持し、
+キー入力（1件ずつ、またはバッチ）を順番に適用します。
+
+用語解説:
+- バッチ判定（Batch Judgment）: 複数のキー入力をまとめて1回のリクエストで判定
+- シーケンス番号（Sequence Number）: クライアントがキー入力ごとに振る連番（1始まり）。
+  到着順が入れ替わっても番号順に適用し、重複は無視する
+- 累積ACK（Cumulative Acknowledgement）: 「この番号までは適用済み」を示す番号
+- 再生検証（Replay Verification）: クライアント側で判定したイベント列をサーバーで
+  再度適用し、報告された結果と一致するか確認すること
+"""
+
+import math
+import sys
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from core.typing_judge import TypingJudge, JudgeResult
+from core.kana_aligner import KanaAligner
+from core.live_stats import LiveStats
+from core.statistics import StatisticsCalculator, KeyEvent, EventType, EventBuffer, iter_event_rows
+
+
+# Backspace の仮想キーコード（VK_BACK）
+VK_BACK = 8
+
+# 受け付ける時刻（ミリ秒）の絶対値の上限（JavaScript で正確に表せる整数の範囲）
+MAX_TIMESTAMP_MS = 2 ** 53
+
+# 受け付ける文字の最大コードポイント（仮想キーコードの列は16ビットのため基本多言語面まで）
+MAX_CHAR_CODE = 0xFFFF
+
+# バッチ1回あたりの最大イベント数
+MAX_BATCH_EVENTS = 500
+
+# 完了時の再生検証で受け付ける最大イベント数
+MAX_REPLAY_EVENTS = 5000
+
+# 並べ替えバッファに保持できる先行イベントの範囲（次に適用する番号からの距離）
+REORDER_WINDOW = 64
+
+
+class TypingSession:
+    """タイピングセッションクラス"""
+
+    def __init__(self, scenario_file: str, target_text: str, target_rubi: str):
+        """
+        コンストラクタ
+
+        Args:
+            scenario_file: シナリオファイル名
+            target_text: 目標テキスト（日本語）
+            target_rubi: 目標ルビ（ローマ字）
+        """
+        self.scenario_file = scenario_file
+        self.target_text = target_text
+        self.target_rubi = target_rubi
+        self.judge = TypingJudge(target_text, target_rubi)
+        # イベントはセッション側で保持するため、統計計算器は集計値のみ持つ
+        self.stats_calculator = StatisticsCalculator(keep_events=False)
+        # セッションで唯一のイベント列（CSV 出力・セッションストアはここから読む）
+        self.events = EventBuffer()
+        # 直近の時間窓での速度・正解率（ライブ統計）
+        self.live_stats = LiveStats()
+        # かな単位の入力時間（確定したかなを統計計算器に渡す）
+        self.kana_aligner = KanaAligner(self.judge.automaton)
+        self.start_time = datetime.now()
+        # 同一セッションへの同時入力を直列化するロック
+        self.lock = threading.Lock()
+        # シーケンス番号付き入力の状態（次に適用する番号と、先着した後続イベント）
+        self.next_seq = 1
+        self.reorder_buffer: Dict[int, Dict[str, Any]] = {}
+
+    def _record_event(self, event_type: EventType, timestamp: int, virtual_key: int, character: str):
+        """イベントを統計計算器とイベント列に記録"""
+        self.stats_calculator.record(event_type, timestamp, virtual_key, character)
+        self.events.add(event_type, timestamp, virtual_key, character)
+
+    def apply_char(self, char: str, timestamp: float) -> JudgeResult:
+        """
+        1文字の入力を判定して記録
+
+        Args:
+            char: 入力文字
+            timestamp: 入力時刻（ミリ秒単位、セッション開始からの経過時間。小数も可）
+
+        Returns:
+            JudgeResult: 判定結果
+        """
+        micros = int(timestamp * 1000)  # マイクロ秒に変換
+        result = self.judge.judge_char(char)
+        self.live_stats.record(micros, result.value)
+
+        if result == JudgeResult.CORRECT:
+            for data in self.kana_aligner.advance(self.judge.current_state, char.lower(), micros):
+                self.stats_calculator.add_kana_data(data)
+
+        self._record_event(EventType.KEY_DOWN, micros, ord(char[0].upper()[0]), char)
+
+        return result
+
+    def apply_backspace(self, timestamp: float):
+        """
+        Backspace を処理して記録
+
+        Args:
+            timestamp: 入力時刻（ミリ秒単位、小数も可）
+        """
+        micros = int(timestamp * 1000)
+        # 直前に正解した1文字を取り消す
+        self.judge.backspace()
+        self.live_stats.record(micros, "backspace")
+        for data in self.kana_aligner.backspace(self.judge.current_state):
+            self.stats_calculator.remove_kana_data(data)
+
+        self._record_event(EventType.BACKSPACE, micros, VK_BACK, '\b')
+
+    def apply_batch(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        キー入力イベント列を順番にまとめて適用
+
+        各イベントは {"char": "k", "timestamp": 123} または
+        {"type": "backspace", "timestamp": 150} の形式です。
+        事前に validate_batch() で検証しておく必要があります。
+
+        Args:
+            batch: キー入力イベントのリスト（入力順）
+
+        Returns:
+            List[Dict]: イベントごとの判定結果
+        """
+        return [{"result": self._apply_event(item)} for item in batch]
+
+    def _apply_event(self, item: Dict[str, Any]) -> str:
+        """イベント1件を適用して判定結果の文字列を返す"""
+        timestamp = item.get('timestamp', 0)
+
+        if item.get('type') == 'backspace':
+            self.apply_backspace(timestamp)
+            return "backspace"
+
+        return self.apply_char(item['char'], timestamp).value
+
+    def submit(self, seq: int, item: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        シーケンス番号付きのイベントを受け付ける
+
+        番号が次に適用すべきものなら、並べ替えバッファに溜まっている
+        後続イベントと合わせて番号順に適用します。先着したイベントは
+        バッファに保持し、適用済み・保持済みの番号は重複として無視します。
+
+        Args:
+            seq: シーケンス番号（1始まり）
+            item: apply_batch() と同じ形式のイベント
+
+        Returns:
+            List[Dict]: 今回適用されたイベントの番号と判定結果
+
+        Raises:
+            ValueError: 番号が並べ替えウィンドウの範囲外の場合
+        """
+        if seq >= self.next_seq + REORDER_WINDOW:
+            raise ValueError(f"Sequence {seq} is outside the reorder window")
+
+        # 重複（再送）は無視
+        if seq < self.next_seq or seq in self.reorder_buffer:
+            return []
+
+        self.reorder_buffer[seq] = item
+
+        applied = []
+        while self.next_seq in self.reorder_buffer:
+            result = self._apply_event(self.reorder_buffer.pop(self.next_seq))
+            applied.append({"seq": self.next_seq, "result": result})
+            self.next_seq += 1
+
+        return applied
+
+    def get_ack(self) -> int:
+        """累積ACK（適用済みの最大シーケンス番号）を取得"""
+        return self.next_seq - 1
+
+    def replay(self, batch: List[Dict[str, Any]]) -> 'TypingSession':
+        """
+        同じ目標の新しいセッションにイベント列を最初から適用
+
+        クライアント側判定モードの完了時に使用します。
+        サーバー側で受け付けたイベントは使わず、送信されたイベント列のみで判定します。
+
+        Args:
+            batch: apply_batch() と同じ形式のイベント列
+
+        Returns:
+            TypingSession: イベント列を適用したセッション
+        """
+        replayed = TypingSession(self.scenario_file, self.target_text, self.target_rubi)
+        replayed.start_time = self.start_time
+        replayed.apply_batch(batch)
+        return replayed
+
+    def verify_client_result(self, client_result: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        クライアントが報告した判定結果をサーバーの判定結果と比較
+
+        Args:
+            client_result: get_progress_delta() と同じ形式の判定結果
+
+        Returns:
+            Dict: 一致しなかった項目（一致した場合は空）
+        """
+        server_result = self.judge.get_progress_delta()
+        return {
+            key: {"client": client_result.get(key), "server": value}
+            for key, value in server_result.items()
+            if client_result.get(key) != value
+        }
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        イベント列を除いたセッション状態を辞書に変換（共有ストア保存用）
+
+        Returns:
+            Dict: JSON に変換可能なセッション状態
+        """
+        return {
+            "scenario_file": self.scenario_file,
+            "target_text": self.target_text,
+            "target_rubi": self.target_rubi,
+            "start_time": self.start_time.isoformat(),
+            "judge": self.judge.to_state(),
+            "next_seq": self.next_seq,
+            "reorder_buffer": {str(seq): item for seq, item in self.reorder_buffer.items()},
+            "live_stats": self.live_stats.to_state(),
+            "kana_aligner": self.kana_aligner.to_state(),
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any],
+                   events: Optional[Union[EventBuffer, Iterable[KeyEvent]]] = None) -> 'TypingSession':
+        """
+        to_state() で保存した状態からセッションを復元
+
+        Args:
+            state: セッション状態
+            events: 保存済みのイベント列（省略時は空のまま復元）
+
+        Returns:
+            TypingSession: 復元したセッション
+        """
+        session = cls(state["scenario_file"], state["target_text"], state["target_rubi"])
+        session.start_time = datetime.fromisoformat(state["start_time"])
+        session.judge.restore_state(state["judge"])
+        session.next_seq = state.get("next_seq", 1)
+        session.reorder_buffer = {
+            int(seq): item for seq, item in state.get("reorder_buffer", {}).items()
+        }
+        if "live_stats" in state:
+            session.live_stats = LiveStats.from_state(state["live_stats"])
+        session.kana_aligner.restore_state(state.get("kana_aligner", {}))
+
+        # 確定したかなは保存していないため、イベント列を判定し直して求める
+        replay_judge = TypingJudge(session.target_text, session.target_rubi)
+        replay_aligner = KanaAligner(replay_judge.automaton)
+        for event_type, timestamp, virtual_key, character in iter_event_rows(events or ()):
+            session._record_event(event_type, timestamp, virtual_key, character)
+            if event_type == EventType.KEY_DOWN:
+                session.judge.input_history.append(character)
+                if replay_judge.judge_char(character) == JudgeResult.CORRECT:
+                    replay_aligner.advance(replay_judge.current_state, character.lower(), timestamp)
+            elif event_type == EventType.BACKSPACE:
+                replay_judge.backspace()
+                replay_aligner.backspace(replay_judge.current_state)
+        for data in replay_aligner.completed:
+            session.stats_calculator.add_kana_data(data)
+
+        return session
+
+    def estimate_memory(self) -> int:
+        """
+        セッションのおおよそのメモリ使用量を取得
+
+        統計計算器は集計値のみを持つため、イベントは列指向バッファの使用量で見積もります。
+
+        Returns:
+            int: 推定バイト数
+        """
+        return (
+            sys.getsizeof(self)
+            + sys.getsizeof(self.target_text)
+            + sys.getsizeof(self.target_rubi) * 2
+            + self.events.nbytes()
+        )
+
+    @staticmethod
+    def validate_batch(batch: Any, max_events: int = MAX_BATCH_EVENTS) -> str:
+        """
+        バッチの形式を検証
+
+        Args:
+            batch: リクエストで受け取ったイベント列
+            max_events: 受け付ける最大イベント数
+
+        Returns:
+            str: エラーメッセージ（問題がなければ空文字列）
+        """
+        if not isinstance(batch, list):
+            return "Events must be a list"
+
+        if len(batch) > max_events:
+            return f"Too many events (max {max_events})"
+
+        for index, item in enumerate(batch):
+            if not isinstance(item, dict):
+                return f"events[{index}] must be an object"
+
+            error = TypingSession.validate_event(item)
+            if error:
+                return f"events[{index}]: {error}"
+
+        return ""
+
+    @staticmethod
+    def validate_event(item: Dict[str, Any]) -> str:
+        """
+        キー入力イベント1件（apply_batch() と同じ形式）を検証
+
+        Args:
+            item: キー入力イベント
+
+        Returns:
+            str: エラーメッセージ（問題がなければ空文字列）
+        """
+        # bool は int の派生型のため数値として扱わない
+        timestamp = item.get('timestamp', 0)
+        if isinstance(timestamp, bool) or not isinstance(timestamp, (int, float)):
+            return "Timestamp must be a number"
+        if not math.isfinite(timestamp) or abs(timestamp) >= MAX_TIMESTAMP_MS:
+            return "Timestamp out of range"
+
+        if item.get('type') == 'backspace':
+            return ""
+
+        char = item.get('char')
+        if not isinstance(char, str) or not char:
+            return "Character required"
+        if ord(char[0].upper()[0]) > MAX_CHAR_CODE:
+            return "Character must be in the Basic Multilingual Plane"
+
+        return ""
@@ -0,0 +1,137 @@
+"""
+realtime_server.py
+Typinger Web - キー入力用 WebSocket サーバー
+
+asyncio ベースの WebSocket サーバーで、タイピングセッションのキー入力を
+常時接続の1フレーム単位で受け付けます。開発用サーバー（python app.py）では
+Flask アプリと同じプロセス内のバックグラウンドスレッドで起動し、セッション（app.sessions）を共有します。
+
+gunicorn などで動かす場合はワーカーの中では起動しないため、別プロセスとして起動します
+（SESSION_BACKEND=sqlite でセッションをワーカーと共有し、アプリ側には WS_SEPARATE=1 を設定）:
+
+    python realtime_server.py
+
+接続URL: ws://<host>:<port>/session/<session_id>
+フレーム形式は core/keystroke_channel.py を参照してください。
+"""
+
+import asyncio
+import sys
+import threading
+
+try:
+    import websockets
+except ImportError:  # websockets 未インストール時は HTTP のみで動作
+    websockets = None
+
+from core.keystroke_channel import KeystrokeChannel, encode_frame, MAX_FRAME_SIZE
+
+
+SESSION_PATH_PREFIX = "/session/"
+
+
+def is_available() -> bool:
+    """WebSocket サーバーが利用可能か（websockets がインストール済みか）"""
+    return websockets is not None
+
+
+async def _handle_connection(websocket, sessions):
+    """1接続（=1セッション）分のフレームを処理"""
+    path = websocket.path
+    if not path.startswith(SESSION_PATH_PREFIX):
+        await websocket.close(code=4404, reason="Not Found")
+        return
+
+    session_id = path[len(SESSION_PATH_PREFIX):]
+    if session_id not in sessions:
+        await websocket.send(encode_frame({"e": "Session not found"}))
+        await websocket.close(code=4404, reason="Session not found")
+        return
+
+    channel = KeystrokeChannel(sessions, session_id)
+    async for frame in websocket:
+        await websocket.send(channel.handle_frame(frame))
+
+
+def _serve(sessions, host: str, port: int):
+    """WebSocket サーバーを作成（await すると待ち受けを開始）"""
+    return websockets.serve(
+        lambda websocket: _handle_connection(websocket, sessions),
+        host,
+        port,
+        max_size=MAX_FRAME_SIZE,
+        compression=None,  # 数十バイトのフレームなので圧縮しない
+    )
+
+
+def start_in_background(sessions, host: str, port: int) -> threading.Thread:
+    """
+    WebSocket サーバーをバックグラウンドスレッドで起動
+
+    Args:
+        sessions: セッションストア（Flask と共有）
+        host: 待ち受けホスト
+        port: 待ち受けポート
+
+    Returns:
+        threading.Thread: サーバースレッド
+    """
+    if not is_available():
+        raise RuntimeError("websockets is not installed")
+
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    errors = []
+
+    def run():
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(_serve(sessions, host, port))
+        except OSError as e:
+            errors.append(e)
+            return
+        finally:
+            ready.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, name="typinger-realtime", daemon=True)
+    thread.start()
+    ready.wait()
+
+    if errors:
+        raise errors[0]
+
+    return thread
+
+
+def main():
+    """
+    WebSocket サーバーを単独のプロセスとして起動
+
+    セッションは SESSION_DB_PATH の SQLite データベースを通じて
+    gunicorn のワーカーと共有します。
+    """
+    from config import get_config
+    from core.session_store import SQLiteSessionStore
+
+    config = get_config()
+    if not config.WS_PORT:
+        sys.exit('WS_PORT is not set')
+    if not is_available():
+        sys.exit('websockets is not installed')
+    if config.SESSION_BACKEND != 'sqlite':
+        sys.exit('SESSION_BACKEND=sqlite is required to share sessions with the app workers')
+
+    sessions = SQLiteSessionStore(config.SESSION_DB_PATH,
+                                  config.SESSION_MAX_COUNT, config.SESSION_IDLE_TTL)
+
+    async def serve_forever():
+        async with _serve(sessions, config.WS_HOST, config.WS_PORT):
+            print(f'[REALTIME] WebSocket server listening on port {config.WS_PORT}')
+            await asyncio.Future()
+
+    asyncio.run(serve_forever())
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,10 @@ class AdminDashboard {
     constructor() {
         this.currentFile = null;
         this.fileList = [];
+        // ファイル一覧のページ（サーバー側でタイプの絞り込みとページ分割を行う）
+        this.filePageSize = 50;
+        this.fileOffset = 0;
+        this.fileTotal = 0;
         this.init();
     }
 
@@ -26,6 +30,8 @@ class AdminDashboard {
 
         // ファイル一覧
         document.getElementById('file-type-filter').addEventListener('change', () => this.filterFiles());
+        document.getElementById('btn-files-prev').addEventListener('click', () => this.changeFilePage(-1));
+        document.getElementById('btn-files-next').addEventListener('click', () => this.changeFilePage(1));
 
         // ログビューア
         document.getElementById('btn-load-file').addEventListener('click', () => this.loadSelectedFile());
@@ -76,11 +82,26 @@ class AdminDashboard {
     }
 
     displayDashboard(summary) {
-        // 統計カードを更新
-        document.getElementById('stat-total-files').textContent = summary.total_csv_files;
-        document.getElementById('stat-events-files').textContent = summary.file_types.events;
-        document.getElementById('stat-summary-files').textContent = summary.file_types.summary;
-        document.getElementById('stat-total-size').textContent = this.formatFileSize(summary.total_size_bytes);
+        // 統計カードを更新（結果ストアがある場合はファイル数ではなくセッションの集計を表示）
+        if (summary.sessions) {
+            const sessions = summary.sessions;
+            const cards = [
+                ['stat-total-files', '総セッション数', sessions.session_count],
+                ['stat-events-files', '平均WPM', sessions.avg_wpm_correct ?? '-'],
+                ['stat-summary-files', '平均正解率', sessions.avg_accuracy_percent === null ? '-' : `${sessions.avg_accuracy_percent}%`],
+                ['stat-total-size', '合計入力時間', `${sessions.total_duration_seconds}秒`],
+            ];
+            cards.forEach(([id, title, value]) => {
+                const element = document.getElementById(id);
+                element.previousElementSibling.textContent = title;
+                element.textContent = value;
+            });
+        } else {
+            document.getElementById('stat-total-files').textContent = summary.total_csv_files;
+            document.getElementById('stat-events-files').textContent = summary.file_types.events;
+            document.getElementById('stat-summary-files').textContent = summary.file_types.summary;
+            document.getElementById('stat-total-size').textContent = this.formatFileSize(summary.total_size_bytes);
+        }
 
         // 最新セッション情報を表示
         if (summary.latest_summary) {
@@ -110,19 +131,46 @@ class AdminDashboard {
 
     // ========== ファイル一覧 ==========
     async loadFileList() {
+        const filter = document.getElementById('file-type-filter').value;
+        const params = new URLSearchParams({
+            type: filter,
+            offset: this.fileOffset,
+            limit: this.filePageSize,
+        });
+
         try {
-            const response = await fetch('/api/admin/csv-files');
+            const response = await fetch(`/api/admin/csv-files?${params}`);
             const data = await response.json();
 
             if (data.ok) {
+                // 削除などで現在のページが範囲外になった場合は最後のページに戻す
+                if (data.files.length === 0 && this.fileOffset > 0 && data.total_count > 0) {
+                    this.fileOffset = Math.floor((data.total_count - 1) / this.filePageSize) * this.filePageSize;
+                    return this.loadFileList();
+                }
                 this.fileList = data.files;
+                this.fileTotal = data.total_count;
                 this.displayFileList(this.fileList);
+                this.displayFilePager();
             }
         } catch (error) {
             console.error('Error loading file list:', error);
         }
     }
 
+    displayFilePager() {
+        const start = this.fileTotal === 0 ? 0 : this.fileOffset + 1;
+        const end = Math.min(this.fileOffset + this.filePageSize, this.fileTotal);
+        document.getElementById('files-page-info').textContent = `${start} - ${end} / ${this.fileTotal}件`;
+        document.getElementById('btn-files-prev').disabled = this.fileOffset === 0;
+        document.getElementById('btn-files-next').disabled = end >= this.fileTotal;
+    }
+
+    changeFilePage(direction) {
+        this.fileOffset = Math.max(0, this.fileOffset + direction * this.filePageSize);
+        this.loadFileList();
+    }
+
     displayFileList(files) {
         const tbody = document.getElementById('files-tbody');
         tbody.innerHTML = '';
@@ -152,20 +200,15 @@ class AdminDashboard {
     }
 
     filterFiles() {
-        const filter = document.getElementById('file-type-filter').value;
-        
-        if (filter === 'all') {
-            this.displayFileList(this.fileList);
-        } else {
-            const filtered = this.fileList.filter(f => f.file_type === filter);
-            this.displayFileList(filtered);
-        }
+        this.fileOffset = 0;
+        this.loadFileList();
     }
 
     // ========== ログビューア ==========
     async loadFileSelectOptions() {
         try {
-            const response = await fetch('/api/admin/csv-files');
+            // 新しい順に最大200件（全件は取得しない）
+            const response = await fetch('/api/admin/csv-files?limit=200');
             const data = await response.json();
 
             if (data.ok) {
@@ -238,7 +281,7 @@ class AdminDashboard {
     // ========== 統計 ==========
     async loadStatistics() {
         try {
-            const response = await fetch('/api/admin/export-summary');
+            const response = await fetch('/api/admin/export-summary?limit=10');
             const data = await response.json();
 
             if (data.ok) {
@@ -247,6 +290,68 @@ class AdminDashboard {
         } catch (error) {
             console.error('Error loading statistics:', error);
         }
+
+        this.loadBigramHeatmap();
+    }
+
+    async loadBigramHeatmap() {
+        try {
+            const response = await fetch('/api/admin/bigram-latency?min_count=3');
+            const data = await response.json();
+
+            if (data.ok) {
+                this.displayBigramHeatmap(data.heatmap);
+            }
+        } catch (error) {
+            console.error('Error loading bigram latency:', error);
+        }
+    }
+
+    displayBigramHeatmap(heatmap) {
+        const container = document.getElementById('bigram-heatmap');
+        if (heatmap.keys.length === 0) {
+            container.innerHTML = '<p>キー遷移のデータがありません</p>';
+            return;
+        }
+
+        // 平均遅延が最大のセルを最も濃く表示
+        const values = heatmap.mean_ms.flat().filter(value => value !== null);
+        const maxValue = Math.max(...values, 1);
+
+        // ラベルは "<" や "&" などの記号キーを含むため、HTML として組み立てずに textContent で設定する
+        const table = document.createElement('table');
+        table.className = 'heatmap-table';
+        const headRow = table.createTHead().insertRow();
+        const corner = document.createElement('th');
+        corner.textContent = '前＼次';
+        headRow.appendChild(corner);
+        heatmap.labels.forEach(label => {
+            const th = document.createElement('th');
+            th.textContent = label;
+            headRow.appendChild(th);
+        });
+
+        const body = table.createTBody();
+        heatmap.labels.forEach((label, row) => {
+            const tr = body.insertRow();
+            const th = document.createElement('th');
+            th.textContent = label;
+            tr.appendChild(th);
+            heatmap.mean_ms[row].forEach((mean, column) => {
+                const td = tr.insertCell();
+                if (mean === null) {
+                    return;
+                }
+                const alpha = (mean / maxValue).toFixed(2);
+                td.style.background = `rgba(220, 53, 69, ${alpha})`;
+                td.title = `${label} → ${heatmap.labels[column]}: 平均 ${mean}ms / p90 ${heatmap.p90_ms[row][column]}ms / ${heatmap.count[row][column]}回`;
+                td.textContent = Math.round(mean);
+            });
+        });
+
+        const caption = document.createElement('p');
+        caption.textContent = `${heatmap.transition_count} 回のキー遷移（平均遅延 ms、3回以上の組のみ）`;
+        container.replaceChildren(caption, table);
     }
 
     displayStatistics(statsData) {
@@ -260,9 +365,9 @@ class AdminDashboard {
             <div class="sessions-list">
         `;
 
-        // セッションを逆順（最新から）でリスト化
+        // セッションを新しい順にリスト化（キーはセッションID・ファイル名が混在するため作成日時で並べる）
         const sessions = Object.entries(statsData.sessions)
-            .sort(([a], [b]) => b.localeCompare(a))
+            .sort(([, a], [, b]) => String(b.created).localeCompare(String(a.created)))
             .slice(0, 10);  // 最新10件
 
         sessions.forEach(([timestamp, session]) => {
@@ -0,0 +1,189 @@
+// keystroke_batcher.js - キー入力のまとめ送信（コアレシング）
+//
+// キー入力ごとに judge_char を呼ぶ代わりに、一定時間（flushIntervalMs）または
+// 一定キー数（maxKeys）ごとに /api/session/<id>/judge_batch へまとめて送信します。
+// 送信は常に1本ずつ直列化されるため、サーバー側で入力順が入れ替わることはありません。
+// 各イベントには KeystrokePipeline と同じ1始まりの連番（seq）を付けるため、
+// 失敗したバッチは未送信のイベントの前に戻して retryMs 後に再送します（重複はサーバー側で無視されます）。
+// セッションがない（404 / 410）場合は再送しても届かないため、送信をやめて flush() を失敗させます。
+
+class KeystrokeBatcher {
+    constructor(sessionId, options = {}) {
+        this.sessionId = sessionId;
+        this.flushIntervalMs = options.flushIntervalMs ?? 100;
+        this.maxKeys = options.maxKeys ?? 8;
+        this.retryMs = options.retryMs ?? 1000;
+        // 'delta' の場合、進捗は位置とカウントのみの差分形式で返る
+        this.progressMode = options.progressMode || 'full';
+        // true の場合、応答に直近5秒・30秒の速度（live_stats）が含まれる
+        this.liveStats = options.liveStats ?? false;
+        this.onResponse = options.onResponse || (() => {});
+        this.seq = 0;
+        this.ack = 0;
+        this.pending = [];
+        this.timer = null;
+        this.sending = false;
+        // 失敗したバッチの再送待ち（retryMs のタイマーで送信する）
+        this.retryScheduled = false;
+        // flush() の待ち（{ resolve, reject }）
+        this.waiters = [];
+        // 送信をやめた原因（null の場合は送信中）
+        this.error = null;
+    }
+
+    pushChar(char, timestamp) {
+        this._push({ char: char, timestamp: timestamp });
+    }
+
+    pushBackspace(timestamp) {
+        this._push({ type: 'backspace', timestamp: timestamp });
+    }
+
+    _push(event) {
+        if (this.error !== null) {
+            console.error('❌ Batcher stopped:', this.error.message);
+            return;
+        }
+        event.seq = ++this.seq;
+        this.pending.push(event);
+
+        if (this.pending.length >= this.maxKeys) {
+            this._sendPending();
+        } else {
+            this._schedule(this.flushIntervalMs);
+        }
+    }
+
+    // 他の送信経路（KeystrokeSocket）で ACK されなかった入力を同じ番号のまま引き継ぐ
+    adopt(events, lastSeq) {
+        this.seq = Math.max(this.seq, lastSeq);
+        if (events.length > 0) {
+            this.pending = events.concat(this.pending);
+            this._sendPending();
+        }
+    }
+
+    // 溜まっているイベントを送信（全イベントが ACK されるまで待つ Promise を返す）
+    flush() {
+        if (this.error !== null) {
+            return Promise.reject(this.error);
+        }
+        if (this.pending.length === 0 && !this.sending) {
+            return Promise.resolve();
+        }
+        const waiter = new Promise((resolve, reject) => this.waiters.push({ resolve: resolve, reject: reject }));
+        this._sendPending();
+        return waiter;
+    }
+
+    _schedule(delayMs) {
+        if (this.timer === null) {
+            this.timer = setTimeout(() => {
+                this.timer = null;
+                this._sendPending();
+            }, delayMs);
+        }
+    }
+
+    _clearTimer() {
+        if (this.timer !== null) {
+            clearTimeout(this.timer);
+            this.timer = null;
+        }
+    }
+
+    _sendPending() {
+        if (this.sending || this.error !== null || this.pending.length === 0) {
+            return;
+        }
+        this._clearTimer();
+        this.retryScheduled = false;
+
+        const events = this.pending;
+        this.pending = [];
+        this.sending = true;
+        this._send(events).then(() => {
+            this.sending = false;
+            this._afterSend();
+        });
+    }
+
+    // 送信後の続き（溜まった分の送信・flush() の待ちの解決）
+    _afterSend() {
+        if (this.error !== null || this.retryScheduled) {
+            return;
+        }
+        if (this.pending.length === 0) {
+            this.waiters.splice(0).forEach(waiter => waiter.resolve());
+        } else if (this.waiters.length > 0 || this.pending.length >= this.maxKeys) {
+            this._sendPending();
+        } else {
+            this._schedule(this.flushIntervalMs);
+        }
+    }
+
+    // 送信に失敗したイベントを未送信の先頭に戻し、retryMs 後に再送する
+    _requeue(events) {
+        this.pending = events.filter(event => event.seq > this.ack).concat(this.pending);
+        this._clearTimer();
+        this.retryScheduled = true;
+        this._schedule(this.retryMs);
+    }
+
+    // 再送しても回復しないため送信をやめ、flush() の待ちを失敗させる
+    _fail(error) {
+        if (this.error !== null) {
+            return;
+        }
+        this.error = error;
+        this._clearTimer();
+        this.pending = [];
+        this.waiters.splice(0).forEach(waiter => waiter.reject(error));
+    }
+
+    async _send(events) {
+        let response;
+        let data;
+        try {
+            response = await fetch(`/api/session/${this.sessionId}/judge_batch`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    events: events,
+                    progress_mode: this.progressMode,
+                    live_stats: this.liveStats
+                })
+            });
+            data = await response.json();
+        } catch (error) {
+            console.error('❌ Batch send error:', error);
+            this._requeue(events);
+            return;
+        }
+
+        if (data.ack !== undefined && data.ack > this.ack) {
+            this.ack = data.ack;
+        }
+
+        if (!response.ok) {
+            console.error('❌ Batch API error:', response.status, data.error);
+            // 再送しても回復しないステータスは keystroke_pipeline.js と共通
+            if (PIPELINE_FATAL_STATUSES.includes(response.status)) {
+                this._fail(new Error(data.error || `HTTP ${response.status}`));
+            } else {
+                this._requeue(events);
+            }
+            return;
+        }
+
+        if (data.ok) {
+            this.onResponse(data, events);
+        }
+        // ACK されなかった入力（番号の抜けがある場合）は再送する
+        if (events.some(event => event.seq > this.ack)) {
+            this._requeue(events);
+        }
+    }
+}
+
+window.KeystrokeBatcher = KeystrokeBatcher;
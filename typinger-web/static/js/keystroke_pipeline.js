@@ -0,0 +1,163 @@
+// keystroke_pipeline.js - シーケンス番号付きのパイプライン送信
+//
+// キー入力ごとに前の応答を待たずに judge_char / backspace を送信します。
+// 各入力には1始まりの連番（seq）を付け、サーバー側で番号順に並べ替えて適用します。
+// サーバーは「この番号までは適用済み」という累積ACK（ack）を返すため、
+// ACK されていない入力だけを一定時間後に再送します（重複はサーバー側で無視されます）。
+// セッションがない（404 / 410）場合は再送しても届かないため、送信をやめて flush() を失敗させます。
+
+// 再送しても回復しない応答のステータス（セッションがない・完了済み）
+const PIPELINE_FATAL_STATUSES = [404, 410];
+
+class KeystrokePipeline {
+    constructor(sessionId, options = {}) {
+        this.sessionId = sessionId;
+        // 'delta' の場合、進捗は位置とカウントのみの差分形式で返る
+        this.progressMode = options.progressMode || 'full';
+        // true の場合、応答に直近5秒・30秒の速度（live_stats）が含まれる
+        this.liveStats = options.liveStats ?? false;
+        this.retryMs = options.retryMs ?? 1000;
+        this.onResponse = options.onResponse || (() => {});
+        this.seq = 0;
+        this.ack = 0;
+        // seq -> { event, sentAt }
+        this.unacked = new Map();
+        this.retryTimer = null;
+        // flush() の待ち（{ resolve, reject }）
+        this.waiters = [];
+        // 送信をやめた原因（null の場合は送信中）
+        this.error = null;
+    }
+
+    pushChar(char, timestamp) {
+        this._push({ char: char, timestamp: timestamp });
+    }
+
+    pushBackspace(timestamp) {
+        this._push({ type: 'backspace', timestamp: timestamp });
+    }
+
+    _push(event) {
+        if (this.error !== null) {
+            console.error('❌ Pipeline stopped:', this.error.message);
+            return;
+        }
+        event.seq = ++this.seq;
+        this.unacked.set(event.seq, { event: event, sentAt: Date.now() });
+        this._send(event);
+
+        if (this.retryTimer === null) {
+            this.retryTimer = setInterval(() => this._retry(), this.retryMs);
+        }
+    }
+
+    // 他の送信経路（KeystrokeSocket）で ACK されなかった入力を同じ番号のまま引き継ぐ
+    adopt(events, lastSeq) {
+        this.seq = Math.max(this.seq, lastSeq);
+        events.forEach(event => {
+            this.unacked.set(event.seq, { event: event, sentAt: Date.now() });
+            this._send(event);
+        });
+
+        if (this.unacked.size > 0 && this.retryTimer === null) {
+            this.retryTimer = setInterval(() => this._retry(), this.retryMs);
+        }
+    }
+
+    // 全入力が ACK されるまで待つ Promise を返す（送信をやめた場合は失敗する）
+    flush() {
+        if (this.error !== null) {
+            return Promise.reject(this.error);
+        }
+        if (this.unacked.size === 0) {
+            return Promise.resolve();
+        }
+        return new Promise((resolve, reject) => this.waiters.push({ resolve: resolve, reject: reject }));
+    }
+
+    _stopRetry() {
+        if (this.retryTimer !== null) {
+            clearInterval(this.retryTimer);
+            this.retryTimer = null;
+        }
+    }
+
+    // 再送しても回復しないため送信をやめ、flush() の待ちを失敗させる
+    _fail(error) {
+        if (this.error !== null) {
+            return;
+        }
+        this.error = error;
+        this._stopRetry();
+        this.unacked.clear();
+        this.waiters.splice(0).forEach(waiter => waiter.reject(error));
+    }
+
+    async _send(event) {
+        const path = event.type === 'backspace' ? 'backspace' : 'judge_char';
+        const body = {
+            seq: event.seq,
+            timestamp: event.timestamp,
+            progress_mode: this.progressMode,
+            live_stats: this.liveStats
+        };
+        if (event.char !== undefined) {
+            body.char = event.char;
+        }
+
+        try {
+            const response = await fetch(`/api/session/${this.sessionId}/${path}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(body)
+            });
+
+            const data = await response.json();
+            if (data.ack !== undefined) {
+                this._handleResponse(data);
+            }
+            if (!response.ok) {
+                console.error('❌ Pipeline API error:', response.status, data.error);
+                if (PIPELINE_FATAL_STATUSES.includes(response.status)) {
+                    this._fail(new Error(data.error || `HTTP ${response.status}`));
+                }
+            }
+        } catch (error) {
+            // ACK されないままなので _retry() で再送される
+            console.error('❌ Pipeline send error:', error);
+        }
+    }
+
+    _handleResponse(data) {
+        const stale = data.ack < this.ack;
+
+        if (data.ack > this.ack) {
+            for (let seq = this.ack + 1; seq <= data.ack; seq++) {
+                this.unacked.delete(seq);
+            }
+            this.ack = data.ack;
+        }
+
+        // 追い越された古い応答の進捗は捨て、判定結果だけを渡す
+        if (data.ok && (data.results.length > 0 || !stale)) {
+            this.onResponse(stale ? { results: data.results, finished: false } : data);
+        }
+
+        if (this.unacked.size === 0) {
+            this._stopRetry();
+            this.waiters.splice(0).forEach(waiter => waiter.resolve());
+        }
+    }
+
+    _retry() {
+        const now = Date.now();
+        this.unacked.forEach(entry => {
+            if (now - entry.sentAt >= this.retryMs) {
+                entry.sentAt = now;
+                this._send(entry.event);
+            }
+        });
+    }
+}
+
+window.KeystrokePipeline = KeystrokePipeline;
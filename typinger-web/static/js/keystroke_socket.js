@@ -0,0 +1,122 @@
+// keystroke_socket.js - WebSocket によるキー入力チャネル
+//
+// KeystrokeBatcher と同じインターフェース（pushChar / pushBackspace / flush）で、
+// キー入力を1フレームずつ常時接続の WebSocket に送信します。
+// フレーム形式は core/keystroke_channel.py を参照してください。
+// 連番（s）は HTTP の seq と共通のため、接続が切れた場合は未送信・未ACKの入力を
+// onClose(events, lastSeq) が返す送信経路（adopt() を持つ KeystrokeBatcher など）に同じ番号のまま引き渡します。
+
+class KeystrokeSocket {
+    constructor(sessionId, port, options = {}) {
+        this.url = `ws://${window.location.hostname}:${port}/session/${sessionId}`;
+        this.onResponse = options.onResponse || (() => {});
+        this.onClose = options.onClose || (() => {});
+        this.seq = 0;
+        // seq -> HTTP 形式のイベント（引き渡し用）
+        this.unacked = new Map();
+        this.queue = [];
+        // flush() の待ち（{ resolve, reject }）
+        this.flushWaiters = [];
+        this.closed = false;
+        this.connect();
+    }
+
+    connect() {
+        this.socket = new WebSocket(this.url);
+        this.socket.addEventListener('open', () => {
+            // 接続前に溜まったフレームを送信
+            this.queue.forEach(frame => this.socket.send(frame));
+            this.queue = [];
+        });
+        this.socket.addEventListener('message', (e) => this._handleMessage(e.data));
+        this.socket.addEventListener('close', () => this._handleClose());
+    }
+
+    pushChar(char, timestamp) {
+        this._send({ c: char, t: timestamp }, { char: char, timestamp: timestamp });
+    }
+
+    pushBackspace(timestamp) {
+        this._send({ b: 1, t: timestamp }, { type: 'backspace', timestamp: timestamp });
+    }
+
+    _send(message, event) {
+        message.s = event.seq = ++this.seq;
+        this.unacked.set(event.seq, event);
+
+        const frame = JSON.stringify(message);
+        if (this.socket.readyState === WebSocket.OPEN) {
+            this.socket.send(frame);
+        } else {
+            this.queue.push(frame);
+        }
+    }
+
+    _handleMessage(frame) {
+        const message = JSON.parse(frame);
+        if (message.a !== undefined) {
+            this.unacked.forEach((event, seq) => {
+                if (seq <= message.a) {
+                    this.unacked.delete(seq);
+                }
+            });
+        }
+
+        if (message.e) {
+            console.error('❌ Socket error:', message.e);
+        } else {
+            // HTTP の判定レスポンスと同じ形に変換して通知（重複の応答には判定結果がない）
+            this.onResponse({
+                results: message.r !== undefined ? [{ result: message.r }] : [],
+                position: message.p,
+                remaining_splice: message.d,
+                finished: message.f === 1
+            });
+        }
+
+        if (this.unacked.size === 0) {
+            this.flushWaiters.splice(0).forEach(waiter => waiter.resolve());
+        }
+    }
+
+    // 接続が切れたら未ACKの入力を代わりの送信経路に引き渡し、flush() の待ちをそちらの完了に繋ぐ
+    _handleClose() {
+        if (this.closed) {
+            return;
+        }
+        this.closed = true;
+
+        const events = Array.from(this.unacked.values());
+        this.unacked.clear();
+        this.queue = [];
+
+        const fallback = this.onClose(events, this.seq);
+        if (fallback && typeof fallback.adopt === 'function') {
+            fallback.adopt(events, this.seq);
+        }
+
+        const waiters = this.flushWaiters.splice(0);
+        if (waiters.length === 0) {
+            return;
+        }
+        let settled;
+        if (fallback) {
+            settled = fallback.flush();
+        } else if (events.length > 0) {
+            settled = Promise.reject(new Error('WebSocket closed'));
+        } else {
+            settled = Promise.resolve();
+        }
+        waiters.forEach(waiter => settled.then(waiter.resolve, waiter.reject));
+    }
+
+    // 送信済みフレームの応答がすべて届くまで待つ
+    flush() {
+        if (this.unacked.size === 0 || this.closed) {
+            return Promise.resolve();
+        }
+        return new Promise((resolve, reject) => this.flushWaiters.push({ resolve: resolve, reject: reject }));
+    }
+}
+
+window.KeystrokeSocket = KeystrokeSocket;
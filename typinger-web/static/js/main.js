@@ -7,6 +7,14 @@ class TypingerApp {
         this.sessionId = null;
         this.currentScenario = null;
         this.typingStartTime = null;
+        // セッション開始時に受け取った目標ルビ（差分形式の進捗に適用する）
+        this.targetRubi = '';
+        // キー入力のまとめ送信（null の場合は1キーごとに送信）
+        this.batcher = null;
+        // キー入力の送信方式（typing.html の KEYSTROKE_MODE と同じ。'pipeline' は明示した場合のみ）
+        //   'batch' : まとめて judge_batch に送信
+        //   'pipeline' : 1キーごとに連番付きで送信（応答を待たずに次を送る）
+        this.keystrokeMode = 'batch';
         this.init();
     }
 
@@ -197,6 +205,18 @@ class TypingerApp {
                 this.sessionId = data.session_id;
                 this.currentScenario = scenarioFile;
                 this.typingStartTime = Date.now();
+                this.targetRubi = data.target_rubi;
+                // まとめ送信（既定）。'pipeline' の場合のみ連番付きパイプライン送信。
+                // どちらも読み込まれていなければ1キーごとに送信
+                const transportOptions = {
+                    progressMode: 'delta',
+                    onResponse: (judgeData) => this.handleJudgeResponse(judgeData)
+                };
+                if (this.keystrokeMode === 'pipeline' && window.KeystrokePipeline) {
+                    this.batcher = new KeystrokePipeline(data.session_id, transportOptions);
+                } else if (window.KeystrokeBatcher) {
+                    this.batcher = new KeystrokeBatcher(data.session_id, transportOptions);
+                }
                 console.log(`🎨 Switching to typing screen...`);
                 this.displayTypingScreen(data.target_text, data.target_rubi);
                 console.log(`✅ Typing screen displayed!`);
@@ -268,37 +288,54 @@ class TypingerApp {
         // 通常のキー入力を判定
         const timestamp = Date.now() - this.typingStartTime;
 
+        if (this.batcher) {
+            this.batcher.pushChar(char, timestamp);
+            return;
+        }
+
         try {
             const response = await fetch(`/api/session/${this.sessionId}/judge_char`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ char: char, timestamp: timestamp })
+                body: JSON.stringify({ char: char, timestamp: timestamp, progress_mode: 'delta' })
             });
             const data = await response.json();
 
             if (data.ok) {
-                this.updateDisplay(data.progress);
-
-                // 完了判定
-                if (data.progress.is_completed) {
-                    setTimeout(() => this.finishSession(), 500);
-                }
+                this.handleJudgeResponse(data);
             }
         } catch (error) {
             console.error('Error judging character:', error);
         }
     }
 
+    handleJudgeResponse(data) {
+        // 追い越された古い応答には進捗が含まれない
+        if (!data.progress) return;
+
+        this.updateDisplay(data.progress);
+
+        // 完了判定
+        if (data.progress.is_completed) {
+            setTimeout(() => this.finishSession(), 500);
+        }
+    }
+
     async handleBackspace() {
         if (!this.sessionId) return;
 
         const timestamp = Date.now() - this.typingStartTime;
 
+        if (this.batcher) {
+            this.batcher.pushBackspace(timestamp);
+            return;
+        }
+
         try {
             const response = await fetch(`/api/session/${this.sessionId}/backspace`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ timestamp: timestamp })
+                body: JSON.stringify({ timestamp: timestamp, progress_mode: 'delta' })
             });
             const data = await response.json();
 
@@ -311,13 +348,25 @@ class TypingerApp {
     }
 
     updateDisplay(progress) {
-        // ローマ字表示の更新
-        const targetRubi = progress.target_rubi;
+        // ローマ字表示の更新（入力中の綴り。差分形式では残りが目標ルビの続きと異なる場合のみ
+        // remaining_splice: [先頭, 位置] が届き、残り = 先頭 + 目標ルビ[位置:]）
+        const targetRubi = progress.target_rubi ?? this.targetRubi;
         const currentPos = progress.current_position;
-
-        const completed = targetRubi.substring(0, currentPos);
-        const current = currentPos < targetRubi.length ? targetRubi[currentPos] : '';
-        const remaining = targetRubi.substring(currentPos + 1);
+        const splice = progress.remaining_splice;
+        const remainingRubi = progress.remaining_rubi ??
+            (splice ? splice[0] + targetRubi.substring(splice[1]) : targetRubi.substring(currentPos));
+
+        // 入力済みの部分は全体形式なら入力した綴り、差分形式なら目標ルビ上の綴りで表示する
+        const completed = progress.display_rubi !== undefined
+            ? progress.display_rubi.substring(0, currentPos)
+            : targetRubi.substring(0, Math.max(0, targetRubi.length - remainingRubi.length));
+        const current = remainingRubi.substring(0, 1);
+        const remaining = remainingRubi.substring(1);
+
+        const total = progress.correct_count + progress.incorrect_count;
+        const accuracy = progress.accuracy ?? (total > 0 ? progress.correct_count / total : 0);
+        const progressPercent = progress.progress_percent ??
+            (currentPos + remainingRubi.length > 0 ? currentPos / (currentPos + remainingRubi.length) * 100 : 0);
 
         document.getElementById('rubi-completed').textContent = completed;
         document.getElementById('rubi-current').textContent = current;
@@ -327,9 +376,9 @@ class TypingerApp {
         document.getElementById('stat-correct').textContent = progress.correct_count;
         document.getElementById('stat-incorrect').textContent = progress.incorrect_count;
         document.getElementById('stat-accuracy').textContent = 
-            (progress.accuracy * 100).toFixed(1) + '%';
+            (accuracy * 100).toFixed(1) + '%';
         document.getElementById('stat-progress').textContent = 
-            progress.progress_percent.toFixed(1) + '%';
+            progressPercent.toFixed(1) + '%';
 
         // 入力フィールドをクリア
         document.getElementById('typing-input').value = '';
@@ -339,6 +388,16 @@ class TypingerApp {
     async finishSession() {
         if (!this.sessionId) return;
 
+        // 未送信のキー入力を先に送る
+        if (this.batcher) {
+            try {
+                await this.batcher.flush();
+            } catch (error) {
+                // セッションがない場合など（complete の応答でエラーを表示する）
+                console.error('Error flushing keystrokes:', error);
+            }
+        }
+
         try {
             const response = await fetch(`/api/session/${this.sessionId}/complete`, {
                 method: 'POST',
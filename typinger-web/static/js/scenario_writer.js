@@ -37,6 +37,10 @@ class ScenarioWriter {
         // エントリ追加
         document.getElementById('btn-add-entry').addEventListener('click', () => this.addEntry());
 
+        // ローマ字生成
+        document.getElementById('btn-generate-rubi').addEventListener('click', () => this.generateRubi());
+        document.getElementById('btn-fill-rubi').addEventListener('click', () => this.fillEmptyRubi());
+
         // エントリ編集適用
         document.getElementById('btn-apply-edit').addEventListener('click', () => this.applyEdit());
 
@@ -253,6 +257,61 @@ class ScenarioWriter {
         }
     }
 
+    async requestRomaji(texts) {
+        const response = await fetch('/api/scenario/romaji', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ texts: texts })
+        });
+
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error);
+        }
+        return data.rubis;
+    }
+
+    async generateRubi() {
+        const text = document.getElementById('edit-text').value;
+        if (!text) {
+            this.showMessage('テキストを入力してください', 'warning');
+            return;
+        }
+
+        try {
+            const [rubi] = await this.requestRomaji([text]);
+            document.getElementById('edit-rubi').value = rubi;
+            this.updatePreview();
+        } catch (error) {
+            this.showMessage(`生成エラー: ${error.message}`, 'error');
+        }
+    }
+
+    async fillEmptyRubi() {
+        if (!this.currentScenario) {
+            this.showMessage('シナリオが作成されていません', 'warning');
+            return;
+        }
+
+        const entries = this.currentScenario.entries;
+        const ids = Object.keys(entries).filter(id => entries[id].text && !entries[id].rubi);
+        if (ids.length === 0) {
+            this.showMessage('ローマ字が空のエントリはありません', 'success');
+            return;
+        }
+
+        try {
+            const rubis = await this.requestRomaji(ids.map(id => entries[id].text));
+            ids.forEach((id, index) => {
+                entries[id].rubi = rubis[index];
+            });
+            this.updateUI();
+            this.showMessage(`${ids.length}件のローマ字を生成しました`, 'success');
+        } catch (error) {
+            this.showMessage(`生成エラー: ${error.message}`, 'error');
+        }
+    }
+
     addEntry() {
         if (!this.currentScenario) {
             this.showMessage('シナリオが作成されていません', 'warning');
@@ -0,0 +1,183 @@
+// typing_judge.js - タイピング判定ロジック（core/typing_judge.py の移植）
+//
+// クライアント側判定モードで使用します。キー入力ごとにサーバーへ問い合わせず、
+// ブラウザ内で判定して即座に表示へ反映し、完了時にイベント列をまとめて送信します。
+// サーバーは complete でイベント列を Python の TypingJudge で再生して結果を検証します。
+//
+// 別綴りの受理規則はサーバーでコンパイルした入力オートマトン（core/input_automaton.py）を
+// そのまま使うため、ここでは状態遷移のみを実装します。
+// Python 実装と判定結果が完全に一致する必要があるため、変更した場合は
+// tests/conformance/judge_cases.json の適合テストを両方の実装で実行してください。
+
+const JudgeResult = Object.freeze({
+    CORRECT: 'correct',
+    INCORRECT: 'incorrect',
+    ALREADY_DONE: 'already_done',
+    BACKSPACE: 'backspace'
+});
+
+// 目標ルビどおりの綴りのみを受理するオートマトン（サーバーから受け取れない場合の代替）
+// （1文字を1入力単位とし、状態 i は i 単位を入力し終えた境界）
+function literalAutomaton(targetRubi) {
+    const transitions = [];
+    const accepting = [];
+    const states = [];
+    for (let i = 0; i <= targetRubi.length; i++) {
+        transitions.push(i < targetRubi.length ? { [targetRubi[i]]: i + 1 } : {});
+        accepting.push(i === targetRubi.length);
+        states.push(i);
+    }
+    return {
+        transitions: transitions,
+        accepting: accepting,
+        units_done: states,
+        unit_offset: states.map(() => 0),
+        unit_spelling: states.map(() => 0),
+        unit_start: states,
+        spellings: Array.from(targetRubi, char => [char])
+    };
+}
+
+class TypingJudge {
+    // automaton: InputAutomaton.to_dict() の形式（"shi" / "si" などの別綴りを受理）
+    constructor(targetText, targetRubi, automaton = null) {
+        this.targetText = targetText;
+        this.targetRubi = targetRubi.toLowerCase();  // 小文字正規化
+        this.automaton = automaton || literalAutomaton(this.targetRubi);
+        this.correctCount = 0;
+        this.incorrectCount = 0;
+        // 正解した入力ごとの状態と文字
+        this.states = [0];
+        this.typed = [];
+    }
+
+    get currentPosition() {
+        return this.typed.length;
+    }
+
+    // 1文字判定（TypingJudge.judge_char と同じ規則）
+    judgeChar(inputChar) {
+        if (this.isCompleted()) {
+            return JudgeResult.ALREADY_DONE;
+        }
+
+        const lower = inputChar.toLowerCase();
+        const transitions = this.automaton.transitions[this.states[this.states.length - 1]];
+        if (!Object.prototype.hasOwnProperty.call(transitions, lower)) {
+            this.incorrectCount++;
+            return JudgeResult.INCORRECT;
+        }
+
+        this.correctCount++;
+        this.states.push(transitions[lower]);
+        this.typed.push(lower);
+        return JudgeResult.CORRECT;
+    }
+
+    // Backspace（TypingJudge.backspace と同じく直前の正解を1文字取り消す）
+    backspace() {
+        if (this.typed.length > 0) {
+            this.states.pop();
+            this.typed.pop();
+        }
+        return JudgeResult.BACKSPACE;
+    }
+
+    isCompleted() {
+        return this.automaton.accepting[this.states[this.states.length - 1]];
+    }
+
+    getAccuracy() {
+        const total = this.correctCount + this.incorrectCount;
+        return total === 0 ? 0 : this.correctCount / total;
+    }
+
+    // InputAutomaton.remaining_splice と同じく [入力中の単位の残りの綴り, 目標ルビ上の位置]
+    getRemainingSplice() {
+        const automaton = this.automaton;
+        const state = this.states[this.states.length - 1];
+        const done = automaton.units_done[state];
+        const offset = automaton.unit_offset[state];
+        if (offset === 0) {
+            return ['', automaton.unit_start[done]];
+        }
+        const spelling = automaton.spellings[done][automaton.unit_spelling[state]];
+        return [spelling.substring(offset), automaton.unit_start[done + 1]];
+    }
+
+    getRemainingRubi() {
+        const [head, tail] = this.getRemainingSplice();
+        return head + this.targetRubi.substring(tail);
+    }
+
+    getDisplayRubi() {
+        return this.typed.join('') + this.getRemainingRubi();
+    }
+
+    // TypingJudge.get_progress_delta と同じ形式
+    getProgressDelta() {
+        const delta = {
+            current_position: this.currentPosition,
+            correct_count: this.correctCount,
+            incorrect_count: this.incorrectCount,
+            is_completed: this.isCompleted()
+        };
+        // 残りの綴りが 目標ルビ[現在位置:] と異なる場合のみ差し替え形式で含める
+        const [head, tail] = this.getRemainingSplice();
+        const position = this.currentPosition;
+        if (tail - head.length !== position || !this.targetRubi.startsWith(head, position)) {
+            delta.remaining_splice = [head, tail];
+        }
+        return delta;
+    }
+}
+
+// KeystrokeBatcher と同じインターフェースでブラウザ内判定を行う送信経路
+class LocalKeystrokeJudge {
+    constructor(targetText, targetRubi, options = {}) {
+        this.judge = new TypingJudge(targetText, targetRubi, options.automaton);
+        this.onResponse = options.onResponse || (() => {});
+        this.events = [];
+    }
+
+    pushChar(char, timestamp) {
+        const result = this.judge.judgeChar(char);
+        this.events.push({ char: char, timestamp: timestamp });
+        this._respond(result);
+    }
+
+    pushBackspace(timestamp) {
+        const result = this.judge.backspace();
+        this.events.push({ type: 'backspace', timestamp: timestamp });
+        this._respond(result);
+    }
+
+    _respond(result) {
+        const progress = this.judge.getProgressDelta();
+        this.onResponse({
+            ok: true,
+            results: [{ result: result }],
+            progress: progress,
+            finished: progress.is_completed
+        });
+    }
+
+    flush() {
+        return Promise.resolve();
+    }
+
+    // complete に送信する検証用のイベント列とクライアント側の判定結果
+    getCompletionPayload() {
+        return {
+            events: this.events,
+            client_result: this.judge.getProgressDelta()
+        };
+    }
+}
+
+if (typeof module !== 'undefined' && module.exports) {
+    module.exports = { JudgeResult, TypingJudge, LocalKeystrokeJudge };
+} else {
+    window.TypingJudge = TypingJudge;
+    window.LocalKeystrokeJudge = LocalKeystrokeJudge;
+}
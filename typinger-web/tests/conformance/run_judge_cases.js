@@ -0,0 +1,35 @@
+// run_judge_cases.js - JS 版 TypingJudge の適合テスト
+//
+// judge_cases.json の各ケースを static/js/typing_judge.js で実行し、
+// Python 実装と同じ期待値になるかを確認します（"\b" は Backspace）。
+// 入力オートマトンは Python でコンパイルした judge_automata.json を使います
+// （update_automata.py で再生成）。
+//
+// 実行方法（typinger-web ディレクトリで）:
+//     node tests/conformance/run_judge_cases.js
+
+const path = require('path');
+const { TypingJudge } = require(path.join(__dirname, '..', '..', 'static', 'js', 'typing_judge.js'));
+const cases = require(path.join(__dirname, 'judge_cases.json'));
+const automata = require(path.join(__dirname, 'judge_automata.json'));
+
+let failures = 0;
+
+cases.forEach(testCase => {
+    const automaton = automata[testCase.target_rubi.toLowerCase()];
+    const judge = new TypingJudge('', testCase.target_rubi, automaton);
+    const results = testCase.inputs.map(input => (
+        input === '\b' ? judge.backspace() : judge.judgeChar(input)
+    ));
+    const actual = Object.assign({ results: results }, judge.getProgressDelta());
+
+    if (JSON.stringify(actual) !== JSON.stringify(testCase.expected)) {
+        failures++;
+        console.error(`FAIL ${testCase.name}`);
+        console.error(`  expected: ${JSON.stringify(testCase.expected)}`);
+        console.error(`  actual:   ${JSON.stringify(actual)}`);
+    }
+});
+
+console.log(`${cases.length - failures}/${cases.length} cases passed`);
+process.exit(failures === 0 ? 0 : 1);
@@ -0,0 +1,42 @@
+"""
+update_automata.py
+適合テスト用の入力オートマトンを再生成
+
+JS 版の判定器はサーバーでコンパイルした入力オートマトンを使うため、
+judge_cases.json の各目標ルビについて core/input_automaton.py でコンパイルした
+結果を judge_automata.json に保存します。入力オートマトンの構築規則や
+変換テーブルを変更した場合に実行してください（古いままだと pytest が失敗します）。
+
+実行方法（typinger-web ディレクトリで）:
+    python tests/conformance/update_automata.py
+"""
+
+import json
+import os
+import sys
+
+CONFORMANCE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(CONFORMANCE_DIR, '..', '..'))
+
+from core.input_automaton import compile_automaton
+
+
+def build_automata(cases):
+    """各ケースの目標ルビ（小文字）→ オートマトンの辞書を作成"""
+    return {
+        case["target_rubi"].lower(): compile_automaton(case["target_rubi"].lower()).to_dict()
+        for case in cases
+    }
+
+
+def main():
+    with open(os.path.join(CONFORMANCE_DIR, "judge_cases.json"), encoding="utf-8") as f:
+        cases = json.load(f)
+
+    with open(os.path.join(CONFORMANCE_DIR, "judge_automata.json"), "w", encoding="utf-8") as f:
+        json.dump(build_automata(cases), f, ensure_ascii=False, sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
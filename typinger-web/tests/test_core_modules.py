@@ -3,11 +3,39 @@ test_core_modules.py
 コアモジュールのユニットテスト
 """
 
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import struct
+import sys
+from datetime import datetime
+
 import pytest
-from core.romaji_converter import RomajiConverter, ConvertStatus
-from core.typing_judge import TypingJudge, JudgeResult
-from core.statistics import StatisticsCalculator, KeyEvent, EventType
+from core.romaji_converter import RomajiConverter, RomajiStream, ConvertStatus
+from core.typing_judge import STATE_HISTORY, TypingJudge, JudgeResult
+from core.statistics import StatisticsCalculator, KeyEvent, EventType, EventBuffer
 from core.scenario_manager import ScenarioManager
+from core.typing_session import TypingSession, REORDER_WINDOW
+from core.keystroke_channel import KeystrokeChannel
+from core.session_store import SessionStore, SQLiteSessionStore
+from core.input_automaton import compile_automaton
+from core.batch_statistics import BatchStatisticsCalculator
+from core.bigram_latency import BigramLatencyMatrix, BigramLatencyCollector
+from core.live_stats import LiveStats
+from core.quantile_sketch import QuantileSketch
+from core.log_viewer import LogViewer
+from core.kana_aligner import KanaAligner
+from core.csv_logger import CSVLogger
+from core.session_journal import SessionJournal
+from core.results_store import ResultsStore
+from core.summary_index import SummaryIndex, SUMMARY_INDEX_FILENAME
+from core.event_log import (BinaryEventLog, EventLogReader, load_event_logs, encode_block,
+                            encode_timestamps, decode_timestamps)
+
+CONFORMANCE_CASES = os.path.join(os.path.dirname(__file__), "conformance", "judge_cases.json")
+CONFORMANCE_AUTOMATA = os.path.join(os.path.dirname(__file__), "conformance", "judge_automata.json")
 
 
 class TestRomajiConverter:
@@ -33,6 +61,30 @@ class TestRomajiConverter:
         assert result.status == ConvertStatus.MATCHED
         assert result.kana == "しゃ"
 
+    def test_longest_match_and_remaining(self):
+        result = self.converter.convert("shak")
+        assert (result.kana, result.consumed, result.remaining) == ("しゃ", "sha", "k")
+
+        # "n" は単独でも一致するが "nya" が優先される
+        assert self.converter.convert("nya").kana == "にゃ"
+        assert self.converter.convert("ky").status == ConvertStatus.PARTIAL
+        assert self.converter.convert("kx").status == ConvertStatus.NO_MATCH
+
+    def test_convert_greedy(self):
+        assert self.converter.convert_greedy("SaKura") == ("さくら", "")
+        assert self.converter.convert_greedy("sushi!desu") == ("すし", "!desu")
+
+    def test_rebuild_trie(self):
+        self.converter.conversion_table = {**self.converter.conversion_table, "xa": "ぁ"}
+        self.converter.rebuild_trie()
+        assert self.converter.convert("xa").kana == "ぁ"
+        assert RomajiConverter().convert("xa").status == ConvertStatus.NO_MATCH
+
+    def test_shared_tables(self):
+        assert RomajiConverter().conversion_table is self.converter.conversion_table
+        with pytest.raises(TypeError):
+            self.converter.conversion_table["xa"] = "ぁ"
+
     def test_can_convert(self):
         assert self.converter.can_convert("ka") == True
         assert self.converter.can_convert("xyz") == False
@@ -41,6 +93,60 @@ class TestRomajiConverter:
         assert RomajiConverter.to_romaji("か") == "ka"
         assert RomajiConverter.to_romaji("しゃ") == "sha"
 
+    def test_to_romaji_sokuon_and_n(self):
+        assert RomajiConverter.to_romaji("がっこう") == "gakkou"
+        assert RomajiConverter.to_romaji("ラーメン") == "ra-menn"
+        assert RomajiConverter.to_romaji("こんばんは") == "konbanha"
+        assert RomajiConverter.to_romaji("ほんや") == "honnya"
+
+    def test_to_romaji_many(self):
+        texts = ["すし", "てんぷら", "すし"]
+        assert RomajiConverter.to_romaji_many(texts) == ["sushi", "tenpura", "sushi"]
+        assert RomajiConverter.to_romaji_many(iter(texts)) == ["sushi", "tenpura", "sushi"]
+
+
+class TestRomajiStream:
+    def setup_method(self):
+        self.stream = RomajiStream()
+
+    def feed_all(self, romaji):
+        return [self.stream.feed(char) for char in romaji]
+
+    def test_commits_per_key(self):
+        assert self.feed_all("kasha") == ["", "か", "", "", "しゃ"]
+        assert self.stream.kana == "かしゃ"
+        assert self.stream.kana_length == 3
+
+    def test_n_handling(self):
+        # "nn" は「ん」を確定する（convert_greedy・to_romaji と同じ読み）
+        converter = RomajiConverter()
+        for romaji, kana in [("kanji", "かんじ"), ("hon'ya", "ほんや"), ("konnnichiha", "こんにちは"),
+                             ("kinnyou", "きんよう"), ("honnya", "ほんや"), ("nna", "んあ")]:
+            self.stream.reset()
+            self.feed_all(romaji)
+            assert self.stream.kana == kana
+            assert converter.convert_greedy(romaji) == (kana, "")
+        assert RomajiConverter.to_romaji("きんよう") == "kinnyou"
+
+        self.stream.reset()
+        self.feed_all("shinbun")
+        assert (self.stream.kana, self.stream.pending) == ("しんぶ", "n")
+        assert self.stream.flush() == "ん"
+
+    def test_sokuon(self):
+        assert self.feed_all("kitte") == ["", "き", "", "っ", "て"]
+        self.stream.reset()
+        self.feed_all("kky")
+        assert (self.stream.kana, self.stream.pending) == ("っ", "ky")
+
+    def test_backspace(self):
+        self.feed_all("kitt")
+        assert (self.stream.kana, self.stream.pending) == ("きっ", "t")
+        assert self.stream.backspace()
+        assert (self.stream.kana, self.stream.pending) == ("き", "t")
+        self.feed_all("te")
+        assert self.stream.kana == "きって"
+
 
 class TestTypingJudge:
     def setup_method(self):
@@ -85,6 +191,110 @@ class TestTypingJudge:
         remaining = self.judge.get_remaining_rubi()
         assert remaining == "nnichiha"
 
+    def test_progress_delta(self):
+        self.judge.judge_char("k")
+        self.judge.judge_char("x")
+        delta = self.judge.get_progress_delta()
+        full = self.judge.get_progress_display()
+
+        assert delta == {
+            "current_position": 1,
+            "correct_count": 1,
+            "incorrect_count": 1,
+            "is_completed": False,
+        }
+        assert all(full[key] == value for key, value in delta.items())
+
+    def test_typed_kana(self):
+        for char in "konnic":
+            self.judge.judge_char(char)
+        assert (self.judge.get_typed_kana(), self.judge.get_pending_romaji()) == ("こんに", "c")
+        self.judge.backspace()
+        self.judge.backspace()
+        full = self.judge.get_progress_display()
+        assert (full["typed_kana"], full["pending_romaji"]) == ("こん", "n")
+
+        # 判定と同じ入力単位で区切る（"tch" は っ + ち、末尾の "n" は ん）
+        for rubi, typed, kana in [("matcha", "matcha", "まっちゃ"), ("hon", "hon", "ほん"),
+                                  ("shinnai", "sinnnai", "しんない")]:
+            judge = TypingJudge("", rubi)
+            assert all(judge.judge_char(char) == JudgeResult.CORRECT for char in typed)
+            assert (judge.get_typed_kana(), judge.get_pending_romaji()) == (kana, "")
+
+
+class TestInputAutomaton:
+    def _accepts(self, rubi, typed):
+        judge = TypingJudge("", rubi)
+        results = [judge.judge_char(char) for char in typed]
+        return all(r == JudgeResult.CORRECT for r in results) and judge.is_completed()
+
+    def test_variant_spellings(self):
+        assert self._accepts("sasisuseso", "sashisuseso")
+        assert self._accepts("tatituteto", "tachitsuteto")
+        assert self._accepts("konnitiha", "konnnichiha")
+        assert self._accepts("konnbannha", "konbanha")
+        assert self._accepts("gakkou", "gaxtukou")
+        assert not self._accepts("hon'ya", "honya")  # 「ん」+「や」は "n" 1文字では入力できない
+
+    def test_literal_rubi_always_accepted(self):
+        manager = ScenarioManager("scenario")
+        for filename in manager.get_available_scenarios():
+            for entry in manager.load_scenario(filename)["entries"].values():
+                assert self._accepts(entry["rubi"], entry["rubi"].lower()), entry["rubi"]
+
+    def test_display_follows_spelling(self):
+        judge = TypingJudge("さしすせそ", "sasisuseso")
+        for char in "sas":
+            judge.judge_char(char)
+        assert judge.get_display_rubi() == "sasisuseso"
+
+        judge.judge_char("h")
+        assert judge.get_display_rubi() == "sashisuseso"
+        # 残り = 先頭 + 目標ルビ[位置:]（"i" + "suseso"）
+        assert judge.get_progress_delta()["remaining_splice"] == ["i", 4]
+
+        judge.backspace()
+        assert judge.get_display_rubi() == "sasisuseso"
+        assert "remaining_splice" not in judge.get_progress_delta()
+
+    def test_size_linear_in_rubi(self):
+        # 残りの綴りを状態ごとに持たないため、文の長さに比例した大きさになる
+        short = len(json.dumps(compile_automaton("sasisuseso" * 20).to_dict()))
+        long = len(json.dumps(compile_automaton("sasisuseso" * 40).to_dict()))
+        assert long < short * 2.2
+
+        automaton = compile_automaton("konnnichiha")
+        for state in range(automaton.state_count()):
+            head, tail = automaton.remaining_splice(state)
+            assert automaton.remaining(state) == head + "konnnichiha"[tail:]
+
+    def test_shared_and_restored(self):
+        first = TypingJudge("", "sushi")
+        second = TypingJudge("", "SUSHI")
+        assert first.automaton is second.automaton
+
+        for char in "sus":
+            first.judge_char(char)
+        second.restore_state(first.to_state())
+        assert second.judge_char("i") == JudgeResult.CORRECT
+        assert second.is_completed()
+
+    def test_state_history_bounded(self):
+        rubi = "sashisuseso" * 10
+        judge = TypingJudge("", rubi)
+        for char in rubi[:-1]:
+            judge.judge_char(char)
+        state = judge.to_state()
+        assert len(state["states"]) == STATE_HISTORY
+
+        # 保存した状態の数を超えて戻っても、正解した文字列から状態を求め直す
+        restored = TypingJudge("", rubi)
+        restored.restore_state(state)
+        for _ in range(STATE_HISTORY + 5):
+            restored.backspace()
+        assert restored.get_display_rubi() == rubi
+        assert restored.judge_char(rubi[len(rubi) - STATE_HISTORY - 6]) == JudgeResult.CORRECT
+
 
 class TestStatisticsCalculator:
     def setup_method(self):
@@ -118,6 +328,885 @@ class TestStatisticsCalculator:
         assert stats.correct_key_count == 3
         assert stats.total_duration == 200000
 
+    def test_online_statistics_without_events(self):
+        calc = StatisticsCalculator(keep_events=False)
+        timestamps = [0, 120000, 150000, 400000, 410000]
+        for index, timestamp in enumerate(timestamps):
+            event_type = EventType.BACKSPACE if index == 3 else EventType.KEY_DOWN
+            calc.add_event(KeyEvent(event_type, timestamp, 65, 'a'))
+
+        stats = calc.calculate_statistics(3, 10)
+        intervals = [b - a for a, b in zip(timestamps, timestamps[1:])]
+
+        assert len(calc.events) == 0
+        assert (stats.total_key_count, stats.backspace_count) == (5, 1)
+        assert stats.avg_inter_key_interval == pytest.approx(statistics.mean(intervals) / 1000)
+        assert stats.std_inter_key_interval == pytest.approx(statistics.pstdev(intervals) / 1000)
+        assert (stats.min_inter_key_interval, stats.max_inter_key_interval) == (10.0, 250.0)
+
+    def test_kana_frequency(self):
+        categories = self.calc.get_category_frequency("かきしゃんあ")
+        assert (categories["K行"], categories["S行"], categories["W行"], categories["母音"]) == (2, 1, 1, 1)
+        # 拗音は2文字の並びとして数える
+        assert self.calc.get_important_kana_frequency("しゃしか") == {"か": 1, "し": 1, "しゃ": 1}
+
+        corpus = self.calc.get_corpus_frequency(["かか", "か", "ん"])
+        assert corpus["sentence_count"] == 3
+        assert corpus["category_frequency"]["K行"] == 3
+        assert corpus["important_kana_frequency"] == {"か": 3, "ん": 1}
+        assert "あ" in corpus["missing_important_kana"]
+
+
+class TestEventBuffer:
+    def setup_method(self):
+        self.events = [
+            KeyEvent(EventType.KEY_DOWN, 0, 75, 'k'),
+            KeyEvent(EventType.BACKSPACE, 120000, 8, '\b'),
+            KeyEvent(EventType.KEY_DOWN, 250000, 83, 'Shift'),
+        ]
+        self.buffer = EventBuffer(self.events)
+
+    def test_round_trip(self):
+        assert len(self.buffer) == 3
+        assert list(self.buffer) == self.events
+        assert self.buffer[-1] == self.events[-1]
+        with pytest.raises(IndexError):
+            self.buffer[3]
+
+    def test_rows_range(self):
+        rows = list(self.buffer.rows(1, 3))
+        assert rows == [(EventType.BACKSPACE, 120000, 8, '\b'), (EventType.KEY_DOWN, 250000, 83, 'Shift')]
+
+    def test_session_stores_events_once(self):
+        session = TypingSession("test.json", "か", "ka")
+        session.apply_char("k", 10)
+        session.apply_backspace(20)
+        assert isinstance(session.events, EventBuffer)
+        assert [e.timestamp for e in session.events] == [10000, 20000]
+        assert len(session.stats_calculator.events) == 0
+
+
+class TestBatchStatistics:
+    def setup_method(self):
+        # 2セッション分（2つ目のセッションは時刻が0から始まる）
+        self.events = EventBuffer()
+        for index, timestamp in enumerate([0, 100000, 180000, 1500000, 1600000, 0, 50000, 3000000]):
+            event_type = EventType.BACKSPACE if index == 2 else EventType.KEY_DOWN
+            self.events.add(event_type, timestamp, 65, 'a')
+        self.offsets = [0, 5, 8]
+
+    def test_python_backend(self):
+        data = BatchStatisticsCalculator('python').calculate(self.events, self.offsets)
+        stats = data.statistics
+
+        # セッションをまたぐ間隔は含めない
+        assert stats.total_duration == 1600000 + 3000000
+        assert (stats.min_inter_key_interval, stats.max_inter_key_interval) == (50.0, 2950.0)
+        assert stats.backspace_count == 1
+        assert data.interval_percentiles["p50"] == 100.0
+        assert sum(data.histogram_counts) == 6
+        assert [burst.key_count for burst in data.bursts] == [3, 2, 2, 1]
+        assert (data.pause_count, data.total_pause_time) == (2, 1320000 + 2950000)
+
+    def test_matches_online_calculator(self):
+        calc = StatisticsCalculator()
+        for event in list(self.events)[:5]:
+            calc.add_event(event)
+        online = calc.calculate_statistics(3, 0)
+        batch = BatchStatisticsCalculator('python').calculate(
+            EventBuffer(list(self.events)[:5]), correct_key_count=3).statistics
+
+        assert batch.total_duration == online.total_duration
+        assert batch.wpm_correct == online.wpm_correct
+        assert batch.avg_inter_key_interval == pytest.approx(online.avg_inter_key_interval)
+        assert batch.std_inter_key_interval == pytest.approx(online.std_inter_key_interval)
+
+    def test_numpy_backend_identical(self):
+        pytest.importorskip("numpy")
+        assert (BatchStatisticsCalculator('numpy').calculate(self.events, self.offsets)
+                == BatchStatisticsCalculator('python').calculate(self.events, self.offsets))
+
+    def test_load_events_csv(self, tmp_path):
+        logger = CSVLogger(str(tmp_path))
+        path = logger.save_events_csv(self.events)
+        events, offsets = BatchStatisticsCalculator.load_events_csv([path, path])
+        assert offsets == [0, 8, 16]
+        assert list(events.rows(0, 8)) == list(self.events.rows())
+
+
+class TestBigramLatency:
+    def setup_method(self):
+        # K → A を 100ms / 200ms、A → K を 150ms、2秒の一時停止は遷移に含めない
+        self.events = EventBuffer()
+        for timestamp, char in [(0, 'k'), (100000, 'a'), (250000, 'k'), (450000, 'a'), (2450000, 'k')]:
+            self.events.add(EventType.KEY_DOWN, timestamp, ord(char.upper()), char)
+
+    def test_matrix(self):
+        matrix = BigramLatencyMatrix()
+        matrix.add_events(self.events)
+
+        assert matrix.transition_count == 3
+        assert matrix.get(ord('K'), ord('A')) == {"count": 2, "mean_ms": 150.0, "p90_ms": 208.0}
+        assert matrix.get(ord('A'), ord('K'))["count"] == 1
+
+        heatmap = matrix.to_heatmap('hid')
+        assert heatmap["labels"] == ["A", "K"]
+        assert heatmap["count"] == [[0, 1], [2, 0]]
+        assert heatmap["mean_ms"][1][0] == 150.0
+
+        # HID に対応するキーがない組（Shift など）は HID のヒートマップに載せない
+        self.events.add(EventType.KEY_DOWN, 2550000, 16, 'shift')
+        matrix.add_events(self.events)
+        assert matrix.get(ord('K'), 16)["count"] == 1
+        heatmap = matrix.to_heatmap('hid')
+        assert heatmap["labels"] == ["A", "K"] and heatmap["transition_count"] == 6
+
+    def test_collector_merges_csv(self, tmp_path):
+        logger = CSVLogger(str(tmp_path))
+        path = logger.save_events_csv(self.events)
+
+        collector = BigramLatencyCollector(str(tmp_path))
+        collector.add_session(self.events, os.path.basename(path))
+        assert collector.refresh().transition_count == 3
+
+        os.rename(path, str(tmp_path / "typing_events_20240101_000000.csv"))
+        matrix = collector.refresh()
+        assert matrix.transition_count == 3
+        assert matrix.get(ord('K'), ord('A'))["count"] == 2
+
+
+class TestQuantileSketch:
+    def setup_method(self):
+        self.values = [(index * 7919) % 100000 + 1000 for index in range(5000)]
+
+    def test_relative_accuracy_and_merge(self):
+        whole, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for index, value in enumerate(self.values):
+            whole.add(value)
+            (first if index % 2 else second).add(value)
+        first.merge(second)
+
+        exact = sorted(self.values)
+        for q in (0.5, 0.95, 0.99):
+            true_value = exact[int(q * (len(exact) - 1))]
+            assert abs(whole.quantile(q) - true_value) <= true_value * 0.01
+        assert first.quantiles([0.5, 0.99]) == whole.quantiles([0.5, 0.99])
+        assert (first.count, first.min, first.max) == (5000, whole.min, whole.max)
+
+    def test_serialization(self):
+        sketch = QuantileSketch()
+        for value in self.values + [0]:
+            sketch.add(value)
+        restored = QuantileSketch.from_string(sketch.to_string())
+        assert restored.to_string() == sketch.to_string()
+        assert restored.quantile(0.0) == 0.0
+        assert QuantileSketch().quantile(0.5) is None
+        with pytest.raises(ValueError):
+            QuantileSketch.from_string("0;bad")
+
+    def test_log_viewer_merges_summaries(self, tmp_path, monkeypatch):
+        for index, interval in enumerate([100000, 300000]):
+            calc = StatisticsCalculator(keep_events=False)
+            for step in range(11):
+                calc.add_event(KeyEvent(EventType.KEY_DOWN, step * interval, 65, 'a'))
+            stats_data = calc.calculate_statistics(11, 11)
+            path = CSVLogger(str(tmp_path)).save_summary_csv(stats_data, "a", 1.0)
+            os.rename(path, str(tmp_path / f"typing_summary_20240101_00000{index}.csv"))
+
+        viewer = LogViewer(str(tmp_path))
+        # ファイル名は一覧（os.scandir）から求め、問い合わせごとに os.listdir しない
+        monkeypatch.setattr(os, "listdir", None)
+        result = viewer.get_interval_percentiles()
+        assert (result["session_count"], result["interval_count"]) == (2, 20)
+        assert (result["min_ms"], result["max_ms"]) == (100.0, 300.0)
+        assert result["percentiles_ms"]["p99"] == pytest.approx(300.0, rel=0.01)
+
+        os.remove(str(tmp_path / "typing_summary_20240101_000001.csv"))
+        assert viewer.get_interval_percentiles()["percentiles_ms"]["p50"] == 100.0
+
+
+class TestCSVLoggerAsync:
+    def test_write_behind_matches_sync(self, tmp_path):
+        events = EventBuffer()
+        for index, char in enumerate("konnichiha"):
+            events.add(EventType.KEY_DOWN, index * 100000, ord(char.upper()), char)
+
+        sync_logger = CSVLogger(str(tmp_path / "sync"))
+        async_logger = CSVLogger(str(tmp_path / "async"), async_write=True, queue_size=2, fsync='batch')
+        paths = [
+            (sync_logger.save_events_csv(events), async_logger.save_events_csv(events)),
+            (sync_logger.save_kana_analysis_csv({"こ": {"avg_time": 1.5, "count": 2}}),
+             async_logger.save_kana_analysis_csv({"こ": {"avg_time": 1.5, "count": 2}})),
+        ]
+        async_logger.flush()
+
+        for sync_path, async_path in paths:
+            with open(sync_path, encoding='utf-8') as f, open(async_path, encoding='utf-8') as g:
+                assert f.read() == g.read()
+        assert not [name for name in os.listdir(tmp_path / "async") if name.endswith(".tmp")]
+
+        stats = async_logger.get_stats()
+        assert (stats["mode"], stats["queued"], stats["written"], stats["failed"]) == ("async", 2, 2, 0)
+
+        # 終了後の保存は同期で書く
+        async_logger.close()
+        assert async_logger.get_stats()["mode"] == "sync"
+        assert os.path.exists(async_logger.save_kana_analysis_csv({}))
+
+
+class TestSessionJournal:
+    def setup_method(self):
+        self.events = EventBuffer()
+        calc = StatisticsCalculator(keep_events=False)
+        for index, char in enumerate("kaki"):
+            self.events.add(EventType.KEY_DOWN, index * 100000, ord(char.upper()), char)
+            calc.add_event(KeyEvent(EventType.KEY_DOWN, index * 100000, ord(char.upper()), char))
+        self.stats_data = calc.calculate_statistics(4, 4)
+
+    def test_export_matches_csv_logger(self, tmp_path):
+        journal = SessionJournal(str(tmp_path / "journal"))
+        journal.append_session("s1", self.events, self.stats_data, "かき", 1.0, {"か": {"avg_time": 100.0, "count": 1}})
+
+        logger = CSVLogger(str(tmp_path / "csv"))
+        paths = {
+            'events': logger.save_events_csv(self.events),
+            'summary': logger.save_summary_csv(self.stats_data, "かき", 1.0),
+            'kana_analysis': logger.save_kana_analysis_csv({"か": {"avg_time": 100.0, "count": 1}}),
+        }
+        # 同じ秒に保存してもファイル名が衝突しない
+        assert len(set(paths.values())) == 3 and len(os.listdir(tmp_path / "csv")) == 3
+        for kind, path in paths.items():
+            with open(path, newline='', encoding='utf-8') as f:
+                assert journal.export_csv(kind=kind, session_id="s1") == f.read()
+        assert journal.export_csv("missing", "events") is None
+
+    def test_rotation_and_index(self, tmp_path):
+        journal = SessionJournal(str(tmp_path), max_bytes=1)
+        for index in range(3):
+            journal.append({"session_id": f"s{index}", "events": [[index, "key_down", 65, "a"]]})
+        assert len(journal.segments()) == 3
+
+        # 書きかけの行は読まず、次の追記と混ざらない
+        with open(tmp_path / journal.segments()[-1], 'ab') as f:
+            f.write(b'{"session_id": "torn')
+        assert [record["session_id"] for record, _ in journal.iter_records()] == ["s0", "s1", "s2"]
+        journal.max_bytes = 1 << 20
+        journal.append({"session_id": "s3"})
+
+        os.remove(tmp_path / "journal.idx")
+        assert journal.rebuild_index() == 4
+        assert SessionJournal(str(tmp_path)).get("s1")["events"] == [[1, "key_down", 65, "a"]]
+        assert journal.get("s3") == {"session_id": "s3"}
+        sessions, total = journal.list_sessions(limit=2)
+        assert total == 4 and [entry["session_id"] for entry in sessions] == ["s3", "s2"]
+
+    def test_concurrent_writers(self, tmp_path):
+        script = (
+            "import sys; from core.session_journal import SessionJournal; "
+            "journal = SessionJournal(sys.argv[1], max_bytes=4096); "
+            "[journal.append({'session_id': f'{sys.argv[2]}-{i}', 'pad': 'x' * 100}) for i in range(50)]"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        workers = [
+            subprocess.Popen([sys.executable, "-c", script, str(tmp_path), str(worker)], cwd=root)
+            for worker in range(4)
+        ]
+        assert all(worker.wait() == 0 for worker in workers)
+
+        journal = SessionJournal(str(tmp_path))
+        records = [record for record, _ in journal.iter_records()]
+        assert len(records) == 200 and len({record["session_id"] for record in records}) == 200
+        assert all(journal.get(f"{worker}-49")["pad"] == "x" * 100 for worker in range(4))
+
+        collector = BigramLatencyCollector(str(tmp_path), journal)
+        collector.refresh()
+        assert len(collector.files) == 200
+
+
+class TestResultsStore:
+    def setup_method(self):
+        calc = StatisticsCalculator(keep_events=False)
+        for index, char in enumerate("kaki"):
+            calc.add_event(KeyEvent(EventType.KEY_DOWN, index * 100000, ord(char.upper()), char))
+        self.stats_data = calc.calculate_statistics(4, 4)
+
+    def test_filters_and_aggregates(self, tmp_path):
+        store = ResultsStore(str(tmp_path / "results.db"))
+        store.add_result("s1", "a.json", self.stats_data, "かき", 1.0, completed_at=1000.0)
+        store.add_result("s2", "b.json", self.stats_data, "かき", 0.5, completed_at=2000.0)
+        store.add_result("s3", "a.json", self.stats_data, "かき", 0.75, completed_at=3000.0)
+
+        results, total = store.query(scenario="a.json", limit=1)
+        assert total == 2 and [result["session_id"] for result in results] == ["s3"]
+        assert store.query(since=1500.0, until=3000.0)[1] == 1
+
+        summary = store.summarize()
+        assert summary["session_count"] == 3 and summary["avg_accuracy_percent"] == 75.0
+        assert summary["total_duration_seconds"] == 3 * self.stats_data.total_duration / 1000000
+        assert store.summarize_by_scenario()[0] == {
+            "scenario": "a.json", "session_count": 2,
+            "avg_wpm_correct": round(self.stats_data.wpm_correct, 2), "avg_accuracy_percent": 87.5,
+        }
+        # 索引を使って絞り込む
+        plan = store._connect().execute(
+            "EXPLAIN QUERY PLAN SELECT COUNT(*) FROM results WHERE scenario = ? AND completed_at >= ?",
+            ("a.json", 0)).fetchall()
+        assert "idx_results_scenario" in str([tuple(row) for row in plan])
+
+    def test_import_summary_csv_and_export(self, tmp_path):
+        logger = CSVLogger(str(tmp_path / "output"))
+        logger.save_summary_csv(self.stats_data, "かき", 0.75)
+        store = ResultsStore(str(tmp_path / "results.db"))
+        assert store.import_summary_csvs(str(tmp_path / "output")) == 1
+        assert store.import_summary_csvs(str(tmp_path / "output")) == 1 and len(store) == 1
+
+        viewer = LogViewer(str(tmp_path / "output"), results=store)
+        latest = viewer.get_summary_statistics()["latest_summary"]
+        assert latest["metrics"]["Accuracy (%)"] == 75.0
+        assert latest["metrics"]["WPM (Correct)"] == round(self.stats_data.wpm_correct, 2)
+        assert viewer.get_interval_percentiles()["session_count"] == 1
+        assert viewer.export_statistics_summary(scenario="other.json") == {"total_sessions": 0, "sessions": {}}
+
+        lines = store.export_csv().splitlines()
+        assert lines[0].startswith("session_id,scenario,completed_at,Target Text") and len(lines) == 2
+
+    def test_imported_completed_at_comes_from_filename(self, tmp_path):
+        path = CSVLogger(str(tmp_path)).save_summary_csv(self.stats_data, "かき", 0.75)
+        legacy = str(tmp_path / "typing_summary_20240102_030405.csv")
+        shutil.copy(path, legacy)
+        store = ResultsStore(str(tmp_path / "results.db"))
+        store.add_result("session_1", "a.json", self.stats_data, "かき", 1.0,
+                         completed_at=datetime(2024, 1, 3).timestamp())
+        # コピーした時刻（更新日時）ではなく、ファイル名の日時で並ぶ
+        assert store.import_summary_csv(legacy)
+        results, _ = store.query()
+        assert [result["session_id"] for result in results] == ["session_1", "typing_summary_20240102_030405.csv"]
+        assert results[1]["completed_at"] == "2024-01-02T03:04:05"
+
+
+class TestCSVListing:
+    def _settle(self, directory):
+        # ディレクトリの更新時刻を過去にして、一覧のキャッシュが使われるようにする
+        past = os.stat(directory).st_mtime - 60
+        os.utime(directory, (past, past))
+
+    def test_paging_and_type_filter(self, tmp_path, monkeypatch):
+        for number in range(5):
+            for prefix in ("typing_events", "typing_summary"):
+                (tmp_path / f"{prefix}_{number}.csv").write_text("a,b\n")
+                os.utime(tmp_path / f"{prefix}_{number}.csv", (1000 + number, 1000 + number))
+        self._settle(tmp_path)
+        viewer = LogViewer(str(tmp_path))
+
+        files, total = viewer.get_csv_files_page("summary", offset=1, limit=2)
+        assert total == 5 and [f["filename"] for f in files] == ["typing_summary_3.csv", "typing_summary_2.csv"]
+        assert len(viewer.get_csv_files()) == 10
+
+        # ディレクトリが変わっていなければ読み直さない
+        scans = []
+        real_scandir = os.scandir
+        monkeypatch.setattr(os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+        assert viewer.get_summary_statistics()["file_types"]["summary"] == 5
+        assert viewer.get_csv_files_page(limit=1)[0][0]["filename"] == "typing_events_4.csv"
+        assert scans == []
+
+        assert viewer.delete_csv_file("typing_summary_4.csv")
+        assert viewer.get_csv_files_page("summary")[1] == 4
+
+    def test_logger_inserts_and_rescan_reuses_entries(self, tmp_path, monkeypatch):
+        (tmp_path / "typing_events_old.csv").write_text("a,b\n")
+        os.utime(tmp_path / "typing_events_old.csv", (1000, 1000))
+        self._settle(tmp_path)
+        viewer = LogViewer(str(tmp_path))
+        assert viewer.get_csv_files_page()[1] == 1
+
+        logger = CSVLogger(str(tmp_path))
+        logger.add_listener(viewer.add_csv_file)
+        path = logger.save_kana_analysis_csv({"か": {"avg_time": 100.0, "count": 1}})
+        # ほぼ同時に別のプロセスが書いたファイル
+        (tmp_path / "typing_events_other.csv").write_text("a,b\n")
+
+        # ディレクトリは読み直すが、変わっていないファイルの情報は使い回す
+        infos = []
+        real_file_info = viewer._file_info
+        monkeypatch.setattr(viewer, "_file_info", lambda name, stat: infos.append(name) or real_file_info(name, stat))
+        files, total = viewer.get_csv_files_page()
+        assert total == 3 and os.path.basename(path) in [f["filename"] for f in files]
+        assert viewer.get_csv_files_page("kana_analysis")[1] == 1
+        assert infos == ["typing_events_other.csv"]
+
+
+class TestSummaryIndex:
+    def _write_summary(self, directory, name, wpm):
+        with open(directory / name, 'w', newline='', encoding='utf-8') as f:
+            f.write(f"Metric,Value\nWPM (Correct),{wpm}\n")
+
+    def test_incremental_refresh(self, tmp_path):
+        self._write_summary(tmp_path, "typing_summary_1.csv", "10.00")
+        self._write_summary(tmp_path, "typing_summary_2.csv", "20.00")
+        index = SummaryIndex(str(tmp_path))
+        assert len(index.refresh()) == 2 and index.last_read == 2
+
+        # 変わっていなければ読まない
+        index.refresh()
+        assert index.last_read == 0 and index.total_reads == 2
+
+        self._write_summary(tmp_path, "typing_summary_3.csv", "30.00")
+        self._write_summary(tmp_path, "typing_summary_1.csv", "15.000")
+        os.remove(tmp_path / "typing_summary_2.csv")
+        entries = index.refresh()
+        assert index.last_read == 2 and index.last_removed == 1
+        assert {name: entry["metrics"]["WPM (Correct)"] for name, entry in entries.items()} == {
+            "typing_summary_1.csv": "15.000", "typing_summary_3.csv": "30.00"}
+
+        # 再起動後も索引を使う
+        restarted = SummaryIndex(str(tmp_path))
+        assert restarted.refresh() == entries and restarted.last_read == 0
+
+    def test_parallel_rebuild(self, tmp_path):
+        for number in range(40):
+            self._write_summary(tmp_path, f"typing_summary_{number:02d}.csv", f"{number}.00")
+        entries = SummaryIndex(str(tmp_path)).refresh()
+
+        os.remove(tmp_path / SUMMARY_INDEX_FILENAME)
+        index = SummaryIndex(str(tmp_path), max_workers=4)
+        assert index.refresh() == entries and index.last_read == 40
+
+        viewer = LogViewer(str(tmp_path))
+        exported = viewer.export_statistics_summary(limit=5)
+        assert exported["total_sessions"] == 40 and len(exported["sessions"]) == 5
+        assert viewer.summary_index.last_read == 0
+
+
+class TestEventLog:
+    def setup_method(self):
+        self.sessions = []
+        for offset in (0, 5):
+            events = EventBuffer()
+            for index, char in enumerate("kakikukeko"[offset:offset + 5]):
+                events.add(EventType.KEY_DOWN, 1700000000000000 + index * 150000, ord(char.upper()), char)
+            events.add(EventType.BACKSPACE, 1700000000000000 + 5 * 150000, 8, '\b')
+            events.add(EventType.KEY_UP, 1700000000000000 + 4 * 150000, 0, 'shift')
+            self.sessions.append(events)
+
+    def test_round_trip_and_zero_copy_columns(self, tmp_path):
+        assert list(decode_timestamps(encode_timestamps([5, 3, 1 << 40, 0]))) == [5, 3, 1 << 40, 0]
+        # 典型的なキー間隔の差分は3バイト以下
+        assert len(encode_timestamps([1700000000000000, 1700000000150000])) <= 8 + 3
+
+        log = BinaryEventLog(str(tmp_path))
+        filename = log.append_session("s1", self.sessions[0])
+        log.append_session("s2", self.sessions[1])
+        with EventLogReader(str(tmp_path / filename)) as reader:
+            assert reader.session_ids() == ["s1", "s2"]
+            block = reader.find("s2")
+            assert isinstance(block.virtual_keys, memoryview) and block.virtual_keys.readonly
+            assert block.virtual_keys.tolist()[:2] == [ord('U'), ord('K')]
+            assert block.info.first_timestamp == 1700000000000000
+            block.release()
+            replayed = [(session_id, list(events.rows())) for session_id, events in reader.iter_sessions()]
+        assert replayed == [("s1", list(self.sessions[0].rows())), ("s2", list(self.sessions[1].rows()))]
+
+    def test_matches_csv_and_feeds_collector(self, tmp_path):
+        log = BinaryEventLog(str(tmp_path))
+        logger = CSVLogger(str(tmp_path / "csv"))
+        paths = []
+        for index, events in enumerate(self.sessions):
+            log.append_session(f"s{index}", events)
+            paths.append(logger.save_events_csv(events))
+
+        from_log = load_event_logs(log.find_logs())
+        from_csv = BatchStatisticsCalculator.load_events_csv(paths)
+        assert list(from_log[0].rows()) == list(from_csv[0].rows()) and from_log[1] == from_csv[1]
+
+        collector = BigramLatencyCollector(str(tmp_path), event_log=log)
+        assert collector.refresh().transition_count == BigramLatencyCollector(str(tmp_path / "csv")).refresh().transition_count
+        log.append_session("s2", self.sessions[0])
+        collector.refresh()
+        assert len(collector.files) == 3
+
+    def test_torn_tail(self, tmp_path):
+        log = BinaryEventLog(str(tmp_path))
+        path = os.path.join(str(tmp_path), log.append_session("s1", self.sessions[0]))
+        with open(path, 'ab') as f:
+            f.write(b"TYBK\x01")
+
+        with EventLogReader(path) as reader:
+            assert reader.session_ids() == ["s1"]
+        log.append_session("s2", self.sessions[1])
+        with EventLogReader(path) as reader:
+            assert reader.session_ids() == ["s1", "s2"]
+
+        # 8 バイト境界に揃った書きかけのブロックも、確定済みの末尾位置より後ろなので読まない
+        size = os.path.getsize(path)
+        with open(path, 'ab') as f:
+            f.write(encode_block("s3", self.sessions[0])[:40])
+        with EventLogReader(path) as reader:
+            assert reader.session_ids() == ["s1", "s2"]
+        log.append_session("s4", self.sessions[0])
+        with EventLogReader(path) as reader:
+            assert reader.session_ids() == ["s1", "s2", "s4"]
+            assert reader.find("s4").info.offset == size
+
+    def test_without_positioned_io(self, tmp_path, monkeypatch):
+        # Windows には os.pread / os.pwrite がない
+        monkeypatch.delattr(os, "pread", raising=False)
+        monkeypatch.delattr(os, "pwrite", raising=False)
+        log = BinaryEventLog(str(tmp_path))
+        path = os.path.join(str(tmp_path), log.append_session("s1", self.sessions[0]))
+        with open(path, 'ab') as f:
+            f.write(b"TYBK\x01")
+        log.append_session("s2", self.sessions[1])
+        with EventLogReader(path) as reader:
+            assert reader.session_ids() == ["s1", "s2"]
+
+    def test_broken_block_stops_reading(self, tmp_path):
+        # 確定済みの末尾位置を記録していない古いファイルに壊れたブロックがある場合
+        path = str(tmp_path / "event_log_20240101.tyel")
+        with open(path, 'wb') as f:
+            f.write(struct.pack("<4sHHq", b"TYEL", 1, 0, 0))
+            f.write(encode_block("s1", self.sessions[0]))
+            f.write(b"XXXX" + b"\0" * 60)
+        with EventLogReader(path) as reader:
+            assert reader.session_ids() == ["s1"]
+
+
+class TestLiveStats:
+    def setup_method(self):
+        self.live = LiveStats()
+
+    def test_windows(self):
+        # 0～40秒に1秒ごとに入力（10秒ごとに1回ミス）
+        for second in range(41):
+            self.live.record(second * 1000000, "incorrect" if second % 10 == 0 else "correct")
+
+        snapshot = self.live.snapshot()
+        # 直近5秒 (35, 40] は5件（40秒のミスを含む）、直近30秒 (10, 40] は30件
+        assert snapshot["5s"]["keys"] == 5
+        assert snapshot["5s"]["cpm"] == 4 / (5 / 60)
+        assert snapshot["30s"]["keys"] == 30
+        assert snapshot["30s"]["accuracy"] == 0.9
+        # 最も長い時間窓の分だけ保持する
+        assert len(self.live.entries) == 30
+
+    def test_short_session_and_state(self):
+        self.live.record(0, "correct")
+        self.live.record(500000, "backspace")
+        self.live.record(1000000, "correct")
+        assert self.live.snapshot()["5s"]["cpm"] == 2 / (1 / 60)
+
+        restored = LiveStats.from_state(self.live.to_state())
+        assert restored.snapshot() == self.live.snapshot()
+
+    def test_session_records_live_stats(self):
+        session = TypingSession("test.json", "か", "ka")
+        session.apply_char("x", 0)
+        session.apply_char("k", 500)
+        restored = TypingSession.from_state(session.to_state())
+        assert restored.live_stats.snapshot()["5s"]["accuracy"] == 0.5
+
+
+class TestKanaAligner:
+    def setup_method(self):
+        self.session = TypingSession("test.json", "しった", "shitta")
+
+    def _type(self, chars, step=100):
+        for index, char in enumerate(chars):
+            self.session.apply_char(char, (index + 1) * step)
+
+    def test_kana_timing(self):
+        # 目標と異なる綴り（si）でも入力単位に対応づける
+        self._type("sitta")
+        data = self.session.stats_calculator.kana_input_data
+        assert [(d.kana, d.romaji) for d in data] == [("し", "si"), ("った", "tta")]
+        assert [(d.start_time, d.end_time) for d in data] == [(100000, 200000), (200000, 500000)]
+
+        top = self.session.stats_calculator.get_top_n_kana_by_time(n=1)
+        assert top == [("った", 300.0)]
+        assert top == self.session.stats_calculator.get_top_n_kana_by_time(data, n=1)
+
+    def test_backspace_and_state(self):
+        self._type("shi")
+        self.session.apply_backspace(400)
+        assert self.session.stats_calculator.kana_input_data == []
+        self.session.apply_char("i", 500)
+        self.session.apply_char("t", 550)
+
+        # 保存するのは入力中の単位だけで、確定したかなはイベント列から求め直す
+        state = self.session.to_state()
+        assert state["kana_aligner"] == {"chars": "t", "times": [550000], "last_end": 500000, "done": 1}
+        restored = TypingSession.from_state(state, self.session.events)
+        restored.apply_backspace(580)
+        restored.apply_char("t", 600)
+        restored.apply_char("t", 700)
+        restored.apply_char("a", 800)
+        analysis = restored.stats_calculator.get_kana_analysis()
+        assert analysis == {"し": {"avg_time": 400.0, "count": 1}, "った": {"avg_time": 300.0, "count": 1}}
+
+    def test_n_completes_on_next_unit(self):
+        # "kanji" の ん は次の j で確定するが、時刻と綴りは n の入力で記録する
+        aligner = KanaAligner(compile_automaton("kannji"))
+        automaton = aligner.automaton
+        state = automaton.start
+        emitted = []
+        for index, char in enumerate("kanji"):
+            state = automaton.step(state, char)
+            emitted += aligner.advance(state, char, index)
+        assert [(d.kana, d.romaji, d.end_time) for d in emitted] == [
+            ("か", "ka", 1), ("ん", "n", 2), ("じ", "ji", 4)
+        ]
+
+
+class TestTypingSession:
+    def setup_method(self):
+        self.session = TypingSession("test.json", "こんにちは", "konnichiha")
+
+    def test_apply_batch(self):
+        results = self.session.apply_batch([
+            {"char": "k", "timestamp": 0},
+            {"char": "x", "timestamp": 100},
+            {"type": "backspace", "timestamp": 200},
+            {"char": "k", "timestamp": 300},
+        ])
+
+        assert [r["result"] for r in results] == ["correct", "incorrect", "backspace", "correct"]
+        assert self.session.judge.get_current_position() == 1
+        assert len(self.session.events) == 4
+        assert self.session.events[-1].timestamp == 300000
+
+    def test_batch_matches_single_events(self):
+        single = TypingSession("test.json", "こんにちは", "konnichiha")
+        for i, char in enumerate("konx"):
+            single.apply_char(char, i * 100)
+
+        self.session.apply_batch([
+            {"char": char, "timestamp": i * 100} for i, char in enumerate("konx")
+        ])
+
+        assert self.session.judge.get_progress_display() == single.judge.get_progress_display()
+
+    def test_validate_batch(self):
+        assert TypingSession.validate_batch([{"char": "a", "timestamp": 0}]) == ""
+        assert TypingSession.validate_batch([{"type": "backspace"}]) == ""
+        assert TypingSession.validate_batch({"char": "a"}) != ""
+        assert TypingSession.validate_batch([{"timestamp": 0}]) != ""
+        assert TypingSession.validate_batch([{"char": 5, "timestamp": 0}]) != ""
+        assert TypingSession.validate_batch([{"char": ["a"], "timestamp": 0}]) != ""
+        assert TypingSession.validate_batch([{"char": "a", "timestamp": "0"}]) != ""
+        assert TypingSession.validate_batch([{"type": "backspace", "timestamp": True}]) != ""
+        assert TypingSession.validate_batch([{"char": "\U0001F600", "timestamp": 0}]) != ""
+        assert TypingSession.validate_event({"char": "a", "timestamp": float("nan")}) != ""
+
+    def test_fractional_timestamp(self):
+        self.session.apply_char("k", 12.5)
+        self.session.apply_backspace(20.25)
+        assert [e.timestamp for e in self.session.events] == [12500, 20250]
+
+    def test_submit_reorders_and_drops_duplicates(self):
+        assert self.session.submit(2, {"char": "o", "timestamp": 100}) == []
+        assert self.session.get_ack() == 0
+
+        applied = self.session.submit(1, {"char": "k", "timestamp": 0})
+        assert applied == [{"seq": 1, "result": "correct"}, {"seq": 2, "result": "correct"}]
+        assert self.session.get_ack() == 2
+
+        # 再送は無視される
+        assert self.session.submit(1, {"char": "k", "timestamp": 0}) == []
+        assert self.session.judge.get_current_position() == 2
+        assert [e.character for e in self.session.events] == ["k", "o"]
+
+    def test_submit_window_and_state(self):
+        with pytest.raises(ValueError):
+            self.session.submit(1 + REORDER_WINDOW, {"char": "k", "timestamp": 0})
+
+        self.session.submit(3, {"type": "backspace", "timestamp": 200})
+        restored = TypingSession.from_state(json.loads(json.dumps(self.session.to_state())))
+        assert restored.reorder_buffer == {3: {"type": "backspace", "timestamp": 200}}
+        assert restored.get_ack() == 0
+
+
+    def test_replay_verifies_client_result(self):
+        self.session.apply_char("x", 0)  # サーバー側で受け付けた入力は再生に使わない
+        batch = [{"char": c, "timestamp": i * 100} for i, c in enumerate("kox")]
+        batch.append({"type": "backspace", "timestamp": 400})
+
+        replayed = self.session.replay(batch)
+        assert len(replayed.events) == 4
+        assert replayed.verify_client_result(
+            {"current_position": 1, "correct_count": 2, "incorrect_count": 1, "is_completed": False}
+        ) == {}
+
+        mismatches = replayed.verify_client_result(
+            {"current_position": 2, "correct_count": 2, "incorrect_count": 1, "is_completed": False}
+        )
+        assert mismatches == {"current_position": {"client": 2, "server": 1}}
+
+
+class TestJudgeConformance:
+    """Python / JS の判定器が共通の適合テストケースで一致することを確認"""
+
+    def setup_method(self):
+        with open(CONFORMANCE_CASES, encoding="utf-8") as f:
+            self.cases = json.load(f)
+
+    def test_python_judge(self):
+        for case in self.cases:
+            session = TypingSession("conformance.json", "", case["target_rubi"])
+            results = [
+                session.apply_batch([{"type": "backspace"} if c == "\b" else {"char": c}])[0]["result"]
+                for c in case["inputs"]
+            ]
+            actual = dict(results=results, **session.judge.get_progress_delta())
+            assert actual == case["expected"], case["name"]
+
+    def test_automata_up_to_date(self):
+        with open(CONFORMANCE_AUTOMATA, encoding="utf-8") as f:
+            stored = json.load(f)
+
+        for case in self.cases:
+            rubi = case["target_rubi"].lower()
+            expected = json.loads(json.dumps(compile_automaton(rubi).to_dict()))
+            assert stored[rubi] == expected, "run tests/conformance/update_automata.py"
+
+    def test_js_judge(self):
+        node = shutil.which("node")
+        if node is None:
+            pytest.skip("node is not installed")
+
+        runner = os.path.join(os.path.dirname(CONFORMANCE_CASES), "run_judge_cases.js")
+        completed = subprocess.run([node, runner], capture_output=True, text=True)
+        assert completed.returncode == 0, completed.stderr
+
+
+class TestKeystrokeChannel:
+    def setup_method(self):
+        self.session = TypingSession("test.json", "こんにちは", "konnichiha")
+        self.store = SessionStore()
+        self.store.put("s1", self.session)
+        self.channel = KeystrokeChannel(self.store, "s1")
+
+    def test_char_frame(self):
+        reply = json.loads(self.channel.handle_frame('{"s":1,"t":10,"c":"k"}'))
+        assert reply == {"s": 1, "a": 1, "r": "correct", "p": 1, "f": 0}
+        assert self.session.events[0].timestamp == 10000
+
+    def test_resent_frame_shares_http_sequence(self):
+        self.channel.handle_frame('{"s":1,"t":10,"c":"k"}')
+        # 接続が切れた後に HTTP で同じ番号を再送しても二重に適用されない
+        assert self.session.submit(1, {"char": "k", "timestamp": 10}) == []
+        reply = json.loads(self.channel.handle_frame('{"s":1,"t":10,"c":"k"}'))
+        assert "r" not in reply
+        assert reply["a"] == 1
+        assert self.session.judge.current_position == 1
+
+    def test_backspace_frame(self):
+        self.channel.handle_frame('{"s":1,"t":10,"c":"k"}')
+        reply = json.loads(self.channel.handle_frame('{"s":2,"t":20,"b":1}'))
+        assert reply["r"] == "backspace"
+        assert reply["p"] == 0
+
+    def test_invalid_frame(self):
+        assert "e" in json.loads(self.channel.handle_frame("not json"))
+        assert "e" in json.loads(self.channel.handle_frame('{"s":1,"t":10}'))
+        assert "e" in json.loads(self.channel.handle_frame('{"t":10,"c":"k"}'))
+
+
+class TestSessionStore:
+    def _session(self):
+        return TypingSession("test.json", "あい", "ai")
+
+    def test_put_and_get(self):
+        store = SessionStore(max_sessions=10, idle_ttl=60)
+        session = self._session()
+        store.put("s1", session)
+
+        assert store.get("s1") is session
+        assert "s1" in store
+        assert store.pop("s1") is session
+        assert store.get("s1") is None
+
+    def test_lru_eviction(self):
+        store = SessionStore(max_sessions=2, idle_ttl=60)
+        store.put("s1", self._session())
+        store.put("s2", self._session())
+        store.get("s1")  # s1 を最近使用にする
+        store.put("s3", self._session())
+
+        assert "s1" in store
+        assert "s2" not in store
+        assert store.get_stats()["evictions"]["lru"] == 1
+
+    def test_idle_sweep(self):
+        store = SessionStore(max_sessions=10, idle_ttl=0)
+        store.put("s1", self._session())
+        store.put("s2", self._session())
+
+        assert store.sweep() == 2
+        assert len(store) == 0
+        assert store.get_stats()["evictions"]["idle"] == 2
+
+    def test_stats_memory(self):
+        store = SessionStore(max_sessions=10, idle_ttl=60)
+        session = self._session()
+        store.put("s1", session)
+        before = store.get_stats()["estimated_session_bytes"]
+        session.apply_char("a", 0)
+
+        assert store.get_stats()["estimated_session_bytes"] > before
+
+
+class TestSQLiteSessionStore:
+    def setup_method(self):
+        self.session = TypingSession("test.json", "こんにちは", "konnichiha")
+
+    def test_edit_persists_state_and_events(self, tmp_path):
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+        store.put("s1", self.session)
+
+        with store.edit("s1") as session:
+            session.apply_char("k", 0)
+            session.apply_char("x", 100)
+        with store.edit("s1") as session:
+            session.apply_backspace(200)
+            session.apply_char("k", 300)
+
+        judge = store.get("s1").judge
+        assert judge.to_state() == {
+            "current_position": 1, "correct_count": 2, "incorrect_count": 1, "typed": "k",
+            "states": [judge.automaton.start, judge.automaton.step(judge.automaton.start, "k")],
+        }
+
+        restored = store.pop("s1")
+        assert [e.timestamp for e in restored.events] == [0, 100000, 200000, 300000]
+        assert restored.events[2].event_type == EventType.BACKSPACE
+        assert restored.stats_calculator.event_count == 4
+        assert "s1" not in store
+
+    def test_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / "sessions.db")
+        SQLiteSessionStore(path).put("s1", self.session)
+
+        other = SQLiteSessionStore(path)
+        with other.edit("s1") as session:
+            session.apply_char("k", 0)
+
+        assert SQLiteSessionStore(path).get("s1").judge.get_current_position() == 1
+
+    def test_eviction(self, tmp_path):
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"), max_sessions=1, idle_ttl=0)
+        store.put("s1", self.session)
+        store.put("s2", self.session)
+
+        assert "s1" not in store
+        assert store.sweep() == 1
+        assert store.get_stats()["evictions"] == {"lru": 1, "idle": 1}
+
+    def test_missing_session(self, tmp_path):
+        store = SQLiteSessionStore(str(tmp_path / "sessions.db"))
+        with store.edit("missing") as session:
+            assert session is None
+        assert store.pop("missing") is None
+
 
 class TestScenarioManager:
     def setup_method(self):
@@ -132,6 +1221,15 @@ class TestScenarioManager:
         result = self.manager.load_scenario("nonexistent.json")
         assert result is None
 
+    def test_sentences_rubi_generated(self, tmp_path):
+        (tmp_path / "s.json").write_text(
+            json.dumps({"sentences": ["がっこう", "ラーメン"]}, ensure_ascii=False), encoding="utf-8"
+        )
+        manager = ScenarioManager(str(tmp_path))
+
+        assert manager.get_first_sentence("s.json") == ("がっこう", "gakkou")
+        assert manager.get_all_sentences("s.json") == [("がっこう", "gakkou"), ("ラーメン", "ra-menn")]
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])